@@ -0,0 +1,228 @@
+"""
+Tính BMI/BMR/TDEE và mục tiêu dinh dưỡng cho hàng loạt hồ sơ bằng phép toán mảng NumPy.
+
+Dùng chung hằng số với UserHealthCalculator nên kết quả khớp với API từng người
+(/nutrition/analyze-body). Đầu vào CSV hoặc mảng JSON các UserProfile, có thể kèm cột "id"
+để đối chiếu; đầu ra dạng CSV hoặc NDJSON, sinh từng khối để trả về dạng stream.
+
+CLI:
+    python -m app.bulk_metrics cohort.csv --format ndjson -o metrics.ndjson
+"""
+
+from __future__ import annotations
+
+import argparse
+import csv
+import io
+import json
+import sys
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import numpy as np
+
+from .rounding import py_round
+from .schemas import ActivityLevel, Gender, Goal
+from .user_health_calculator import UserHealthCalculator
+
+PROFILE_FIELDS = ("height", "weight", "age", "gender", "activity_level", "goal")
+OUTPUT_FIELDS = (
+    "id", "bmi", "bmi_category", "bmr", "tdee",
+    "daily_calories_target", "daily_protein_target", "daily_carbs_target", "daily_fat_target",
+    "error",
+)
+
+# Số dòng mỗi khối khi ghi kết quả dạng stream
+CHUNK_ROWS = 1000
+
+
+class BulkProfiles:
+    """Các cột hồ sơ đã chuẩn hoá thành mảng, kèm lỗi kiểm tra theo từng dòng"""
+
+    def __init__(self, rows: List[Dict]):
+        n = len(rows)
+        self.size = n
+        self.ids = [str(r.get("id", i)) for i, r in enumerate(rows)]
+        self.errors: List[Optional[str]] = [None] * n
+
+        self.height = self._numeric(rows, "height")
+        self.weight = self._numeric(rows, "weight")
+        self.age = self._numeric(rows, "age")
+        self.gender = self._categorical(rows, "gender", [g.value for g in Gender])
+        self.activity_level = self._categorical(rows, "activity_level", [a.value for a in ActivityLevel])
+        self.goal = self._categorical(rows, "goal", [g.value for g in Goal])
+
+        # Cùng giới hạn với UserProfile
+        self._check_range("height", self.height, 0, 300)
+        self._check_range("weight", self.weight, 0, 500)
+        self._check_range("age", self.age, 0, 120)
+        bad_age = np.flatnonzero(~np.isnan(self.age) & (self.age != np.floor(self.age)))
+        self._mark(bad_age, "age phải là số nguyên")
+
+        self.valid = np.array([e is None for e in self.errors], dtype=bool)
+
+    def _mark(self, indices: Iterable[int], message: str) -> None:
+        for i in indices:
+            if self.errors[i] is None:
+                self.errors[i] = message
+
+    def _numeric(self, rows: List[Dict], field: str) -> np.ndarray:
+        try:
+            # Đường nhanh: toàn bộ cột chuyển được sang số
+            values = np.array([r.get(field) for r in rows], dtype=np.float64)
+        except (TypeError, ValueError):
+            values = np.full(len(rows), np.nan, dtype=np.float64)
+            for i, r in enumerate(rows):
+                raw = r.get(field)
+                try:
+                    values[i] = float(raw)
+                except (TypeError, ValueError):
+                    self._mark([i], f"{field} không hợp lệ: {raw!r}")
+        # Thiếu cột, null hoặc "nan" đều thành NaN (np.array đổi None sang NaN), không được tính tiếp
+        self._mark(np.flatnonzero(np.isnan(values)), f"{field} không hợp lệ")
+        return values
+
+    def _categorical(self, rows: List[Dict], field: str, choices: List[str]) -> np.ndarray:
+        values = np.array([str(r.get(field, "")).strip().lower() for r in rows], dtype=object)
+        invalid = np.flatnonzero(~np.isin(values, choices))
+        self._mark(invalid, f"{field} phải là một trong {choices}")
+        return values
+
+    def _check_range(self, field: str, values: np.ndarray, low: float, high: float) -> None:
+        out = np.flatnonzero(~np.isnan(values) & ((values <= low) | (values > high)))
+        self._mark(out, f"{field} phải trong khoảng ({low}, {high}]")
+
+
+def _lookup(values: np.ndarray, table: Dict[str, float], default: float) -> np.ndarray:
+    """Tra bảng theo mảng chuỗi: searchsorted trên các khoá đã sắp xếp"""
+    keys = np.array(sorted(table), dtype=object)
+    mapped = np.array([table[k] for k in keys], dtype=np.float64)
+    idx = np.clip(np.searchsorted(keys, values), 0, len(keys) - 1)
+    return np.where(keys[idx] == values, mapped[idx], default)
+
+
+def compute_bulk_metrics(profiles: BulkProfiles) -> Dict[str, np.ndarray]:
+    """Tính toàn bộ chỉ số cho mọi hồ sơ bằng phép toán mảng"""
+    calc = UserHealthCalculator
+    height = np.nan_to_num(profiles.height)
+    weight = np.nan_to_num(profiles.weight)
+    age = np.nan_to_num(profiles.age)
+
+    height_m = height / 100
+    with np.errstate(divide="ignore", invalid="ignore"):
+        bmi_raw = weight / (height_m * height_m)
+    uppers = np.array([upper for upper, _ in calc.BMI_CATEGORIES])
+    labels = np.array([label for _, label in calc.BMI_CATEGORIES], dtype=object)
+    bmi_category = labels[np.minimum(np.searchsorted(uppers, bmi_raw, side="right"), len(labels) - 1)]
+
+    male = profiles.gender == "male"
+    coeffs = np.where(
+        male[:, None],
+        np.array(calc.BMR_COEFFICIENTS["male"]),
+        np.array(calc.BMR_COEFFICIENTS["female"]),
+    )
+    bmr = py_round(coeffs[:, 0] + coeffs[:, 1] * weight + coeffs[:, 2] * height - coeffs[:, 3] * age, 0)
+
+    multiplier = _lookup(profiles.activity_level, calc.ACTIVITY_MULTIPLIERS, calc.DEFAULT_ACTIVITY_MULTIPLIER)
+    tdee = py_round(bmr * multiplier, 0)
+
+    target_calories = tdee + _lookup(profiles.goal, calc.GOAL_CALORIE_ADJUSTMENTS, 0)
+    result = {
+        "bmi": py_round(bmi_raw, 1),
+        "bmi_category": bmi_category,
+        "bmr": bmr,
+        "tdee": tdee,
+        "daily_calories_target": py_round(target_calories, 0),
+    }
+    for macro, (ratio, cal_per_gram) in calc.MACRO_SPLIT.items():
+        result[f"daily_{macro}_target"] = py_round(target_calories * ratio / cal_per_gram, 1)
+    return result
+
+
+def _output_rows(profiles: BulkProfiles, metrics: Dict[str, np.ndarray], start: int, end: int) -> List[Dict]:
+    rows = []
+    for i in range(start, end):
+        if profiles.valid[i]:
+            row = {"id": profiles.ids[i]}
+            for field, values in metrics.items():
+                value = values[i]
+                row[field] = value if isinstance(value, str) else float(value)
+            row["error"] = None
+        else:
+            row = {"id": profiles.ids[i], "error": profiles.errors[i]}
+        rows.append(row)
+    return rows
+
+
+def iter_ndjson(profiles: BulkProfiles, metrics: Dict[str, np.ndarray]) -> Iterator[str]:
+    for start in range(0, profiles.size, CHUNK_ROWS):
+        rows = _output_rows(profiles, metrics, start, min(start + CHUNK_ROWS, profiles.size))
+        yield "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in rows)
+
+
+def iter_csv(profiles: BulkProfiles, metrics: Dict[str, np.ndarray]) -> Iterator[str]:
+    buf = io.StringIO()
+    writer = csv.DictWriter(buf, fieldnames=OUTPUT_FIELDS)
+    writer.writeheader()
+    for start in range(0, profiles.size, CHUNK_ROWS):
+        for row in _output_rows(profiles, metrics, start, min(start + CHUNK_ROWS, profiles.size)):
+            writer.writerow(row)
+        yield buf.getvalue()
+        buf.seek(0)
+        buf.truncate()
+    if buf.tell():
+        yield buf.getvalue()
+
+
+def parse_profiles(content: str, fmt: Optional[str] = None) -> List[Dict]:
+    """Đọc danh sách hồ sơ từ CSV (có dòng tiêu đề) hoặc mảng JSON. fmt=None thì tự nhận dạng."""
+    text = content.lstrip("\ufeff")
+    if fmt is None:
+        fmt = "json" if text.lstrip().startswith("[") else "csv"
+    if fmt == "json":
+        data = json.loads(text)
+        if not isinstance(data, list):
+            raise ValueError("JSON phải là một mảng các hồ sơ")
+        return [r if isinstance(r, dict) else {} for r in data]
+    if fmt == "csv":
+        return list(csv.DictReader(io.StringIO(text)))
+    raise ValueError(f"Định dạng không hỗ trợ: {fmt}")
+
+
+def stream_bulk_metrics(rows: List[Dict], output: str = "ndjson") -> Iterator[str]:
+    profiles = BulkProfiles(rows)
+    metrics = compute_bulk_metrics(profiles)
+    if output == "csv":
+        return iter_csv(profiles, metrics)
+    if output == "ndjson":
+        return iter_ndjson(profiles, metrics)
+    raise ValueError(f"Định dạng đầu ra không hỗ trợ: {output}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Tính chỉ số sức khỏe cho hàng loạt hồ sơ (CSV/JSON)")
+    parser.add_argument("input", help="File CSV hoặc JSON, '-' để đọc từ stdin")
+    parser.add_argument("--format", choices=["csv", "ndjson"], default="ndjson", help="Định dạng đầu ra")
+    parser.add_argument("-o", "--output", help="File đầu ra (mặc định stdout)")
+    args = parser.parse_args()
+
+    if args.input == "-":
+        content = sys.stdin.read()
+        fmt = None
+    else:
+        path = Path(args.input)
+        content = path.read_text(encoding="utf-8")
+        fmt = "json" if path.suffix.lower() == ".json" else "csv" if path.suffix.lower() == ".csv" else None
+
+    chunks = stream_bulk_metrics(parse_profiles(content, fmt), args.format)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8", newline="") as f:
+            for chunk in chunks:
+                f.write(chunk)
+    else:
+        for chunk in chunks:
+            sys.stdout.write(chunk)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,3 +1,4 @@
+import os
 from pathlib import Path
 
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -9,3 +10,118 @@ DEFAULT_IMAGE_SIZE = 256
 DEFAULT_NUM_EPOCHS = 5
 DEFAULT_BATCH_SIZE = 32
 DEFAULT_LR = 5e-4
+
+# Kho dữ liệu dinh dưỡng: "json" (nạp toàn bộ file), "sqlite" (truy vấn theo nhu cầu)
+# hoặc "binary" (catalog nhị phân mmap, các worker dùng chung một bản trong page cache)
+NUTRITION_DIR = BASE_DIR / "datasets" / "nutrition"
+NUTRITION_JSON_PATH = NUTRITION_DIR / "vietnamese_foods.json"
+NUTRITION_DB_PATH = Path(os.getenv("NUTRITION_DB_PATH", NUTRITION_DIR / "vietnamese_foods.sqlite3"))
+NUTRITION_BIN_PATH = Path(os.getenv("NUTRITION_BIN_PATH", NUTRITION_DIR / "vietnamese_foods.bin"))
+NUTRITION_BACKEND = os.getenv("NUTRITION_BACKEND", "json")
+NUTRITION_DB_POOL_SIZE = int(os.getenv("NUTRITION_DB_POOL_SIZE", "4"))
+
+# Số hồ sơ người dùng được nhớ kết quả BMI/BMR/TDEE (LRU)
+USER_METRICS_CACHE_SIZE = int(os.getenv("USER_METRICS_CACHE_SIZE", "4096"))
+
+# Giới hạn số hồ sơ mỗi request tính chỉ số hàng loạt
+BULK_METRICS_MAX_ROWS = int(os.getenv("BULK_METRICS_MAX_ROWS", "200000"))
+
+# Bảng luật khuyến nghị (ngưỡng, điểm, lời khuyên) - sửa file này để đổi ngưỡng mà không cần sửa code
+RECOMMENDATION_RULES_PATH = Path(os.getenv(
+    "RECOMMENDATION_RULES_PATH", Path(__file__).resolve().parent / "rules" / "recommendation_rules.json"
+))
+
+# Bảng alias nhãn mô hình -> món trong catalog dinh dưỡng (dùng khi tên món không suy ra được từ nhãn)
+LABEL_ALIASES_PATH = Path(os.getenv(
+    "LABEL_ALIASES_PATH", Path(__file__).resolve().parent / "rules" / "label_aliases.json"
+))
+
+# Cache kết quả khuyến nghị theo (hồ sơ đã lượng tử hoá, món ăn)
+RECOMMENDATION_CACHE_SIZE = int(os.getenv("RECOMMENDATION_CACHE_SIZE", "20000"))
+RECOMMENDATION_CACHE_MAX_BYTES = int(os.getenv("RECOMMENDATION_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RECOMMENDATION_CACHE_TTL = float(os.getenv("RECOMMENDATION_CACHE_TTL", "3600"))
+# Bước làm tròn chiều cao (cm) và cân nặng (kg) khi tạo khoá cache; 0 = không làm tròn
+PROFILE_HEIGHT_STEP = float(os.getenv("PROFILE_HEIGHT_STEP", "1"))
+PROFILE_WEIGHT_STEP = float(os.getenv("PROFILE_WEIGHT_STEP", "0.5"))
+
+# Nhật ký ăn uống (SQLite, append-only) và số ngày giữ chi tiết trước khi nén
+MEAL_LOG_PATH = Path(os.getenv("MEAL_LOG_PATH", BASE_DIR / "data" / "meal_log.sqlite3"))
+MEAL_LOG_RETENTION_DAYS = int(os.getenv("MEAL_LOG_RETENTION_DAYS", "90"))
+
+# Cache ảnh huấn luyện đã giải mã (uint8 memmap), tự dựng lại khi file nguồn thay đổi
+TRAIN_CACHE_DIR = Path(os.getenv("TRAIN_CACHE_DIR", BASE_DIR / "data" / "train_cache"))
+TRAIN_CACHE_ENABLED = os.getenv("TRAIN_CACHE_ENABLED", "1") not in ("0", "false", "no")
+TRAIN_CACHE_SHARD_IMAGES = int(os.getenv("TRAIN_CACHE_SHARD_IMAGES", "512"))
+# Đọc dataset tuần tự từ shard tar (thay cho ảnh rời), số ảnh mỗi shard và kích thước shuffle buffer
+TRAIN_STREAMING = os.getenv("TRAIN_STREAMING", "0") in ("1", "true", "yes")
+TRAIN_TAR_SHARD_IMAGES = int(os.getenv("TRAIN_TAR_SHARD_IMAGES", "1000"))
+TRAIN_SHUFFLE_BUFFER = int(os.getenv("TRAIN_SHUFFLE_BUFFER", "1000"))
+# Chế độ huấn luyện tối ưu CPU: bf16 autocast ("auto" = khi CPU hỗ trợ bf16 gốc), channels_last,
+# torch.compile; số worker DataLoader và số batch nạp trước mỗi worker
+TRAIN_PERF_MODE = os.getenv("TRAIN_PERF_MODE", "0") in ("1", "true", "yes")
+TRAIN_BF16 = os.getenv("TRAIN_BF16", "auto")
+TRAIN_CHANNELS_LAST = os.getenv("TRAIN_CHANNELS_LAST", "1") not in ("0", "false", "no")
+TRAIN_COMPILE = os.getenv("TRAIN_COMPILE", "0") in ("1", "true", "yes")
+TRAIN_NUM_WORKERS = int(os.getenv("TRAIN_NUM_WORKERS", "2"))
+TRAIN_PREFETCH_FACTOR = int(os.getenv("TRAIN_PREFETCH_FACTOR", "4"))
+
+# Cache activation của phần backbone bị đóng băng: chỉ huấn luyện các block cuối + classifier
+TRAIN_FEATURE_CACHE = os.getenv("TRAIN_FEATURE_CACHE", "0") in ("1", "true", "yes")
+# Số biến thể mỗi ảnh train: biến thể 0 không augment, các biến thể còn lại augment ngẫu nhiên cố định
+TRAIN_FEATURE_VARIANTS = int(os.getenv("TRAIN_FEATURE_VARIANTS", "3"))
+
+# Huấn luyện tăng dần khi thêm lớp: số ảnh cũ giữ lại mỗi lớp (replay) và mức giảm accuracy lớp cũ tối đa
+INCREMENTAL_REPLAY_PER_CLASS = int(os.getenv("INCREMENTAL_REPLAY_PER_CLASS", "20"))
+INCREMENTAL_MAX_OLD_ACC_DROP = float(os.getenv("INCREMENTAL_MAX_OLD_ACC_DROP", "0.02"))
+
+# Job huấn luyện chạy ở tiến trình riêng: thư mục lưu trạng thái, độ ưu tiên (nice) và ngân sách CPU
+# TRAIN_JOB_BUDGETS dạng "default=1-3;nightly=4-7" (mỗi ngân sách chạy tối đa 1 job); rỗng = mọi CPU trừ CPU 0
+TRAIN_JOBS_DIR = Path(os.getenv("TRAIN_JOBS_DIR", BASE_DIR / "data" / "jobs"))
+TRAIN_JOB_NICE = int(os.getenv("TRAIN_JOB_NICE", "10"))
+TRAIN_JOB_BUDGETS = os.getenv("TRAIN_JOB_BUDGETS", "")
+
+# Crawler ảnh cho autotrain: số luồng tải, giới hạn đồng thời và tốc độ (request/giây) mỗi host,
+# số lần thử lại, cache kết quả tìm kiếm và kích thước ảnh tối thiểu
+CRAWLER_MAX_WORKERS = int(os.getenv("CRAWLER_MAX_WORKERS", "16"))
+CRAWLER_PER_HOST = int(os.getenv("CRAWLER_PER_HOST", "4"))
+CRAWLER_HOST_RATE = float(os.getenv("CRAWLER_HOST_RATE", "4"))
+CRAWLER_RETRIES = int(os.getenv("CRAWLER_RETRIES", "3"))
+CRAWLER_TIMEOUT = float(os.getenv("CRAWLER_TIMEOUT", "20"))
+CRAWLER_CACHE_DIR = Path(os.getenv("CRAWLER_CACHE_DIR", BASE_DIR / "data" / "crawl_cache"))
+CRAWLER_SEARCH_CACHE_TTL = float(os.getenv("CRAWLER_SEARCH_CACHE_TTL", str(7 * 24 * 3600)))
+CRAWLER_MAX_IMAGE_BYTES = int(os.getenv("CRAWLER_MAX_IMAGE_BYTES", str(10 * 1024 * 1024)))
+CRAWLER_MIN_IMAGE_SIDE = int(os.getenv("CRAWLER_MIN_IMAGE_SIDE", "64"))
+
+# Autotrain: số ảnh hợp lệ tối thiểu để một lớp được đưa vào huấn luyện tăng dần
+AUTOTRAIN_MIN_CLASS_IMAGES = int(os.getenv("AUTOTRAIN_MIN_CLASS_IMAGES", "5"))
+
+# Ảnh gần trùng: số bit dHash (64 bit) lệch tối đa để coi là cùng một ảnh
+DEDUPE_HAMMING_THRESHOLD = int(os.getenv("DEDUPE_HAMMING_THRESHOLD", "4"))
+
+# Checkpoint đầy đủ để chạy tiếp lần train bị ngắt: thư mục các lần chạy và số epoch giữa hai lần ghi
+TRAIN_RUNS_DIR = Path(os.getenv("TRAIN_RUNS_DIR", BASE_DIR / "data" / "runs"))
+TRAIN_CHECKPOINT_EVERY = int(os.getenv("TRAIN_CHECKPOINT_EVERY", "1"))
+
+# Huấn luyện data-parallel nhiều tiến trình CPU (gloo): số tiến trình mặc định
+TRAIN_DDP_WORLD_SIZE = int(os.getenv("TRAIN_DDP_WORLD_SIZE", "1"))
+
+# Dò siêu tham số (app/training/sweep.py): số CPU mỗi trial, mốc epoch đầu tiên và hệ số loại của successive halving
+TRAIN_SWEEP_CPUS_PER_TRIAL = int(os.getenv("TRAIN_SWEEP_CPUS_PER_TRIAL", "2"))
+TRAIN_SWEEP_MIN_EPOCHS = int(os.getenv("TRAIN_SWEEP_MIN_EPOCHS", "1"))
+TRAIN_SWEEP_ETA = int(os.getenv("TRAIN_SWEEP_ETA", "3"))
+
+# Chưng cất Large -> Small (app/training/distill.py): nhiệt độ softmax, trọng số phần loss theo teacher,
+# số biến thể augment cố định mỗi ảnh train (logits teacher được cache cho từng biến thể)
+DISTILL_TEMPERATURE = float(os.getenv("DISTILL_TEMPERATURE", "4.0"))
+DISTILL_ALPHA = float(os.getenv("DISTILL_ALPHA", "0.7"))
+DISTILL_VARIANTS = int(os.getenv("DISTILL_VARIANTS", "4"))
+
+# Nén mô hình cho máy kiosk (app/training/compress.py): các mức sparsity kênh cần quét và backend int8
+# (x86/fbgemm cho CPU x86, qnnpack cho ARM)
+COMPRESS_SPARSITIES = [float(s) for s in os.getenv("COMPRESS_SPARSITIES", "0.25,0.5,0.7").split(",") if s.strip()]
+COMPRESS_QUANT_ENGINE = os.getenv("COMPRESS_QUANT_ENGINE", "x86")
+
+# Đánh giá offline (app/training/evaluate.py): các batch đo độ trễ, số lần đo mỗi batch, số khoảng tính ECE
+EVAL_BATCH_SIZES = [int(s) for s in os.getenv("EVAL_BATCH_SIZES", "1,8,32").split(",") if s.strip()]
+EVAL_LATENCY_RUNS = int(os.getenv("EVAL_LATENCY_RUNS", "20"))
+EVAL_ECE_BINS = int(os.getenv("EVAL_ECE_BINS", "15"))
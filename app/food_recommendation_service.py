@@ -1,7 +1,15 @@
-from typing import Dict, List
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from app.rounding import py_round
+from app.recommendation_rules import get_ruleset
 from app.schemas import UserProfile, UserMetrics, FoodRecommendation
 from app.user_health_calculator import UserHealthCalculator
 
+# Các chất được so với mục tiêu hàng ngày (tên chỉ số trong bảng luật: "<chất>_percent")
+PERCENT_NUTRIENTS = ("calories", "protein", "carbs", "fat")
+
 class FoodRecommendationService:
     """Dịch vụ tư vấn và khuyến nghị món ăn"""
     
@@ -42,132 +50,67 @@ class FoodRecommendationService:
             }
         }
     
+    @staticmethod
+    def rule_metrics(user_profile: UserProfile, food_analysis: dict, user_metrics: Optional[UserMetrics] = None) -> dict:
+        """Chỉ số đầu vào cho bảng luật khuyến nghị (app/rules/recommendation_rules.json)"""
+        metrics = {f"{nutrient}_percent": food_analysis[nutrient]["percent"] for nutrient in PERCENT_NUTRIENTS}
+        metrics["goal"] = user_profile.goal
+        if user_metrics is not None:
+            metrics["bmi_category"] = user_metrics.bmi_category
+        return metrics
+    
     @staticmethod
     def generate_recommendation(user_profile: UserProfile, food_analysis: dict) -> str:
         """Đưa ra khuyến nghị chính"""
-        calories_percent = food_analysis["calories"]["percent"]
-        
-        if user_profile.goal == "lose_weight":
-            if calories_percent > 30:
-                return "HẠN CHẾ ĂN"
-            elif calories_percent > 20:
-                return "ĂN VỪA PHẢI"
-            else:
-                return "NÊN ĂN"
-        elif user_profile.goal == "gain_weight":
-            if calories_percent < 15:
-                return "NÊN ĂN THÊM"
-            elif calories_percent < 25:
-                return "NÊN ĂN"
-            else:
-                return "ĂN VỪA PHẢI"
-        else:  # maintain
-            if calories_percent > 25:
-                return "ĂN VỪA PHẢI"
-            else:
-                return "NÊN ĂN"
+        metrics = FoodRecommendationService.rule_metrics(user_profile, food_analysis)
+        return get_ruleset("recommendation_label").evaluate(metrics).label
     
     @staticmethod
     def generate_detailed_advice(user_profile: UserProfile, food_analysis: dict, user_metrics: UserMetrics) -> List[str]:
         """Tạo lời khuyên chi tiết"""
-        advice = []
-        
-        calories_percent = food_analysis["calories"]["percent"]
-        protein_percent = food_analysis["protein"]["percent"]
-        carbs_percent = food_analysis["carbs"]["percent"]
-        fat_percent = food_analysis["fat"]["percent"]
-        
-        # Lời khuyên về calories
-        if calories_percent > 30:
-            advice.append("⚠️ Món ăn này có lượng calo cao, chiếm {:.1f}% nhu cầu hàng ngày".format(calories_percent))
-        elif calories_percent < 10:
-            advice.append("✅ Món ăn này ít calo, chỉ chiếm {:.1f}% nhu cầu hàng ngày".format(calories_percent))
-        
-        # Lời khuyên về protein
-        if protein_percent > 40:
-            advice.append("💪 Protein cao, tốt cho cơ bắp và no lâu")
-        elif protein_percent < 15:
-            advice.append("🥩 Có thể bổ sung thêm protein từ thịt, cá, trứng")
-        
-        # Lời khuyên về carbs
-        if carbs_percent > 40:
-            advice.append("🍞 Carbs cao, nên ăn vào buổi sáng hoặc trước khi tập")
-        elif carbs_percent < 20:
-            advice.append("🌾 Carbs thấp, phù hợp với chế độ low-carb")
-        
-        # Lời khuyên về fat
-        if fat_percent > 40:
-            advice.append("🥑 Chất béo cao, nên ăn vừa phải")
-        elif fat_percent < 15:
-            advice.append("🥜 Chất béo thấp, có thể bổ sung từ các loại hạt")
-        
-        # Lời khuyên theo mục tiêu
-        if user_profile.goal == "lose_weight":
-            if calories_percent > 25:
-                advice.append("🎯 Để giảm cân, nên ăn món này vào bữa chính và giảm bữa phụ")
-        elif user_profile.goal == "gain_weight":
-            if calories_percent < 20:
-                advice.append("🎯 Để tăng cân, có thể ăn thêm món này hoặc bổ sung thêm calo")
-        
-        # Lời khuyên theo BMI
-        if user_metrics.bmi_category == "Thừa cân" or user_metrics.bmi_category == "Béo phì":
-            advice.append("📊 Với BMI hiện tại, nên ưu tiên món ăn ít calo, nhiều protein")
-        elif user_metrics.bmi_category == "Thiếu cân":
-            advice.append("📊 Với BMI hiện tại, nên ưu tiên món ăn giàu calo và dinh dưỡng")
-        
-        return advice
+        metrics = FoodRecommendationService.rule_metrics(user_profile, food_analysis, user_metrics)
+        return get_ruleset("recommendation_advice").evaluate(metrics).messages()
     
     @staticmethod
     def calculate_health_score(user_profile: UserProfile, food_analysis: dict) -> float:
         """Tính điểm sức khỏe của món ăn (0-100)"""
-        score = 100
-        
-        calories_percent = food_analysis["calories"]["percent"]
-        protein_percent = food_analysis["protein"]["percent"]
-        carbs_percent = food_analysis["carbs"]["percent"]
-        fat_percent = food_analysis["fat"]["percent"]
-        
-        # Trừ điểm nếu calories quá cao
-        if calories_percent > 40:
-            score -= 20
-        elif calories_percent > 30:
-            score -= 10
-        elif calories_percent > 25:
-            score -= 5
-        
-        # Cộng điểm nếu protein cân bằng
-        if 20 <= protein_percent <= 40:
-            score += 10
-        elif protein_percent < 15:
-            score -= 5
-        
-        # Cộng điểm nếu carbs cân bằng
-        if 30 <= carbs_percent <= 50:
-            score += 10
-        elif carbs_percent > 60:
-            score -= 5
-        
-        # Cộng điểm nếu fat cân bằng
-        if 20 <= fat_percent <= 35:
-            score += 10
-        elif fat_percent > 40:
-            score -= 5
-        
-        # Điểm theo mục tiêu
-        if user_profile.goal == "lose_weight" and calories_percent <= 25:
-            score += 15
-        elif user_profile.goal == "gain_weight" and calories_percent >= 20:
-            score += 15
-        elif user_profile.goal == "maintain" and 20 <= calories_percent <= 30:
-            score += 15
-        
-        return max(0, min(100, round(score, 1)))
+        metrics = FoodRecommendationService.rule_metrics(user_profile, food_analysis)
+        return get_ruleset("recommendation_score").evaluate(metrics).score
+    
+    @staticmethod
+    def score_foods(user_profile: UserProfile, foods: Dict[str, np.ndarray],
+                    user_metrics: Optional[UserMetrics] = None) -> Dict[str, np.ndarray]:
+        """Chấm điểm nhiều món cùng lúc cho một người dùng.
+        foods là các cột dinh dưỡng (calories, protein, carbs, fat) dạng mảng; trả về
+        "health_score" và "recommendation" theo cùng thứ tự, khớp với get_food_recommendation.
+        """
+        if user_metrics is None:
+            user_metrics = UserHealthCalculator.calculate_user_metrics(user_profile)
+        size = len(foods["calories"])
+        metrics = {"goal": user_profile.goal, "bmi_category": user_metrics.bmi_category}
+        for nutrient in PERCENT_NUTRIENTS:
+            target = getattr(user_metrics, f"daily_{nutrient}_target")
+            values = np.asarray(foods.get(nutrient, np.zeros(size)), dtype=np.float64)
+            percent = values / target * 100 if target > 0 else np.zeros(size)
+            metrics[f"{nutrient}_percent"] = py_round(percent, 1)
+        return {
+            "health_score": get_ruleset("recommendation_score").evaluate_batch(metrics, size).scores,
+            "recommendation": get_ruleset("recommendation_label").evaluate_batch(metrics, size).labels,
+        }
     
     @staticmethod
-    def get_food_recommendation(user_profile: UserProfile, food_name: str, food_nutrition: dict) -> FoodRecommendation:
-        """Tạo khuyến nghị hoàn chỉnh cho món ăn"""
+    def get_food_recommendation(
+        user_profile: UserProfile,
+        food_name: str,
+        food_nutrition: dict,
+        user_metrics: Optional[UserMetrics] = None,
+    ) -> FoodRecommendation:
+        """Tạo khuyến nghị hoàn chỉnh cho món ăn.
+        Truyền user_metrics đã tính sẵn để không phải tính lại khi xử lý nhiều món cho cùng người dùng.
+        """
         # Tính toán metrics người dùng
-        user_metrics = UserHealthCalculator.calculate_user_metrics(user_profile)
+        if user_metrics is None:
+            user_metrics = UserHealthCalculator.calculate_user_metrics(user_profile)
         
         # Phân tích dinh dưỡng món ăn
         food_analysis = FoodRecommendationService.analyze_food_nutrition(food_nutrition, user_metrics)
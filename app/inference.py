@@ -1,4 +1,5 @@
 from __future__ import annotations
+from io import BytesIO
 from pathlib import Path
 from typing import List, Tuple
 import torch
@@ -52,6 +53,11 @@ def load_model() -> None:
     raise RuntimeError(f"Không nạp được mô hình từ {MODEL_PATH}: {last_err}")
 
 
+def labels() -> List[str]:
+    """Danh sách nhãn của mô hình đang nạp (đối tượng mới sau mỗi lần load_model)"""
+    return _labels
+
+
 def ensure_loaded() -> None:
     if _model is None:
         load_model()
@@ -65,18 +71,34 @@ def _build_transform() -> transforms.Compose:
     ])
 
 
-def predict(img: Image.Image) -> Tuple[str, float]:
+_transform = _build_transform()
+
+
+def preprocess(img: Image.Image) -> torch.Tensor:
+    """Ảnh PIL -> tensor đầu vào (1, 3, H, W)"""
+    return _transform(img).unsqueeze(0)
+
+
+def decode_image(content: bytes) -> torch.Tensor:
+    """Giải mã ảnh upload (bytes) thành tensor đầu vào, không cần mô hình"""
+    return preprocess(Image.open(BytesIO(content)).convert("RGB"))
+
+
+def predict_tensor(tensor: torch.Tensor) -> Tuple[str, float]:
     ensure_loaded()
     if _model is None:
         raise RuntimeError("Model chưa sẵn sàng. Hãy train trước hoặc đặt file models/best.pt và labels.txt")
     if not _labels:
         raise RuntimeError("Thiếu labels.txt. Hãy train để sinh labels")
 
-    transform = _build_transform()
-    tensor = transform(img).unsqueeze(0).to(_device)
+    tensor = tensor.to(_device)
     with torch.inference_mode():
         logits = _model(tensor)
         probs = torch.softmax(logits, dim=1)
         score, idx = torch.max(probs, dim=1)
         dish = _labels[int(idx.item())] if int(idx.item()) < len(_labels) else str(int(idx.item()))
         return dish, float(score.item())
+
+
+def predict(img: Image.Image) -> Tuple[str, float]:
+    return predict_tensor(preprocess(img))
@@ -0,0 +1,112 @@
+"""
+Ánh xạ nhãn mô hình (labels.txt, vd "pho_bo") sang món trong catalog dinh dưỡng (vd "Phở bò").
+
+Bảng ánh xạ được dựng một lần khi nạp mô hình hoặc catalog, sau đó tra cứu theo nhãn là O(1).
+Thứ tự so khớp cho mỗi nhãn:
+    1. nhãn trùng food_key
+    2. bảng alias (app/rules/label_aliases.json): food_key hoặc tên món, thử theo thứ tự
+    3. nhãn sau khi bỏ dấu trùng food_key/tên món sau khi bỏ dấu ("Phở bò" -> "pho_bo")
+Nhãn không khớp được liệt kê trong unmapped và in ra khi dựng bảng.
+"""
+
+from __future__ import annotations
+
+import json
+import re
+import threading
+import unicodedata
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+
+from .config import LABEL_ALIASES_PATH
+from .nutrition_store import NutritionStore
+
+_NON_WORD = re.compile(r"[^a-z0-9]+")
+
+
+def fold_name(text: str) -> str:
+    """Bỏ dấu tiếng Việt, chữ thường, nối bằng "_": "Phở bò" -> "pho_bo" """
+    text = unicodedata.normalize("NFD", str(text).replace("đ", "d").replace("Đ", "D"))
+    text = "".join(ch for ch in text if unicodedata.category(ch) != "Mn")
+    return _NON_WORD.sub("_", text.lower()).strip("_")
+
+
+def load_aliases(path: str | Path = LABEL_ALIASES_PATH) -> Dict[str, List[str]]:
+    path = Path(path)
+    if not path.exists():
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    return {
+        label: [candidates] if isinstance(candidates, str) else list(candidates)
+        for label, candidates in data.items()
+        if not label.startswith("_")
+    }
+
+
+class LabelCatalog:
+    """Bảng nhãn -> dict dinh dưỡng, dựng lại khi danh sách nhãn hoặc catalog thay đổi"""
+
+    def __init__(self, store: NutritionStore, aliases: Optional[Dict[str, List[str]]] = None):
+        self.store = store
+        self.aliases = load_aliases() if aliases is None else aliases
+        self._lock = threading.Lock()
+        self._labels: Optional[Sequence[str]] = None
+        self._store_version: Optional[int] = None
+        self._foods: Dict[str, Dict] = {}
+        self.mapping: Dict[str, str] = {}
+        self.unmapped: List[str] = []
+
+    def _resolve(self, label: str, names: Dict[str, str], folded: Dict[str, str]) -> Optional[str]:
+        if label in names:
+            return names[label]
+        for candidate in self.aliases.get(label, []):
+            key = names.get(candidate) or folded.get(fold_name(candidate))
+            if key is not None:
+                return key
+        return folded.get(fold_name(label))
+
+    def build(self, labels: Sequence[str]) -> None:
+        """Dựng bảng ánh xạ cho danh sách nhãn (duyệt catalog một lần)"""
+        version = self.store.version
+        # names: food_key hoặc tên món chính xác -> food_key; folded: dạng bỏ dấu -> food_key
+        names: Dict[str, str] = {}
+        folded: Dict[str, str] = {}
+        foods = list(self.store.items())
+        # food_key ưu tiên hơn tên món khi trùng nhau
+        for key, _ in foods:
+            names[key] = key
+            folded.setdefault(fold_name(key), key)
+        for key, food in foods:
+            name = str(food.get("name") or "")
+            if name:
+                names.setdefault(name, key)
+                folded.setdefault(fold_name(name), key)
+
+        mapping: Dict[str, str] = {}
+        unmapped: List[str] = []
+        for label in labels:
+            key = self._resolve(label, names, folded)
+            if key is None:
+                unmapped.append(label)
+            else:
+                mapping[label] = key
+        by_key = dict(foods)
+        resolved = {label: dict(by_key[key]) for label, key in mapping.items()}
+
+        with self._lock:
+            self.mapping, self.unmapped, self._foods = mapping, unmapped, resolved
+            self._labels, self._store_version = labels, version
+        if unmapped:
+            print(f"[LABEL_CATALOG] {len(unmapped)}/{len(labels)} nhãn không có trong catalog dinh dưỡng: {', '.join(unmapped)}")
+        else:
+            print(f"[LABEL_CATALOG] Đã ánh xạ {len(mapping)} nhãn vào catalog dinh dưỡng")
+
+    def refresh(self, labels: Sequence[str]) -> None:
+        """Dựng lại nếu mô hình đã nạp danh sách nhãn mới hoặc catalog đã reload"""
+        if labels is not self._labels or self.store.version != self._store_version:
+            self.build(labels)
+
+    def lookup(self, label: str) -> Optional[Dict]:
+        """Dinh dưỡng của món ứng với nhãn, None nếu nhãn chưa ánh xạ. Dict dùng chung, không được sửa."""
+        return self._foods.get(label)
@@ -1,16 +1,20 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
-from fastapi.responses import JSONResponse
+import asyncio
+
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, BackgroundTasks, Response, Query
+from fastapi.responses import JSONResponse, StreamingResponse
 from PIL import Image
+from pydantic import ValidationError
 from io import BytesIO
 from pathlib import Path
-import json
-from typing import List
+from datetime import date
+from typing import List, Optional, Tuple
 
 from . import inference
 from .schemas import (
     TrainRequest, 
     PredictResponse, 
     AutoTrainRequest, 
+    SweepRequest,
     NutritionInfo, 
     FoodListResponse,
     NutritionAnalysis,
@@ -22,25 +26,93 @@ from .schemas import (
     # New schemas for nutrition advice
     UserProfile,
     UserMetrics,
-    FoodRecommendation
+    FoodRecommendation,
+    MealEntryRequest,
+    MealEntry,
+    IntakeProgress
 )
-from .config import MODEL_DIR
-from .training.train import train_model
-from .training.clean_dataset import clean_dataset
-from .training.auto_dataset import build_dataset
+from .config import MODEL_DIR, BULK_METRICS_MAX_ROWS, TRAIN_DDP_WORLD_SIZE
+from .training.jobs import JobBusyError, JobManager
 from .nutrition_analyzer import NutritionAnalyzer
+from .nutrition_store import open_nutrition_store
 from .user_health_calculator import UserHealthCalculator
-from .food_recommendation_service import FoodRecommendationService
+from .bulk_metrics import parse_profiles, stream_bulk_metrics
+from .timing import StageTimer
+from .label_catalog import LabelCatalog
+from .recommendation_cache import RecommendationCache
+from .meal_log import MealLog
 
 app = FastAPI(title="ScanFood Server", version="0.1.0")
 
+# Kho dữ liệu dinh dưỡng dùng chung (JSON hoặc SQLite, xem NUTRITION_BACKEND)
+nutrition_store = open_nutrition_store()
+
 # Khởi tạo nutrition analyzer
-nutrition_analyzer = NutritionAnalyzer()
+nutrition_analyzer = NutritionAnalyzer(store=nutrition_store)
+
+# Ánh xạ nhãn mô hình -> món trong catalog, dựng khi nạp mô hình/catalog
+label_catalog = LabelCatalog(nutrition_store)
+
+# Cache khuyến nghị theo (hồ sơ đã lượng tử hoá, food_key), xoá khi catalog/luật nạp lại
+recommendation_cache = RecommendationCache(nutrition_store)
+
+
+def _prepare_catalog() -> bool:
+    """Kiểm tra database dinh dưỡng và cập nhật bảng nhãn -> món nếu mô hình/catalog vừa đổi"""
+    if not nutrition_store.exists:
+        return False
+    label_catalog.refresh(inference.labels())
+    return True
+
+
+def _find_food(food_name: str) -> Optional[Tuple[str, dict]]:
+    """Tìm (food_key, thông tin dinh dưỡng) theo key hoặc tên món (không phân biệt hoa thường)"""
+    found = nutrition_store.find(food_name)
+    # Chuyển về dict thường (backend nhị phân trả về view chỉ đọc)
+    return (found[0], dict(found[1])) if found else None
+
+
+_meal_log: Optional[MealLog] = None
+
+
+def get_meal_log() -> MealLog:
+    """Nhật ký ăn uống dùng chung, mở khi được dùng lần đầu"""
+    global _meal_log
+    if _meal_log is None:
+        _meal_log = MealLog()
+    return _meal_log
+
+
+_job_manager: Optional[JobManager] = None
+
+
+def get_job_manager() -> JobManager:
+    """Quản lý job huấn luyện (tiến trình riêng), khởi tạo khi được dùng lần đầu"""
+    global _job_manager
+    if _job_manager is None:
+        _job_manager = JobManager()
+    return _job_manager
+
+
+def _submit_job(kind: str, params: dict, budget: str) -> dict:
+    try:
+        return get_job_manager().submit(kind, params, budget)
+    except JobBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+
+def _find_food_nutrition(food_name: str) -> Optional[dict]:
+    """Tìm thông tin dinh dưỡng theo key hoặc tên món (không phân biệt hoa thường)"""
+    found = _find_food(food_name)
+    return found[1] if found else None
 
 @app.on_event("startup")
 async def startup_event():
     MODEL_DIR.mkdir(parents=True, exist_ok=True)
     inference.load_model()
+    label_catalog.build(inference.labels())
 
 
 @app.get("/health")
@@ -48,6 +120,21 @@ async def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics/cache")
+async def cache_metrics():
+    """Thống kê cache khuyến nghị và cache chỉ số người dùng"""
+    user_metrics = UserHealthCalculator.cache_info()
+    return {
+        "recommendations": recommendation_cache.stats(),
+        "user_metrics": {
+            "hits": user_metrics.hits,
+            "misses": user_metrics.misses,
+            "maxsize": user_metrics.maxsize,
+            "currsize": user_metrics.currsize,
+        },
+    }
+
+
 @app.post("/predict", response_model=PredictResponse)
 async def predict(file: UploadFile = File(...)):
     try:
@@ -60,61 +147,114 @@ async def predict(file: UploadFile = File(...)):
 
 
 @app.post("/train")
-async def train(req: TrainRequest, background_tasks: BackgroundTasks):
+async def train(req: TrainRequest):
     dataset_dir = Path(req.dataset_dir)
     if not dataset_dir.exists():
         raise HTTPException(status_code=400, detail=f"dataset_dir không tồn tại: {dataset_dir}")
 
-    # chạy nền để không block request
-    background_tasks.add_task(
-        train_model,
-        dataset_dir=str(dataset_dir),
-        num_epochs=req.num_epochs or 5,
-        batch_size=req.batch_size or 32,
-        learning_rate=req.learning_rate or 5e-4,
-    )
-    return JSONResponse({"status": "training_started"})
+    # chạy ở tiến trình riêng để không chiếm CPU của server
+    params = {
+        "dataset_dir": str(dataset_dir),
+        "num_epochs": req.num_epochs or 5,
+        "batch_size": req.batch_size or 32,
+        "learning_rate": req.learning_rate or 5e-4,
+        "cache_features": req.cache_features,
+        "resume": req.resume,
+    }
+    world_size = req.world_size or TRAIN_DDP_WORLD_SIZE
+    if world_size > 1:
+        # Các rank chia nhau CPU của ngân sách job
+        job = _submit_job("distributed", {**params, "world_size": world_size}, req.budget)
+    else:
+        job = _submit_job("train", params, req.budget)
+    return JSONResponse({"status": "training_started", "job_id": job["id"]})
 
 
 @app.post("/autotrain")
-async def autotrain(req: AutoTrainRequest, background_tasks: BackgroundTasks):
+async def autotrain(req: AutoTrainRequest):
     base_dataset_dir = Path.cwd() / "datasets"
     base_dataset_dir.mkdir(parents=True, exist_ok=True)
 
-    # Crawl ảnh
-    built_dir = build_dataset(base_dataset_dir, req.classes, images_per_class=req.images_per_class)
+    # Crawl + kiểm tra ảnh + train đều chạy trong job nền, trả về ngay job_id
+    # (incremental: lớp nào đủ ảnh thì được train ngay, không chờ các lớp còn lại)
+    job = _submit_job("autotrain", {
+        "classes": req.classes,
+        "dataset_dir": str(base_dataset_dir),
+        "images_per_class": req.images_per_class,
+        "num_epochs": req.num_epochs,
+        "batch_size": req.batch_size,
+        "learning_rate": req.learning_rate,
+        "incremental": req.incremental,
+        "cache_features": req.cache_features,
+    }, req.budget)
+    return JSONResponse({"status": "autotrain_started", "dataset_dir": str(base_dataset_dir),
+                         "incremental": req.incremental, "job_id": job["id"]})
+
+
+@app.post("/sweep")
+async def sweep(req: SweepRequest):
+    dataset_dir = Path(req.dataset_dir)
+    if not dataset_dir.exists():
+        raise HTTPException(status_code=400, detail=f"dataset_dir không tồn tại: {dataset_dir}")
+
+    # Các trial chạy song song trong CPU của ngân sách job; trial thắng ghi vào models/
+    job = _submit_job("sweep", {
+        "dataset_dir": str(dataset_dir),
+        "space": req.space,
+        "n_trials": req.n_trials,
+        "min_epochs": req.min_epochs,
+        "eta": req.eta,
+        "install": req.install,
+    }, req.budget)
+    return JSONResponse({"status": "sweep_started", "job_id": job["id"]})
 
-    # Clean dataset trước khi train
-    deleted, scanned = clean_dataset(built_dir)
-    print(f"[CLEAN_DATASET] deleted={deleted} / scanned={scanned}")
 
-    # Train nền
-    background_tasks.add_task(
-        train_model,
-        dataset_dir=built_dir,
-        num_epochs=req.num_epochs,
-        batch_size=req.batch_size,
-        learning_rate=req.learning_rate,
-    )
-    return JSONResponse({"status": "autotrain_started", "dataset_dir": built_dir})
+@app.get("/jobs")
+async def list_jobs():
+    """Danh sách job huấn luyện (mới nhất trước)"""
+    return get_job_manager().list()
+
+
+@app.get("/jobs/{job_id}")
+async def get_job(job_id: str):
+    """Trạng thái và tiến độ từng epoch (loss, accuracy, ảnh/giây) của một job"""
+    try:
+        return get_job_manager().get(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Không tìm thấy job {job_id}")
+
+
+@app.post("/jobs/{job_id}/cancel")
+async def cancel_job(job_id: str):
+    try:
+        return get_job_manager().cancel(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Không tìm thấy job {job_id}")
+
+
+@app.post("/jobs/{job_id}/resume")
+async def resume_job(job_id: str):
+    try:
+        return get_job_manager().resume(job_id)
+    except KeyError:
+        raise HTTPException(status_code=404, detail=f"Không tìm thấy job {job_id}")
+    except JobBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
 
 
 @app.get("/nutrition/{food_name}", response_model=NutritionInfo)
 async def get_nutrition(food_name: str):
     """Lấy thông tin dinh dưỡng cho món ăn"""
     try:
-        nutrition_file = Path.cwd() / "datasets" / "nutrition" / "vietnamese_foods.json"
-        if not nutrition_file.exists():
+        if not nutrition_store.exists:
             raise HTTPException(status_code=404, detail="Database dinh dưỡng không tồn tại")
         
-        with open(nutrition_file, 'r', encoding='utf-8') as f:
-            nutrition_data = json.load(f)
-        
         # Tìm kiếm món ăn (không phân biệt hoa thường)
-        food_name_lower = food_name.lower()
-        for key, data in nutrition_data.items():
-            if key.lower() == food_name_lower or data["name"].lower() == food_name_lower:
-                return data
+        data = _find_food_nutrition(food_name)
+        if data:
+            return data
         
         # Nếu không tìm thấy, trả về lỗi
         raise HTTPException(status_code=404, detail=f"Không tìm thấy thông tin dinh dưỡng cho: {food_name}")
@@ -127,15 +267,11 @@ async def get_nutrition(food_name: str):
 async def list_all_foods():
     """Liệt kê tất cả các món ăn có trong database dinh dưỡng"""
     try:
-        nutrition_file = Path.cwd() / "datasets" / "nutrition" / "vietnamese_foods.json"
-        if not nutrition_file.exists():
+        if not nutrition_store.exists:
             raise HTTPException(status_code=404, detail="Database dinh dưỡng không tồn tại")
         
-        with open(nutrition_file, 'r', encoding='utf-8') as f:
-            nutrition_data = json.load(f)
-        
         # Trả về danh sách tên các món ăn
-        food_list = [{"key": key, "name": data["name"]} for key, data in nutrition_data.items()]
+        food_list = [{"key": key, "name": data["name"]} for key, data in nutrition_store.items()]
         return {"foods": food_list}
         
     except Exception as e:
@@ -228,18 +364,16 @@ async def get_foods_by_category(category: str):
         raise HTTPException(status_code=500, detail=f"Lỗi khi lấy món ăn theo phân loại: {str(e)}")
 
 @app.get("/nutrition/search", response_model=FoodSearch)
-async def search_foods(query: str):
-    """Tìm kiếm món ăn theo tên hoặc mô tả"""
+async def search_foods(query: str, limit: Optional[int] = Query(None, ge=1)):
+    """Tìm kiếm món ăn theo tên hoặc mô tả (limit: số món tối đa, mặc định trả về tất cả)"""
     try:
-        summaries = nutrition_analyzer.get_all_foods_summary()
-        query_lower = query.lower()
-        
-        # Tìm kiếm theo tên món ăn hoặc mô tả
+        # Tìm kiếm theo tên món ăn hoặc mô tả (FTS5 nếu dùng backend SQLite)
         matched_foods = []
-        for food in summaries:
-            if (query_lower in food["food_name"].lower() or 
-                query_lower in food.get("description", "").lower()):
-                matched_foods.append(food)
+        for food_key in nutrition_store.search(query, limit=limit):
+            summary = nutrition_analyzer.get_nutrition_summary(food_key)
+            if summary:
+                summary["food_key"] = food_key
+                matched_foods.append(summary)
         
         return {
             "query": query,
@@ -260,6 +394,25 @@ async def analyze_user_body(user_profile: UserProfile):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lỗi khi phân tích thông tin cơ thể: {str(e)}")
 
+@app.post("/nutrition/analyze-body/bulk")
+async def analyze_user_body_bulk(file: UploadFile = File(...), output: str = "ndjson"):
+    """Tính BMI, BMR, TDEE cho hàng loạt hồ sơ (file CSV hoặc mảng JSON), trả về CSV/NDJSON dạng stream"""
+    if output not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="output phải là 'csv' hoặc 'ndjson'")
+    try:
+        content = (await file.read()).decode("utf-8-sig")
+        suffix = Path(file.filename or "").suffix.lower()
+        fmt = "json" if suffix == ".json" else "csv" if suffix == ".csv" else None
+        rows = parse_profiles(content, fmt)
+    except ValueError as e:
+        # json.JSONDecodeError và UnicodeDecodeError đều là ValueError
+        raise HTTPException(status_code=400, detail=f"Không đọc được danh sách hồ sơ: {str(e)}")
+    if len(rows) > BULK_METRICS_MAX_ROWS:
+        raise HTTPException(status_code=413, detail=f"Tối đa {BULK_METRICS_MAX_ROWS} hồ sơ mỗi lần")
+
+    media_type = "text/csv" if output == "csv" else "application/x-ndjson"
+    return StreamingResponse(stream_bulk_metrics(rows, output), media_type=media_type)
+
 @app.post("/nutrition/daily-needs", response_model=UserMetrics)
 async def calculate_daily_nutrition_needs(user_profile: UserProfile):
     """Tính toán nhu cầu dinh dưỡng hàng ngày dựa trên thông tin cá nhân"""
@@ -274,26 +427,19 @@ async def get_food_recommendation(user_profile: UserProfile, food_name: str):
     """Đưa ra khuyến nghị về món ăn dựa trên thông tin cá nhân"""
     try:
         # Lấy thông tin dinh dưỡng món ăn
-        nutrition_file = Path.cwd() / "datasets" / "nutrition" / "vietnamese_foods.json"
-        if not nutrition_file.exists():
+        if not nutrition_store.exists:
             raise HTTPException(status_code=404, detail="Không tìm thấy file dinh dưỡng")
         
-        with open(nutrition_file, 'r', encoding='utf-8') as f:
-            foods_data = json.load(f)
-        
         # Tìm món ăn
-        food_nutrition = None
-        for food in foods_data:
-            if food["name"].lower() == food_name.lower():
-                food_nutrition = food
-                break
+        found = _find_food(food_name)
         
-        if not food_nutrition:
+        if not found:
             raise HTTPException(status_code=404, detail=f"Không tìm thấy món ăn: {food_name}")
+        food_key, food_nutrition = found
         
         # Tạo khuyến nghị sử dụng service mới
-        recommendation = FoodRecommendationService.get_food_recommendation(
-            user_profile, food_name, food_nutrition
+        recommendation = recommendation_cache.get_recommendation(
+            user_profile, food_key, food_name, food_nutrition
         )
         
         return recommendation
@@ -305,26 +451,19 @@ async def get_complete_nutrition_analysis(user_profile: UserProfile, food_name:
     """Phân tích hoàn chỉnh dinh dưỡng và đưa ra khuyến nghị chi tiết"""
     try:
         # Lấy thông tin dinh dưỡng món ăn
-        nutrition_file = Path.cwd() / "datasets" / "nutrition" / "vietnamese_foods.json"
-        if not nutrition_file.exists():
+        if not nutrition_store.exists:
             raise HTTPException(status_code=404, detail="Không tìm thấy file dinh dưỡng")
         
-        with open(nutrition_file, 'r', encoding='utf-8') as f:
-            foods_data = json.load(f)
-        
         # Tìm món ăn
-        food_nutrition = None
-        for food in foods_data:
-            if food["name"].lower() == food_name.lower():
-                food_nutrition = food
-                break
+        found = _find_food(food_name)
         
-        if not food_nutrition:
+        if not found:
             raise HTTPException(status_code=404, detail=f"Không tìm thấy món ăn: {food_name}")
+        food_key, food_nutrition = found
         
         # Tạo phân tích hoàn chỉnh sử dụng service mới
-        complete_analysis = FoodRecommendationService.get_food_recommendation(
-            user_profile, food_name, food_nutrition
+        complete_analysis = recommendation_cache.get_recommendation(
+            user_profile, food_key, food_name, food_nutrition
         )
         
         return complete_analysis
@@ -342,34 +481,29 @@ async def compare_multiple_foods(user_profile: UserProfile, food_names: List[str
             raise HTTPException(status_code=400, detail="Chỉ có thể so sánh tối đa 5 món ăn")
         
         # Lấy thông tin dinh dưỡng
-        nutrition_file = Path.cwd() / "datasets" / "nutrition" / "vietnamese_foods.json"
-        if not nutrition_file.exists():
+        if not nutrition_store.exists:
             raise HTTPException(status_code=404, detail="Không tìm thấy file dinh dưỡng")
         
-        with open(nutrition_file, 'r', encoding='utf-8') as f:
-            foods_data = json.load(f)
-        
+        # Chỉ số người dùng tính một lần cho mọi món (trên hồ sơ đã lượng tử hoá của cache)
+        user_metrics = UserHealthCalculator.calculate_user_metrics(recommendation_cache.quantize(user_profile))
         recommendations = []
         
         for food_name in food_names:
             # Tìm món ăn
-            food_nutrition = None
-            for food in foods_data:
-                if food["name"].lower() == food_name.lower():
-                    food_nutrition = food
-                    break
+            found = _find_food(food_name)
             
-            if food_nutrition:
+            if found:
                 # Tạo khuyến nghị sử dụng service mới
-                recommendation = FoodRecommendationService.get_food_recommendation(
-                    user_profile, food_name, food_nutrition
+                food_key, food_nutrition = found
+                recommendation = recommendation_cache.get_recommendation(
+                    user_profile, food_key, food_name, food_nutrition, user_metrics=user_metrics
                 )
                 recommendations.append(recommendation)
             else:
                 # Tạo khuyến nghị mặc định nếu không tìm thấy món ăn
                 recommendations.append(FoodRecommendation(
                     food_name=food_name,
-                    user_metrics=UserHealthCalculator.calculate_user_metrics(user_profile),
+                    user_metrics=user_metrics,
                     food_nutrition={},
                     analysis={},
                     recommendation="KHÔNG THỂ ĐÁNH GIÁ",
@@ -384,55 +518,128 @@ async def compare_multiple_foods(user_profile: UserProfile, food_names: List[str
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Lỗi khi so sánh món ăn: {str(e)}")
 
+# Dinh dưỡng mặc định khi món nhận diện được chưa có trong database
+DEFAULT_SCAN_NUTRITION = {
+    "calories": 300,
+    "protein": 15,
+    "carbs": 40,
+    "fat": 10,
+    "fiber": 3,
+    "sugar": 5,
+    "sodium": 500
+}
+
+
 @app.post("/nutrition/scan-and-recommend", response_model=FoodRecommendation)
-async def scan_food_and_recommend(user_profile: UserProfile, file: UploadFile = File(...)):
-    """Nhận diện món ăn từ ảnh và đưa ra khuyến nghị dinh dưỡng"""
+async def scan_food_and_recommend(
+    response: Response,
+    background_tasks: BackgroundTasks,
+    user_profile: str = Form(...),
+    file: UploadFile = File(...),
+    user_id: Optional[str] = Form(None),
+):
+    """Nhận diện món ăn từ ảnh và đưa ra khuyến nghị dinh dưỡng.
+    user_profile là UserProfile dạng JSON gửi kèm ảnh trong form multipart.
+    Nếu có user_id, món nhận diện được (có trong catalog) được ghi vào nhật ký ăn uống sau khi trả kết quả.
+    Chỉ số người dùng và kiểm tra database chạy song song với giải mã ảnh + suy luận;
+    thời gian từng giai đoạn trả về trong header Server-Timing.
+    """
+    timer = StageTimer()
+    try:
+        profile = UserProfile.model_validate_json(user_profile)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+    side_tasks = []
     try:
+        with timer.stage("read"):
+            content = await file.read()
+        
+        # Các bước không phụ thuộc vào ảnh chạy song song với giải mã + suy luận
+        metrics_task = asyncio.create_task(
+            timer.run_in_thread("metrics", UserHealthCalculator.calculate_user_metrics, recommendation_cache.quantize(profile))
+        )
+        catalog_task = asyncio.create_task(
+            timer.run_in_thread("catalog", _prepare_catalog)
+        )
+        side_tasks = [metrics_task, catalog_task]
+        
         # Nhận diện món ăn
-        content = await file.read()
-        img = Image.open(BytesIO(content)).convert("RGB")
-        dish_name, confidence = inference.predict(img)
+        tensor = await timer.run_in_thread("decode", inference.decode_image, content)
+        dish_name, confidence = await timer.run_in_thread("infer", inference.predict_tensor, tensor)
         
         if confidence < 0.5:
             raise HTTPException(status_code=400, detail=f"Không thể nhận diện món ăn với độ tin cậy cao (confidence: {confidence:.2f})")
         
         # Lấy thông tin dinh dưỡng món ăn
-        nutrition_file = Path.cwd() / "datasets" / "nutrition" / "vietnamese_foods.json"
-        if not nutrition_file.exists():
+        if not await catalog_task:
             raise HTTPException(status_code=404, detail="Không tìm thấy file dinh dưỡng")
         
-        with open(nutrition_file, 'r', encoding='utf-8') as f:
-            foods_data = json.load(f)
-        
-        # Tìm món ăn
-        food_nutrition = None
-        for food in foods_data:
-            if food["name"].lower() == dish_name.lower():
-                food_nutrition = food
-                break
-        
+        # Tra bảng nhãn -> món đã dựng sẵn; nhãn chưa có trong catalog dùng thông tin mặc định
+        with timer.stage("lookup"):
+            label_catalog.refresh(inference.labels())  # mô hình có thể vừa được nạp trong lúc suy luận
+            food_nutrition = label_catalog.lookup(dish_name)
+            food_key = label_catalog.mapping.get(dish_name)
         if not food_nutrition:
-            # Nếu không tìm thấy, tạo thông tin mặc định
-            food_nutrition = {
-                "name": dish_name,
-                "calories": 300,  # Giá trị mặc định
-                "protein": 15,
-                "carbs": 40,
-                "fat": 10,
-                "fiber": 3,
-                "sugar": 5,
-                "sodium": 500
-            }
+            food_nutrition = {"name": dish_name, **DEFAULT_SCAN_NUTRITION}
+            food_key = None
         
         # Tạo khuyến nghị dinh dưỡng
-        recommendation = FoodRecommendationService.get_food_recommendation(
-            user_profile, dish_name, food_nutrition
-        )
-        
+        user_metrics = await metrics_task
+        with timer.stage("recommend"):
+            recommendation = recommendation_cache.get_recommendation(
+                profile, food_key, dish_name, food_nutrition, user_metrics=user_metrics
+            )
+        
+        if user_id and food_key is not None:
+            background_tasks.add_task(
+                get_meal_log().append, user_id, dish_name, food_nutrition, food_key=food_key, source="scan"
+            )
+        
+        response.headers["Server-Timing"] = timer.header()
         return recommendation
         
+    except HTTPException as e:
+        raise HTTPException(status_code=e.status_code, detail=e.detail, headers={"Server-Timing": timer.header()})
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Lỗi khi xử lý ảnh và tạo khuyến nghị: {str(e)}")
+        raise HTTPException(
+            status_code=500,
+            detail=f"Lỗi khi xử lý ảnh và tạo khuyến nghị: {str(e)}",
+            headers={"Server-Timing": timer.header()},
+        )
+    finally:
+        for task in side_tasks:
+            if not task.done():
+                task.cancel()
+            elif not task.cancelled():
+                task.exception()  # lỗi của task phụ đã được xử lý ở trên, tránh cảnh báo asyncio
+
+# === NHẬT KÝ ĂN UỐNG ===
+
+@app.post("/diary/entries", response_model=MealEntry)
+async def add_meal_entry(req: MealEntryRequest):
+    """Ghi một bữa ăn nhập tay vào nhật ký"""
+    found = _find_food(req.food_name)
+    if not found:
+        raise HTTPException(status_code=404, detail=f"Không tìm thấy món ăn: {req.food_name}")
+    food_key, food_nutrition = found
+    return get_meal_log().append(
+        req.user_id, food_nutrition.get("name", req.food_name), food_nutrition,
+        servings=req.servings, food_key=food_key, source="manual", eaten_at=req.eaten_at,
+    )
+
+
+@app.get("/diary/{user_id}/entries", response_model=List[MealEntry])
+async def list_meal_entries(user_id: str, day: Optional[date] = None):
+    """Các bữa ăn trong ngày (mặc định hôm nay)"""
+    return get_meal_log().entries(user_id, day or date.today())
+
+
+@app.post("/diary/{user_id}/progress", response_model=IntakeProgress)
+async def get_intake_progress(user_id: str, user_profile: UserProfile, day: Optional[date] = None):
+    """Tổng calo/macro hôm nay và tuần này so với mục tiêu của người dùng"""
+    user_metrics = UserHealthCalculator.calculate_user_metrics(user_profile)
+    return IntakeProgress(user_id=user_id, **get_meal_log().progress(user_id, user_metrics, day))
+
 
 @app.get("/nutrition/activity-levels")
 async def get_activity_levels():
@@ -0,0 +1,379 @@
+"""
+Nhật ký ăn uống: mỗi lần scan hoặc nhập tay được ghi thêm (append-only) vào SQLite.
+
+Tổng calo/macro theo ngày và theo tuần của từng người dùng được cộng dồn ngay trong cùng
+transaction với lần ghi (bảng daily_totals / weekly_totals), nên câu hỏi "hôm nay tôi ăn
+bao nhiêu" chỉ đọc một dòng theo khoá chính thay vì cộng lại toàn bộ lịch sử.
+
+Nén (compact): các bữa ăn cũ hơn số ngày giữ lại được gộp theo (người dùng, ngày, món) vào
+bảng meal_history rồi xoá khỏi bảng chi tiết; tổng theo ngày/tuần không đổi.
+
+CLI:
+    python -m app.meal_log compact --keep-days 90
+    python -m app.meal_log bench --entries 2000000 --users 1000
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence, Tuple
+
+from .config import MEAL_LOG_PATH, MEAL_LOG_RETENTION_DAYS
+from .schemas import IntakeTotals, MealEntry, UserMetrics
+
+MACROS = ("calories", "protein", "carbs", "fat")
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS meal_entries (
+    id INTEGER PRIMARY KEY,
+    user_id TEXT NOT NULL,
+    eaten_at TEXT NOT NULL,
+    day TEXT NOT NULL,
+    food_key TEXT,
+    food_name TEXT NOT NULL,
+    servings REAL NOT NULL,
+    source TEXT NOT NULL,
+    calories REAL NOT NULL,
+    protein REAL NOT NULL,
+    carbs REAL NOT NULL,
+    fat REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_meal_entries_user_day ON meal_entries(user_id, day);
+CREATE INDEX IF NOT EXISTS idx_meal_entries_day ON meal_entries(day);
+
+CREATE TABLE IF NOT EXISTS daily_totals (
+    user_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    entries INTEGER NOT NULL,
+    calories REAL NOT NULL,
+    protein REAL NOT NULL,
+    carbs REAL NOT NULL,
+    fat REAL NOT NULL,
+    PRIMARY KEY (user_id, day)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS weekly_totals (
+    user_id TEXT NOT NULL,
+    week TEXT NOT NULL,
+    entries INTEGER NOT NULL,
+    calories REAL NOT NULL,
+    protein REAL NOT NULL,
+    carbs REAL NOT NULL,
+    fat REAL NOT NULL,
+    PRIMARY KEY (user_id, week)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS meal_history (
+    user_id TEXT NOT NULL,
+    day TEXT NOT NULL,
+    food_key TEXT NOT NULL,
+    food_name TEXT NOT NULL,
+    entries INTEGER NOT NULL,
+    servings REAL NOT NULL,
+    calories REAL NOT NULL,
+    protein REAL NOT NULL,
+    carbs REAL NOT NULL,
+    fat REAL NOT NULL,
+    PRIMARY KEY (user_id, day, food_key)
+) WITHOUT ROWID;
+"""
+
+_ADD_TOTALS = """
+INSERT INTO {table} (user_id, {period}, entries, calories, protein, carbs, fat)
+VALUES (?, ?, ?, ?, ?, ?, ?)
+ON CONFLICT (user_id, {period}) DO UPDATE SET
+    entries = entries + excluded.entries,
+    calories = calories + excluded.calories,
+    protein = protein + excluded.protein,
+    carbs = carbs + excluded.carbs,
+    fat = fat + excluded.fat
+"""
+
+# (user_id, eaten_at, food_key, food_name, servings, source, nutrition)
+MealRecord = Tuple[str, datetime, Optional[str], str, float, str, Dict]
+
+
+def iso_week(day: date) -> str:
+    year, week, _ = day.isocalendar()
+    return f"{year}-W{week:02d}"
+
+
+class MealLog:
+    """Nhật ký ăn uống trên SQLite (WAL), một kết nối dùng chung có khoá"""
+
+    def __init__(self, db_path: str | Path = MEAL_LOG_PATH):
+        self.db_path = Path(db_path)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(str(self.db_path), check_same_thread=False, isolation_level=None)
+        # Chỉ có hiệu lực với database mới; cho phép compact trả lại dung lượng mà không cần VACUUM
+        self._conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(_SCHEMA)
+
+    def close(self) -> None:
+        self._conn.close()
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+
+    @staticmethod
+    def _row(record: MealRecord) -> Tuple:
+        user_id, eaten_at, food_key, food_name, servings, source, nutrition = record
+        values = [float(nutrition.get(m) or 0) * servings for m in MACROS]
+        return (user_id, eaten_at.isoformat(), eaten_at.date().isoformat(), food_key, food_name,
+                servings, source, *values)
+
+    def append_many(self, records: Iterable[MealRecord]) -> int:
+        """Ghi nhiều bữa ăn trong một transaction; tổng theo ngày/tuần được cộng một lần cho mỗi nhóm"""
+        rows = [self._row(r) for r in records]
+        if not rows:
+            return 0
+        daily: Dict[Tuple[str, str], List[float]] = defaultdict(lambda: [0, 0.0, 0.0, 0.0, 0.0])
+        for row in rows:
+            acc = daily[(row[0], row[2])]
+            acc[0] += 1
+            for i, value in enumerate(row[7:], start=1):
+                acc[i] += value
+        weekly: Dict[Tuple[str, str], List[float]] = defaultdict(lambda: [0, 0.0, 0.0, 0.0, 0.0])
+        for (user_id, day), acc in daily.items():
+            target = weekly[(user_id, iso_week(date.fromisoformat(day)))]
+            for i, value in enumerate(acc):
+                target[i] += value
+
+        with self._transaction() as conn:
+            conn.executemany(
+                "INSERT INTO meal_entries (user_id, eaten_at, day, food_key, food_name, servings, source, "
+                "calories, protein, carbs, fat) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            conn.executemany(_ADD_TOTALS.format(table="daily_totals", period="day"),
+                             [(*k, *v) for k, v in daily.items()])
+            conn.executemany(_ADD_TOTALS.format(table="weekly_totals", period="week"),
+                             [(*k, *v) for k, v in weekly.items()])
+        return len(rows)
+
+    def append(
+        self,
+        user_id: str,
+        food_name: str,
+        nutrition: Dict,
+        servings: float = 1.0,
+        food_key: Optional[str] = None,
+        source: str = "manual",
+        eaten_at: Optional[datetime] = None,
+    ) -> MealEntry:
+        """Ghi một bữa ăn và cập nhật tổng theo ngày/tuần"""
+        eaten_at = eaten_at or datetime.now()
+        row = self._row((user_id, eaten_at, food_key, food_name, servings, source, nutrition))
+        with self._transaction() as conn:
+            entry_id = conn.execute(
+                "INSERT INTO meal_entries (user_id, eaten_at, day, food_key, food_name, servings, source, "
+                "calories, protein, carbs, fat) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                row,
+            ).lastrowid
+            conn.execute(_ADD_TOTALS.format(table="daily_totals", period="day"),
+                         (user_id, row[2], 1, *row[7:]))
+            conn.execute(_ADD_TOTALS.format(table="weekly_totals", period="week"),
+                         (user_id, iso_week(eaten_at.date()), 1, *row[7:]))
+        return MealEntry(
+            id=entry_id, user_id=user_id, eaten_at=eaten_at, day=row[2], food_key=food_key,
+            food_name=food_name, servings=servings, source=source,
+            **dict(zip(MACROS, row[7:])),
+        )
+
+    def _totals(self, table: str, period_column: str, user_id: str, period: str) -> Tuple[int, Dict[str, float]]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT entries, calories, protein, carbs, fat FROM {table} WHERE user_id = ? AND {period_column} = ?",
+                (user_id, period),
+            ).fetchone()
+        if row is None:
+            return 0, {m: 0.0 for m in MACROS}
+        return row[0], dict(zip(MACROS, row[1:]))
+
+    def daily_totals(self, user_id: str, day: date) -> Tuple[int, Dict[str, float]]:
+        return self._totals("daily_totals", "day", user_id, day.isoformat())
+
+    def weekly_totals(self, user_id: str, day: date) -> Tuple[int, Dict[str, float]]:
+        return self._totals("weekly_totals", "week", user_id, iso_week(day))
+
+    def entries(self, user_id: str, day: date, limit: int = 200) -> List[MealEntry]:
+        """Các bữa ăn chưa nén trong một ngày, theo thứ tự ghi"""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id, user_id, eaten_at, day, food_key, food_name, servings, source, "
+                "calories, protein, carbs, fat FROM meal_entries WHERE user_id = ? AND day = ? ORDER BY id LIMIT ?",
+                (user_id, day.isoformat(), limit),
+            ).fetchall()
+        fields = ("id", "user_id", "eaten_at", "day", "food_key", "food_name", "servings", "source", *MACROS)
+        return [MealEntry(**dict(zip(fields, row))) for row in rows]
+
+    def progress(self, user_id: str, user_metrics: UserMetrics, day: Optional[date] = None) -> Dict[str, IntakeTotals]:
+        """Tổng hôm nay và tuần này so với mục tiêu hàng ngày (mục tiêu tuần = 7 x ngày)"""
+        day = day or date.today()
+        daily_target = {
+            "calories": user_metrics.daily_calories_target,
+            "protein": user_metrics.daily_protein_target,
+            "carbs": user_metrics.daily_carbs_target,
+            "fat": user_metrics.daily_fat_target,
+        }
+        weekly_target = {m: v * 7 for m, v in daily_target.items()}
+        return {
+            "today": _compare(day.isoformat(), *self.daily_totals(user_id, day), daily_target),
+            "week": _compare(iso_week(day), *self.weekly_totals(user_id, day), weekly_target),
+        }
+
+    def compact(self, keep_days: int = MEAL_LOG_RETENTION_DAYS, today: Optional[date] = None) -> int:
+        """Gộp các bữa ăn cũ hơn keep_days ngày vào meal_history, xoá khỏi bảng chi tiết.
+        Trả về số dòng chi tiết đã xoá. Tổng theo ngày/tuần không thay đổi."""
+        cutoff = ((today or date.today()) - timedelta(days=keep_days)).isoformat()
+        with self._transaction() as conn:
+            conn.execute(
+                """
+                INSERT INTO meal_history (user_id, day, food_key, food_name, entries, servings,
+                                          calories, protein, carbs, fat)
+                SELECT user_id, day, COALESCE(food_key, food_name), MIN(food_name), COUNT(*), SUM(servings),
+                       SUM(calories), SUM(protein), SUM(carbs), SUM(fat)
+                FROM meal_entries WHERE day < ?
+                GROUP BY user_id, day, COALESCE(food_key, food_name)
+                ON CONFLICT (user_id, day, food_key) DO UPDATE SET
+                    entries = entries + excluded.entries,
+                    servings = servings + excluded.servings,
+                    calories = calories + excluded.calories,
+                    protein = protein + excluded.protein,
+                    carbs = carbs + excluded.carbs,
+                    fat = fat + excluded.fat
+                """,
+                (cutoff,),
+            )
+            deleted = conn.execute("DELETE FROM meal_entries WHERE day < ?", (cutoff,)).rowcount
+        if deleted:
+            with self._lock:
+                # Trả lại các trang trống cho hệ điều hành
+                self._conn.execute("PRAGMA incremental_vacuum")
+                self._conn.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return deleted
+
+
+def _compare(period: str, entries: int, consumed: Dict[str, float], target: Dict[str, float]) -> IntakeTotals:
+    return IntakeTotals(
+        period=period,
+        entries=entries,
+        consumed={m: round(v, 1) for m, v in consumed.items()},
+        target=target,
+        remaining={m: round(target[m] - consumed[m], 1) for m in MACROS},
+        percent={m: round(consumed[m] / target[m] * 100, 1) if target[m] > 0 else 0.0 for m in MACROS},
+    )
+
+
+def _bench(db_path: Path, n_entries: int, n_users: int, days: int, batch: int) -> None:
+    rng = random.Random(0)
+    foods = [
+        ("pho_bo", "Phở bò", {"calories": 350, "protein": 25, "carbs": 45, "fat": 8}),
+        ("banh_my", "Bánh mì", {"calories": 420, "protein": 15, "carbs": 55, "fat": 16}),
+        ("goi_cuon", "Gỏi cuốn", {"calories": 150, "protein": 10, "carbs": 20, "fat": 3}),
+        ("bun_cha", "Bún chả", {"calories": 500, "protein": 28, "carbs": 60, "fat": 18}),
+    ]
+    start_day = datetime.combine(date.today() - timedelta(days=days - 1), datetime.min.time())
+    log = MealLog(db_path)
+
+    def records(count: int) -> Sequence[MealRecord]:
+        out = []
+        for _ in range(count):
+            key, name, nutrition = rng.choice(foods)
+            eaten_at = start_day + timedelta(seconds=rng.randrange(days * 86400))
+            out.append((f"user{rng.randrange(n_users)}", eaten_at, key, name, rng.choice([0.5, 1.0, 1.5]), "manual", nutrition))
+        return out
+
+    t0 = time.perf_counter()
+    written = 0
+    while written < n_entries:
+        written += log.append_many(records(min(batch, n_entries - written)))
+    t_write = time.perf_counter() - t0
+    print(f"ghi {written:,} bữa ăn: {t_write:.1f}s ({written / t_write:,.0f} bữa/s, lô {batch})")
+
+    singles = 1000
+    t0 = time.perf_counter()
+    for i in range(singles):
+        log.append(f"user{i % n_users}", "Phở bò", foods[0][2], food_key="pho_bo")
+    print(f"ghi từng bữa: {(time.perf_counter() - t0) * 1000 / singles:.3f} ms/bữa")
+
+    today = date.today()
+    users = [f"user{rng.randrange(n_users)}" for _ in range(1000)]
+    t0 = time.perf_counter()
+    for user in users:
+        log.daily_totals(user, today)
+        log.weekly_totals(user, today)
+    t_fast = (time.perf_counter() - t0) / len(users) * 1000
+    t0 = time.perf_counter()
+    for user in users[:100]:
+        log._conn.execute(
+            "SELECT COUNT(*), SUM(calories), SUM(protein), SUM(carbs), SUM(fat) FROM meal_entries "
+            "WHERE user_id = ? AND day >= ?", (user, (today - timedelta(days=today.weekday())).isoformat()),
+        ).fetchone()
+    t_sum = (time.perf_counter() - t0) / 100 * 1000
+    print(f"tiến độ ngày+tuần từ bảng tổng: {t_fast:.3f} ms/người; cộng lại từ bảng chi tiết (tuần): {t_sum:.3f} ms/người")
+
+    t0 = time.perf_counter()
+    deleted = log.compact(keep_days=7)
+    size_mb = db_path.stat().st_size / 1e6
+    print(f"nén {deleted:,} bữa cũ hơn 7 ngày: {time.perf_counter() - t0:.1f}s, file {size_mb:.0f} MB")
+    log.close()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Nhật ký ăn uống")
+    sub = parser.add_subparsers(dest="command", required=True)
+    compact = sub.add_parser("compact", help="Gộp các bữa ăn cũ vào meal_history")
+    compact.add_argument("--db", default=str(MEAL_LOG_PATH))
+    compact.add_argument("--keep-days", type=int, default=MEAL_LOG_RETENTION_DAYS)
+    bench = sub.add_parser("bench", help="Benchmark ghi/đọc trên database tạm")
+    bench.add_argument("--db", default=None, help="File database chưa tồn tại (mặc định: file trong thư mục tạm)")
+    bench.add_argument("--entries", type=int, default=2_000_000)
+    bench.add_argument("--users", type=int, default=1000)
+    bench.add_argument("--days", type=int, default=60)
+    bench.add_argument("--batch", type=int, default=10_000)
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        log = MealLog(args.db)
+        print(f"Đã nén {log.compact(args.keep_days):,} bữa ăn")
+        log.close()
+    elif args.db is None:
+        with tempfile.TemporaryDirectory(prefix="meal_log_bench_") as tmp:
+            _bench(Path(tmp) / "meal_log.sqlite3", args.entries, args.users, args.days, args.batch)
+    else:
+        db_path = Path(args.db)
+        # Không xoá file có sẵn của người dùng; chỉ dọn các file do bench tạo ra
+        files = [Path(str(db_path) + suffix) for suffix in ("", "-wal", "-shm")]
+        existing = [f for f in files if f.exists()]
+        if existing:
+            parser.error(f"{existing[0]} đã tồn tại, hãy chọn đường dẫn khác cho --db")
+        try:
+            _bench(db_path, args.entries, args.users, args.days, args.batch)
+        finally:
+            for f in files:
+                f.unlink(missing_ok=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -7,6 +7,11 @@ from pathlib import Path
 from typing import Dict, List, Optional, Tuple
 from dataclasses import dataclass
 
+import numpy as np
+
+from .nutrition_store import NutritionStore
+from .recommendation_rules import RuleResult, get_ruleset
+
 @dataclass
 class NutritionAnalysis:
     """Kết quả phân tích dinh dưỡng"""
@@ -26,9 +31,10 @@ class NutritionAnalysis:
 class NutritionAnalyzer:
     """Phân tích dinh dưỡng cho các món ăn Việt Nam"""
     
-    def __init__(self, nutrition_file: str = "datasets/nutrition/vietnamese_foods.json"):
+    def __init__(self, nutrition_file: str = "datasets/nutrition/vietnamese_foods.json", store: Optional[NutritionStore] = None):
         self.nutrition_file = Path(nutrition_file)
-        self.nutrition_data = self._load_nutrition_data()
+        # Dùng kho dữ liệu dùng chung nếu có (JSON hoặc SQLite), nếu không thì nạp file JSON
+        self.nutrition_data = store if store is not None else self._load_nutrition_data()
         
         # Nhu cầu dinh dưỡng hàng ngày (người trưởng thành)
         self.daily_values = {
@@ -64,12 +70,10 @@ class NutritionAnalyzer:
         
         food_data = self.nutrition_data[food_key]
         
-        # Tính điểm sức khỏe
-        health_score = self._calculate_health_score(food_data)
-        
-        # Tạo lời khuyên sức khỏe
-        health_tips = self._generate_health_tips(food_data)
-        
+        # Tính điểm sức khỏe và lời khuyên theo bảng luật
+        return self._build_analysis(food_data, self._evaluate_health_rules(food_data))
+    
+    def _build_analysis(self, food_data: Dict, health: RuleResult) -> NutritionAnalysis:
         # Tính phần trăm so với nhu cầu hàng ngày
         daily_value_percentage = self._calculate_daily_value_percentage(food_data)
         
@@ -85,71 +89,23 @@ class NutritionAnalyzer:
             fiber=food_data["fiber"],
             sodium=food_data["sodium"],
             serving_size=food_data["serving_size"],
-            health_score=health_score,
-            health_tips=health_tips,
+            health_score=health.score,
+            health_tips=health.messages(),
             daily_value_percentage=daily_value_percentage,
             category=category
         )
     
+    def _evaluate_health_rules(self, food_data: Dict) -> RuleResult:
+        """Đánh giá bảng luật "food_health" (app/rules/recommendation_rules.json)"""
+        return get_ruleset("food_health").evaluate(food_data)
+    
     def _calculate_health_score(self, food_data: Dict) -> float:
         """Tính điểm sức khỏe từ 0-100"""
-        score = 100.0
-        
-        # Trừ điểm cho calo cao
-        if food_data["calories"] > 400:
-            score -= 20
-        elif food_data["calories"] > 300:
-            score -= 10
-        
-        # Trừ điểm cho natri cao
-        if food_data["sodium"] > 1000:
-            score -= 15
-        elif food_data["sodium"] > 600:
-            score -= 8
-        
-        # Trừ điểm cho chất béo cao
-        if food_data["fat"] > 20:
-            score -= 15
-        elif food_data["fat"] > 15:
-            score -= 8
-        
-        # Cộng điểm cho protein cao
-        if food_data["protein"] > 20:
-            score += 10
-        elif food_data["protein"] > 15:
-            score += 5
-        
-        # Cộng điểm cho chất xơ
-        if food_data["fiber"] > 3:
-            score += 10
-        elif food_data["fiber"] > 1:
-            score += 5
-        
-        return max(0, min(100, score))
+        return self._evaluate_health_rules(food_data).score
     
     def _generate_health_tips(self, food_data: Dict) -> List[str]:
         """Tạo lời khuyên sức khỏe dựa trên dinh dưỡng"""
-        tips = []
-        
-        if food_data["calories"] > 400:
-            tips.append("Món ăn này có lượng calo cao, nên ăn vừa phải")
-        
-        if food_data["sodium"] > 1000:
-            tips.append("Hàm lượng natri cao, người bị huyết áp nên hạn chế")
-        
-        if food_data["protein"] > 20:
-            tips.append("Giàu protein, tốt cho việc xây dựng cơ bắp")
-        
-        if food_data["fiber"] > 3:
-            tips.append("Chứa nhiều chất xơ, tốt cho hệ tiêu hóa")
-        
-        if food_data["fat"] > 20:
-            tips.append("Hàm lượng chất béo cao, nên ăn điều độ")
-        
-        if not tips:
-            tips.append("Món ăn cân bằng dinh dưỡng, phù hợp cho bữa ăn hàng ngày")
-        
-        return tips
+        return self._evaluate_health_rules(food_data).messages()
     
     def _calculate_daily_value_percentage(self, food_data: Dict) -> Dict[str, float]:
         """Tính phần trăm so với nhu cầu hàng ngày"""
@@ -191,6 +147,9 @@ class NutritionAnalyzer:
         if not analysis:
             return None
         
+        return self._summarize(analysis)
+    
+    def _summarize(self, analysis: NutritionAnalysis) -> Dict:
         return {
             "food_name": analysis.food_name,
             "calories": analysis.calories,
@@ -207,12 +166,22 @@ class NutritionAnalyzer:
         }
     
     def get_all_foods_summary(self) -> List[Dict]:
-        """Lấy tóm tắt dinh dưỡng cho tất cả món ăn"""
+        """Lấy tóm tắt dinh dưỡng cho tất cả món ăn.
+        Điểm sức khỏe của toàn bộ catalog được tính một lượt trên ma trận dinh dưỡng.
+        """
+        keys = list(self.nutrition_data.keys())
+        foods = [self.nutrition_data[k] for k in keys]
+        rules = get_ruleset("food_health")
+        matrix = {
+            metric: np.array([food.get(metric, np.nan) for food in foods], dtype=np.float64)
+            for metric in rules.metrics
+        }
+        health = rules.evaluate_batch(matrix, size=len(foods))
+        
         summaries = []
-        for food_key in self.nutrition_data.keys():
-            summary = self.get_nutrition_summary(food_key)
-            if summary:
-                summary["food_key"] = food_key
-                summaries.append(summary)
+        for i, (food_key, food_data) in enumerate(zip(keys, foods)):
+            summary = self._summarize(self._build_analysis(food_data, health.row(i)))
+            summary["food_key"] = food_key
+            summaries.append(summary)
         
         return summaries
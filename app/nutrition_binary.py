@@ -0,0 +1,428 @@
+"""
+Định dạng catalog dinh dưỡng nhị phân, nạp bằng mmap.
+
+Các worker uvicorn cùng mở một file nên dùng chung page cache của hệ điều hành,
+không worker nào giữ bản sao dict-of-dicts riêng. Bố cục file (little-endian, mỗi khối căn lề 8 byte):
+
+    header   : magic, version, số món, số chuỗi, kích thước các khối, kích thước bảng băm
+    columns  : float64[len(NUMERIC_COLUMNS), count]  - cột dinh dưỡng cố định (NaN = thiếu)
+    records  : struct[count]                         - id chuỗi + vị trí danh sách của từng món
+    lists    : uint32[...]                           - id chuỗi của nguyên liệu
+    pairs    : (uint32, float64)[...]                - vitamins/minerals (id tên, giá trị)
+    offsets  : uint64[nstrings + 1]                  - bảng chuỗi đã intern
+    strings  : utf-8 bytes
+    key_hash : uint32[table_size]                    - băm mở theo key (viết thường)
+    name_hash: uint32[table_size]                    - băm mở theo tên món (viết thường)
+
+Chuyển JSON sang định dạng nhị phân:
+    python -m app.nutrition_binary build datasets/nutrition/vietnamese_foods.json datasets/nutrition/vietnamese_foods.bin
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import math
+import mmap
+import os
+import struct
+from collections.abc import Mapping
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+
+from .config import NUTRITION_BIN_PATH, NUTRITION_JSON_PATH
+from .nutrition_store import (
+    NUMERIC_COLUMNS,
+    NutritionStore,
+    _check_bounds,
+    _matches_phrases,
+    _search_phrases,
+    _search_tokens,
+)
+
+MAGIC = b"SFCAT\x00\x00\x01"
+FORMAT_VERSION = 1
+
+# magic, version, count, nstrings, n_list_items, n_pairs, table_size, strings_bytes
+_HEADER = struct.Struct("<8sIIIIIIQ")
+
+# Các trường chuỗi và danh sách được lưu riêng, phần còn lại của bản ghi nằm trong "extra" (JSON)
+_STRING_FIELDS = ("name", "serving_size", "description")
+_KNOWN_FIELDS = set(NUMERIC_COLUMNS) | set(_STRING_FIELDS) | {"ingredients", "vitamins", "minerals"}
+
+_NO_STRING = 0xFFFFFFFF
+
+_RECORD_DTYPE = np.dtype([
+    ("key", "<u4"),
+    ("name", "<u4"),
+    ("serving_size", "<u4"),
+    ("description", "<u4"),
+    ("extra", "<u4"),
+    ("int_mask", "<u4"),  # bit i = cột NUMERIC_COLUMNS[i] là số nguyên trong JSON gốc
+    ("ingredients_start", "<u4"),
+    ("ingredients_len", "<u4"),
+    ("vitamins_start", "<u4"),
+    ("vitamins_len", "<u4"),
+    ("minerals_start", "<u4"),
+    ("minerals_len", "<u4"),
+])
+_PAIR_DTYPE = np.dtype([("name", "<u4"), ("value", "<f8")])
+
+
+def _fnv1a(text: str) -> int:
+    """Băm FNV-1a 64-bit, ổn định giữa các tiến trình (khác với hash() của Python)"""
+    h = 0xCBF29CE484222325
+    for b in text.encode("utf-8"):
+        h ^= b
+        h = (h * 0x100000001B3) & 0xFFFFFFFFFFFFFFFF
+    return h
+
+
+def _table_size(count: int) -> int:
+    size = 8
+    while size < count * 2:
+        size *= 2
+    return size
+
+
+def _build_hash_table(keys: List[str], size: int) -> np.ndarray:
+    """Bảng băm mở (linear probing), lưu chỉ số món + 1 (0 = ô trống). Key trùng giữ món đầu tiên."""
+    table = np.zeros(size, dtype="<u4")
+    seen = set()
+    mask = size - 1
+    for idx, key in enumerate(keys):
+        if key in seen:
+            continue
+        seen.add(key)
+        slot = _fnv1a(key) & mask
+        while table[slot]:
+            slot = (slot + 1) & mask
+        table[slot] = idx + 1
+    return table
+
+
+def build_binary_catalog(json_path: str | Path, out_path: str | Path) -> int:
+    """Biên dịch file JSON dinh dưỡng sang định dạng nhị phân. Trả về số món."""
+    with open(json_path, "r", encoding="utf-8") as f:
+        data: Dict[str, Dict] = json.load(f)
+
+    strings: List[str] = []
+    string_ids: Dict[str, int] = {}
+
+    def intern(value: Optional[str]) -> int:
+        if value is None:
+            return _NO_STRING
+        sid = string_ids.get(value)
+        if sid is None:
+            sid = len(strings)
+            string_ids[value] = sid
+            strings.append(value)
+        return sid
+
+    count = len(data)
+    columns = np.full((len(NUMERIC_COLUMNS), count), np.nan, dtype="<f8")
+    records = np.zeros(count, dtype=_RECORD_DTYPE)
+    list_items: List[int] = []
+    pairs: List[Tuple[int, float]] = []
+
+    for idx, (key, food) in enumerate(data.items()):
+        rec = records[idx]
+        rec["key"] = intern(key)
+        for field in _STRING_FIELDS:
+            value = food.get(field)
+            rec[field] = intern(str(value)) if value is not None else _NO_STRING
+        int_mask = 0
+        for col_idx, column in enumerate(NUMERIC_COLUMNS):
+            value = food.get(column)
+            if value is None:
+                continue
+            columns[col_idx, idx] = float(value)
+            if isinstance(value, int) and not isinstance(value, bool):
+                int_mask |= 1 << col_idx
+        rec["int_mask"] = int_mask
+
+        ingredients = food.get("ingredients") or []
+        rec["ingredients_start"] = len(list_items)
+        rec["ingredients_len"] = len(ingredients)
+        list_items.extend(intern(str(i)) for i in ingredients)
+
+        for field in ("vitamins", "minerals"):
+            values = food.get(field) or {}
+            rec[f"{field}_start"] = len(pairs)
+            rec[f"{field}_len"] = len(values)
+            pairs.extend((intern(str(k)), float(v)) for k, v in values.items())
+
+        extra = {k: v for k, v in food.items() if k not in _KNOWN_FIELDS}
+        rec["extra"] = intern(json.dumps(extra, ensure_ascii=False)) if extra else _NO_STRING
+
+    encoded = [s.encode("utf-8") for s in strings]
+    offsets = np.zeros(len(encoded) + 1, dtype="<u8")
+    offsets[1:] = np.cumsum([len(b) for b in encoded], dtype=np.uint64)
+    blob = b"".join(encoded)
+
+    keys = list(data.keys())
+    size = _table_size(count)
+    key_table = _build_hash_table([k.lower() for k in keys], size)
+    name_table = _build_hash_table([str(data[k].get("name", k)).lower() for k in keys], size)
+
+    out_path = Path(out_path)
+    out_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = out_path.with_name(out_path.name + ".tmp")
+    with open(tmp_path, "wb") as f:
+        f.write(_HEADER.pack(MAGIC, FORMAT_VERSION, count, len(strings), len(list_items), len(pairs), size, len(blob)))
+        # Mỗi khối được căn lề 8 byte để numpy đọc trực tiếp trên mmap
+        for block in (
+            columns,
+            records,
+            np.asarray(list_items, dtype="<u4"),
+            np.asarray(pairs, dtype=_PAIR_DTYPE),
+            offsets,
+            np.frombuffer(blob, dtype=np.uint8),
+            key_table,
+            name_table,
+        ):
+            raw = block.tobytes()
+            f.write(raw)
+            f.write(b"\x00" * (-len(raw) % 8))
+    os.replace(tmp_path, out_path)
+    return count
+
+
+class _MappedCatalog:
+    """Các mảng numpy trỏ thẳng vào vùng nhớ mmap của một file catalog"""
+
+    __slots__ = ("count", "columns", "records", "lists", "pairs", "offsets", "strings", "key_table", "name_table", "_mm")
+
+    def __init__(self, path: Optional[Path] = None):
+        self.count = 0
+        self.columns = np.zeros((len(NUMERIC_COLUMNS), 0), dtype="<f8")
+        self.records = np.zeros(0, dtype=_RECORD_DTYPE)
+        self.lists = np.zeros(0, dtype="<u4")
+        self.pairs = np.zeros(0, dtype=_PAIR_DTYPE)
+        self.offsets = np.zeros(1, dtype="<u8")
+        self.strings = memoryview(b"")
+        self.key_table = np.zeros(8, dtype="<u4")
+        self.name_table = np.zeros(8, dtype="<u4")
+        self._mm = None
+        if path is None:
+            return
+
+        with open(path, "rb") as f:
+            mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, count, nstrings, n_list, n_pairs, size, blob_len = _HEADER.unpack_from(mm, 0)
+        if magic != MAGIC or version != FORMAT_VERSION:
+            raise ValueError(f"File catalog không hợp lệ hoặc sai phiên bản: {path}")
+
+        offset = _HEADER.size
+
+        def take(dtype, n: int) -> np.ndarray:
+            nonlocal offset
+            arr = np.frombuffer(mm, dtype=dtype, count=n, offset=offset)
+            offset += arr.nbytes + (-arr.nbytes % 8)
+            return arr
+
+        self.columns = take("<f8", len(NUMERIC_COLUMNS) * count).reshape(len(NUMERIC_COLUMNS), count)
+        self.records = take(_RECORD_DTYPE, count)
+        self.lists = take("<u4", n_list)
+        self.pairs = take(_PAIR_DTYPE, n_pairs)
+        self.offsets = take("<u8", nstrings + 1)
+        self.strings = memoryview(mm)[offset:offset + blob_len]
+        offset += blob_len + (-blob_len % 8)
+        self.key_table = take("<u4", size)
+        self.name_table = take("<u4", size)
+        self.count = count
+        self._mm = mm
+
+    def string(self, sid: int) -> str:
+        start, end = int(self.offsets[sid]), int(self.offsets[sid + 1])
+        return str(self.strings[start:end], "utf-8")
+
+    def key_of(self, idx: int) -> str:
+        return self.string(int(self.records[idx]["key"]))
+
+    def lookup(self, table: np.ndarray, text: str, field: str) -> Optional[int]:
+        """Dò bảng băm theo chuỗi đã viết thường, trả về chỉ số món hoặc None"""
+        mask = len(table) - 1
+        slot = _fnv1a(text) & mask
+        while True:
+            entry = int(table[slot])
+            if entry == 0:
+                return None
+            idx = entry - 1
+            sid = int(self.records[idx][field])
+            if sid != _NO_STRING and self.string(sid).lower() == text:
+                return idx
+            slot = (slot + 1) & mask
+
+
+_COLUMN_INDEX = {c: i for i, c in enumerate(NUMERIC_COLUMNS)}
+
+
+class FoodRecordView(Mapping):
+    """View chỉ đọc của một món trong catalog, giải mã trường khi được truy cập"""
+
+    __slots__ = ("_cat", "_idx")
+
+    def __init__(self, cat: _MappedCatalog, idx: int):
+        # Giữ tham chiếu tới catalog đã map nên view vẫn hợp lệ sau khi store reload
+        self._cat = cat
+        self._idx = idx
+
+    def _fields(self) -> List[str]:
+        cat = self._cat
+        rec = cat.records[self._idx]
+        fields = [f for f in _STRING_FIELDS if rec[f] != _NO_STRING]
+        fields += [c for i, c in enumerate(NUMERIC_COLUMNS) if not math.isnan(cat.columns[i, self._idx])]
+        fields += ["ingredients", "vitamins", "minerals"]
+        if rec["extra"] != _NO_STRING:
+            fields += list(json.loads(cat.string(int(rec["extra"]))))
+        return fields
+
+    def __getitem__(self, field: str):
+        cat = self._cat
+        rec = cat.records[self._idx]
+        if field in _STRING_FIELDS:
+            sid = int(rec[field])
+            if sid == _NO_STRING:
+                raise KeyError(field)
+            return cat.string(sid)
+        if field in _COLUMN_INDEX:
+            col = _COLUMN_INDEX[field]
+            value = float(cat.columns[col, self._idx])
+            if math.isnan(value):
+                raise KeyError(field)
+            return int(value) if int(rec["int_mask"]) & (1 << col) else value
+        if field == "ingredients":
+            start, length = int(rec["ingredients_start"]), int(rec["ingredients_len"])
+            return [cat.string(int(sid)) for sid in cat.lists[start:start + length]]
+        if field in ("vitamins", "minerals"):
+            start, length = int(rec[f"{field}_start"]), int(rec[f"{field}_len"])
+            return {cat.string(int(p["name"])): float(p["value"]) for p in cat.pairs[start:start + length]}
+        if rec["extra"] != _NO_STRING:
+            extra = json.loads(cat.string(int(rec["extra"])))
+            if field in extra:
+                return extra[field]
+        raise KeyError(field)
+
+    def __contains__(self, field: object) -> bool:
+        try:
+            self[field]
+            return True
+        except KeyError:
+            return False
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._fields())
+
+    def __len__(self) -> int:
+        return len(self._fields())
+
+    @property
+    def key(self) -> str:
+        return self._cat.key_of(self._idx)
+
+    def to_dict(self) -> Dict:
+        return {field: self[field] for field in self._fields()}
+
+    def __repr__(self) -> str:
+        return f"FoodRecordView({self.key!r})"
+
+
+class BinaryNutritionStore(NutritionStore):
+    """Backend nhị phân mmap: các cột là numpy view trực tiếp trên vùng nhớ của file"""
+
+    def __init__(self, bin_path: str | Path = NUTRITION_BIN_PATH):
+        self.bin_path = Path(bin_path)
+        self._cat = _MappedCatalog()
+        self.version = 0
+        self.reload()
+
+    def reload(self) -> None:
+        # Catalog cũ được giải phóng khi không còn view nào tham chiếu
+        self._cat = _MappedCatalog(self.bin_path) if self.bin_path.exists() else _MappedCatalog()
+        self.version += 1
+
+    @property
+    def exists(self) -> bool:
+        return self.bin_path.exists()
+
+    def __getitem__(self, key: str) -> FoodRecordView:
+        cat = self._cat
+        idx = cat.lookup(cat.key_table, key.lower(), "key")
+        # Bảng băm theo key viết thường, kiểm tra lại để giữ ngữ nghĩa phân biệt hoa thường của dict
+        if idx is None or cat.key_of(idx) != key:
+            raise KeyError(key)
+        return FoodRecordView(cat, idx)
+
+    def __contains__(self, key: object) -> bool:
+        if not isinstance(key, str):
+            return False
+        try:
+            self[key]
+            return True
+        except KeyError:
+            return False
+
+    def __iter__(self) -> Iterator[str]:
+        cat = self._cat
+        for idx in range(cat.count):
+            yield cat.key_of(idx)
+
+    def __len__(self) -> int:
+        return self._cat.count
+
+    def find(self, name: str) -> Optional[Tuple[str, FoodRecordView]]:
+        cat = self._cat
+        name_lower = name.lower()
+        idx = cat.lookup(cat.key_table, name_lower, "key")
+        if idx is None:
+            idx = cat.lookup(cat.name_table, name_lower, "name")
+        if idx is None:
+            return None
+        return cat.key_of(idx), FoodRecordView(cat, idx)
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[str]:
+        cat = self._cat
+        phrases = _search_phrases(query)
+        matched = []
+        for idx in range(cat.count):
+            rec = cat.records[idx]
+            fields = [_search_tokens(cat.string(int(rec[f]))) for f in ("name", "description") if rec[f] != _NO_STRING]
+            if _matches_phrases(phrases, fields):
+                matched.append(cat.key_of(idx))
+                if limit is not None and len(matched) >= limit:
+                    break
+        return matched
+
+    def filter_ranges(self, limit: int = 100, **bounds: Tuple[Optional[float], Optional[float]]) -> List[str]:
+        _check_bounds(bounds)
+        cat = self._cat
+        mask = np.ones(cat.count, dtype=bool)
+        for column, (low, high) in bounds.items():
+            values = cat.columns[_COLUMN_INDEX[column]]
+            # NaN (thiếu dữ liệu) luôn bị loại
+            mask &= ~np.isnan(values)
+            if low is not None:
+                mask &= values >= low
+            if high is not None:
+                mask &= values <= high
+        return [cat.key_of(int(i)) for i in np.flatnonzero(mask)[:limit]]
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Biên dịch catalog dinh dưỡng sang định dạng nhị phân mmap")
+    sub = parser.add_subparsers(dest="command", required=True)
+    build = sub.add_parser("build", help="Chuyển file JSON sang định dạng nhị phân")
+    build.add_argument("json_path", nargs="?", default=str(NUTRITION_JSON_PATH))
+    build.add_argument("out_path", nargs="?", default=str(NUTRITION_BIN_PATH))
+    args = parser.parse_args()
+
+    if args.command == "build":
+        count = build_binary_catalog(args.json_path, args.out_path)
+        print(f"Đã biên dịch {count} món vào {args.out_path}")
+
+
+if __name__ == "__main__":
+    main()
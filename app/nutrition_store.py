@@ -0,0 +1,450 @@
+"""
+Kho dữ liệu dinh dưỡng dùng chung cho NutritionAnalyzer và các API.
+
+Hai backend có cùng giao diện tra cứu (Mapping food_key -> dict dinh dưỡng):
+- JsonNutritionStore: nạp toàn bộ file JSON vào bộ nhớ (mặc định, phù hợp catalog nhỏ)
+- SqliteNutritionStore: truy vấn SQLite theo nhu cầu, có index cho truy vấn theo khoảng
+  dinh dưỡng và FTS5 cho tìm kiếm tên/mô tả, bộ nhớ không tăng theo kích thước catalog
+- BinaryNutritionStore (app/nutrition_binary.py): catalog nhị phân nạp bằng mmap
+
+Tìm kiếm (search) giống nhau ở mọi backend, theo ngữ nghĩa FTS5 unicode61 remove_diacritics 2:
+không phân biệt hoa thường và dấu, mỗi từ trong truy vấn là tiền tố của một từ trong tên hoặc mô tả
+(AND giữa các từ). Khác biệt duy nhất là thứ tự: SQLite xếp theo rank (bm25), JSON/nhị phân theo
+thứ tự trong catalog.
+
+Chuyển JSON sang SQLite:
+    python -m app.nutrition_store import datasets/nutrition/vietnamese_foods.json datasets/nutrition/vietnamese_foods.sqlite3
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import queue
+import re
+import sqlite3
+import threading
+import unicodedata
+from abc import ABC, abstractmethod
+from collections.abc import Mapping
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from .config import (
+    NUTRITION_BACKEND,
+    NUTRITION_BIN_PATH,
+    NUTRITION_DB_PATH,
+    NUTRITION_DB_POOL_SIZE,
+    NUTRITION_JSON_PATH,
+)
+
+# Các cột số được index để truy vấn theo khoảng (vd: calories <= 300)
+NUMERIC_COLUMNS = ("calories", "protein", "carbs", "fat", "fiber", "sodium")
+
+
+class NutritionStore(Mapping, ABC):
+    """Giao diện chung: food_key -> dict dinh dưỡng, kèm các truy vấn phụ trợ"""
+
+    # Tăng mỗi lần reload để các cache phía trên biết dữ liệu đã đổi
+    version: int = 0
+
+    @property
+    @abstractmethod
+    def exists(self) -> bool:
+        ...
+
+    @abstractmethod
+    def find(self, name: str) -> Optional[Tuple[str, Dict]]:
+        """Tìm món theo key hoặc tên (không phân biệt hoa thường)"""
+
+    @abstractmethod
+    def search(self, query: str, limit: Optional[int] = None) -> List[str]:
+        """Tìm food_key theo tên hoặc mô tả; limit=None trả về mọi món khớp"""
+
+    @abstractmethod
+    def filter_ranges(self, limit: int = 100, **bounds: Tuple[Optional[float], Optional[float]]) -> List[str]:
+        """Lọc food_key theo khoảng giá trị, vd: filter_ranges(calories=(None, 300), protein=(15, None))"""
+
+    @abstractmethod
+    def reload(self) -> None:
+        ...
+
+
+_TOKEN_RE = re.compile(r"[^\W_]+")
+
+
+def _search_tokens(text: str) -> List[str]:
+    """Tách từ như tokenizer unicode61 remove_diacritics 2 của FTS5: chữ thường, bỏ dấu (giữ "đ")"""
+    folded = unicodedata.normalize("NFD", text.lower())
+    folded = unicodedata.normalize("NFC", "".join(ch for ch in folded if unicodedata.category(ch) != "Mn"))
+    return _TOKEN_RE.findall(folded)
+
+
+def _search_phrases(query: str) -> List[List[str]]:
+    """Mỗi từ (tách theo khoảng trắng) của truy vấn là một cụm; từ cuối của cụm khớp theo tiền tố"""
+    return [tokens for tokens in (_search_tokens(term) for term in query.split()) if tokens]
+
+
+def _matches_phrases(phrases: List[List[str]], fields: List[List[str]]) -> bool:
+    """Mọi cụm đều xuất hiện liên tiếp trong một trường (tên hoặc mô tả), giống MATCH '"a b"* "c"*'"""
+    if not phrases:
+        return False
+    for phrase in phrases:
+        *exact, prefix = phrase
+        if not any(
+            tokens[i:i + len(exact)] == exact and tokens[i + len(exact)].startswith(prefix)
+            for tokens in fields
+            for i in range(len(tokens) - len(exact))
+        ):
+            return False
+    return True
+
+
+def _check_bounds(bounds: Dict[str, Tuple[Optional[float], Optional[float]]]) -> None:
+    unknown = set(bounds) - set(NUMERIC_COLUMNS)
+    if unknown:
+        raise ValueError(f"Cột không hỗ trợ truy vấn khoảng: {sorted(unknown)}")
+
+
+class JsonNutritionStore(NutritionStore):
+    """Backend JSON: nạp toàn bộ file vào dict"""
+
+    def __init__(self, json_path: str | Path = NUTRITION_JSON_PATH):
+        self.json_path = Path(json_path)
+        self._data: Dict[str, Dict] = {}
+        self._name_index: Dict[str, str] = {}
+        self._search_fields: Dict[str, List[List[str]]] = {}
+        self.version = 0
+        self.reload()
+
+    def reload(self) -> None:
+        data: Dict[str, Dict] = {}
+        if self.json_path.exists():
+            try:
+                with open(self.json_path, "r", encoding="utf-8") as f:
+                    data = json.load(f)
+            except Exception as e:
+                print(f"Lỗi khi load file dinh dưỡng: {e}")
+                data = {}
+        self._data = data
+        self._name_index = {}
+        for key, food in data.items():
+            self._name_index.setdefault(key.lower(), key)
+            self._name_index.setdefault(str(food.get("name", "")).lower(), key)
+        # Tách từ sẵn tên/mô tả để search không phải chuẩn hoá lại mỗi truy vấn
+        self._search_fields = {
+            key: [_search_tokens(str(food.get("name", key))), _search_tokens(str(food.get("description", "")))]
+            for key, food in data.items()
+        }
+        self.version += 1
+
+    @property
+    def exists(self) -> bool:
+        return self.json_path.exists()
+
+    def __getitem__(self, key: str) -> Dict:
+        return self._data[key]
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._data)
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def find(self, name: str) -> Optional[Tuple[str, Dict]]:
+        key = self._name_index.get(name.lower())
+        if key is None:
+            return None
+        return key, self._data[key]
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[str]:
+        phrases = _search_phrases(query)
+        matched = []
+        for key, fields in self._search_fields.items():
+            if _matches_phrases(phrases, fields):
+                matched.append(key)
+                if limit is not None and len(matched) >= limit:
+                    break
+        return matched
+
+    def filter_ranges(self, limit: int = 100, **bounds: Tuple[Optional[float], Optional[float]]) -> List[str]:
+        _check_bounds(bounds)
+        matched = []
+        for key, food in self._data.items():
+            ok = True
+            for column, (low, high) in bounds.items():
+                value = food.get(column)
+                if value is None or (low is not None and value < low) or (high is not None and value > high):
+                    ok = False
+                    break
+            if ok:
+                matched.append(key)
+                if len(matched) >= limit:
+                    break
+        return matched
+
+
+class _ConnectionPool:
+    """Pool kết nối SQLite chỉ đọc, giới hạn số kết nối đồng thời"""
+
+    def __init__(self, db_path: Path, size: int):
+        self.db_path = db_path
+        self.size = max(1, size)
+        self._idle: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._created = 0
+        self._closed = False
+        self._lock = threading.Lock()
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(
+            f"file:{self.db_path}?mode=ro", uri=True, check_same_thread=False
+        )
+        conn.execute("PRAGMA query_only = 1")
+        return conn
+
+    @contextmanager
+    def connection(self, timeout: float = 30.0) -> Iterator[sqlite3.Connection]:
+        conn = None
+        try:
+            conn = self._idle.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                if self._created < self.size:
+                    self._created += 1
+                    create = True
+                else:
+                    create = False
+            if create:
+                try:
+                    conn = self._connect()
+                except Exception:
+                    with self._lock:
+                        self._created -= 1
+                    raise
+            else:
+                conn = self._idle.get(timeout=timeout)
+        try:
+            yield conn
+        finally:
+            self._release(conn)
+
+    def _release(self, conn: sqlite3.Connection) -> None:
+        with self._lock:
+            if not self._closed:
+                self._idle.put(conn)
+                return
+            # Pool đã đóng (reload) khi kết nối đang được dùng: đóng luôn thay vì trả về pool cũ
+            self._created -= 1
+        conn.close()
+
+    def close(self) -> None:
+        with self._lock:
+            self._closed = True
+        while True:
+            try:
+                conn = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            conn.close()
+            with self._lock:
+                self._created -= 1
+
+
+class SqliteNutritionStore(NutritionStore):
+    """Backend SQLite: chỉ đọc bản ghi khi cần, bộ nhớ ổn định với catalog lớn"""
+
+    # Số key đọc mỗi lần khi duyệt toàn bộ catalog
+    _ITER_PAGE_SIZE = 1000
+
+    def __init__(self, db_path: str | Path = NUTRITION_DB_PATH, pool_size: int = NUTRITION_DB_POOL_SIZE):
+        self.db_path = Path(db_path)
+        self.pool_size = pool_size
+        self._pool = _ConnectionPool(self.db_path, pool_size)
+        self.version = 1
+
+    def reload(self) -> None:
+        # Đóng các kết nối cũ để đọc file DB mới (vd: sau khi import lại)
+        self._pool.close()
+        self._pool = _ConnectionPool(self.db_path, self.pool_size)
+        self.version += 1
+
+    @property
+    def exists(self) -> bool:
+        return self.db_path.exists()
+
+    def __getitem__(self, key: str) -> Dict:
+        with self._pool.connection() as conn:
+            row = conn.execute("SELECT data FROM foods WHERE key = ?", (key,)).fetchone()
+        if row is None:
+            raise KeyError(key)
+        return json.loads(row[0])
+
+    def __contains__(self, key: object) -> bool:
+        if not isinstance(key, str):
+            return False
+        with self._pool.connection() as conn:
+            row = conn.execute("SELECT 1 FROM foods WHERE key = ?", (key,)).fetchone()
+        return row is not None
+
+    def __iter__(self) -> Iterator[str]:
+        # Phân trang theo id để không giữ kết nối trong suốt quá trình duyệt
+        last_id = 0
+        while True:
+            with self._pool.connection() as conn:
+                rows = conn.execute(
+                    "SELECT id, key FROM foods WHERE id > ? ORDER BY id LIMIT ?",
+                    (last_id, self._ITER_PAGE_SIZE),
+                ).fetchall()
+            if not rows:
+                return
+            for row_id, key in rows:
+                yield key
+            last_id = rows[-1][0]
+
+    def __len__(self) -> int:
+        with self._pool.connection() as conn:
+            return conn.execute("SELECT COUNT(*) FROM foods").fetchone()[0]
+
+    def find(self, name: str) -> Optional[Tuple[str, Dict]]:
+        name_lower = name.lower()
+        with self._pool.connection() as conn:
+            row = conn.execute(
+                "SELECT key, data FROM foods WHERE key_lower = ? OR name_lower = ? "
+                "ORDER BY key_lower = ? DESC, id LIMIT 1",
+                (name_lower, name_lower, name_lower),
+            ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def search(self, query: str, limit: Optional[int] = None) -> List[str]:
+        terms = [t for t in query.split() if t]
+        if not terms:
+            return []
+        # Mỗi từ là một prefix phrase, escape dấu " theo cú pháp FTS5
+        match = " ".join('"' + t.replace('"', '""') + '"*' for t in terms)
+        with self._pool.connection() as conn:
+            rows = conn.execute(
+                "SELECT foods.key FROM foods_fts JOIN foods ON foods.id = foods_fts.rowid "
+                "WHERE foods_fts MATCH ? ORDER BY rank LIMIT ?",
+                (match, -1 if limit is None else limit),  # LIMIT -1: không giới hạn
+            ).fetchall()
+        return [r[0] for r in rows]
+
+    def filter_ranges(self, limit: int = 100, **bounds: Tuple[Optional[float], Optional[float]]) -> List[str]:
+        _check_bounds(bounds)
+        clauses = []
+        params: List[float] = []
+        for column, (low, high) in bounds.items():
+            if low is not None:
+                clauses.append(f"{column} >= ?")
+                params.append(low)
+            if high is not None:
+                clauses.append(f"{column} <= ?")
+                params.append(high)
+        where = " AND ".join(clauses) if clauses else "1"
+        with self._pool.connection() as conn:
+            rows = conn.execute(
+                f"SELECT key FROM foods WHERE {where} ORDER BY id LIMIT ?", (*params, limit)
+            ).fetchall()
+        return [r[0] for r in rows]
+
+
+_SCHEMA = f"""
+CREATE TABLE foods (
+    id INTEGER PRIMARY KEY,
+    key TEXT NOT NULL UNIQUE,
+    key_lower TEXT NOT NULL,
+    name TEXT NOT NULL,
+    name_lower TEXT NOT NULL,
+    description TEXT NOT NULL DEFAULT '',
+    {", ".join(f"{c} REAL" for c in NUMERIC_COLUMNS)},
+    data TEXT NOT NULL
+);
+CREATE INDEX idx_foods_key_lower ON foods(key_lower);
+CREATE INDEX idx_foods_name_lower ON foods(name_lower);
+{"".join(f"CREATE INDEX idx_foods_{c} ON foods({c});" for c in NUMERIC_COLUMNS)}
+CREATE VIRTUAL TABLE foods_fts USING fts5(
+    name, description,
+    content='foods', content_rowid='id',
+    tokenize='unicode61 remove_diacritics 2'
+);
+"""
+
+
+def import_json_to_sqlite(json_path: str | Path, db_path: str | Path, batch_size: int = 1000) -> int:
+    """Chuyển file JSON dinh dưỡng sang SQLite. Ghi ra file tạm rồi thay thế nguyên tử.
+    Trả về số món đã import.
+    """
+    json_path = Path(json_path)
+    db_path = Path(db_path)
+    with open(json_path, "r", encoding="utf-8") as f:
+        data: Dict[str, Dict] = json.load(f)
+
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = db_path.with_name(db_path.name + ".tmp")
+    tmp_path.unlink(missing_ok=True)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.executescript(_SCHEMA)
+        columns = ("key", "key_lower", "name", "name_lower", "description", *NUMERIC_COLUMNS, "data")
+        sql = f"INSERT INTO foods ({', '.join(columns)}) VALUES ({', '.join('?' for _ in columns)})"
+        batch = []
+        for key, food in data.items():
+            name = str(food.get("name", key))
+            batch.append((
+                key,
+                key.lower(),
+                name,
+                name.lower(),
+                str(food.get("description", "")),
+                *(food.get(c) for c in NUMERIC_COLUMNS),
+                json.dumps(food, ensure_ascii=False),
+            ))
+            if len(batch) >= batch_size:
+                conn.executemany(sql, batch)
+                batch.clear()
+        if batch:
+            conn.executemany(sql, batch)
+        conn.execute("INSERT INTO foods_fts(foods_fts) VALUES ('rebuild')")
+        conn.commit()
+        conn.execute("ANALYZE")
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, db_path)
+    return len(data)
+
+
+def open_nutrition_store(backend: Optional[str] = None) -> NutritionStore:
+    """Tạo kho dinh dưỡng theo cấu hình NUTRITION_BACKEND"""
+    backend = (backend or NUTRITION_BACKEND).lower()
+    if backend == "sqlite":
+        return SqliteNutritionStore(NUTRITION_DB_PATH)
+    if backend == "json":
+        return JsonNutritionStore(NUTRITION_JSON_PATH)
+    if backend == "binary":
+        # Import trễ để tránh vòng import (nutrition_binary dùng lại các hằng số ở đây)
+        from .nutrition_binary import BinaryNutritionStore
+        return BinaryNutritionStore(NUTRITION_BIN_PATH)
+    raise ValueError(f"NUTRITION_BACKEND không hợp lệ: {backend}")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Công cụ kho dữ liệu dinh dưỡng")
+    sub = parser.add_subparsers(dest="command", required=True)
+    imp = sub.add_parser("import", help="Chuyển file JSON sang SQLite")
+    imp.add_argument("json_path", nargs="?", default=str(NUTRITION_JSON_PATH))
+    imp.add_argument("db_path", nargs="?", default=str(NUTRITION_DB_PATH))
+    imp.add_argument("--batch-size", type=int, default=1000)
+    args = parser.parse_args()
+
+    if args.command == "import":
+        count = import_json_to_sqlite(args.json_path, args.db_path, batch_size=args.batch_size)
+        print(f"Đã import {count} món vào {args.db_path}")
+
+
+if __name__ == "__main__":
+    main()
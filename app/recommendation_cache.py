@@ -0,0 +1,160 @@
+"""
+Cache LRU/TTL cho kết quả FoodRecommendationService.get_food_recommendation.
+
+Khoá cache là hồ sơ đã lượng tử hoá (chiều cao, cân nặng làm tròn theo PROFILE_HEIGHT_STEP /
+PROFILE_WEIGHT_STEP, tuổi, giới tính, mức vận động, mục tiêu) cùng food_key. Khuyến nghị được
+tính trên hồ sơ đã lượng tử hoá nên mọi người dùng trong cùng một nhóm nhận cùng kết quả,
+không phụ thuộc ai gọi trước.
+
+Cache bị xoá khi catalog dinh dưỡng (store.version) hoặc file luật khuyến nghị được nạp lại.
+Bộ nhớ bị giới hạn theo số mục và tổng kích thước JSON của các kết quả.
+"""
+
+from __future__ import annotations
+
+import threading
+import time
+from collections import OrderedDict
+from typing import Dict, Hashable, Optional, Tuple
+
+from .config import (
+    PROFILE_HEIGHT_STEP,
+    PROFILE_WEIGHT_STEP,
+    RECOMMENDATION_CACHE_MAX_BYTES,
+    RECOMMENDATION_CACHE_SIZE,
+    RECOMMENDATION_CACHE_TTL,
+)
+from .food_recommendation_service import FoodRecommendationService
+from .nutrition_store import NutritionStore
+from .recommendation_rules import rules_version
+from .schemas import FoodRecommendation, UserMetrics, UserProfile
+from .user_health_calculator import UserHealthCalculator
+
+
+def _quantize(value: float, step: float) -> float:
+    if step <= 0:
+        return float(value)
+    return round(round(value / step) * step, 6)
+
+
+class RecommendationCache:
+    """LRU có hạn dùng (TTL), giới hạn theo số mục và số byte"""
+
+    def __init__(
+        self,
+        store: NutritionStore,
+        max_entries: int = RECOMMENDATION_CACHE_SIZE,
+        max_bytes: int = RECOMMENDATION_CACHE_MAX_BYTES,
+        ttl: float = RECOMMENDATION_CACHE_TTL,
+        height_step: float = PROFILE_HEIGHT_STEP,
+        weight_step: float = PROFILE_WEIGHT_STEP,
+    ):
+        self.store = store
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.height_step = height_step
+        self.weight_step = weight_step
+        self._lock = threading.Lock()
+        # key -> (hết hạn lúc, kích thước, kết quả)
+        self._entries: "OrderedDict[Hashable, Tuple[float, int, FoodRecommendation]]" = OrderedDict()
+        self._bytes = 0
+        self._versions: Optional[Tuple[int, int]] = None
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.invalidations = 0
+
+    def quantize(self, user_profile: UserProfile) -> UserProfile:
+        """Hồ sơ đại diện cho nhóm chứa user_profile"""
+        return user_profile.model_copy(update={
+            "height": _quantize(user_profile.height, self.height_step),
+            "weight": _quantize(user_profile.weight, self.weight_step),
+        })
+
+    def _check_versions(self) -> None:
+        versions = (self.store.version, rules_version())
+        if versions != self._versions:
+            if self._versions is not None:
+                self.invalidations += 1
+            self._entries.clear()
+            self._bytes = 0
+            self._versions = versions
+
+    def _evict(self) -> None:
+        while self._entries and (len(self._entries) > self.max_entries or self._bytes > self.max_bytes):
+            _, (_, size, _) = self._entries.popitem(last=False)
+            self._bytes -= size
+            self.evictions += 1
+
+    def get_recommendation(
+        self,
+        user_profile: UserProfile,
+        food_key: Optional[str],
+        food_name: str,
+        food_nutrition: dict,
+        user_metrics: Optional[UserMetrics] = None,
+    ) -> FoodRecommendation:
+        """Khuyến nghị cho món food_key, lấy từ cache nếu có.
+        user_metrics (nếu truyền) phải được tính trên self.quantize(user_profile).
+        food_key=None (món không có trong catalog) thì không cache.
+        """
+        profile = self.quantize(user_profile)
+        if food_key is None:
+            return FoodRecommendationService.get_food_recommendation(profile, food_name, food_nutrition, user_metrics)
+
+        key = (UserHealthCalculator.profile_key(profile), food_key)
+        now = time.monotonic()
+        with self._lock:
+            self._check_versions()
+            versions = self._versions
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    cached = entry[2]
+                    return cached if cached.food_name == food_name else cached.model_copy(update={"food_name": food_name})
+                del self._entries[key]
+                self._bytes -= entry[1]
+                self.expirations += 1
+            self.misses += 1
+
+        if user_metrics is None:
+            user_metrics = UserHealthCalculator.calculate_user_metrics(profile)
+        result = FoodRecommendationService.get_food_recommendation(profile, food_name, food_nutrition, user_metrics)
+        size = len(result.model_dump_json())
+
+        with self._lock:
+            # Không lưu kết quả tính trên catalog/luật đã bị thay trong lúc tính
+            if self._versions == versions and size <= self.max_bytes:
+                old = self._entries.pop(key, None)
+                if old is not None:
+                    self._bytes -= old[1]
+                self._entries[key] = (now + self.ttl, size, result)
+                self._bytes += size
+                self._evict()
+        return result
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self) -> Dict[str, float]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_entries": self.max_entries,
+                "max_bytes": self.max_bytes,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "invalidations": self.invalidations,
+            }
@@ -0,0 +1,295 @@
+"""
+Bộ máy luật khuyến nghị dạng bảng.
+
+Các ngưỡng dinh dưỡng (điểm sức khỏe, lời khuyên, nhãn khuyến nghị) được khai báo trong
+app/rules/recommendation_rules.json thay vì viết tay trong code. Mỗi bộ luật (RuleSet) gồm:
+
+    base / min / max / round : điểm khởi đầu, giới hạn và số chữ số làm tròn
+    default_label            : nhãn khi không luật nào cho nhãn
+    fallback_advice          : lời khuyên khi không luật nào sinh lời khuyên
+    rules                    : danh sách luật, mỗi luật có
+        metric : tên chỉ số (vd: "calories", "calories_percent"); bỏ trống nếu chỉ xét "when"
+        when   : điều kiện ngữ cảnh, vd {"goal": ["lose_weight"]}
+        tiers  : các bậc xét theo thứ tự, bậc đầu tiên thỏa mãn được áp dụng; mỗi bậc có
+                 gt/gte/lt/lte (bỏ trống = luôn đúng), delta, advice (template với {value}),
+                 label, channel (nhóm lời khuyên, mặc định "advice")
+
+Bộ luật được biên dịch một lần, đánh giá được một món (evaluate) hoặc cả ma trận dinh dưỡng
+theo cột NumPy (evaluate_batch). File luật được nạp lại tự động khi thay đổi.
+"""
+
+from __future__ import annotations
+
+import json
+import threading
+import time
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Any, Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+
+from .config import RECOMMENDATION_RULES_PATH
+
+DEFAULT_CHANNEL = "advice"
+
+
+def _context_value(value: Any) -> str:
+    return str(getattr(value, "value", value))
+
+
+@dataclass(frozen=True)
+class _Tier:
+    gt: Optional[float]
+    gte: Optional[float]
+    lt: Optional[float]
+    lte: Optional[float]
+    delta: float
+    advice: Optional[str]
+    label: Optional[str]
+    channel: str
+
+    def matches(self, value: float) -> bool:
+        return ((self.gt is None or value > self.gt)
+                and (self.gte is None or value >= self.gte)
+                and (self.lt is None or value < self.lt)
+                and (self.lte is None or value <= self.lte))
+
+    def mask(self, values: np.ndarray) -> np.ndarray:
+        m = np.ones(values.shape, dtype=bool)
+        if self.gt is not None:
+            m &= values > self.gt
+        if self.gte is not None:
+            m &= values >= self.gte
+        if self.lt is not None:
+            m &= values < self.lt
+        if self.lte is not None:
+            m &= values <= self.lte
+        return m
+
+    def format_advice(self, value: Optional[float]) -> str:
+        return self.advice.format(value=value)
+
+
+@dataclass(frozen=True)
+class _Rule:
+    metric: Optional[str]
+    when: Tuple[Tuple[str, frozenset], ...]
+    tiers: Tuple[_Tier, ...]
+
+
+@dataclass
+class RuleResult:
+    """Kết quả đánh giá một món"""
+    score: float
+    label: Optional[str]
+    advice: Dict[str, List[str]] = field(default_factory=dict)
+
+    def messages(self, channel: str = DEFAULT_CHANNEL) -> List[str]:
+        return self.advice.get(channel, [])
+
+
+@dataclass
+class BatchRuleResult:
+    """Kết quả đánh giá N món: điểm và nhãn là mảng, lời khuyên là danh sách theo từng dòng"""
+    scores: np.ndarray
+    labels: np.ndarray
+    advice: List[Dict[str, List[str]]]
+
+    def row(self, i: int) -> RuleResult:
+        label = self.labels[i]
+        return RuleResult(score=float(self.scores[i]), label=label, advice=self.advice[i])
+
+
+class RuleSet:
+    """Bộ luật đã biên dịch"""
+
+    def __init__(self, name: str, spec: Mapping[str, Any]):
+        self.name = name
+        self.base = spec.get("base", 0)
+        self.min = spec.get("min")
+        self.max = spec.get("max")
+        self.round = spec.get("round")
+        self.default_label = spec.get("default_label")
+        self.fallback_advice = list(spec.get("fallback_advice", []))
+        self.rules = tuple(self._compile_rule(r) for r in spec.get("rules", []))
+
+    @property
+    def metrics(self) -> List[str]:
+        """Tên các chỉ số số học mà bộ luật sử dụng"""
+        return sorted({r.metric for r in self.rules if r.metric is not None})
+
+    @staticmethod
+    def _compile_rule(spec: Mapping[str, Any]) -> _Rule:
+        tiers = []
+        for t in spec.get("tiers", []):
+            unknown = set(t) - {"gt", "gte", "lt", "lte", "delta", "advice", "label", "channel"}
+            if unknown:
+                raise ValueError(f"Trường không hợp lệ trong luật: {sorted(unknown)}")
+            tiers.append(_Tier(
+                gt=t.get("gt"), gte=t.get("gte"), lt=t.get("lt"), lte=t.get("lte"),
+                delta=t.get("delta", 0),
+                advice=t.get("advice"),
+                label=t.get("label"),
+                channel=t.get("channel", DEFAULT_CHANNEL),
+            ))
+        when = tuple((k, frozenset(_context_value(v) for v in values)) for k, values in spec.get("when", {}).items())
+        return _Rule(metric=spec.get("metric"), when=when, tiers=tuple(tiers))
+
+    def _finish_score(self, score):
+        if isinstance(score, np.ndarray):
+            if self.round is not None:
+                score = np.round(score, self.round)
+            return np.clip(score, self.min, self.max) if (self.min is not None or self.max is not None) else score
+        if self.round is not None:
+            score = round(score, self.round)
+        if self.max is not None:
+            score = min(self.max, score)
+        if self.min is not None:
+            score = max(self.min, score)
+        return score
+
+    def evaluate(self, metrics: Mapping[str, Any]) -> RuleResult:
+        """Đánh giá một món. metrics gồm chỉ số số học và ngữ cảnh (goal, bmi_category...)"""
+        score = self.base
+        label = None
+        advice: Dict[str, List[str]] = {}
+        for rule in self.rules:
+            if any(_context_value(metrics.get(k)) not in allowed for k, allowed in rule.when):
+                continue
+            value = None
+            if rule.metric is not None:
+                value = metrics.get(rule.metric)
+                if value is None or value != value:  # thiếu dữ liệu hoặc NaN
+                    continue
+            for tier in rule.tiers:
+                if value is None or tier.matches(value):
+                    score += tier.delta
+                    if tier.label is not None and label is None:
+                        label = tier.label
+                    if tier.advice is not None:
+                        advice.setdefault(tier.channel, []).append(tier.format_advice(value))
+                    break
+        if not advice and self.fallback_advice:
+            advice[DEFAULT_CHANNEL] = list(self.fallback_advice)
+        return RuleResult(
+            score=self._finish_score(score),
+            label=label if label is not None else self.default_label,
+            advice=advice,
+        )
+
+    def evaluate_batch(self, metrics: Mapping[str, Any], size: Optional[int] = None) -> BatchRuleResult:
+        """Đánh giá N món cùng lúc. Mỗi chỉ số là mảng độ dài N hoặc một giá trị dùng chung."""
+        if size is None:
+            size = max((len(v) for v in metrics.values() if isinstance(v, (np.ndarray, list, tuple))), default=1)
+        scores = np.full(size, self.base, dtype=np.float64)
+        labels = np.full(size, None, dtype=object)
+        has_label = np.zeros(size, dtype=bool)
+        advice: List[Dict[str, List[str]]] = [{} for _ in range(size)]
+
+        for rule in self.rules:
+            active = np.ones(size, dtype=bool)
+            for key, allowed in rule.when:
+                ctx = metrics.get(key)
+                if isinstance(ctx, (np.ndarray, list, tuple)):
+                    active &= np.isin(np.array([_context_value(v) for v in ctx], dtype=object), list(allowed))
+                elif _context_value(ctx) not in allowed:
+                    active[:] = False
+            values = None
+            if rule.metric is not None:
+                raw = metrics.get(rule.metric)
+                if raw is None:
+                    continue
+                values = np.broadcast_to(np.asarray(raw, dtype=np.float64), (size,))
+                active &= ~np.isnan(values)
+            remaining = active
+            for tier in rule.tiers:
+                if not remaining.any():
+                    break
+                hit = remaining if values is None else remaining & tier.mask(values)
+                remaining = remaining & ~hit
+                if tier.delta:
+                    scores[hit] += tier.delta
+                rows = np.flatnonzero(hit)
+                if tier.label is not None:
+                    unset = hit & ~has_label
+                    labels[unset] = tier.label
+                    has_label |= unset
+                if tier.advice is not None:
+                    for i in rows:
+                        advice[i].setdefault(tier.channel, []).append(
+                            tier.format_advice(None if values is None else float(values[i]))
+                        )
+
+        if self.fallback_advice:
+            for row in advice:
+                if not row:
+                    row[DEFAULT_CHANNEL] = list(self.fallback_advice)
+        if self.default_label is not None:
+            labels[~has_label] = self.default_label
+        return BatchRuleResult(scores=self._finish_score(scores), labels=labels, advice=advice)
+
+
+class RuleBook:
+    """Tập các bộ luật nạp từ file JSON, tự nạp lại khi file thay đổi"""
+
+    # Khoảng thời gian tối thiểu giữa hai lần kiểm tra mtime của file luật
+    CHECK_INTERVAL = 2.0
+
+    def __init__(self, path: str | Path = RECOMMENDATION_RULES_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._rulesets: Dict[str, RuleSet] = {}
+        self._mtime: Optional[float] = None
+        self._checked_at = 0.0
+        # Tăng mỗi lần nạp lại để các cache kết quả phía trên biết luật đã đổi
+        self.version = 0
+        self.reload()
+
+    def reload(self) -> None:
+        with open(self.path, "r", encoding="utf-8") as f:
+            spec = json.load(f)
+        # Biên dịch toàn bộ trước khi thay thế để file lỗi không làm hỏng bộ luật đang dùng
+        rulesets = {name: RuleSet(name, s) for name, s in spec.items()}
+        with self._lock:
+            self._rulesets = rulesets
+            self.version += 1
+            self._mtime = self.path.stat().st_mtime
+            self._checked_at = time.monotonic()
+
+    def _maybe_reload(self) -> None:
+        now = time.monotonic()
+        if now - self._checked_at < self.CHECK_INTERVAL:
+            return
+        self._checked_at = now
+        try:
+            if self.path.stat().st_mtime != self._mtime:
+                self.reload()
+        except Exception as e:
+            print(f"Lỗi khi nạp lại file luật khuyến nghị: {e}")
+
+    def get(self, name: str) -> RuleSet:
+        self._maybe_reload()
+        return self._rulesets[name]
+
+
+_rule_book: Optional[RuleBook] = None
+
+
+def _default_rule_book() -> RuleBook:
+    global _rule_book
+    if _rule_book is None:
+        _rule_book = RuleBook()
+    return _rule_book
+
+
+def get_ruleset(name: str) -> RuleSet:
+    """Lấy bộ luật theo tên từ file luật mặc định"""
+    return _default_rule_book().get(name)
+
+
+def rules_version() -> int:
+    """Phiên bản file luật mặc định (tăng khi file được nạp lại)"""
+    book = _default_rule_book()
+    book._maybe_reload()
+    return book.version
@@ -0,0 +1,21 @@
+"""
+Làm tròn theo mảng NumPy cho kết quả khớp với round() của Python.
+
+Các phép tính theo cột (bulk_metrics, FoodRecommendationService.score_foods) phải trả về đúng các số
+mà code tính từng phần tử bằng round() đã trả về trước đây.
+"""
+
+from __future__ import annotations
+
+import numpy as np
+
+
+def py_round(values: np.ndarray, ndigits: int) -> np.ndarray:
+    """np.round nhưng khớp với round() của Python ở các giá trị sát ranh giới .5"""
+    rounded = np.round(values, ndigits)
+    scaled = values * 10 ** ndigits
+    # np.round nhân với 10^n trước khi làm tròn nên có thể lệch so với round() (làm tròn theo giá trị thập phân chính xác)
+    near_half = np.flatnonzero(np.abs(scaled - np.floor(scaled) - 0.5) < 1e-6)
+    for i in near_half:
+        rounded[i] = round(float(values[i]), ndigits)
+    return rounded
@@ -1,12 +1,17 @@
-from pydantic import BaseModel, Field
+from pydantic import BaseModel, ConfigDict, Field
 from typing import List, Optional, Dict, Any
 from enum import Enum
+from datetime import datetime
 
 class TrainRequest(BaseModel):
     dataset_dir: str = Field(..., description="Đường dẫn tuyệt đối tới thư mục dataset")
     num_epochs: Optional[int] = Field(5, ge=1, le=200)
     batch_size: Optional[int] = Field(32, ge=1, le=512)
     learning_rate: Optional[float] = Field(5e-4, gt=0, le=1.0)
+    cache_features: Optional[bool] = Field(None, description="Cache activation backbone đóng băng, chỉ train phần đuôi")
+    resume: bool = Field(False, description="Chạy tiếp từ checkpoint của lần train trước trên cùng dataset")
+    world_size: Optional[int] = Field(None, ge=1, le=64, description="Số tiến trình data-parallel (mặc định TRAIN_DDP_WORLD_SIZE)")
+    budget: str = Field("default", description="Ngân sách CPU chạy job (TRAIN_JOB_BUDGETS)")
 
 class PredictResponse(BaseModel):
     dish_name: str
@@ -19,6 +24,19 @@ class AutoTrainRequest(BaseModel):
     num_epochs: int = Field(5, ge=1, le=200)
     batch_size: int = Field(32, ge=1, le=512)
     learning_rate: float = Field(5e-4, gt=0, le=1.0)
+    cache_features: Optional[bool] = Field(None, description="Cache activation backbone đóng băng, chỉ train phần đuôi")
+    incremental: bool = Field(False, description="Thêm lớp mới vào mô hình hiện tại thay vì train lại từ đầu")
+    budget: str = Field("default", description="Ngân sách CPU chạy job (TRAIN_JOB_BUDGETS)")
+
+
+class SweepRequest(BaseModel):
+    dataset_dir: str = Field(..., description="Đường dẫn tuyệt đối tới thư mục dataset")
+    space: Optional[dict] = Field(None, description="Không gian tìm kiếm: num_epochs, batch_size, learning_rate, unfrozen_blocks")
+    n_trials: int = Field(8, ge=1, le=100)
+    min_epochs: int = Field(1, ge=1, le=50, description="Mốc epoch đầu tiên của successive halving")
+    eta: int = Field(3, ge=2, le=10, description="Mỗi mốc giữ lại 1/eta trial tốt nhất")
+    install: bool = Field(True, description="Ghi mô hình của trial thắng vào models/")
+    budget: str = Field("default", description="Ngân sách CPU chạy job (TRAIN_JOB_BUDGETS)")
 
 
 class NutritionInfo(BaseModel):
@@ -125,6 +143,9 @@ class UserProfile(BaseModel):
 
 class UserMetrics(BaseModel):
     """Các chỉ số cơ thể đã tính toán"""
+    # Bất biến để có thể dùng chung một instance từ cache cho nhiều request
+    model_config = ConfigDict(frozen=True)
+
     bmi: float = Field(..., description="Chỉ số BMI")
     bmi_category: str = Field(..., description="Phân loại BMI")
     bmr: float = Field(..., description="Tỷ lệ trao đổi chất cơ bản (calories/ngày)")
@@ -143,3 +164,42 @@ class FoodRecommendation(BaseModel):
     recommendation: str = Field(..., description="Khuyến nghị chính")
     detailed_advice: List[str] = Field(..., description="Lời khuyên chi tiết")
     health_score: float = Field(..., ge=0, le=100, description="Điểm sức khỏe (0-100)")
+
+# ===== SCHEMAS FOR MEAL DIARY =====
+
+class MealEntryRequest(BaseModel):
+    """Ghi một bữa ăn vào nhật ký"""
+    user_id: str = Field(..., min_length=1, max_length=128, description="Mã người dùng")
+    food_name: str = Field(..., description="food_key hoặc tên món")
+    servings: float = Field(1.0, gt=0, le=20, description="Số khẩu phần")
+    eaten_at: Optional[datetime] = Field(None, description="Thời điểm ăn (mặc định: bây giờ)")
+
+class MealEntry(BaseModel):
+    """Một dòng trong nhật ký ăn uống"""
+    id: int
+    user_id: str
+    eaten_at: datetime
+    day: str
+    food_key: Optional[str]
+    food_name: str
+    servings: float
+    source: str
+    calories: float
+    protein: float
+    carbs: float
+    fat: float
+
+class IntakeTotals(BaseModel):
+    """Tổng calo/macro đã ăn trong một khoảng (ngày hoặc tuần) so với mục tiêu"""
+    period: str = Field(..., description="Ngày (YYYY-MM-DD) hoặc tuần ISO (YYYY-Www)")
+    entries: int
+    consumed: Dict[str, float]
+    target: Dict[str, float]
+    remaining: Dict[str, float]
+    percent: Dict[str, float]
+
+class IntakeProgress(BaseModel):
+    """Tiến độ ăn uống trong ngày và trong tuần"""
+    user_id: str
+    today: IntakeTotals
+    week: IntakeTotals
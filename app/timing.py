@@ -0,0 +1,54 @@
+"""
+Đo thời gian từng giai đoạn xử lý request và xuất ra header Server-Timing.
+
+    timer = StageTimer()
+    with timer.stage("read"):
+        content = await file.read()
+    tensor = await timer.run_in_thread("decode", inference.decode_image, content)
+    response.headers["Server-Timing"] = timer.header()
+
+Các giai đoạn chạy song song được đo riêng nên tổng các giai đoạn có thể lớn hơn "total".
+"""
+
+from __future__ import annotations
+
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, Iterator, TypeVar
+
+from starlette.concurrency import run_in_threadpool
+
+T = TypeVar("T")
+
+
+class StageTimer:
+    """Ghi lại thời lượng (ms) của các giai đoạn theo thứ tự kết thúc"""
+
+    def __init__(self) -> None:
+        self._start = time.perf_counter()
+        self.stages: Dict[str, float] = {}
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.stages[name] = (time.perf_counter() - start) * 1000
+
+    async def run_in_thread(self, name: str, func: Callable[..., T], *args: Any) -> T:
+        """Chạy hàm đồng bộ trong threadpool để không chặn event loop, đo thời gian giai đoạn"""
+        def timed() -> T:
+            with self.stage(name):
+                return func(*args)
+        return await run_in_threadpool(timed)
+
+    @property
+    def total_ms(self) -> float:
+        return (time.perf_counter() - self._start) * 1000
+
+    def header(self) -> str:
+        """Giá trị header Server-Timing, vd: "read;dur=0.4, decode;dur=12.1, total;dur=30.2" """
+        parts = [f"{name};dur={ms:.1f}" for name, ms in self.stages.items()]
+        parts.append(f"total;dur={self.total_ms:.1f}")
+        return ", ".join(parts)
@@ -0,0 +1,112 @@
+"""
+Autotrain chạy trong job nền: crawl dataset theo pipeline rồi huấn luyện.
+
+- incremental (đã có mô hình): lớp nào đủ ảnh hợp lệ thì được đưa vào train_incremental ngay,
+  các lớp còn lại tiếp tục tải song song; các lớp sẵn sàng trong lúc đang train được gộp vào lượt sau
+- không incremental (hoặc chưa có mô hình): chờ crawl xong rồi train_model trên toàn bộ dataset
+"""
+
+from __future__ import annotations
+
+import queue
+import threading
+from pathlib import Path
+from typing import Callable, List, Optional
+
+from ..config import MODEL_PATH, LABELS_PATH, AUTOTRAIN_MIN_CLASS_IMAGES
+from .auto_dataset import KEYWORD_MAP
+from .clean_dataset import clean_dataset
+from .crawler import ImageCrawler
+from .incremental import train_incremental
+from .train import train_model
+
+_CRAWL_DONE = object()
+
+
+def run_autotrain(
+    classes: List[str],
+    dataset_dir: str,
+    images_per_class: int = 30,
+    num_epochs: int = 5,
+    batch_size: int = 32,
+    learning_rate: float = 5e-4,
+    incremental: bool = False,
+    cache_features: Optional[bool] = None,
+    min_class_images: int = AUTOTRAIN_MIN_CLASS_IMAGES,
+    crawler: Optional[ImageCrawler] = None,
+    on_epoch: Optional[Callable[[dict], None]] = None,
+    on_stage: Optional[Callable[[dict], None]] = None,
+) -> dict:
+    ds_dir = Path(dataset_dir)
+    ds_dir.mkdir(parents=True, exist_ok=True)
+    crawler = crawler or ImageCrawler()
+    requests_by_class = {cls: KEYWORD_MAP.get(cls) for cls in classes}
+    report = {"dataset_dir": str(ds_dir.resolve()), "crawl": {}, "trained": [], "skipped": []}
+
+    def stage(**info) -> None:
+        if on_stage is not None:
+            on_stage(info)
+
+    if not (incremental and MODEL_PATH.exists() and Path(LABELS_PATH).exists()):
+        stage(crawl="running")
+        report["crawl"] = crawler.crawl(ds_dir, requests_by_class, images_per_class)
+        deleted, scanned = clean_dataset(ds_dir)
+        print(f"[CLEAN_DATASET] deleted={deleted} / scanned={scanned}")
+        stage(crawl="done", training="running")
+        result = train_model(str(ds_dir), num_epochs=num_epochs, batch_size=batch_size,
+                             learning_rate=learning_rate, cache_features=cache_features, on_epoch=on_epoch)
+        report["trained"].append({"classes": result["classes"], **result})
+        stage(training="done")
+        return report
+
+    ready: queue.Queue = queue.Queue()
+
+    def crawl() -> None:
+        try:
+            report["crawl"] = crawler.crawl(ds_dir, requests_by_class, images_per_class,
+                                            on_class_ready=lambda name, stats: ready.put((name, stats)))
+        finally:
+            ready.put(_CRAWL_DONE)
+
+    crawl_thread = threading.Thread(target=crawl, daemon=True)
+    crawl_thread.start()
+    stage(crawl="running", ready=[], skipped=[])
+
+    done = False
+    while not done:
+        # Chờ ít nhất một lớp, rồi gộp mọi lớp đã sẵn sàng vào cùng một lượt train
+        items = [ready.get()]
+        while True:
+            try:
+                items.append(ready.get_nowait())
+            except queue.Empty:
+                break
+        batch = []
+        for item in items:
+            if item is _CRAWL_DONE:
+                done = True
+                continue
+            name, stats = item
+            if stats["saved"] >= min(min_class_images, images_per_class):
+                batch.append(name)
+            else:
+                report["skipped"].append({"class": name, **stats})
+        stage(ready=[c for t in report["trained"] for c in t["classes"]] + batch,
+              skipped=[s["class"] for s in report["skipped"]])
+        if not batch:
+            continue
+
+        def epoch_with_classes(metrics: dict, batch=batch) -> None:
+            if on_epoch is not None:
+                on_epoch({**metrics, "classes": batch})
+
+        stage(training=f"running {batch}")
+        result = train_incremental(str(ds_dir), num_epochs=num_epochs, batch_size=batch_size,
+                                   learning_rate=learning_rate, classes=batch, on_epoch=epoch_with_classes)
+        result.pop("best", None)
+        # result["classes"] là toàn bộ nhãn sau khi train, không được đè lên các lớp của batch này
+        report["trained"].append({**result, "classes": batch})
+
+    crawl_thread.join()
+    stage(crawl="done", training="done")
+    return report
@@ -0,0 +1,104 @@
+"""
+Checkpoint đầy đủ để chạy tiếp một lần huấn luyện bị ngắt (máy preemptible, job bị huỷ/kill).
+
+<run_dir>/last.pt chứa trọng số model, trạng thái optimizer, scheduler, RNG (torch, generator của sampler,
+numpy, random), số epoch đã xong, best_acc, danh sách lớp và tiến độ các epoch. File được ghi vào file
+tạm rồi os.replace nên luôn là bản đầy đủ của một epoch đã xong.
+
+Mặc định run_dir = TRAIN_RUNS_DIR/<tên dataset>-<hash đường dẫn>, nên `resume` chạy tiếp lần train
+gần nhất trên cùng dataset.
+
+Cạnh state_dict mô hình phục vụ (vd. models/best.pt) có file best.arch ghi kiến trúc ("large"/"small"):
+sau khi chưng cất và cài student, các bước chỉ làm với MobileNetV3 Large kiểm tra file này trước khi nạp.
+"""
+
+from __future__ import annotations
+
+import hashlib
+import os
+import random
+from pathlib import Path
+from typing import Optional
+
+import numpy as np
+import torch
+
+from ..config import TRAIN_RUNS_DIR
+
+FORMAT_VERSION = 1
+LAST_CHECKPOINT = "last.pt"
+MODEL_ARCHS = ("large", "small")
+
+
+def run_dir_for(dataset_dir: str | Path) -> Path:
+    resolved = str(Path(dataset_dir).resolve())
+    return TRAIN_RUNS_DIR / f"{Path(resolved).name}-{hashlib.sha1(resolved.encode()).hexdigest()[:10]}"
+
+
+def atomic_save(obj, path: str | Path) -> None:
+    """torch.save vào file tạm cùng thư mục rồi thay thế, không để lại file ghi dở khi bị kill"""
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_name(f".{path.name}.tmp{os.getpid()}")
+    torch.save(obj, tmp)
+    os.replace(tmp, path)
+
+
+def arch_path(model_path: str | Path) -> Path:
+    """File ghi kiến trúc MobileNetV3 cạnh state_dict (models/best.pt -> models/best.arch)"""
+    return Path(model_path).with_suffix(".arch")
+
+
+def save_model_arch(model_path: str | Path, arch: str) -> None:
+    if arch not in MODEL_ARCHS:
+        raise ValueError(f"Kiến trúc không hỗ trợ: {arch} ({', '.join(MODEL_ARCHS)})")
+    path = arch_path(model_path)
+    tmp = path.with_name(f".{path.name}.tmp{os.getpid()}")
+    tmp.write_text(arch, encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def model_arch(model_path: str | Path) -> str:
+    """Kiến trúc của checkpoint; chưa có file .arch thì là "large" (checkpoint ghi trước khi có chưng cất)"""
+    try:
+        arch = arch_path(model_path).read_text(encoding="utf-8").strip()
+    except OSError:
+        return "large"
+    return arch if arch in MODEL_ARCHS else "large"
+
+
+def rng_state(sampler_generator: Optional[torch.Generator] = None) -> dict:
+    return {
+        "torch": torch.get_rng_state(),
+        "sampler": sampler_generator.get_state() if sampler_generator is not None else None,
+        "numpy": np.random.get_state(),
+        "python": random.getstate(),
+    }
+
+
+def restore_rng_state(state: dict, sampler_generator: Optional[torch.Generator] = None) -> None:
+    torch.set_rng_state(state["torch"])
+    if sampler_generator is not None and state.get("sampler") is not None:
+        sampler_generator.set_state(state["sampler"])
+    np.random.set_state(state["numpy"])
+    random.setstate(state["python"])
+
+
+def save_checkpoint(run_dir: str | Path, state: dict) -> Path:
+    path = Path(run_dir) / LAST_CHECKPOINT
+    atomic_save({"format_version": FORMAT_VERSION, **state}, path)
+    return path
+
+
+def load_checkpoint(run_dir: str | Path, map_location=None) -> Optional[dict]:
+    path = Path(run_dir) / LAST_CHECKPOINT
+    if not path.exists():
+        return None
+    state = torch.load(path, map_location=map_location)
+    if state.get("format_version") != FORMAT_VERSION:
+        return None
+    return state
+
+
+def clear_checkpoint(run_dir: str | Path) -> None:
+    (Path(run_dir) / LAST_CHECKPOINT).unlink(missing_ok=True)
@@ -1,42 +1,18 @@
 from __future__ import annotations
 from pathlib import Path
-from typing import Tuple
-from PIL import Image, UnidentifiedImageError
+from typing import Optional, Tuple
 
+from .manifest import load_manifest
 
-def _is_image_file(path: Path) -> bool:
-    return path.suffix.lower() in {".jpg", ".jpeg", ".png"}
 
-
-def clean_dataset(dataset_root: str | Path) -> Tuple[int, int]:
+def clean_dataset(dataset_root: str | Path, workers: Optional[int] = None) -> Tuple[int, int]:
     """
-    Quét toàn bộ dataset (train/val) và xoá file ảnh lỗi mà PIL không mở được.
+    Cập nhật manifest của dataset (train/val) và xoá file ảnh lỗi mà PIL không mở được.
+    Chỉ file mới hoặc đã sửa kể từ lần trước mới được kiểm tra lại (song song bằng process pool);
+    ảnh do crawler tải (đã kiểm tra khi tải, ghi trong crawl_index.json, chưa bị sửa) được bỏ qua.
     Trả về: (deleted_count, scanned_count)
     """
-    root = Path(dataset_root)
-    deleted = 0
-    scanned = 0
-    for split in ("train", "val"):
-        split_dir = root / split
-        if not split_dir.exists():
-            continue
-        for cls_dir in split_dir.iterdir():
-            if not cls_dir.is_dir():
-                continue
-            for img_path in cls_dir.iterdir():
-                if not img_path.is_file() or not _is_image_file(img_path):
-                    continue
-                scanned += 1
-                try:
-                    with Image.open(img_path) as im:
-                        im.verify()  # quick check
-                except (UnidentifiedImageError, OSError):
-                    try:
-                        img_path.unlink(missing_ok=True)
-                        deleted += 1
-                    except Exception:
-                        # Nếu không xoá được thì bỏ qua để không dừng toàn bộ quy trình
-                        pass
+    manifest = load_manifest(dataset_root, refresh=False)
+    scanned = manifest.refresh(workers)
+    deleted = manifest.remove_invalid()
     return deleted, scanned
-
-
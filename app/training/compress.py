@@ -0,0 +1,273 @@
+"""
+Nén mô hình sau train_model cho máy kiosk chỉ có CPU: cắt kênh có cấu trúc + quantization-aware training (int8).
+
+- Cắt kênh: trong mỗi inverted residual block có lớp expand, bỏ các kênh mở rộng (hidden) có |gamma| của
+  BatchNorm depthwise nhỏ nhất; expand, depthwise, squeeze-excitation và project của block được cắt
+  tương ứng, kênh vào/ra của block giữ nguyên nên kết nối residual không đổi. Mỗi mức sparsity là một
+  MobileNetV3 nhỏ hơn thật sự (không phải trọng số bằng 0)
+- Fine-tune phục hồi accuracy vài epoch, rồi QAT (fake-quant, backend COMPRESS_QUANT_ENGINE) và convert
+  sang int8; lưu TorchScript trong MODEL_DIR/compressed/
+- Quét các mức sparsity, báo cáo accuracy val / độ trễ CPU (batch 1) / dung lượng của mô hình gốc, bản cắt
+  float và bản int8, đánh dấu các điểm Pareto (MODEL_DIR/compress_report.json)
+
+    python -m app.training.compress datasets --sparsity 0.25 0.5 0.7
+    # Trên máy kiosk: model = torch.jit.load("models/compressed/sparsity_50_int8.pt")
+"""
+
+from __future__ import annotations
+
+import argparse
+import copy
+import json
+import shutil
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import torch
+from torch import nn
+from torch.ao.quantization import convert, disable_observer, get_default_qat_qconfig, prepare_qat
+from torch.utils.data import DataLoader
+from torchvision.models.mobilenetv3 import InvertedResidualConfig, MobileNetV3, _mobilenet_v3_conf
+from torchvision.models.quantization.mobilenetv3 import QuantizableInvertedResidual, QuantizableMobileNetV3
+from torchvision.models.quantization.utils import _replace_relu
+from torchvision.models._utils import _make_divisible
+
+from ..config import (
+    COMPRESS_QUANT_ENGINE, COMPRESS_SPARSITIES, DEFAULT_IMAGE_SIZE, LABELS_PATH, MODEL_DIR, MODEL_PATH,
+)
+from .checkpoint import model_arch
+from .distill import default_teacher_path, evaluate, measure_latency
+from .manifest import load_manifest
+from .perf import PerfSettings, loader_kwargs
+from .shard_cache import cached_datasets
+
+REPORT_NAME = "compress_report.json"
+OUTPUT_DIR_NAME = "compressed"
+
+
+def large_config() -> Tuple[List[InvertedResidualConfig], int]:
+    return _mobilenet_v3_conf("mobilenet_v3_large")
+
+
+def prune_state_dict(
+    state: Dict[str, torch.Tensor], settings: Sequence[InvertedResidualConfig], sparsity: float,
+) -> Tuple[Dict[str, torch.Tensor], List[InvertedResidualConfig]]:
+    """Cắt kênh hidden của mọi block có lớp expand; trả về state_dict và cấu hình block mới"""
+    state = dict(state)
+    pruned_settings = []
+    for i, cnf in enumerate(settings):
+        cnf = copy.copy(cnf)
+        pruned_settings.append(cnf)
+        if cnf.expanded_channels == cnf.input_channels or sparsity <= 0:
+            continue
+        prefix = f"features.{i + 1}.block"
+        hidden = cnf.expanded_channels
+        keep_count = max(8, _make_divisible(hidden * (1 - sparsity), 8))
+        if keep_count == cnf.input_channels:
+            # Bằng số kênh vào thì torchvision bỏ lớp expand, giữ thêm một nhóm 8 kênh
+            keep_count += 8
+        if keep_count >= hidden:
+            continue
+        importance = state[f"{prefix}.1.1.weight"].abs()
+        keep = importance.topk(keep_count).indices.sort().values
+
+        for layer in ("0", "1"):
+            state[f"{prefix}.{layer}.0.weight"] = state[f"{prefix}.{layer}.0.weight"][keep]
+            for name in ("weight", "bias", "running_mean", "running_var"):
+                key = f"{prefix}.{layer}.1.{name}"
+                state[key] = state[key][keep]
+        project = "3" if cnf.use_se else "2"
+        if cnf.use_se:
+            fc1, fc2 = state[f"{prefix}.2.fc1.weight"][:, keep], state[f"{prefix}.2.fc2.weight"][keep]
+            # Kênh squeeze theo quy tắc của torchvision, giữ các kênh có trọng số fc1 lớn nhất
+            squeeze = _make_divisible(keep_count // 4, 8)
+            sq_keep = fc1.abs().sum(dim=(1, 2, 3)).topk(squeeze).indices.sort().values
+            state[f"{prefix}.2.fc1.weight"] = fc1[sq_keep]
+            state[f"{prefix}.2.fc1.bias"] = state[f"{prefix}.2.fc1.bias"][sq_keep]
+            state[f"{prefix}.2.fc2.weight"] = fc2[:, sq_keep]
+            state[f"{prefix}.2.fc2.bias"] = state[f"{prefix}.2.fc2.bias"][keep]
+        state[f"{prefix}.{project}.0.weight"] = state[f"{prefix}.{project}.0.weight"][:, keep]
+        cnf.expanded_channels = keep_count
+    return state, pruned_settings
+
+
+def build_model(settings: Sequence[InvertedResidualConfig], last_channel: int, num_classes: int,
+                quantizable: bool = False) -> nn.Module:
+    if quantizable:
+        model = QuantizableMobileNetV3(list(settings), last_channel, num_classes=num_classes,
+                                       block=QuantizableInvertedResidual)
+        _replace_relu(model)
+        return model
+    return MobileNetV3(list(settings), last_channel, num_classes=num_classes)
+
+
+def _train_epochs(model: nn.Module, loader: DataLoader, epochs: int, learning_rate: float,
+                  on_epoch_end: Optional[Callable[[int], None]] = None) -> None:
+    optimizer = torch.optim.AdamW(model.parameters(), lr=learning_rate)
+    scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=max(1, epochs))
+    criterion = nn.CrossEntropyLoss()
+    for epoch in range(epochs):
+        model.train()
+        if on_epoch_end is not None and epoch > 0:
+            on_epoch_end(epoch)
+        for images, labels in loader:
+            optimizer.zero_grad(set_to_none=True)
+            criterion(model(images), labels).backward()
+            optimizer.step()
+        scheduler.step()
+
+
+def quantize(model: nn.Module, settings: Sequence[InvertedResidualConfig], last_channel: int, num_classes: int,
+             loader: DataLoader, epochs: int, learning_rate: float, engine: str) -> nn.Module:
+    """QAT từ trọng số float rồi convert sang int8"""
+    torch.backends.quantized.engine = engine
+    qat = build_model(settings, last_channel, num_classes, quantizable=True)
+    qat.load_state_dict(model.state_dict())
+    qat.train()
+    qat.fuse_model(is_qat=True)
+    qat.qconfig = get_default_qat_qconfig(engine)
+    prepare_qat(qat, inplace=True)
+
+    def freeze(epoch: int) -> None:
+        # Epoch cuối: cố định scale/zero-point và thống kê BatchNorm
+        if epoch == epochs - 1:
+            qat.apply(disable_observer)
+            qat.apply(torch.ao.nn.intrinsic.qat.freeze_bn_stats)
+
+    _train_epochs(qat, loader, epochs, learning_rate, freeze)
+    qat.eval()
+    return convert(qat)
+
+
+def _export(model: nn.Module, path: Path) -> Path:
+    """TorchScript: chạy được trên máy kiosk chỉ cần torch, không cần mã nguồn mô hình"""
+    model.eval()
+    with torch.inference_mode():
+        scripted = torch.jit.trace(model, torch.randn(1, 3, DEFAULT_IMAGE_SIZE, DEFAULT_IMAGE_SIZE))
+    scripted.save(str(path))
+    return path
+
+
+def _measure(name: str, model: nn.Module, path: Path, val_loader: DataLoader, latency_runs: int, **extra) -> dict:
+    return {
+        "name": name, **extra,
+        "val_acc": evaluate(model, val_loader),
+        "latency_ms": measure_latency(model, runs=latency_runs),
+        "size_mb": path.stat().st_size / 1e6,
+        "path": str(path),
+    }
+
+
+def pareto_front(points: List[dict]) -> List[dict]:
+    """Đánh dấu điểm không bị điểm nào khác trội hơn (accuracy cao hơn, nhanh hơn, nhỏ hơn)"""
+    def dominates(a: dict, b: dict) -> bool:
+        no_worse = a["val_acc"] >= b["val_acc"] and a["latency_ms"] <= b["latency_ms"] and a["size_mb"] <= b["size_mb"]
+        better = a["val_acc"] > b["val_acc"] or a["latency_ms"] < b["latency_ms"] or a["size_mb"] < b["size_mb"]
+        return no_worse and better
+
+    for p in points:
+        p["pareto"] = not any(dominates(q, p) for q in points if q is not p)
+    return points
+
+
+def compress_model(
+    dataset_dir: str,
+    sparsities: Optional[Sequence[float]] = None,
+    finetune_epochs: int = 2,
+    qat_epochs: int = 2,
+    batch_size: int = 32,
+    learning_rate: float = 1e-4,
+    engine: str = COMPRESS_QUANT_ENGINE,
+    model_path: Optional[str] = None,
+    output_dir: Optional[str] = None,
+    latency_runs: int = 30,
+    on_epoch: Optional[Callable[[dict], None]] = None,
+) -> dict:
+    """
+    Cắt kênh + fine-tune + QAT int8 cho mỗi mức sparsity (mặc định COMPRESS_SPARSITIES) từ model_path
+    (mặc định MODEL_PATH, MobileNetV3 Large do train_model ghi; đã cài student thì MODEL_DIR/teacher.pt).
+    on_epoch nhận kết quả từng mức sparsity.
+    Trả về báo cáo (cũng ghi ra MODEL_DIR/compress_report.json).
+    """
+    model_path = Path(model_path) if model_path else default_teacher_path(MODEL_PATH, MODEL_DIR)
+    if model_arch(model_path) != "large":
+        raise ValueError(f"{model_path} là MobileNetV3 {model_arch(model_path).title()}, chỉ nén được mô hình Large")
+    output_dir = Path(output_dir) if output_dir else MODEL_DIR / OUTPUT_DIR_NAME
+    output_dir.mkdir(parents=True, exist_ok=True)
+    sparsities = list(COMPRESS_SPARSITIES if sparsities is None else sparsities)
+    if engine not in torch.backends.quantized.supported_engines:
+        raise ValueError(f"Backend quantization không hỗ trợ: {engine} ({torch.backends.quantized.supported_engines})")
+
+    manifest = load_manifest(dataset_dir)
+    train_ds, val_ds = cached_datasets(dataset_dir, DEFAULT_IMAGE_SIZE, manifest)
+    class_names = train_ds.classes
+    labels = [line.strip() for line in LABELS_PATH.read_text(encoding="utf-8").splitlines() if line.strip()]
+    if labels != class_names:
+        raise ValueError(f"Lớp của mô hình ({LABELS_PATH}) khác dataset hiện tại, hãy train lại trước")
+    shutil.copyfile(LABELS_PATH, output_dir / "labels.txt")
+
+    from .train import _weighted_sampler
+
+    options = loader_kwargs(PerfSettings(), torch.device("cpu"))
+    train_loader = DataLoader(train_ds, batch_size=batch_size, shuffle=False,
+                              sampler=_weighted_sampler(train_ds.targets, len(class_names)), **options)
+    val_loader = DataLoader(val_ds, batch_size=batch_size, shuffle=False, **options)
+
+    settings, last_channel = large_config()
+    state = torch.load(model_path, map_location="cpu")
+    baseline = build_model(settings, last_channel, len(class_names))
+    baseline.load_state_dict(state)
+    points = [_measure("baseline", baseline, _export(baseline, output_dir / "baseline_fp32.pt"), val_loader,
+                       latency_runs, sparsity=0.0, dtype="fp32")]
+    print(f"[COMPRESS] baseline val_acc={points[0]['val_acc']:.4f} {points[0]['latency_ms']:.1f} ms "
+          f"{points[0]['size_mb']:.1f} MB")
+
+    for sparsity in sparsities:
+        started = time.perf_counter()
+        tag = f"sparsity_{round(sparsity * 100):02d}"
+        pruned_state, pruned_settings = prune_state_dict(state, settings, sparsity)
+        pruned = build_model(pruned_settings, last_channel, len(class_names))
+        pruned.load_state_dict(pruned_state)
+        _train_epochs(pruned, train_loader, finetune_epochs, learning_rate)
+        row = [_measure(f"{tag}_fp32", pruned, _export(pruned, output_dir / f"{tag}_fp32.pt"), val_loader,
+                        latency_runs, sparsity=sparsity, dtype="fp32")]
+
+        int8 = quantize(pruned, pruned_settings, last_channel, len(class_names), train_loader, qat_epochs,
+                        learning_rate, engine)
+        row.append(_measure(f"{tag}_int8", int8, _export(int8, output_dir / f"{tag}_int8.pt"), val_loader,
+                            latency_runs, sparsity=sparsity, dtype="int8"))
+        for p in row:
+            print(f"[COMPRESS] {p['name']} val_acc={p['val_acc']:.4f} {p['latency_ms']:.1f} ms {p['size_mb']:.1f} MB")
+        points.extend(row)
+        if on_epoch is not None:
+            on_epoch({"sparsity": sparsity, "points": row, "seconds": time.perf_counter() - started})
+
+    report = {
+        "dataset_dir": str(dataset_dir), "source": str(model_path), "engine": engine,
+        "threads": torch.get_num_threads(), "finetune_epochs": finetune_epochs, "qat_epochs": qat_epochs,
+        "points": pareto_front(points),
+    }
+    (MODEL_DIR / REPORT_NAME).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cắt kênh + QAT int8, báo cáo Pareto accuracy/độ trễ/dung lượng")
+    parser.add_argument("dataset_dir")
+    parser.add_argument("--sparsity", type=float, nargs="+", default=None, help="Các mức tỉ lệ kênh hidden bị cắt")
+    parser.add_argument("--finetune-epochs", type=int, default=2)
+    parser.add_argument("--qat-epochs", type=int, default=2)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--engine", default=COMPRESS_QUANT_ENGINE, help="x86/fbgemm (máy x86), qnnpack (ARM)")
+    args = parser.parse_args()
+    report = compress_model(args.dataset_dir, args.sparsity, args.finetune_epochs, args.qat_epochs,
+                            args.batch_size, engine=args.engine)
+    print(f"{'mô hình':<16} {'val_acc':>8} {'ms':>7} {'MB':>6}  pareto")
+    for p in report["points"]:
+        print(f"{p['name']:<16} {p['val_acc']:>8.4f} {p['latency_ms']:>7.1f} {p['size_mb']:>6.1f}  "
+              f"{'*' if p['pareto'] else ''}")
+
+
+if __name__ == "__main__":
+    main()
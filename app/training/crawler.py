@@ -0,0 +1,532 @@
+"""
+Crawler ảnh song song cho autotrain.
+
+- Pipeline nhiều tầng (tìm kiếm -> tải -> kiểm tra -> ghi) nối bằng hàng đợi có giới hạn; tầng tải chạy
+  nhiều luồng, dùng chung requests.Session (connection pool + Retry có backoff)
+- Mỗi host: tối đa CRAWLER_PER_HOST request đồng thời và nhịp token bucket CRAWLER_HOST_RATE request/giây
+- Kết quả tìm kiếm được cache ra đĩa (CRAWLER_CACHE_DIR, hết hạn sau CRAWLER_SEARCH_CACHE_TTL giây)
+- Loại trùng theo URL và theo SHA-1 nội dung; ảnh được kiểm tra ngay khi tải (PIL verify + kích thước tối thiểu)
+- crawl_index.json trong thư mục dataset ghi lại URL, hash và file đã kiểm tra, để clean_dataset bỏ qua
+  các file này thay vì quét lại toàn bộ
+"""
+
+from __future__ import annotations
+
+import hashlib
+import json
+import os
+import queue
+import re
+import threading
+import time
+from contextlib import contextmanager
+from dataclasses import dataclass
+from io import BytesIO
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import requests
+from PIL import Image
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+from ..config import (
+    CRAWLER_MAX_WORKERS, CRAWLER_PER_HOST, CRAWLER_HOST_RATE, CRAWLER_RETRIES, CRAWLER_TIMEOUT,
+    CRAWLER_CACHE_DIR, CRAWLER_SEARCH_CACHE_TTL, CRAWLER_MAX_IMAGE_BYTES, CRAWLER_MIN_IMAGE_SIDE,
+)
+
+INDEX_FILE = "crawl_index.json"
+TRAIN_RATIO = 0.8
+
+
+class TokenBucket:
+    """Giới hạn tốc độ: trung bình `rate` lần/giây, cho phép dồn tối đa `burst` lần"""
+
+    def __init__(self, rate: float, burst: float = 1.0):
+        self.rate = rate
+        self.burst = burst
+        self._tokens = burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> None:
+        if self.rate <= 0:
+            return
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+
+class HostLimiter:
+    """Semaphore + token bucket riêng cho từng host"""
+
+    def __init__(self, per_host: int, rate: float):
+        self.per_host = per_host
+        self.rate = rate
+        self._lock = threading.Lock()
+        self._hosts: Dict[str, Tuple[threading.Semaphore, TokenBucket]] = {}
+
+    @contextmanager
+    def slot(self, url: str) -> Iterator[None]:
+        host = urlsplit(url).netloc.lower()
+        with self._lock:
+            if host not in self._hosts:
+                self._hosts[host] = (threading.BoundedSemaphore(self.per_host), TokenBucket(self.rate))
+            semaphore, bucket = self._hosts[host]
+        with semaphore:
+            bucket.acquire()
+            yield
+
+
+def make_session(retries: int = CRAWLER_RETRIES, pool_size: int = CRAWLER_MAX_WORKERS,
+                 backoff: float = 0.5) -> requests.Session:
+    """Session dùng chung: giữ kết nối (keep-alive) và thử lại khi lỗi mạng / 429 / 5xx"""
+    retry = Retry(
+        total=retries,
+        backoff_factor=backoff,
+        status_forcelist=(429, 500, 502, 503, 504),
+        allowed_methods=frozenset({"GET", "HEAD"}),
+        respect_retry_after_header=True,
+    )
+    adapter = HTTPAdapter(max_retries=retry, pool_connections=pool_size, pool_maxsize=pool_size)
+    session = requests.Session()
+    session.mount("http://", adapter)
+    session.mount("https://", adapter)
+    session.headers["User-Agent"] = "Mozilla/5.0 (scan-food dataset builder)"
+    return session
+
+
+def ddg_search(query: str, max_results: int) -> List[str]:
+    """Tìm URL ảnh bằng DuckDuckGo"""
+    from duckduckgo_search import DDGS
+
+    with DDGS() as ddgs:
+        return [r["image"] for r in ddgs.images(keywords=query, max_results=max_results, safesearch="Off")
+                if r.get("image")]
+
+
+class SearchCache:
+    """Cache kết quả tìm kiếm theo (truy vấn, số kết quả), mỗi truy vấn một file JSON"""
+
+    def __init__(self, cache_dir: str | Path = CRAWLER_CACHE_DIR, ttl: float = CRAWLER_SEARCH_CACHE_TTL):
+        self.cache_dir = Path(cache_dir)
+        self.ttl = ttl
+
+    def _path(self, query: str, max_results: int) -> Path:
+        return self.cache_dir / f"search-{hashlib.sha1(f'{query}|{max_results}'.encode()).hexdigest()}.json"
+
+    def get(self, query: str, max_results: int) -> Optional[List[str]]:
+        try:
+            with open(self._path(query, max_results), "r", encoding="utf-8") as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if time.time() - entry["saved_at"] > self.ttl:
+            return None
+        return entry["urls"]
+
+    def put(self, query: str, max_results: int, urls: List[str]) -> None:
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        path = self._path(query, max_results)
+        tmp = path.with_name(f"{path.name}.tmp{os.getpid()}.{threading.get_ident()}")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump({"query": query, "saved_at": time.time(), "urls": urls}, f, ensure_ascii=False)
+        os.replace(tmp, path)
+
+
+def validate_image(
+    data: bytes, min_side: int = CRAWLER_MIN_IMAGE_SIDE
+) -> Optional[Tuple[str, bytes, Tuple[int, int]]]:
+    """(đuôi file, dữ liệu, (rộng, cao)) nếu là ảnh hợp lệ; ảnh không phải JPEG/PNG được chuyển sang JPEG"""
+    try:
+        with Image.open(BytesIO(data)) as img:
+            img.verify()
+        with Image.open(BytesIO(data)) as img:
+            img.load()
+            if min(img.size) < min_side:
+                return None
+            if img.format == "JPEG":
+                return ".jpg", data, img.size
+            if img.format == "PNG":
+                return ".png", data, img.size
+            out = BytesIO()
+            img.convert("RGB").save(out, format="JPEG", quality=95)
+            return ".jpg", out.getvalue(), img.size
+    except Exception:
+        return None
+
+
+class CrawlIndex:
+    """URL, hash nội dung và file đã kiểm tra của một dataset (crawl_index.json)"""
+
+    def __init__(self, dataset_dir: str | Path):
+        self.root = Path(dataset_dir)
+        self.path = self.root / INDEX_FILE
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        self.urls: set[str] = set(data.get("urls", []))
+        self.files: Dict[str, dict] = data.get("files", {})
+        self.hashes: Dict[str, str] = {entry["sha1"]: rel for rel, entry in self.files.items()}
+
+    def claim_url(self, url: str) -> bool:
+        with self._lock:
+            if url in self.urls:
+                return False
+            self.urls.add(url)
+            return True
+
+    def release_url(self, url: str) -> None:
+        with self._lock:
+            self.urls.discard(url)
+
+    def claim_hash(self, sha1: str, relpath: str) -> bool:
+        with self._lock:
+            if sha1 in self.hashes:
+                return False
+            self.hashes[sha1] = relpath
+            return True
+
+    def add_file(self, path: Path, sha1: str, url: str, image_size: Tuple[int, int]) -> None:
+        st = path.stat()
+        with self._lock:
+            self.files[path.relative_to(self.root).as_posix()] = {
+                "sha1": sha1, "url": url, "size": st.st_size, "mtime_ns": st.st_mtime_ns,
+                "width": image_size[0], "height": image_size[1],
+            }
+
+    def hash_existing(self, directory: Path) -> None:
+        """Ghi hash nội dung các ảnh có sẵn (không do crawler tải) để không tải trùng lại"""
+        known = set(self.hashes.values())
+        for path in directory.iterdir():
+            rel = path.relative_to(self.root).as_posix()
+            if path.is_file() and rel not in known and not path.name.startswith("."):
+                self.hashes.setdefault(hashlib.sha1(path.read_bytes()).hexdigest(), rel)
+
+    def is_verified(self, path: Path) -> bool:
+        """File do crawler ghi và chưa bị sửa kể từ đó"""
+        entry = self.files.get(path.relative_to(self.root).as_posix())
+        if entry is None:
+            return False
+        try:
+            st = path.stat()
+        except OSError:
+            return False
+        return st.st_size == entry["size"] and st.st_mtime_ns == entry["mtime_ns"]
+
+    def save(self) -> None:
+        with self._lock:
+            data = {"urls": sorted(self.urls), "files": self.files}
+        tmp = self.path.with_name(f"{self.path.name}.tmp{os.getpid()}")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+
+@dataclass
+class _ClassState:
+    name: str
+    target: int
+    train_dir: Path
+    val_dir: Path
+    next_index: int
+    accepted: int = 0
+    candidates: int = 0
+    duplicates: int = 0
+    invalid: int = 0
+    failed: int = 0
+    train: int = 0
+    val: int = 0
+    pending: int = 0
+    searched: bool = False
+    ready: bool = False
+
+    def stats(self) -> dict:
+        return {"requested": self.target, "candidates": self.candidates, "saved": self.accepted,
+                "train": self.train, "val": self.val, "duplicates": self.duplicates,
+                "invalid": self.invalid, "failed": self.failed}
+
+
+def _next_index(class_name: str, dirs: Iterable[Path]) -> int:
+    """Chỉ số tiếp theo cho tên file <class>_<i>.<ext>, không ghi đè ảnh đã có"""
+    pattern = re.compile(rf"^{re.escape(class_name)}_(\d+)\.")
+    highest = -1
+    for d in dirs:
+        for p in d.iterdir():
+            m = pattern.match(p.name)
+            if m:
+                highest = max(highest, int(m.group(1)))
+    return highest + 1
+
+
+class ImageCrawler:
+    def __init__(
+        self,
+        search: Callable[[str, int], List[str]] = ddg_search,
+        session: Optional[requests.Session] = None,
+        max_workers: int = CRAWLER_MAX_WORKERS,
+        per_host: int = CRAWLER_PER_HOST,
+        host_rate: float = CRAWLER_HOST_RATE,
+        timeout: float = CRAWLER_TIMEOUT,
+        search_cache: Optional[SearchCache] = None,
+        max_bytes: int = CRAWLER_MAX_IMAGE_BYTES,
+        min_side: int = CRAWLER_MIN_IMAGE_SIDE,
+    ):
+        self._search = search
+        self.session = session or make_session(pool_size=max_workers)
+        self.max_workers = max_workers
+        self.limiter = HostLimiter(per_host, host_rate)
+        self.timeout = timeout
+        self.search_cache = search_cache or SearchCache()
+        self.max_bytes = max_bytes
+        self.min_side = min_side
+        # Công cụ tìm kiếm giới hạn tần suất chặt, các truy vấn chạy tuần tự
+        self._search_lock = threading.Lock()
+
+    def search(self, queries: List[str], max_results: int) -> List[str]:
+        """URL ảnh (không trùng, giữ thứ tự) từ các truy vấn, dừng khi đủ max_results"""
+        urls: List[str] = []
+        seen = set()
+        for query in queries:
+            found = self.search_cache.get(query, max_results)
+            if found is None:
+                with self._search_lock:
+                    try:
+                        found = self._search(query, max_results)
+                    except Exception as e:
+                        print(f"[CRAWLER] Tìm kiếm lỗi '{query}': {e}")
+                        continue
+                self.search_cache.put(query, max_results, found)
+            for url in found:
+                if url not in seen:
+                    seen.add(url)
+                    urls.append(url)
+            if len(urls) >= max_results:
+                break
+        return urls[:max_results]
+
+    def fetch(self, url: str) -> Optional[bytes]:
+        """Tải nội dung (giới hạn max_bytes) theo giới hạn của host; None nếu lỗi"""
+        try:
+            with self.limiter.slot(url):
+                with self.session.get(url, timeout=self.timeout, stream=True) as r:
+                    r.raise_for_status()
+                    if int(r.headers.get("Content-Length") or 0) > self.max_bytes:
+                        return None
+                    chunks = []
+                    size = 0
+                    for chunk in r.iter_content(chunk_size=65536):
+                        size += len(chunk)
+                        if size > self.max_bytes:
+                            return None
+                        chunks.append(chunk)
+                    return b"".join(chunks)
+        except Exception:
+            return None
+
+    def crawl(
+        self,
+        dataset_dir: str | Path,
+        classes: Dict[str, Optional[List[str]]],
+        num_images: int,
+        on_class_ready: Optional[Callable[[str, dict], None]] = None,
+    ) -> Dict[str, dict]:
+        """
+        Tải num_images ảnh hợp lệ cho mỗi lớp (classes: tên lớp -> từ khoá tìm kiếm, None = tên lớp)
+        vào dataset_dir/{train,val}/<class>/ theo tỉ lệ 80/20. Trả về thống kê từng lớp.
+
+        Pipeline nhiều tầng nối bằng hàng đợi có giới hạn: tìm kiếm -> tải -> kiểm tra -> chia train/val + ghi.
+        Lớp nào đủ ảnh (hoặc hết ứng viên) thì on_class_ready(tên lớp, thống kê) được gọi ngay,
+        trong khi các lớp khác vẫn đang tải.
+        """
+        return _CrawlRun(self, Path(dataset_dir), classes, num_images, on_class_ready).run()
+
+
+_DONE = object()
+
+
+class _CrawlRun:
+    """Một lần crawl: các tầng chạy ở luồng riêng, mỗi lớp đếm số URL còn trong pipeline"""
+
+    def __init__(self, crawler: ImageCrawler, root: Path, classes: Dict[str, Optional[List[str]]],
+                 num_images: int, on_class_ready: Optional[Callable[[str, dict], None]]):
+        self.crawler = crawler
+        self.root = root
+        self.classes = classes
+        self.num_images = num_images
+        self.on_class_ready = on_class_ready
+        self.index = CrawlIndex(root)
+        self.lock = threading.Lock()
+        self.states: List[_ClassState] = []
+        self.stages = {"searched": 0, "downloaded": 0, "verified": 0, "written": 0}
+        self.verify_workers = max(1, min(4, os.cpu_count() or 1))
+        self.download_q: queue.Queue = queue.Queue(maxsize=crawler.max_workers * 4)
+        self.verify_q: queue.Queue = queue.Queue(maxsize=self.verify_workers * 4)
+        self.write_q: queue.Queue = queue.Queue(maxsize=64)
+
+    # ---- theo dõi từng lớp ----
+
+    def _finish(self, state: _ClassState) -> None:
+        """Một URL của lớp đã ra khỏi pipeline (ghi xong hoặc bị loại)"""
+        with self.lock:
+            state.pending -= 1
+            exhausted = state.searched and state.pending == 0
+        if exhausted:
+            self._ready(state)
+
+    def _ready(self, state: _ClassState) -> None:
+        with self.lock:
+            if state.ready:
+                return
+            state.ready = True
+            stats = state.stats()
+        print(f"[CRAWLER] {state.name}: {stats['saved']}/{stats['requested']} ảnh (train {stats['train']}, "
+              f"val {stats['val']}), trùng {stats['duplicates']}, không hợp lệ {stats['invalid']}, "
+              f"lỗi tải {stats['failed']}")
+        if self.on_class_ready is not None:
+            self.on_class_ready(state.name, stats)
+
+    # ---- các tầng ----
+
+    def _search_stage(self) -> None:
+        for name, keywords in self.classes.items():
+            train_dir = self.root / "train" / name
+            val_dir = self.root / "val" / name
+            train_dir.mkdir(parents=True, exist_ok=True)
+            val_dir.mkdir(parents=True, exist_ok=True)
+            self.index.hash_existing(train_dir)
+            self.index.hash_existing(val_dir)
+            state = _ClassState(name, self.num_images, train_dir, val_dir, _next_index(name, (train_dir, val_dir)))
+            self.states.append(state)
+            # Lấy dư ứng viên vì một phần URL sẽ lỗi, trùng hoặc không phải ảnh; bỏ qua URL đã xử lý ở lần trước
+            existing = sum(1 for d in (train_dir, val_dir) for p in d.iterdir() if not p.name.startswith("."))
+            found = self.crawler.search(keywords or [name], (self.num_images + existing) * 2)
+            urls = [u for u in found if u not in self.index.urls][:self.num_images * 2]
+            with self.lock:
+                state.candidates = len(urls)
+                state.pending = len(urls)
+                self.stages["searched"] += len(urls)
+            for url in urls:
+                self.download_q.put((state, url))
+            with self.lock:
+                state.searched = True
+                exhausted = state.pending == 0
+            if exhausted:
+                self._ready(state)
+
+    def _download_stage(self) -> None:
+        while True:
+            item = self.download_q.get()
+            if item is _DONE:
+                return
+            state, url = item
+            # Lớp đã đủ ảnh thì bỏ qua, không tốn request
+            if state.accepted >= state.target or not self.index.claim_url(url):
+                self._finish(state)
+                continue
+            data = self.crawler.fetch(url)
+            if data is None:
+                with self.lock:
+                    state.failed += 1
+                self._finish(state)
+                continue
+            with self.lock:
+                self.stages["downloaded"] += 1
+            self.verify_q.put((state, url, data))
+
+    def _verify_stage(self) -> None:
+        while True:
+            item = self.verify_q.get()
+            if item is _DONE:
+                return
+            state, url, data = item
+            validated = validate_image(data, self.crawler.min_side)
+            if validated is None:
+                with self.lock:
+                    state.invalid += 1
+                self._finish(state)
+                continue
+            ext, data, image_size = validated
+            with self.lock:
+                self.stages["verified"] += 1
+            self.write_q.put((state, url, ext, data, image_size, hashlib.sha1(data).hexdigest()))
+
+    def _write_stage(self) -> None:
+        while True:
+            item = self.write_q.get()
+            if item is _DONE:
+                return
+            state, url, ext, data, image_size, sha1 = item
+            if state.accepted >= state.target:
+                # Lớp đã đủ trong lúc đang tải: trả URL lại để lần crawl sau còn dùng được
+                self.index.release_url(url)
+                self._finish(state)
+                continue
+            to_train = state.accepted < max(1, int(state.target * TRAIN_RATIO))
+            dest = (state.train_dir if to_train else state.val_dir) / f"{state.name}_{state.next_index}{ext}"
+            if not self.index.claim_hash(sha1, dest.relative_to(self.root).as_posix()):
+                with self.lock:
+                    state.duplicates += 1
+                self._finish(state)
+                continue
+            tmp = dest.with_name(f".{dest.name}.part")
+            try:
+                tmp.write_bytes(data)
+                os.replace(tmp, dest)
+            except OSError as e:
+                print(f"[CRAWLER] Không ghi được {dest}: {e}")
+                with self.lock:
+                    state.failed += 1
+                self._finish(state)
+                continue
+            self.index.add_file(dest, sha1, url, image_size)
+            with self.lock:
+                state.next_index += 1
+                state.accepted += 1
+                if to_train:
+                    state.train += 1
+                else:
+                    state.val += 1
+                self.stages["written"] += 1
+                full = state.accepted >= state.target
+            if full:
+                self._ready(state)
+            self._finish(state)
+
+    def run(self) -> Dict[str, dict]:
+        started = time.perf_counter()
+        downloaders = [threading.Thread(target=self._download_stage, daemon=True)
+                       for _ in range(self.crawler.max_workers)]
+        verifiers = [threading.Thread(target=self._verify_stage, daemon=True) for _ in range(self.verify_workers)]
+        writer = threading.Thread(target=self._write_stage, daemon=True)
+        for t in downloaders + verifiers + [writer]:
+            t.start()
+        try:
+            self._search_stage()
+        finally:
+            # Đóng pipeline theo thứ tự từng tầng
+            for stage_q, workers in ((self.download_q, downloaders), (self.verify_q, verifiers),
+                                     (self.write_q, [writer])):
+                for _ in workers:
+                    stage_q.put(_DONE)
+                for t in workers:
+                    t.join()
+            self.index.save()
+        for state in self.states:
+            self._ready(state)
+
+        stages = self.stages
+        print(f"[CRAWLER] {stages['searched']} URL -> tải {stages['downloaded']} -> hợp lệ {stages['verified']} "
+              f"-> ghi {stages['written']} trong {time.perf_counter() - started:.1f}s")
+        return {s.name: s.stats() for s in self.states}
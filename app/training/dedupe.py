@@ -0,0 +1,221 @@
+"""
+Tìm ảnh gần trùng (cùng ảnh khác kích thước/nén lại) trong và giữa train/val bằng perceptual hash.
+
+- dHash 64 bit cho mỗi ảnh (JPEG giải mã ở chế độ draft, rất nhanh), tính song song bằng process pool
+  và lưu vào manifest (mục "dhash"): lần chạy sau chỉ tính cho ảnh mới/đã sửa
+- Multi-index hashing: chia hash thành threshold+1 khối, hai ảnh lệch <= threshold bit chắc chắn trùng
+  ít nhất một khối; chỉ so khoảng cách Hamming trong cùng bucket (numpy), không so từng cặp O(N^2)
+- Các cặp gần trùng được gom cụm bằng union-find; cụm chứa nhiều lớp được báo là xung đột nhãn, không tự xử lý
+
+Hành động với mỗi cụm cùng lớp (giữ ảnh độ phân giải lớn nhất):
+- report: chỉ ghi báo cáo
+- drop: các bản còn lại chuyển vào <dataset>/duplicates/; cụm nằm ở cả train và val thì giữ bản ở train
+- resplit: như drop, nhưng cụm lọt sang cả hai split được gán lại trọn vẹn vào một split
+  (ổn định theo hash, tỉ lệ val theo val_ratio) để val không còn ảnh đã thấy lúc train
+
+    python -m app.training.dedupe datasets --action report
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import os
+import shutil
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+from ..config import DEDUPE_HAMMING_THRESHOLD
+from .manifest import DatasetManifest, load_manifest
+
+HASH_BITS = 64
+DUPLICATES_DIR = "duplicates"
+ACTIONS = ("report", "drop", "resplit")
+# Số hàng mỗi lần so trong bucket lớn (ảnh trơn cùng hash...), giới hạn bộ nhớ ma trận XOR
+_BLOCK_ROWS = 256
+_POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def dhash(path: str) -> Optional[int]:
+    """dHash 64 bit của ảnh (so sánh độ sáng các điểm ảnh kề nhau trên ảnh xám 9x8), None nếu không đọc được"""
+    try:
+        with Image.open(path) as img:
+            # JPEG: giải mã thẳng ở độ phân giải nhỏ (scale DCT), bỏ qua phần lớn chi phí giải mã
+            img.draft("L", (64, 64))
+            small = img.convert("L").resize((9, 8), Image.BILINEAR)
+    except Exception:
+        return None
+    pixels = np.asarray(small, dtype=np.int16)
+    return int(np.packbits(pixels[:, 1:] > pixels[:, :-1]).view(">u8")[0])
+
+
+def popcount64(values: np.ndarray) -> np.ndarray:
+    """Số bit 1 của từng phần tử uint64"""
+    values = np.ascontiguousarray(values, dtype=np.uint64)
+    return _POPCOUNT[values.view(np.uint8)].reshape(*values.shape, 8).sum(axis=-1, dtype=np.uint8)
+
+
+def _blocks(threshold: int) -> List[Tuple[int, int]]:
+    """threshold+1 khối bit (shift, mask) phủ 64 bit"""
+    count = min(threshold + 1, HASH_BITS)
+    bounds = np.linspace(0, HASH_BITS, count + 1).astype(int)
+    return [(int(lo), (1 << int(hi - lo)) - 1) for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+
+def near_duplicate_pairs(hashes: np.ndarray, threshold: int = DEDUPE_HAMMING_THRESHOLD) -> np.ndarray:
+    """Các cặp chỉ số (i < j) có khoảng cách Hamming <= threshold, dạng mảng (K, 2)"""
+    hashes = np.asarray(hashes, dtype=np.uint64)
+    found: List[np.ndarray] = []
+    for shift, mask in _blocks(threshold):
+        keys = (hashes >> np.uint64(shift)) & np.uint64(mask)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        ends = np.r_[starts[1:], len(order)]
+        for start, end in zip(starts[ends - starts > 1], ends[ends - starts > 1]):
+            members = order[start:end]
+            member_hashes = hashes[members]
+            for row in range(0, len(members), _BLOCK_ROWS):
+                rows = members[row:row + _BLOCK_ROWS]
+                dist = popcount64(member_hashes[row:row + _BLOCK_ROWS, None] ^ member_hashes[None, :])
+                i, j = np.nonzero(dist <= threshold)
+                a, b = rows[i], members[j]
+                keep = a < b
+                if keep.any():
+                    found.append(np.stack([a[keep], b[keep]], axis=1))
+    if not found:
+        return np.empty((0, 2), dtype=np.int64)
+    return np.unique(np.concatenate(found), axis=0)
+
+
+def cluster_pairs(n: int, pairs: np.ndarray) -> List[List[int]]:
+    """Union-find: các cụm (>= 2 phần tử) từ danh sách cặp"""
+    parent = list(range(n))
+
+    def find(x: int) -> int:
+        while parent[x] != x:
+            parent[x] = parent[parent[x]]
+            x = parent[x]
+        return x
+
+    for a, b in pairs.tolist():
+        ra, rb = find(a), find(b)
+        if ra != rb:
+            parent[max(ra, rb)] = min(ra, rb)
+    groups: Dict[int, List[int]] = {}
+    for i in range(n):
+        groups.setdefault(find(i), []).append(i)
+    return [g for g in groups.values() if len(g) > 1]
+
+
+def update_hashes(manifest: DatasetManifest, workers: Optional[int] = None) -> int:
+    """Tính dHash cho các ảnh hợp lệ chưa có trong manifest; trả về số ảnh đã tính"""
+    missing = [rel for rel, e in manifest.entries.items() if e["valid"] and "dhash" not in e]
+    paths = [str(manifest.root / rel) for rel in missing]
+    if len(paths) > 256 and (workers or os.cpu_count() or 1) > 1:
+        with ProcessPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1)) as pool:
+            results = list(pool.map(dhash, paths, chunksize=64))
+    else:
+        results = [dhash(p) for p in paths]
+    for rel, value in zip(missing, results):
+        manifest.entries[rel]["dhash"] = None if value is None else f"{value:016x}"
+    if missing:
+        manifest.save()
+    return len(missing)
+
+
+def _assign_split(hash_hex: str, val_ratio: float) -> str:
+    # Ổn định giữa các lần chạy: cùng cụm luôn về cùng split
+    return "val" if (int(hash_hex, 16) * 0x9E3779B97F4A7C15 % 2 ** 64) / 2 ** 64 < val_ratio else "train"
+
+
+def _move(root: Path, rel: str, dest_rel: str) -> str:
+    dest = root / dest_rel
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    stem, suffix, n = dest.stem, dest.suffix, 1
+    while dest.exists():
+        dest = dest.with_name(f"{stem}_{n}{suffix}")
+        n += 1
+    shutil.move(str(root / rel), dest)
+    return dest.relative_to(root).as_posix()
+
+
+def find_duplicates(
+    dataset_dir: str | Path,
+    threshold: int = DEDUPE_HAMMING_THRESHOLD,
+    action: str = "report",
+    val_ratio: float = 0.2,
+    workers: Optional[int] = None,
+) -> dict:
+    """Tìm cụm ảnh gần trùng và (tuỳ action) chuyển/gán lại split; trả về báo cáo"""
+    if action not in ACTIONS:
+        raise ValueError(f"action phải là một trong {ACTIONS}")
+    root = Path(dataset_dir)
+    manifest = load_manifest(root, workers=workers)
+    update_hashes(manifest, workers)
+    rels = sorted(rel for rel, e in manifest.entries.items() if e["valid"] and e.get("dhash"))
+    entries = [manifest.entries[rel] for rel in rels]
+    hashes = np.array([int(e["dhash"], 16) for e in entries], dtype=np.uint64)
+    clusters = cluster_pairs(len(rels), near_duplicate_pairs(hashes, threshold))
+
+    report = {"images": len(rels), "threshold": threshold, "action": action, "clusters": [],
+              "within_split": 0, "cross_split": 0, "conflicts": 0, "dropped": [], "moved": []}
+    for members in clusters:
+        # Ảnh độ phân giải lớn nhất làm đại diện; hoà thì ưu tiên ảnh ở train
+        members.sort(key=lambda i: (-(entries[i]["width"] or 0) * (entries[i]["height"] or 0),
+                                    entries[i]["split"] != "train", rels[i]))
+        splits = {entries[i]["split"] for i in members}
+        classes = {entries[i]["class"] for i in members}
+        cross = len(splits) > 1
+        conflict = len(classes) > 1
+        report["cross_split" if cross else "within_split"] += 1
+        report["conflicts"] += conflict
+        report["clusters"].append({"files": [rels[i] for i in members], "splits": sorted(splits),
+                                   "classes": sorted(classes), "conflict": conflict})
+        if action == "report" or conflict:
+            continue
+
+        keep = members[0]
+        if cross:
+            if action == "resplit":
+                target = _assign_split(entries[keep]["dhash"], val_ratio)
+            else:
+                # drop: bản ở val bị loại, giữ ảnh tốt nhất trong train
+                target = "train"
+                keep = next(i for i in members if entries[i]["split"] == "train")
+            if entries[keep]["split"] != target:
+                dest = _move(root, rels[keep], f"{target}/{entries[keep]['class']}/{Path(rels[keep]).name}")
+                report["moved"].append({"from": rels[keep], "to": dest})
+        for i in members:
+            if i != keep:
+                dest = _move(root, rels[i], f"{DUPLICATES_DIR}/{rels[i]}")
+                report["dropped"].append({"from": rels[i], "to": dest})
+
+    if report["dropped"] or report["moved"]:
+        manifest.refresh(workers)
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Tìm ảnh gần trùng trong/giữa train và val")
+    parser.add_argument("dataset_dir")
+    parser.add_argument("--threshold", type=int, default=DEDUPE_HAMMING_THRESHOLD, help="Số bit lệch tối đa")
+    parser.add_argument("--action", choices=ACTIONS, default="report")
+    parser.add_argument("--val-ratio", type=float, default=0.2, help="Tỉ lệ cụm gán về val khi resplit")
+    parser.add_argument("--workers", type=int, default=None)
+    parser.add_argument("--output", default=None, help="Ghi báo cáo JSON ra file")
+    args = parser.parse_args()
+    report = find_duplicates(args.dataset_dir, args.threshold, args.action, args.val_ratio, args.workers)
+    if args.output:
+        Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"{report['images']} ảnh, {len(report['clusters'])} cụm gần trùng: trong cùng split "
+          f"{report['within_split']}, giữa train/val {report['cross_split']}, xung đột nhãn {report['conflicts']}; "
+          f"đã loại {len(report['dropped'])}, đã chuyển split {len(report['moved'])}")
+
+
+if __name__ == "__main__":
+    main()
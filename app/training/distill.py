@@ -0,0 +1,328 @@
+"""
+Chưng cất (knowledge distillation) mô hình MobileNetV3 Large đã train sang MobileNetV3 Small để phục vụ nhanh hơn.
+
+- Teacher: mô hình đang phục vụ (MODEL_PATH + LABELS_PATH; đã cài student thì MODEL_DIR/teacher.pt),
+  chỉ chạy một lần cho mỗi ảnh / biến thể:
+  logits được lưu float16 trong <train_cache>/<dataset>/teacher/ (fingerprint gồm cache ảnh, trọng số
+  teacher, số biến thể; khác thì dựng lại)
+- Mỗi ảnh train có DISTILL_VARIANTS biến thể augment cố định (biến thể 0 không augment, các biến thể sau
+  augment với seed theo (ảnh, biến thể)) nên student thấy đúng ảnh teacher đã thấy
+- Loss = alpha * KL(student/T || teacher/T) * T^2 + (1 - alpha) * cross-entropy với nhãn thật
+- Student (state_dict MobileNetV3 Small, classifier[3] theo số lớp, kèm file .arch "small") nạp được bằng
+  inference.load_model;
+  báo cáo accuracy val và độ trễ CPU (batch 1) của teacher và student ghi ra JSON
+
+    python -m app.training.distill datasets --epochs 10
+    python -m app.training.distill datasets --epochs 10 --install   # thay mô hình đang phục vụ bằng student
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import statistics
+import time
+from pathlib import Path
+from typing import Callable, List, Optional
+
+import numpy as np
+import torch
+import torch.nn.functional as F
+from PIL import Image
+from torch import nn
+from torch.utils.data import DataLoader, Dataset
+from torchvision.models import (
+    mobilenet_v3_large, mobilenet_v3_small, MobileNet_V3_Small_Weights,
+)
+
+from ..config import (
+    DEFAULT_IMAGE_SIZE, DISTILL_ALPHA, DISTILL_TEMPERATURE, DISTILL_VARIANTS, LABELS_PATH, MODEL_DIR, MODEL_PATH,
+)
+from .checkpoint import atomic_save, model_arch, save_model_arch
+from .feature_cache import module_fingerprint
+from .manifest import load_manifest
+from .perf import PerfSettings, loader_kwargs
+from .shard_cache import CachedImageDataset, cached_datasets, cache_dir_for, normalize_uint8, train_augmentation
+
+FORMAT_VERSION = 1
+STUDENT_NAME = "student.pt"
+TEACHER_NAME = "teacher.pt"
+REPORT_NAME = "distill_report.json"
+
+
+def _with_head(model: nn.Module, num_classes: int) -> nn.Module:
+    model.classifier[3] = nn.Linear(model.classifier[3].in_features, num_classes)
+    return model
+
+
+def default_teacher_path(model_path: Optional[Path] = None, model_dir: Optional[Path] = None) -> Path:
+    """MODEL_PATH; nếu đang phục vụ student (Small) thì teacher đã giữ lại ở MODEL_DIR/teacher.pt"""
+    model_path, model_dir = model_path or MODEL_PATH, model_dir or MODEL_DIR
+    if model_arch(model_path) == "large" or not (model_dir / TEACHER_NAME).exists():
+        return model_path
+    return model_dir / TEACHER_NAME
+
+
+def load_teacher(model_path: Path, num_classes: int) -> nn.Module:
+    """MobileNetV3 Large từ state_dict do train_model ghi"""
+    if model_arch(model_path) != "large":
+        raise ValueError(f"{model_path} là MobileNetV3 {model_arch(model_path).title()}, teacher phải là Large")
+    model = _with_head(mobilenet_v3_large(weights=None), num_classes)
+    model.load_state_dict(torch.load(model_path, map_location="cpu"))
+    return model.eval()
+
+
+class VariantImageDataset(Dataset):
+    """
+    Ảnh train trong cache kèm biến thể augment cố định: biến thể v của ảnh idx luôn cho cùng một ảnh
+    (seed riêng, không đụng RNG chung). variant=None: mỗi lần lấy mẫu chọn ngẫu nhiên một biến thể.
+    """
+
+    def __init__(self, images: CachedImageDataset, variants: int, variant: Optional[int] = None,
+                 seed: int = 0, logits: Optional[List[np.ndarray]] = None):
+        self.images = images
+        self.variants = variants
+        self.variant = variant
+        self.seed = seed
+        self.logits = logits
+        self.targets = images.targets
+        self.classes = images.classes
+        self._augment = train_augmentation(images.image_size)
+
+    def __len__(self) -> int:
+        return len(self.images)
+
+    def view(self, idx: int, variant: int) -> torch.Tensor:
+        image = self.images.get_uint8(idx)
+        if variant > 0:
+            with torch.random.fork_rng(devices=[]):
+                torch.manual_seed((self.seed * 1_000_003 + variant) * 1_000_003 + idx)
+                augmented = self._augment(Image.fromarray(image.permute(1, 2, 0).numpy()))
+            image = torch.from_numpy(np.asarray(augmented, dtype=np.uint8).transpose(2, 0, 1).copy())
+        return normalize_uint8(image)
+
+    def __getitem__(self, idx: int):
+        variant = self.variant
+        if variant is None:
+            variant = int(torch.randint(self.variants, ())) if self.variants > 1 else 0
+        if self.logits is None:
+            return self.view(idx, variant), self.targets[idx]
+        teacher = torch.from_numpy(np.array(self.logits[variant][idx], dtype=np.float32))
+        return self.view(idx, variant), self.targets[idx], teacher
+
+
+def _read_index(cache_dir: Path) -> Optional[dict]:
+    try:
+        with open(cache_dir / "index.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def build_teacher_cache(
+    images: CachedImageDataset,
+    teacher: nn.Module,
+    cache_dir: str | Path,
+    variants: int = DISTILL_VARIANTS,
+    batch_size: int = 64,
+    seed: int = 0,
+) -> List[np.ndarray]:
+    """Logits của teacher cho mọi ảnh x biến thể; dùng lại cache nếu fingerprint khớp"""
+    cache_dir = Path(cache_dir)
+    source = _read_index(images.cache_dir)
+    fingerprint = hashlib.sha1(
+        f"{FORMAT_VERSION}|{source['fingerprint']}|{module_fingerprint(teacher)}|{variants}|{seed}".encode()
+    ).hexdigest()
+    index = _read_index(cache_dir)
+    if index is None or index.get("fingerprint") != fingerprint or not all(
+        (cache_dir / f).exists() for f in index["files"]
+    ):
+        print(f"[DISTILL] Tính logits teacher cho {len(images)} ảnh x {variants} biến thể -> {cache_dir}")
+        tmp_dir = cache_dir.with_name(f"{cache_dir.name}.tmp{os.getpid()}")
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        tmp_dir.mkdir(parents=True)
+        files = []
+        teacher = teacher.eval()
+        options = loader_kwargs(PerfSettings(), torch.device("cpu"))
+        for variant in range(variants):
+            loader = DataLoader(VariantImageDataset(images, variants, variant, seed), batch_size=batch_size,
+                                shuffle=False, **options)
+            name = f"logits_v{variant}.npy"
+            array = np.lib.format.open_memmap(tmp_dir / name, mode="w+", dtype=np.float16,
+                                              shape=(len(images), len(images.classes)))
+            start = 0
+            with torch.inference_mode():
+                for batch, _ in loader:
+                    out = teacher(batch).to(torch.float16).numpy()
+                    array[start:start + len(out)] = out
+                    start += len(out)
+            array.flush()
+            del array
+            files.append(name)
+        index = {"format_version": FORMAT_VERSION, "fingerprint": fingerprint, "count": len(images),
+                 "files": files}
+        with open(tmp_dir / "index.json", "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False, indent=2)
+        shutil.rmtree(cache_dir, ignore_errors=True)
+        os.replace(tmp_dir, cache_dir)
+    # Logits nhỏ (ảnh x lớp), nạp hẳn vào bộ nhớ
+    return [np.load(cache_dir / f) for f in index["files"]]
+
+
+def distillation_loss(student_logits: torch.Tensor, teacher_logits: torch.Tensor, labels: torch.Tensor,
+                      temperature: float = DISTILL_TEMPERATURE, alpha: float = DISTILL_ALPHA) -> torch.Tensor:
+    soft = F.kl_div(F.log_softmax(student_logits / temperature, dim=1),
+                    F.softmax(teacher_logits / temperature, dim=1), reduction="batchmean")
+    return alpha * soft * temperature ** 2 + (1 - alpha) * F.cross_entropy(student_logits, labels)
+
+
+def evaluate(model: nn.Module, loader: DataLoader) -> float:
+    model.eval()
+    corrects = total = 0
+    with torch.inference_mode():
+        for images, labels in loader:
+            corrects += (model(images).argmax(dim=1) == labels).sum().item()
+            total += images.size(0)
+    return corrects / total if total else 0.0
+
+
+def measure_latency(model: nn.Module, image_size: int = DEFAULT_IMAGE_SIZE, runs: int = 30, warmup: int = 5) -> float:
+    """Độ trễ trung vị (ms) một ảnh (batch 1) trên CPU với số luồng hiện tại"""
+    model.eval()
+    x = torch.randn(1, 3, image_size, image_size)
+    timings = []
+    with torch.inference_mode():
+        for i in range(warmup + runs):
+            started = time.perf_counter()
+            model(x)
+            if i >= warmup:
+                timings.append((time.perf_counter() - started) * 1000)
+    return statistics.median(timings)
+
+
+def _model_stats(model: nn.Module, accuracy: float, path: Path, latency_runs: int) -> dict:
+    return {
+        "val_acc": accuracy,
+        "latency_ms": measure_latency(model, runs=latency_runs),
+        "params": sum(p.numel() for p in model.parameters()),
+        "file_mb": path.stat().st_size / 1e6,
+    }
+
+
+def distill_model(
+    dataset_dir: str,
+    num_epochs: int = 10,
+    batch_size: int = 32,
+    learning_rate: float = 1e-3,
+    temperature: float = DISTILL_TEMPERATURE,
+    alpha: float = DISTILL_ALPHA,
+    variants: int = DISTILL_VARIANTS,
+    teacher_path: Optional[str] = None,
+    output_path: Optional[str] = None,
+    install: bool = False,
+    latency_runs: int = 30,
+    on_epoch: Optional[Callable[[dict], None]] = None,
+) -> dict:
+    """
+    Train MobileNetV3 Small từ logits đã cache của teacher (mặc định default_teacher_path()) và nhãn thật.
+    output_path: student tốt nhất theo val accuracy (mặc định MODEL_DIR/student.pt);
+    install: thay MODEL_PATH bằng student (teacher được giữ ở MODEL_DIR/teacher.pt, file .arch ghi kiến trúc).
+    Trả về báo cáo accuracy / độ trễ của teacher và student (cũng ghi ra MODEL_DIR/distill_report.json).
+    """
+    teacher_path = Path(teacher_path) if teacher_path else default_teacher_path()
+    output_path = Path(output_path) if output_path else MODEL_DIR / STUDENT_NAME
+    manifest = load_manifest(dataset_dir)
+    train_images, val_ds = cached_datasets(dataset_dir, DEFAULT_IMAGE_SIZE, manifest)
+    class_names = train_images.classes
+    labels = [line.strip() for line in LABELS_PATH.read_text(encoding="utf-8").splitlines() if line.strip()]
+    if labels != class_names:
+        raise ValueError(f"Lớp của teacher ({LABELS_PATH}) khác dataset hiện tại, hãy train lại teacher trước")
+
+    teacher = load_teacher(teacher_path, len(class_names))
+    logits = build_teacher_cache(train_images, teacher, cache_dir_for(dataset_dir) / "teacher", variants)
+
+    from .train import _weighted_sampler
+
+    train_ds = VariantImageDataset(train_images, variants, logits=logits)
+    options = loader_kwargs(PerfSettings(), torch.device("cpu"))
+    train_loader = DataLoader(train_ds, batch_size=batch_size, shuffle=False,
+                              sampler=_weighted_sampler(train_ds.targets, len(class_names)), **options)
+    val_loader = DataLoader(val_ds, batch_size=batch_size, shuffle=False, **options)
+
+    student = _with_head(mobilenet_v3_small(weights=MobileNet_V3_Small_Weights.DEFAULT), len(class_names))
+    optimizer = torch.optim.AdamW(student.parameters(), lr=learning_rate)
+    scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=max(1, num_epochs))
+    best_acc = 0.0
+    for epoch in range(num_epochs):
+        student.train()
+        running_loss, total = 0.0, 0
+        started = time.perf_counter()
+        for images, targets, teacher_logits in train_loader:
+            optimizer.zero_grad(set_to_none=True)
+            loss = distillation_loss(student(images), teacher_logits, targets, temperature, alpha)
+            loss.backward()
+            optimizer.step()
+            running_loss += loss.item() * images.size(0)
+            total += images.size(0)
+        scheduler.step()
+        val_acc = evaluate(student, val_loader)
+        images_per_sec = total / max(time.perf_counter() - started, 1e-9)
+        print(f"[DISTILL] Epoch {epoch + 1}/{num_epochs} - loss={running_loss / max(1, total):.4f} "
+              f"val_acc={val_acc:.4f} ({images_per_sec:.1f} img/s)")
+        if val_acc > best_acc or epoch == 0:
+            best_acc = max(best_acc, val_acc)
+            atomic_save(student.state_dict(), output_path)
+            save_model_arch(output_path, "small")
+        if on_epoch is not None:
+            on_epoch({"epoch": epoch + 1, "num_epochs": num_epochs, "train_loss": running_loss / max(1, total),
+                      "val_acc": val_acc, "best_acc": best_acc, "images_per_sec": images_per_sec})
+
+    student.load_state_dict(torch.load(output_path, map_location="cpu"))
+    report = {
+        "dataset_dir": str(dataset_dir), "temperature": temperature, "alpha": alpha, "variants": variants,
+        "threads": torch.get_num_threads(),
+        "teacher": {"path": str(teacher_path),
+                    **_model_stats(teacher, evaluate(teacher, val_loader), teacher_path, latency_runs)},
+        "student": {"path": str(output_path),
+                    **_model_stats(student, evaluate(student, val_loader), output_path, latency_runs)},
+    }
+    report["speedup"] = report["teacher"]["latency_ms"] / max(report["student"]["latency_ms"], 1e-9)
+    report["acc_drop"] = report["teacher"]["val_acc"] - report["student"]["val_acc"]
+    if install:
+        # Giữ lại teacher để chưng cất lại / nén / quay về khi cần; file .arch cho các bước chỉ nạp
+        # MobileNetV3 Large (incremental, compress) biết MODEL_PATH giờ là Small
+        if teacher_path != MODEL_DIR / TEACHER_NAME:
+            shutil.copyfile(teacher_path, MODEL_DIR / TEACHER_NAME)
+        save_model_arch(MODEL_DIR / TEACHER_NAME, "large")
+        tmp = MODEL_PATH.with_name(f".{MODEL_PATH.name}.tmp{os.getpid()}")
+        shutil.copyfile(output_path, tmp)
+        os.replace(tmp, MODEL_PATH)
+        save_model_arch(MODEL_PATH, "small")
+        report["installed"] = str(MODEL_PATH)
+    (MODEL_DIR / REPORT_NAME).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"[DISTILL] teacher {report['teacher']['val_acc']:.4f} / {report['teacher']['latency_ms']:.1f} ms, "
+          f"student {report['student']['val_acc']:.4f} / {report['student']['latency_ms']:.1f} ms "
+          f"(nhanh x{report['speedup']:.2f})")
+    return report
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Chưng cất MobileNetV3 Large sang MobileNetV3 Small")
+    parser.add_argument("dataset_dir")
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--batch-size", type=int, default=32)
+    parser.add_argument("--lr", type=float, default=1e-3)
+    parser.add_argument("--temperature", type=float, default=DISTILL_TEMPERATURE)
+    parser.add_argument("--alpha", type=float, default=DISTILL_ALPHA)
+    parser.add_argument("--install", action="store_true", help="Thay mô hình đang phục vụ bằng student")
+    args = parser.parse_args()
+    report = distill_model(args.dataset_dir, args.epochs, args.batch_size, args.lr, args.temperature, args.alpha,
+                           install=args.install)
+    print(json.dumps(report, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
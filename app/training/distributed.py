@@ -0,0 +1,204 @@
+"""
+Huấn luyện data-parallel nhiều tiến trình trên CPU (torch.distributed, backend gloo).
+
+- train_distributed chạy rank 0 ngay trong tiến trình gọi (giữ được on_epoch của job) và spawn
+  world_size-1 tiến trình còn lại; mỗi rank được ghim vào một phần CPU riêng
+- Mỗi rank lấy một phần của cùng một dãy lấy mẫu có trọng số (DistributedWeightedSampler),
+  gradient được đồng bộ bởi DistributedDataParallel
+- Chỉ rank 0 dựng cache/manifest (các rank khác chờ ở barrier), chạy validation, ghi checkpoint và model
+
+So sánh tốc độ với một tiến trình (hiệu suất mở rộng = ảnh/giây N rank / (N x ảnh/giây 1 tiến trình)):
+    python -m app.training.distributed datasets --world-size 4 --epochs 1 --compare
+"""
+
+from __future__ import annotations
+
+import argparse
+import math
+import os
+import socket
+import tempfile
+from datetime import timedelta
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Sequence
+
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.utils.data import Sampler
+
+from ..config import TRAIN_DDP_WORLD_SIZE
+
+# Chờ rank 0 dựng cache (giải mã ảnh, tính activation) có thể lâu với dataset lớn
+_TIMEOUT = timedelta(hours=2)
+
+
+def is_distributed() -> bool:
+    return dist.is_available() and dist.is_initialized() and dist.get_world_size() > 1
+
+
+def get_rank() -> int:
+    return dist.get_rank() if is_distributed() else 0
+
+
+def get_world_size() -> int:
+    return dist.get_world_size() if is_distributed() else 1
+
+
+class DistributedWeightedSampler(Sampler[int]):
+    """
+    Mọi rank sinh cùng một dãy chỉ số lấy mẫu có trọng số (generator cùng seed, cùng trạng thái)
+    rồi mỗi rank lấy phần rank::world_size; mỗi rank nhận ceil(N / world_size) mẫu mỗi epoch.
+    """
+
+    def __init__(self, weights: Sequence[float], rank: int, world_size: int, seed: int):
+        self.weights = torch.as_tensor(weights, dtype=torch.double)
+        self.rank = rank
+        self.world_size = world_size
+        self.num_samples = math.ceil(len(self.weights) / world_size)
+        self.generator = torch.Generator()
+        self.generator.manual_seed(seed)
+
+    def __iter__(self) -> Iterator[int]:
+        indices = torch.multinomial(self.weights, self.num_samples * self.world_size, True, generator=self.generator)
+        return iter(indices[self.rank::self.world_size].tolist())
+
+    def __len__(self) -> int:
+        return self.num_samples
+
+
+def shared_seed() -> int:
+    """Seed do rank 0 chọn, gửi cho mọi rank"""
+    seed = [int(torch.randint(2 ** 62, ()).item())]
+    if is_distributed():
+        dist.broadcast_object_list(seed, src=0)
+    return seed[0]
+
+
+def all_reduce_sum(values: List[float]) -> List[float]:
+    if not is_distributed():
+        return values
+    tensor = torch.tensor(values, dtype=torch.float64)
+    dist.all_reduce(tensor)
+    return tensor.tolist()
+
+
+def _cpu_slices(world_size: int) -> List[List[int]]:
+    """Chia CPU được cấp thành world_size phần rời nhau (ít CPU hơn số rank thì dùng chung)"""
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+    if len(cpus) < world_size:
+        return [cpus] * world_size
+    per_rank = len(cpus) // world_size
+    return [cpus[r * per_rank:(r + 1) * per_rank] for r in range(world_size)]
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def _init(rank: int, world_size: int, port: int, cpus: List[int]) -> None:
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    # Phần CPU dùng chung (máy ít CPU) thì chia đều số luồng giữa các rank
+    shared = len(cpus) < world_size
+    torch.set_num_threads(max(1, len(cpus) // world_size if shared else len(cpus)))
+    dist.init_process_group("gloo", init_method=f"tcp://127.0.0.1:{port}", rank=rank, world_size=world_size,
+                            timeout=_TIMEOUT)
+
+
+def _worker(rank: int, world_size: int, port: int, cpus: List[int], dataset_dir: str, kwargs: dict) -> None:
+    from .train import train_model
+
+    _init(rank, world_size, port, cpus)
+    try:
+        train_model(dataset_dir, **kwargs)
+    finally:
+        dist.destroy_process_group()
+
+
+def train_distributed(
+    dataset_dir: str,
+    world_size: Optional[int] = None,
+    on_epoch: Optional[Callable[[dict], None]] = None,
+    resume: bool = False,
+    **kwargs,
+) -> dict:
+    """
+    Chạy train_model trên world_size tiến trình (mặc định TRAIN_DDP_WORLD_SIZE);
+    kwargs là tham số của train_model, batch_size là batch của mỗi rank.
+    """
+    from .train import train_model
+
+    world_size = world_size or TRAIN_DDP_WORLD_SIZE
+    kwargs["resume"] = resume
+    if world_size <= 1:
+        return train_model(dataset_dir, on_epoch=on_epoch, **kwargs)
+    port = _free_port()
+    slices = _cpu_slices(world_size)
+    ctx = mp.get_context("spawn")
+    procs = [
+        ctx.Process(target=_worker, args=(rank, world_size, port, slices[rank], dataset_dir, kwargs), daemon=True)
+        for rank in range(1, world_size)
+    ]
+    for p in procs:
+        p.start()
+    original_affinity = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else None
+    threads = torch.get_num_threads()
+    try:
+        _init(0, world_size, port, slices[0])
+        result = train_model(dataset_dir, on_epoch=on_epoch, **kwargs)
+    except BaseException:
+        for p in procs:
+            p.terminate()
+        raise
+    finally:
+        if dist.is_initialized():
+            dist.destroy_process_group()
+        if original_affinity is not None:
+            os.sched_setaffinity(0, original_affinity)
+        torch.set_num_threads(threads)
+        for p in procs:
+            p.join()
+    failed = [p.exitcode for p in procs if p.exitcode != 0]
+    if failed:
+        raise RuntimeError(f"Rank con thoát lỗi: exit code {failed}")
+    return {**result, "world_size": world_size}
+
+
+def main() -> None:
+    from . import train as train_module
+
+    parser = argparse.ArgumentParser(description="Huấn luyện data-parallel nhiều tiến trình CPU (gloo)")
+    parser.add_argument("dataset_dir")
+    parser.add_argument("--world-size", type=int, default=TRAIN_DDP_WORLD_SIZE)
+    parser.add_argument("--epochs", type=int, default=1)
+    parser.add_argument("--batch-size", type=int, default=32, help="Batch mỗi rank")
+    parser.add_argument("--compare", action="store_true", help="Chạy thêm một tiến trình để tính hiệu suất mở rộng")
+    args = parser.parse_args()
+
+    def throughput(world_size: int, run_dir: Optional[Path] = None) -> float:
+        epochs = []
+        train_distributed(args.dataset_dir, world_size, on_epoch=epochs.append,
+                          num_epochs=args.epochs, batch_size=args.batch_size, run_dir=run_dir)
+        return sum(e["images_per_sec"] for e in epochs) / max(1, len(epochs))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        run_dir = None
+        if args.compare:
+            # Chỉ đo tốc độ: không ghi đè mô hình đang phục vụ, không xoá checkpoint resume (run_dir tạm)
+            train_module.MODEL_PATH = Path(tmp) / "best.pt"
+            train_module.LABELS_PATH = Path(tmp) / "labels.txt"
+            run_dir = Path(tmp) / "run"
+            single = throughput(1, run_dir / "single")
+        multi = throughput(args.world_size, run_dir / "multi" if run_dir is not None else None)
+    print(f"{args.world_size} rank: {multi:.1f} img/s")
+    if args.compare:
+        efficiency = multi / (args.world_size * single) if single > 0 else 0.0
+        print(f"1 tiến trình: {single:.1f} img/s -> tăng tốc x{multi / max(single, 1e-9):.2f}, "
+              f"hiệu suất mở rộng {efficiency:.0%}")
+
+
+if __name__ == "__main__":
+    main()
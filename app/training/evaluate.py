@@ -0,0 +1,259 @@
+"""
+Đánh giá offline một mô hình trên datasets/val và đo độ trễ, để so sánh các phiên bản trước khi đưa lên phục vụ.
+
+- Mô hình: state_dict MobileNetV3 Large/Small (như inference.load_model) hoặc TorchScript
+  (vd. models/compressed/*_int8.pt); tiền xử lý giống /predict
+- Chỉ số: top-1/top-5, ma trận nhầm lẫn và precision/recall từng lớp, ECE (sai lệch giữa độ tin cậy
+  và accuracy, chia EVAL_ECE_BINS khoảng)
+- Độ trễ: ms mỗi batch (trung vị, p90) và ảnh/giây ở các batch EVAL_BATCH_SIZES trên ảnh val thật
+- Kết quả ghi JSON (mặc định MODEL_DIR/eval/<tên mô hình>.json); --baseline in chênh lệch với báo cáo cũ
+
+    python -m app.training.evaluate --model models/best.pt
+    python -m app.training.evaluate --model models/compressed/sparsity_50_int8.pt --baseline models/eval/best.json
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import statistics
+import time
+import zipfile
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import List, Optional, Sequence, Tuple
+
+import torch
+from torch import nn
+from torch.utils.data import DataLoader
+
+from ..config import (
+    EVAL_BATCH_SIZES, EVAL_ECE_BINS, EVAL_LATENCY_RUNS, LABELS_PATH, MODEL_DIR, MODEL_PATH,
+)
+from ..inference import _build_transform, _load_labels
+from .manifest import load_manifest
+from .perf import PerfSettings, loader_kwargs
+
+BACKENDS = ("auto", "eager", "torchscript")
+
+
+def _is_torchscript(path: Path) -> bool:
+    # File TorchScript là zip có thư mục code/ (state_dict của torch.save thì không)
+    try:
+        with zipfile.ZipFile(path) as z:
+            return any(name.split("/")[1:2] == ["code"] for name in z.namelist())
+    except zipfile.BadZipFile:
+        return False
+
+
+def load_model(model_path: Path, num_classes: int, backend: str = "auto") -> Tuple[nn.Module, str]:
+    """Nạp mô hình theo backend; auto nhận dạng TorchScript, còn lại thử MobileNetV3 Large rồi Small"""
+    if backend not in BACKENDS:
+        raise ValueError(f"Backend không hỗ trợ: {backend} ({', '.join(BACKENDS)})")
+    if backend == "torchscript" or (backend == "auto" and _is_torchscript(model_path)):
+        return torch.jit.load(str(model_path), map_location="cpu").eval(), "torchscript"
+
+    from torchvision.models import mobilenet_v3_large, mobilenet_v3_small
+
+    state = torch.load(model_path, map_location="cpu")
+    last_err: Optional[Exception] = None
+    for variant, factory in (("large", mobilenet_v3_large), ("small", mobilenet_v3_small)):
+        model = factory(weights=None)
+        model.classifier[3] = nn.Linear(model.classifier[3].in_features, num_classes)
+        try:
+            model.load_state_dict(state)
+        except RuntimeError as e:
+            last_err = e
+            continue
+        return model.eval(), f"eager-{variant}"
+    raise RuntimeError(f"Không nạp được mô hình từ {model_path}: {last_err}")
+
+
+def expected_calibration_error(confidences: torch.Tensor, correct: torch.Tensor, bins: int = EVAL_ECE_BINS) -> float:
+    """ECE: trung bình có trọng số |accuracy - độ tin cậy trung bình| trên các khoảng độ tin cậy đều nhau"""
+    edges = torch.linspace(0, 1, bins + 1)
+    ece = 0.0
+    for low, high in zip(edges[:-1], edges[1:]):
+        in_bin = (confidences > low) & (confidences <= high)
+        if in_bin.any():
+            ece += in_bin.float().mean().item() * abs(
+                correct[in_bin].float().mean().item() - confidences[in_bin].mean().item())
+    return ece
+
+
+def classification_metrics(logits: torch.Tensor, targets: torch.Tensor, classes: Sequence[str],
+                           bins: int = EVAL_ECE_BINS) -> dict:
+    num_classes = len(classes)
+    probs = torch.softmax(logits.float(), dim=1)
+    confidences, preds = probs.max(dim=1)
+    correct = preds == targets
+    k = min(5, num_classes)
+    top5 = (probs.topk(k, dim=1).indices == targets.unsqueeze(1)).any(dim=1)
+    confusion = torch.bincount(targets * num_classes + preds, minlength=num_classes ** 2).view(num_classes, -1)
+    per_class = {}
+    for i, name in enumerate(classes):
+        support = int(confusion[i].sum())
+        predicted = int(confusion[:, i].sum())
+        per_class[name] = {
+            "support": support,
+            "recall": confusion[i, i].item() / support if support else None,
+            "precision": confusion[i, i].item() / predicted if predicted else None,
+        }
+    return {
+        "images": len(targets),
+        "top1": correct.float().mean().item() if len(targets) else 0.0,
+        "top5": top5.float().mean().item() if len(targets) else 0.0,
+        "ece": expected_calibration_error(confidences, correct, bins),
+        "mean_confidence": confidences.mean().item() if len(targets) else 0.0,
+        "per_class": per_class,
+        # Hàng: lớp thật, cột: lớp dự đoán (theo thứ tự "classes")
+        "confusion": confusion.tolist(),
+    }
+
+
+def benchmark_latency(model: nn.Module, images: torch.Tensor, batch_sizes: Sequence[int] = EVAL_BATCH_SIZES,
+                      runs: int = EVAL_LATENCY_RUNS, warmup: int = 3) -> List[dict]:
+    """ms mỗi batch và ảnh/giây; batch lớn hơn số ảnh val thì lặp lại ảnh"""
+    results = []
+    with torch.inference_mode():
+        for batch_size in batch_sizes:
+            batch = images[torch.arange(batch_size) % len(images)]
+            timings = []
+            for i in range(warmup + runs):
+                started = time.perf_counter()
+                model(batch)
+                if i >= warmup:
+                    timings.append(time.perf_counter() - started)
+            median = statistics.median(timings)
+            results.append({
+                "batch_size": batch_size,
+                "median_ms": median * 1000,
+                "p90_ms": sorted(timings)[min(len(timings) - 1, int(0.9 * len(timings)))] * 1000,
+                "images_per_sec": batch_size / median,
+            })
+    return results
+
+
+def _sha1(path: Path) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def evaluate_model(
+    model_path: Optional[str] = None,
+    labels_path: Optional[str] = None,
+    dataset_dir: str = "datasets",
+    backend: str = "auto",
+    batch_size: int = 32,
+    batch_sizes: Sequence[int] = EVAL_BATCH_SIZES,
+    latency_runs: int = EVAL_LATENCY_RUNS,
+    threads: Optional[int] = None,
+    output: Optional[str] = None,
+) -> dict:
+    """
+    Chạy mô hình (mặc định MODEL_PATH + LABELS_PATH) trên split val theo batch, đo độ trễ và ghi báo cáo JSON
+    (mặc định MODEL_DIR/eval/<tên file mô hình>.json). threads: số luồng torch khi đo (mặc định giữ nguyên).
+    """
+    model_path = Path(model_path) if model_path else MODEL_PATH
+    labels_path = Path(labels_path) if labels_path else LABELS_PATH
+    classes = _load_labels(labels_path)
+    if not classes:
+        raise ValueError(f"Thiếu nhãn: {labels_path}")
+    if threads:
+        torch.set_num_threads(threads)
+    model, resolved_backend = load_model(model_path, len(classes), backend)
+
+    # Ảnh val (theo manifest) với đúng tiền xử lý của /predict; nhãn ánh xạ theo tên lớp của mô hình
+    val_ds = load_manifest(dataset_dir).image_folder("val", transform=_build_transform())
+    missing = sorted(set(val_ds.classes[t] for t in val_ds.targets) - set(classes))
+    if missing:
+        raise ValueError(f"Lớp trong val không có trong nhãn của mô hình: {missing}")
+    remap = torch.tensor([classes.index(c) if c in classes else -1 for c in val_ds.classes])
+    loader = DataLoader(val_ds, batch_size=batch_size, shuffle=False,
+                        **loader_kwargs(PerfSettings(), torch.device("cpu")))
+
+    all_logits, all_targets, sample = [], [], []
+    started = time.perf_counter()
+    with torch.inference_mode():
+        for images, targets in loader:
+            all_logits.append(model(images).float())
+            all_targets.append(remap[targets])
+            if sum(len(s) for s in sample) < max(batch_sizes):
+                sample.append(images)
+    eval_seconds = time.perf_counter() - started
+    if not all_targets:
+        raise ValueError(f"Không có ảnh val trong {dataset_dir}")
+
+    report = {
+        "model": str(model_path),
+        "model_sha1": _sha1(model_path),
+        "model_mb": model_path.stat().st_size / 1e6,
+        "backend": resolved_backend,
+        "quantized_engine": torch.backends.quantized.engine,
+        "threads": torch.get_num_threads(),
+        "dataset_dir": str(dataset_dir),
+        "evaluated_at": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "classes": classes,
+        **classification_metrics(torch.cat(all_logits), torch.cat(all_targets), classes),
+        "eval_images_per_sec": sum(len(t) for t in all_targets) / max(eval_seconds, 1e-9),
+        "latency": benchmark_latency(model, torch.cat(sample), batch_sizes, latency_runs),
+    }
+    output_path = Path(output) if output else MODEL_DIR / "eval" / f"{model_path.stem}.json"
+    output_path.parent.mkdir(parents=True, exist_ok=True)
+    output_path.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    report["output"] = str(output_path)
+    return report
+
+
+def compare(report: dict, baseline: dict) -> List[str]:
+    """Các dòng chênh lệch chính so với báo cáo cũ (dương = tăng)"""
+    lines = [f"{key}: {baseline[key]:.4f} -> {report[key]:.4f} ({report[key] - baseline[key]:+.4f})"
+             for key in ("top1", "top5", "ece")]
+    old = {row["batch_size"]: row for row in baseline.get("latency", [])}
+    for row in report["latency"]:
+        if row["batch_size"] in old:
+            before = old[row["batch_size"]]["median_ms"]
+            lines.append(f"batch {row['batch_size']}: {before:.1f} -> {row['median_ms']:.1f} ms "
+                         f"(x{before / max(row['median_ms'], 1e-9):.2f})")
+    return lines
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Đánh giá mô hình trên datasets/val và đo độ trễ")
+    parser.add_argument("--model", default=str(MODEL_PATH), help="state_dict MobileNetV3 hoặc TorchScript")
+    parser.add_argument("--labels", default=None, help="labels.txt (mặc định cạnh mô hình nếu có, không thì LABELS_PATH)")
+    parser.add_argument("--dataset-dir", default="datasets")
+    parser.add_argument("--backend", choices=BACKENDS, default="auto")
+    parser.add_argument("--engine", default=None, help="Backend int8 cho mô hình quantized (x86, qnnpack...)")
+    parser.add_argument("--batch-sizes", type=int, nargs="+", default=list(EVAL_BATCH_SIZES))
+    parser.add_argument("--runs", type=int, default=EVAL_LATENCY_RUNS)
+    parser.add_argument("--threads", type=int, default=None)
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--baseline", default=None, help="Báo cáo JSON cũ để so sánh")
+    args = parser.parse_args()
+
+    if args.engine:
+        torch.backends.quantized.engine = args.engine
+    labels = args.labels
+    if labels is None and (Path(args.model).parent / "labels.txt").exists():
+        labels = str(Path(args.model).parent / "labels.txt")
+    report = evaluate_model(args.model, labels, args.dataset_dir, args.backend, batch_sizes=args.batch_sizes,
+                            latency_runs=args.runs, threads=args.threads, output=args.output)
+    print(f"{report['model']} ({report['backend']}, {report['threads']} luồng): top1={report['top1']:.4f} "
+          f"top5={report['top5']:.4f} ECE={report['ece']:.4f} trên {report['images']} ảnh")
+    for row in report["latency"]:
+        print(f"  batch {row['batch_size']:>3}: {row['median_ms']:.1f} ms (p90 {row['p90_ms']:.1f}) "
+              f"{row['images_per_sec']:.1f} ảnh/giây")
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            for line in compare(report, json.load(f)):
+                print(f"  {line}")
+    print(f"Đã ghi {report['output']}")
+
+
+if __name__ == "__main__":
+    main()
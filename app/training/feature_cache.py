@@ -0,0 +1,196 @@
+"""
+Cache activation của phần backbone bị đóng băng (MobileNetV3 features[:-N]).
+
+train_model chỉ mở khoá N block cuối của features và classifier; phần đầu không đổi trong suốt
+quá trình huấn luyện nên chỉ cần chạy một lần cho mỗi ảnh (hoặc mỗi biến thể augment cố định).
+Activation được lưu float16 dạng .npy memmap, các epoch sau chỉ chạy phần đuôi (TailModel).
+
+- val: một biến thể, ảnh không augment (giống val transform)
+- train: biến thể 0 không augment, các biến thể 1.. augment ngẫu nhiên với seed cố định;
+  mỗi lần lấy mẫu chọn ngẫu nhiên một biến thể
+
+Phần đầu chạy ở chế độ eval (BatchNorm dùng running stats), fingerprint gồm fingerprint cache ảnh,
+trọng số phần đầu và số biến thể; khác nhau thì cache được dựng lại.
+"""
+
+from __future__ import annotations
+
+import copy
+import hashlib
+import json
+import os
+import shutil
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+import torch
+from torch import nn
+from torch.utils.data import DataLoader, Dataset
+
+from ..config import DEFAULT_IMAGE_SIZE
+from .manifest import DatasetManifest
+from .perf import PerfSettings, loader_kwargs
+from .shard_cache import CachedImageDataset, build_split_cache, cache_dir_for, train_augmentation
+
+FORMAT_VERSION = 1
+
+
+class TailModel(nn.Module):
+    """Phần đuôi của MobileNetV3 (N block cuối + avgpool + classifier), dùng chung module với model gốc"""
+
+    def __init__(self, model: nn.Module, unfrozen_blocks: int):
+        super().__init__()
+        self.features = model.features[-unfrozen_blocks:]
+        self.avgpool = model.avgpool
+        self.classifier = model.classifier
+
+    def forward(self, x: torch.Tensor) -> torch.Tensor:
+        x = self.avgpool(self.features(x))
+        return self.classifier(torch.flatten(x, 1))
+
+
+def frozen_prefix(model: nn.Module, unfrozen_blocks: int) -> nn.Module:
+    return model.features[:-unfrozen_blocks]
+
+
+def module_fingerprint(module: nn.Module) -> str:
+    h = hashlib.sha1()
+    for name, tensor in module.state_dict().items():
+        h.update(name.encode())
+        h.update(tensor.detach().cpu().contiguous().numpy().tobytes())
+    return h.hexdigest()
+
+
+def _read_index(cache_dir: Path) -> Optional[dict]:
+    try:
+        with open(cache_dir / "index.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def build_feature_cache(
+    images: CachedImageDataset,
+    prefix: nn.Module,
+    cache_dir: str | Path,
+    variants: int = 1,
+    batch_size: int = 64,
+    device: Optional[torch.device] = None,
+    seed: int = 0,
+) -> dict:
+    """Chạy phần đầu cho mọi ảnh (mỗi biến thể) và ghi activation; bỏ qua nếu cache còn đúng"""
+    cache_dir = Path(cache_dir)
+    source = _read_index(images.cache_dir)
+    fingerprint = hashlib.sha1(
+        f"{FORMAT_VERSION}|{source['fingerprint']}|{module_fingerprint(prefix)}|{variants}|{seed}".encode()
+    ).hexdigest()
+    index = _read_index(cache_dir)
+    if index is not None and index.get("fingerprint") == fingerprint and all(
+        (cache_dir / f).exists() for f in index["files"]
+    ):
+        return index
+
+    device = device or torch.device("cpu")
+    prefix = prefix.to(device).eval()
+    with torch.inference_mode():
+        shape = tuple(prefix(torch.zeros(1, 3, images.image_size, images.image_size, device=device)).shape[1:])
+    print(f"[FEATURE_CACHE] Tính activation {len(images)} ảnh x {variants} biến thể {shape} -> {cache_dir}")
+
+    tmp_dir = cache_dir.with_name(f"{cache_dir.name}.tmp{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    files: List[str] = []
+    for variant in range(variants):
+        dataset = copy.copy(images)
+        dataset.transform = train_augmentation(images.image_size) if variant > 0 else None
+        loader = DataLoader(
+            dataset,
+            batch_size=batch_size,
+            shuffle=False,
+            generator=torch.Generator().manual_seed(seed + variant),
+            **loader_kwargs(PerfSettings(), device),
+        )
+        name = f"features_v{variant}.npy"
+        array = np.lib.format.open_memmap(tmp_dir / name, mode="w+", dtype=np.float16, shape=(len(images),) + shape)
+        start = 0
+        with torch.inference_mode():
+            for batch, _ in loader:
+                out = prefix(batch.to(device)).to("cpu", torch.float16).numpy()
+                array[start:start + len(out)] = out
+                start += len(out)
+        array.flush()
+        del array
+        files.append(name)
+
+    index = {
+        "format_version": FORMAT_VERSION,
+        "fingerprint": fingerprint,
+        "source": str(images.cache_dir),
+        "classes": images.classes,
+        "count": len(images),
+        "shape": list(shape),
+        "files": files,
+    }
+    np.save(tmp_dir / "labels.npy", np.asarray(images.targets, dtype=np.int64))
+    with open(tmp_dir / "index.json", "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.replace(tmp_dir, cache_dir)
+    return index
+
+
+class FeatureDataset(Dataset):
+    """Activation đã cache; random_variant=True chọn ngẫu nhiên một biến thể cho mỗi lần lấy mẫu"""
+
+    def __init__(self, cache_dir: str | Path, random_variant: bool = False):
+        self.cache_dir = Path(cache_dir)
+        index = _read_index(self.cache_dir)
+        if index is None:
+            raise FileNotFoundError(f"Chưa có cache activation tại {self.cache_dir}")
+        self.classes: List[str] = index["classes"]
+        self.class_to_idx = {c: i for i, c in enumerate(self.classes)}
+        self.random_variant = random_variant
+        self._files = index["files"]
+        self.targets: List[int] = np.load(self.cache_dir / "labels.npy").tolist()
+        self._arrays: Optional[List[np.ndarray]] = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state["_arrays"] = None
+        return state
+
+    def _variants(self) -> List[np.ndarray]:
+        if self._arrays is None:
+            self._arrays = [np.load(self.cache_dir / f, mmap_mode="r") for f in self._files]
+        return self._arrays
+
+    def __len__(self) -> int:
+        return len(self.targets)
+
+    def __getitem__(self, idx: int) -> Tuple[torch.Tensor, int]:
+        arrays = self._variants()
+        variant = int(torch.randint(len(arrays), ())) if self.random_variant and len(arrays) > 1 else 0
+        return torch.from_numpy(np.array(arrays[variant][idx], dtype=np.float32)), self.targets[idx]
+
+
+def cached_features(
+    dataset_dir: str | Path,
+    prefix: nn.Module,
+    variants: int,
+    image_size: int = DEFAULT_IMAGE_SIZE,
+    device: Optional[torch.device] = None,
+    manifest: Optional[DatasetManifest] = None,
+) -> Tuple[FeatureDataset, FeatureDataset]:
+    """(train, val) activation của phần đầu, dựng cache ảnh và cache activation khi cần"""
+    dataset_dir = Path(dataset_dir)
+    root = cache_dir_for(dataset_dir)
+    for split, split_variants in (("train", variants), ("val", 1)):
+        folder = manifest.image_folder(split) if manifest is not None else None
+        build_split_cache(dataset_dir / split, root / split, image_size, folder=folder)
+        build_feature_cache(
+            CachedImageDataset(root / split), prefix, root / "features" / split, split_variants, device=device
+        )
+    return FeatureDataset(root / "features" / "train", random_variant=True), FeatureDataset(root / "features" / "val")
@@ -0,0 +1,244 @@
+"""
+Huấn luyện tăng dần khi thêm món mới, khởi động từ mô hình hiện tại.
+
+- Nạp checkpoint + labels hiện có, mở rộng classifier[3]: giữ nguyên các hàng của lớp cũ,
+  thêm hàng cho lớp mới (nhãn mới được nối vào cuối, chỉ số lớp cũ không đổi)
+- Fine-tune trên toàn bộ ảnh lớp mới + một replay buffer nhỏ ảnh lớp cũ
+- Chốt chặn: chỉ ghi checkpoint khi accuracy trên val của các lớp cũ không giảm quá
+  INCREMENTAL_MAX_OLD_ACC_DROP so với mô hình trước đó
+- Dataset không có ảnh val của lớp cũ thì không đo được chốt chặn: từ chối (guard: skipped)
+"""
+
+from __future__ import annotations
+
+import os
+import random
+import time
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import torch
+from torch.utils.data import DataLoader, Dataset
+from torchvision.models import mobilenet_v3_large, mobilenet_v3_small
+
+from ..config import (
+    MODEL_DIR, MODEL_PATH, LABELS_PATH, TRAIN_CACHE_ENABLED,
+    INCREMENTAL_REPLAY_PER_CLASS, INCREMENTAL_MAX_OLD_ACC_DROP,
+)
+from .checkpoint import model_arch, save_model_arch
+from .perf import PerfSettings, loader_kwargs
+from .train import UNFROZEN_BLOCKS, _build_datasets, _weighted_sampler
+
+
+class _Relabeled(Dataset):
+    """Tập con của dataset với nhãn đổi sang thứ tự lớp của mô hình mở rộng"""
+
+    def __init__(self, dataset: Dataset, indices: Sequence[int], label_map: Dict[int, int]):
+        self.dataset = dataset
+        self.indices = list(indices)
+        self.label_map = label_map
+        self.targets = [label_map[dataset.targets[i]] for i in self.indices]
+
+    def __len__(self) -> int:
+        return len(self.indices)
+
+    def __getitem__(self, idx: int):
+        image, _ = self.dataset[self.indices[idx]]
+        return image, self.targets[idx]
+
+
+def _load_labels() -> List[str]:
+    if not LABELS_PATH.exists():
+        return []
+    return [line.strip() for line in LABELS_PATH.read_text(encoding="utf-8").splitlines() if line.strip()]
+
+
+def expand_classifier(model: torch.nn.Module, num_classes: int) -> None:
+    """Thay classifier[3] bằng lớp Linear lớn hơn, chép nguyên trọng số các lớp cũ"""
+    old = model.classifier[3]
+    new = torch.nn.Linear(old.in_features, num_classes)
+    with torch.no_grad():
+        new.weight[:old.out_features] = old.weight
+        new.bias[:old.out_features] = old.bias
+        # Lớp mới bắt đầu với bias trung bình để không lấn át lớp cũ ngay từ đầu
+        new.bias[old.out_features:] = old.bias.mean()
+    model.classifier[3] = new
+
+
+def _evaluate(model: torch.nn.Module, loader: DataLoader, device: torch.device, num_old: int) -> Tuple[float, float, float]:
+    """(accuracy lớp cũ, accuracy lớp mới, accuracy toàn bộ) trên val"""
+    correct = {True: 0, False: 0}
+    total = {True: 0, False: 0}
+    model.eval()
+    with torch.inference_mode():
+        for images, labels in loader:
+            preds = model(images.to(device)).argmax(dim=1).cpu()
+            for pred, label in zip(preds.tolist(), labels.tolist()):
+                is_old = label < num_old
+                total[is_old] += 1
+                correct[is_old] += int(pred == label)
+
+    def acc(hits: int, n: int) -> float:
+        return hits / n if n else 0.0
+
+    return (
+        acc(correct[True], total[True]),
+        acc(correct[False], total[False]),
+        acc(correct[True] + correct[False], total[True] + total[False]),
+    )
+
+
+def train_incremental(
+    dataset_dir: str,
+    num_epochs: int = 3,
+    batch_size: int = 32,
+    learning_rate: float = 3e-4,
+    replay_per_class: int = INCREMENTAL_REPLAY_PER_CLASS,
+    max_old_acc_drop: float = INCREMENTAL_MAX_OLD_ACC_DROP,
+    use_cache: Optional[bool] = None,
+    seed: int = 0,
+    on_epoch: Optional[Callable[[dict], None]] = None,
+    classes: Optional[Sequence[str]] = None,
+) -> dict:
+    """
+    Thêm các lớp có trong dataset_dir nhưng chưa có trong labels hiện tại.
+    classes: chỉ thêm các lớp này (các lớp mới khác trong dataset, ví dụ đang được crawl, bị bỏ qua).
+    Không có mô hình/labels cũ thì chuyển sang train_model đầy đủ. Trả về báo cáo (dict).
+    """
+    old_labels = _load_labels()
+    if not old_labels or not MODEL_PATH.exists():
+        from .train import train_model
+
+        print("[INCREMENTAL] Chưa có mô hình hiện tại, chuyển sang huấn luyện đầy đủ")
+        result = train_model(dataset_dir, num_epochs=num_epochs, batch_size=batch_size, learning_rate=learning_rate,
+                             use_cache=use_cache, on_epoch=on_epoch)
+        return {"status": "full_retrain", **result}
+
+    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    train_ds, val_ds = _build_datasets(Path(dataset_dir), TRAIN_CACHE_ENABLED if use_cache is None else use_cache)
+    new_classes = [c for c in train_ds.classes if c not in old_labels and (classes is None or c in classes)]
+    if not new_classes:
+        print("[INCREMENTAL] Không có lớp mới, giữ nguyên mô hình")
+        return {"status": "no_new_classes", "classes": old_labels}
+
+    labels = old_labels + new_classes
+    num_old = len(old_labels)
+    train_map = {train_ds.class_to_idx[c]: labels.index(c) for c in train_ds.classes if c in labels}
+    val_map = {val_ds.class_to_idx[c]: labels.index(c) for c in val_ds.classes if c in labels}
+
+    # Toàn bộ ảnh lớp mới + replay_per_class ảnh ngẫu nhiên mỗi lớp cũ
+    rng = random.Random(seed)
+    by_class: Dict[int, List[int]] = {}
+    for i, t in enumerate(train_ds.targets):
+        if t in train_map:
+            by_class.setdefault(train_map[t], []).append(i)
+    indices: List[int] = []
+    replay = 0
+    for label, members in by_class.items():
+        if label >= num_old:
+            indices.extend(members)
+        else:
+            chosen = rng.sample(members, min(replay_per_class, len(members)))
+            indices.extend(chosen)
+            replay += len(chosen)
+    train_subset = _Relabeled(train_ds, sorted(indices), train_map)
+    val_subset = _Relabeled(val_ds, [i for i, t in enumerate(val_ds.targets) if t in val_map], val_map)
+    old_val = _Relabeled(val_ds, [i for i in val_subset.indices if val_map[val_ds.targets[i]] < num_old], val_map)
+    # Lớp cũ không còn ảnh train trong dataset thì không có ảnh replay
+    no_replay = [c for i, c in enumerate(old_labels) if i not in by_class]
+    if no_replay:
+        print(f"[INCREMENTAL] Lớp cũ không có ảnh train để replay: {no_replay}")
+    if not old_val.indices:
+        # Không có val lớp cũ thì chốt chặn accuracy lớp cũ không đo được (baseline 0 luôn qua)
+        print("[INCREMENTAL] Dataset không có ảnh val của lớp cũ, không thể kiểm tra chốt chặn, giữ nguyên mô hình")
+        return {"status": "rejected", "guard": "skipped", "new_classes": new_classes, "classes": labels,
+                "no_replay_classes": no_replay,
+                "reason": "Không có ảnh val của lớp cũ để kiểm tra accuracy lớp cũ"}
+
+    options = loader_kwargs(PerfSettings(), device)
+    train_loader = DataLoader(
+        train_subset, batch_size=batch_size, sampler=_weighted_sampler(train_subset.targets, len(labels)),
+        **options,
+    )
+    val_loader = DataLoader(val_subset, batch_size=batch_size, shuffle=False, **options)
+
+    # Mô hình đang phục vụ có thể là student MobileNetV3 Small (distill --install)
+    arch = model_arch(MODEL_PATH)
+    model = (mobilenet_v3_large if arch == "large" else mobilenet_v3_small)(weights=None)
+    model.classifier[3] = torch.nn.Linear(model.classifier[3].in_features, num_old)
+    model.load_state_dict(torch.load(MODEL_PATH, map_location="cpu"))
+    model = model.to(device)
+
+    # Mốc so sánh: accuracy lớp cũ của mô hình hiện tại
+    baseline_old, _, _ = _evaluate(
+        model, DataLoader(old_val, batch_size=batch_size, shuffle=False, **options), device, num_old
+    )
+
+    expand_classifier(model, len(labels))
+    model = model.to(device)
+    for param in model.parameters():
+        param.requires_grad = False
+    trainable = [model.classifier, *list(model.features.children())[-UNFROZEN_BLOCKS:]]
+    for module in trainable:
+        for param in module.parameters():
+            param.requires_grad = True
+    frozen = model.features[:-UNFROZEN_BLOCKS]
+
+    criterion = torch.nn.CrossEntropyLoss()
+    optimizer = torch.optim.AdamW(filter(lambda p: p.requires_grad, model.parameters()), lr=learning_rate)
+    scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=max(1, num_epochs))
+
+    print(f"[INCREMENTAL] Lớp mới {new_classes}; {len(train_subset)} ảnh train ({replay} ảnh replay); "
+          f"old_acc trước đó={baseline_old:.4f}")
+
+    best: Optional[dict] = None
+    history = []
+    for epoch in range(num_epochs):
+        model.train()
+        # Phần backbone đóng băng giữ running stats của BatchNorm (batch nhỏ, lệch lớp mới)
+        frozen.eval()
+        running_loss = 0.0
+        total = 0
+        started = time.perf_counter()
+        for images, targets in train_loader:
+            images, targets = images.to(device), targets.to(device)
+            optimizer.zero_grad(set_to_none=True)
+            loss = criterion(model(images), targets)
+            loss.backward()
+            optimizer.step()
+            running_loss += loss.item() * images.size(0)
+            total += images.size(0)
+        scheduler.step()
+        images_per_sec = total / max(time.perf_counter() - started, 1e-9)
+
+        old_acc, new_acc, val_acc = _evaluate(model, val_loader, device, num_old)
+        accepted = old_acc >= baseline_old - max_old_acc_drop
+        history.append({"epoch": epoch + 1, "old_acc": old_acc, "new_acc": new_acc, "val_acc": val_acc,
+                        "accepted": accepted})
+        print(f"[INCREMENTAL] Epoch {epoch+1}/{num_epochs} - old_acc={old_acc:.4f} new_acc={new_acc:.4f} "
+              f"val_acc={val_acc:.4f}{'' if accepted else ' (lớp cũ giảm quá ngưỡng)'}")
+        if accepted and (best is None or val_acc > best["val_acc"]):
+            best = {"epoch": epoch + 1, "val_acc": val_acc, "old_acc": old_acc, "new_acc": new_acc,
+                    "state": {k: v.detach().cpu().clone() for k, v in model.state_dict().items()}}
+        if on_epoch is not None:
+            on_epoch({"epoch": epoch + 1, "num_epochs": num_epochs, "train_loss": running_loss / max(total, 1),
+                      "val_acc": val_acc, "old_acc": old_acc, "new_acc": new_acc, "images_per_sec": images_per_sec})
+
+    report = {"new_classes": new_classes, "classes": labels, "baseline_old_acc": baseline_old,
+              "train_images": len(train_subset), "replay_images": replay, "no_replay_classes": no_replay,
+              "history": history}
+    if best is None:
+        print("[INCREMENTAL] Không epoch nào giữ được accuracy lớp cũ, giữ nguyên mô hình hiện tại")
+        return {"status": "rejected", **report}
+
+    # Ghi checkpoint và labels (thay thế nguyên tử để server không đọc phải file dở)
+    MODEL_DIR.mkdir(parents=True, exist_ok=True)
+    tmp_model = MODEL_PATH.with_name(MODEL_PATH.name + ".tmp")
+    tmp_labels = Path(LABELS_PATH).with_name(Path(LABELS_PATH).name + ".tmp")
+    torch.save(best.pop("state"), tmp_model)
+    tmp_labels.write_text("\n".join(labels), encoding="utf-8")
+    os.replace(tmp_model, MODEL_PATH)
+    save_model_arch(MODEL_PATH, arch)
+    os.replace(tmp_labels, LABELS_PATH)
+    print(f"[INCREMENTAL] Saved model to {MODEL_PATH} (epoch {best['epoch']}, val_acc={best['val_acc']:.4f})")
+    return {"status": "updated", "best": best, **report}
@@ -0,0 +1,376 @@
+"""
+Quản lý job huấn luyện chạy ở tiến trình riêng (không chiếm CPU của tiến trình phục vụ).
+
+- Mỗi job là một file JSON trong TRAIN_JOBS_DIR (tham số, trạng thái, tiến độ từng epoch) và một file log
+- Tiến trình con: `python -m app.training.jobs run <job.json>`, hạ độ ưu tiên (nice) và ghim vào
+  tập CPU của ngân sách; chỉ tiến trình con ghi file job khi đang chạy (ghi nguyên tử)
+- Mỗi ngân sách CPU chỉ chạy một job tại một thời điểm; job có thể huỷ (SIGTERM) và chạy lại (resume)
+- Server khởi động lại: job còn tiến trình sống vẫn được theo dõi theo pid, job mất tiến trình
+  chuyển sang "interrupted"
+- Nhiều worker uvicorn dùng chung TRAIN_JOBS_DIR: submit và mọi lần chuyển trạng thái giữ khoá file
+  (fcntl) trên TRAIN_JOBS_DIR/.lock; job chưa có pid chỉ bị coi là mất khi tiến trình đã tạo nó (launcher) chết
+
+Trạng thái: queued -> running -> completed | failed | cancelled | interrupted
+"""
+
+from __future__ import annotations
+
+import argparse
+import fcntl
+import importlib
+import inspect
+import json
+import os
+import signal
+import subprocess
+import sys
+import threading
+import traceback
+import uuid
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional
+
+from ..config import BASE_DIR, TRAIN_JOBS_DIR, TRAIN_JOB_NICE, TRAIN_JOB_BUDGETS
+
+# Loại job -> hàm huấn luyện (module:hàm), hàm nhận tham số của job + on_epoch (và on_stage nếu có)
+TARGETS: Dict[str, str] = {
+    "train": "app.training.train:train_model",
+    "distributed": "app.training.distributed:train_distributed",
+    "incremental": "app.training.incremental:train_incremental",
+    "autotrain": "app.training.autotrain:run_autotrain",
+    "sweep": "app.training.sweep:run_sweep",
+}
+ACTIVE = ("queued", "running")
+RESUMABLE = ("failed", "cancelled", "interrupted")
+
+
+class JobBusyError(RuntimeError):
+    """Ngân sách CPU đang có job chạy"""
+
+
+def parse_cpus(spec: str) -> List[int]:
+    """"0-2,5" -> [0, 1, 2, 5]"""
+    cpus: List[int] = []
+    for part in spec.split(","):
+        part = part.strip()
+        if not part:
+            continue
+        if "-" in part:
+            lo, hi = part.split("-", 1)
+            cpus.extend(range(int(lo), int(hi) + 1))
+        else:
+            cpus.append(int(part))
+    return sorted(set(cpus))
+
+
+def parse_budgets(spec: str) -> Dict[str, List[int]]:
+    """"default=1-3;nightly=4-7" -> {"default": [1, 2, 3], ...}; rỗng = mọi CPU trừ CPU 0 (để lại cho server)"""
+    budgets = {}
+    for item in spec.split(";"):
+        if "=" in item:
+            name, cpus = item.split("=", 1)
+            budgets[name.strip()] = parse_cpus(cpus)
+    if not budgets:
+        available = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else list(range(os.cpu_count() or 1))
+        budgets["default"] = available[1:] or available
+    return budgets
+
+
+def _now() -> str:
+    return datetime.now().isoformat(timespec="seconds")
+
+
+def _write_json(path: Path, data: dict) -> None:
+    tmp = path.with_name(f"{path.name}.tmp{os.getpid()}")
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2, default=str)
+    os.replace(tmp, path)
+
+
+def _read_json(path: Path) -> dict:
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+@contextmanager
+def _file_lock(state_dir: Path) -> Iterator[None]:
+    """Khoá độc quyền giữa các tiến trình (worker uvicorn, tiến trình con) dùng chung thư mục job"""
+    with open(state_dir / ".lock", "a") as f:
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+
+def _alive(pid: Optional[int]) -> bool:
+    if not pid:
+        return False
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+class JobManager:
+    def __init__(
+        self,
+        state_dir: str | Path = TRAIN_JOBS_DIR,
+        budgets: Optional[Dict[str, List[int]]] = None,
+        nice: int = TRAIN_JOB_NICE,
+    ):
+        self.state_dir = Path(state_dir)
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        self.budgets = budgets if budgets is not None else parse_budgets(TRAIN_JOB_BUDGETS)
+        self.nice = nice
+        self._lock = threading.Lock()
+        self._procs: Dict[str, subprocess.Popen] = {}
+        self._monitors: Dict[str, threading.Thread] = {}
+        self._cancel_requested: set[str] = set()
+        with self._locked():
+            for path in self.state_dir.glob("*.json"):
+                self._refresh(_read_json(path))
+
+    # ---- trạng thái ----
+
+    @contextmanager
+    def _locked(self) -> Iterator[None]:
+        with self._lock, _file_lock(self.state_dir):
+            yield
+
+    def _path(self, job_id: str) -> Path:
+        return self.state_dir / f"{job_id}.json"
+
+    def _refresh(self, job: dict) -> dict:
+        """Job đang active nhưng tiến trình đã mất (server/máy khởi động lại) -> interrupted"""
+        if job["status"] not in ACTIVE or job["id"] in self._procs:
+            return job
+        # Chưa có pid: job vừa được worker khác xếp hàng, chỉ coi là mất khi worker đó đã chết
+        owner = job.get("pid") if job.get("pid") is not None else job.get("launcher")
+        if not _alive(owner):
+            job.update(status="interrupted", finished_at=_now())
+            _write_json(self._path(job["id"]), job)
+        return job
+
+    def get(self, job_id: str) -> dict:
+        path = self._path(job_id)
+        if not path.exists():
+            raise KeyError(job_id)
+        with self._locked():
+            return self._refresh(_read_json(path))
+
+    def list(self) -> List[dict]:
+        with self._locked():
+            jobs = [self._refresh(_read_json(p)) for p in self.state_dir.glob("*.json")]
+        return sorted(jobs, key=lambda j: j["created_at"], reverse=True)
+
+    def _busy_job(self, budget: str) -> Optional[dict]:
+        for path in self.state_dir.glob("*.json"):
+            job = self._refresh(_read_json(path))
+            if job["budget"] == budget and job["status"] in ACTIVE:
+                return job
+        return None
+
+    # ---- điều khiển ----
+
+    def submit(self, kind: str, params: dict, budget: str = "default") -> dict:
+        if kind not in TARGETS:
+            raise ValueError(f"Loại job không hỗ trợ: {kind}")
+        if budget not in self.budgets:
+            raise ValueError(f"Ngân sách CPU không tồn tại: {budget}")
+        with self._locked():
+            busy = self._busy_job(budget)
+            if busy is not None:
+                raise JobBusyError(f"Ngân sách '{budget}' đang chạy job {busy['id']}")
+            job = {
+                "id": uuid.uuid4().hex[:12],
+                "kind": kind,
+                "target": TARGETS[kind],
+                "params": params,
+                "budget": budget,
+                "cpus": self.budgets[budget],
+                "nice": self.nice,
+                "status": "queued",
+                "attempt": 1,
+                "created_at": _now(),
+                "started_at": None,
+                "finished_at": None,
+                "pid": None,
+                "launcher": os.getpid(),
+                "progress": [],
+                "result": None,
+                "error": None,
+            }
+            self._start(job)
+        return job
+
+    def resume(self, job_id: str) -> dict:
+        """
+        Chạy lại job đã dừng với cùng tham số (tiến độ cũ được giữ trong lịch sử);
+        hàm huấn luyện có tham số resume thì chạy tiếp từ checkpoint thay vì từ đầu
+        """
+        with self._locked():
+            path = self._path(job_id)
+            if not path.exists():
+                raise KeyError(job_id)
+            job = self._refresh(_read_json(path))
+            if job["status"] not in RESUMABLE:
+                raise ValueError(f"Job {job_id} đang ở trạng thái {job['status']}, không thể chạy lại")
+            busy = self._busy_job(job["budget"])
+            if busy is not None:
+                raise JobBusyError(f"Ngân sách '{job['budget']}' đang chạy job {busy['id']}")
+            job.setdefault("history", []).append(
+                {k: job[k] for k in ("attempt", "status", "started_at", "finished_at", "progress", "error")}
+            )
+            job.update(status="queued", attempt=job["attempt"] + 1, started_at=None, finished_at=None,
+                       pid=None, launcher=os.getpid(), progress=[], result=None, error=None)
+            self._start(job)
+        return job
+
+    def cancel(self, job_id: str) -> dict:
+        with self._locked():
+            path = self._path(job_id)
+            if not path.exists():
+                raise KeyError(job_id)
+            job = self._refresh(_read_json(path))
+            if job["status"] not in ACTIVE:
+                return job
+            proc = self._procs.get(job_id)
+            if proc is not None:
+                # Monitor ghi trạng thái "cancelled" khi tiến trình thoát
+                self._cancel_requested.add(job_id)
+                proc.terminate()
+            else:
+                # Tiến trình của lần chạy server trước: chỉ còn pid
+                if _alive(job.get("pid")):
+                    os.kill(job["pid"], signal.SIGTERM)
+                job.update(status="cancelled", finished_at=_now())
+                _write_json(path, job)
+            return job
+
+    def wait(self, job_id: str, timeout: Optional[float] = None) -> dict:
+        monitor = self._monitors.get(job_id)
+        if monitor is not None:
+            monitor.join(timeout)
+        return self.get(job_id)
+
+    def _start(self, job: dict) -> None:
+        """Gọi khi đang giữ khoá: tiến trình con chỉ ghi "running" sau khi submit/resume nhả khoá"""
+        path = self._path(job["id"])
+        _write_json(path, job)
+        env = dict(os.environ)
+        # Tiến trình con import được cùng các module như tiến trình cha
+        env["PYTHONPATH"] = os.pathsep.join([str(BASE_DIR)] + [p for p in sys.path if p])
+        log = open(self.state_dir / f"{job['id']}.log", "a", encoding="utf-8")
+        try:
+            proc = subprocess.Popen(
+                [sys.executable, "-m", "app.training.jobs", "run", str(path)],
+                cwd=str(BASE_DIR), env=env, stdout=log, stderr=subprocess.STDOUT,
+            )
+        except OSError as e:
+            # Không để job "queued" không pid chiếm ngân sách tới khi worker này chết
+            job.update(status="failed", error=f"{type(e).__name__}: {e}", finished_at=_now())
+            _write_json(path, job)
+            raise
+        finally:
+            log.close()
+        self._procs[job["id"]] = proc
+        monitor = threading.Thread(target=self._monitor, args=(job["id"], proc), daemon=True)
+        self._monitors[job["id"]] = monitor
+        monitor.start()
+
+    def _monitor(self, job_id: str, proc: subprocess.Popen) -> None:
+        code = proc.wait()
+        with self._locked():
+            self._procs.pop(job_id, None)
+            path = self._path(job_id)
+            job = _read_json(path)
+            if job_id in self._cancel_requested:
+                self._cancel_requested.discard(job_id)
+                job["status"] = "cancelled"
+            elif job["status"] in ACTIVE:
+                # Tiến trình con chết trước khi kịp ghi kết quả (bị kill, hết bộ nhớ...)
+                job["status"] = "interrupted" if code in (-signal.SIGTERM, -signal.SIGKILL) else "failed"
+                job["error"] = job.get("error") or f"exit code {code}"
+            job["finished_at"] = job.get("finished_at") or _now()
+            _write_json(path, job)
+
+
+def run_job(path: str | Path) -> int:
+    """Chạy trong tiến trình con: áp nice/affinity, gọi hàm huấn luyện và ghi tiến độ vào file job"""
+    path = Path(path)
+    job = _read_json(path)
+    if hasattr(os, "sched_setaffinity") and job["cpus"]:
+        os.sched_setaffinity(0, job["cpus"])
+    if job["nice"]:
+        os.nice(job["nice"])
+    write_lock = threading.Lock()
+
+    def save() -> None:
+        # Cùng khoá file với JobManager để không ghi đè lần chuyển trạng thái của worker khác
+        with _file_lock(path.parent):
+            _write_json(path, job)
+
+    job.update(status="running", pid=os.getpid(), started_at=_now())
+    save()
+
+    def on_epoch(metrics: dict) -> None:
+        with write_lock:
+            job["progress"].append(metrics)
+            save()
+
+    def on_stage(stage: dict) -> None:
+        # Trạng thái các giai đoạn không phải epoch (crawl dataset, lớp đã sẵn sàng...)
+        with write_lock:
+            job.setdefault("stages", {}).update(stage)
+            save()
+
+    try:
+        import torch
+
+        torch.set_num_threads(max(1, len(job["cpus"])))
+        module_name, func_name = job["target"].split(":")
+        func = getattr(importlib.import_module(module_name), func_name)
+        accepted = inspect.signature(func).parameters
+        params = dict(job["params"])
+        if job["attempt"] > 1 and "resume" in accepted:
+            # Chạy lại job đã dừng: tiếp tục từ checkpoint của lần trước
+            params["resume"] = True
+        callbacks = {"on_epoch": on_epoch}
+        if "on_stage" in accepted:
+            callbacks["on_stage"] = on_stage
+        result = func(**params, **callbacks)
+    except Exception as e:
+        traceback.print_exc()
+        with write_lock:
+            job.update(status="failed", error=f"{type(e).__name__}: {e}", finished_at=_now())
+            save()
+        return 1
+    with write_lock:
+        job.update(status="completed", result=result, finished_at=_now())
+        save()
+    return 0
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Job huấn luyện chạy nền")
+    sub = parser.add_subparsers(dest="command", required=True)
+    run = sub.add_parser("run", help="Chạy một job (dùng nội bộ bởi JobManager)")
+    run.add_argument("path")
+    sub.add_parser("list", help="Liệt kê job")
+    args = parser.parse_args()
+    if args.command == "run":
+        sys.exit(run_job(args.path))
+    for job in JobManager().list():
+        last = job["progress"][-1] if job["progress"] else {}
+        print(f"{job['id']} {job['kind']:<11} {job['status']:<11} epoch {last.get('epoch', 0)}/"
+              f"{job['params'].get('num_epochs', '?')} val_acc={last.get('val_acc', 0):.4f} {job['created_at']}")
+
+
+if __name__ == "__main__":
+    main()
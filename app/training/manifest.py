@@ -0,0 +1,211 @@
+"""
+Manifest của dataset (train/val dạng ImageFolder): manifest.json ở gốc dataset.
+
+Mỗi file ảnh có một mục: split, lớp, kích thước, mtime, SHA-1 nội dung, kích thước ảnh, hợp lệ hay không.
+- refresh(): chỉ liệt kê thư mục (một lượt os.scandir, không glob theo từng đuôi) rồi kiểm tra lại
+  các file mới hoặc đã đổi (kích thước/mtime) trong process pool; file crawler đã kiểm tra lúc tải
+  (crawl_index.json) được ghi thẳng vào manifest
+- train_model, clean_dataset, train_script.py đọc danh sách lớp, số ảnh mỗi lớp và danh sách file
+  từ manifest thay vì quét lại thư mục
+
+Cập nhật thủ công:
+    python -m app.training.manifest datasets
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import json
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from io import BytesIO
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from PIL import Image
+from torchvision import datasets
+
+from .crawler import CrawlIndex
+
+MANIFEST_FILE = "manifest.json"
+FORMAT_VERSION = 1
+SPLITS = ("train", "val")
+IMAGE_EXTENSIONS = {".jpg", ".jpeg", ".png"}
+# Dưới ngưỡng này kiểm tra ngay trong tiến trình hiện tại (khởi động process pool đắt hơn)
+_POOL_MIN_FILES = 32
+
+
+def validate_file(path: str) -> dict:
+    """Đọc và kiểm tra một file ảnh (chạy trong process pool)"""
+    try:
+        data = Path(path).read_bytes()
+    except OSError as e:
+        return {"sha1": None, "width": None, "height": None, "valid": False, "error": f"{type(e).__name__}: {e}"}
+    entry = {"sha1": hashlib.sha1(data).hexdigest(), "width": None, "height": None, "valid": False, "error": None}
+    try:
+        with Image.open(BytesIO(data)) as img:
+            img.verify()
+        with Image.open(BytesIO(data)) as img:
+            entry["width"], entry["height"] = img.size
+        entry["valid"] = True
+    except Exception as e:
+        entry["error"] = f"{type(e).__name__}: {e}"
+    return entry
+
+
+class DatasetManifest:
+    def __init__(self, dataset_dir: str | Path):
+        self.root = Path(dataset_dir)
+        self.path = self.root / MANIFEST_FILE
+        self._lock = threading.Lock()
+        try:
+            with open(self.path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+        except (OSError, ValueError):
+            data = {}
+        self.entries: Dict[str, dict] = data.get("files", {}) if data.get("format_version") == FORMAT_VERSION else {}
+
+    def _scan(self) -> Dict[str, Tuple[str, str, os.stat_result]]:
+        """relpath -> (split, lớp, stat) của mọi file ảnh trong train/val"""
+        found = {}
+        for split in SPLITS:
+            split_dir = self.root / split
+            if not split_dir.is_dir():
+                continue
+            with os.scandir(split_dir) as classes:
+                class_dirs = [d for d in classes if d.is_dir() and not d.name.startswith(".")]
+            for cls_dir in class_dirs:
+                with os.scandir(cls_dir.path) as files:
+                    for f in files:
+                        if f.name.startswith(".") or os.path.splitext(f.name)[1].lower() not in IMAGE_EXTENSIONS:
+                            continue
+                        if f.is_file():
+                            found[f"{split}/{cls_dir.name}/{f.name}"] = (split, cls_dir.name, f.stat())
+        return found
+
+    def refresh(self, workers: Optional[int] = None) -> int:
+        """Đồng bộ manifest với thư mục, kiểm tra lại file mới/đã đổi; trả về số file đã kiểm tra"""
+        found = self._scan()
+        crawl_index = CrawlIndex(self.root)
+        entries: Dict[str, dict] = {}
+        to_check: List[str] = []
+        for rel, (split, cls, st) in found.items():
+            old = self.entries.get(rel)
+            if old is not None and old["size"] == st.st_size and old["mtime_ns"] == st.st_mtime_ns:
+                entries[rel] = old
+                continue
+            entry = {"split": split, "class": cls, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+            crawled = crawl_index.files.get(rel)
+            if crawled is not None and crawled.get("width") and crawl_index.is_verified(self.root / rel):
+                entry.update(sha1=crawled["sha1"], width=crawled["width"], height=crawled["height"],
+                             valid=True, error=None)
+            else:
+                to_check.append(rel)
+            entries[rel] = entry
+
+        paths = [str(self.root / rel) for rel in to_check]
+        if len(paths) >= _POOL_MIN_FILES and (workers or os.cpu_count() or 1) > 1:
+            with ProcessPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1)) as pool:
+                results = list(pool.map(validate_file, paths, chunksize=16))
+        else:
+            results = [validate_file(p) for p in paths]
+        for rel, result in zip(to_check, results):
+            entries[rel].update(result)
+
+        with self._lock:
+            changed = bool(to_check) or entries.keys() != self.entries.keys()
+            self.entries = entries
+        if changed:
+            self.save()
+        return len(to_check)
+
+    def remove_invalid(self) -> int:
+        """Xoá file ảnh lỗi khỏi đĩa và khỏi manifest; trả về số file đã xoá"""
+        deleted = 0
+        with self._lock:
+            for rel in [rel for rel, e in self.entries.items() if not e["valid"]]:
+                try:
+                    (self.root / rel).unlink(missing_ok=True)
+                except OSError:
+                    # Không xoá được thì giữ mục (vẫn bị loại khỏi danh sách train)
+                    continue
+                del self.entries[rel]
+                deleted += 1
+        if deleted:
+            self.save()
+        return deleted
+
+    def classes(self) -> List[str]:
+        """Các lớp có ít nhất một ảnh train hợp lệ (sắp xếp như ImageFolder)"""
+        return sorted({e["class"] for e in self.entries.values() if e["split"] == "train" and e["valid"]})
+
+    def class_counts(self, split: str = "train") -> Dict[str, int]:
+        counts = {c: 0 for c in self.classes()}
+        for e in self.entries.values():
+            if e["split"] == split and e["valid"] and e["class"] in counts:
+                counts[e["class"]] += 1
+        return counts
+
+    def samples(self, split: str, class_to_idx: Optional[Dict[str, int]] = None) -> List[Tuple[str, int]]:
+        """(đường dẫn, nhãn) các ảnh hợp lệ, cùng thứ tự với ImageFolder (theo lớp rồi theo tên file)"""
+        class_to_idx = class_to_idx or {c: i for i, c in enumerate(self.classes())}
+        rels = sorted(
+            (class_to_idx[e["class"]], rel) for rel, e in self.entries.items()
+            if e["split"] == split and e["valid"] and e["class"] in class_to_idx
+        )
+        return [(str(self.root / rel), idx) for idx, rel in rels]
+
+    def image_folder(self, split: str, transform=None) -> "ManifestImageFolder":
+        return ManifestImageFolder(self, split, transform=transform)
+
+    def save(self) -> None:
+        with self._lock:
+            data = {"format_version": FORMAT_VERSION, "files": self.entries}
+        tmp = self.path.with_name(f"{self.path.name}.tmp{os.getpid()}")
+        with open(tmp, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+
+class ManifestImageFolder(datasets.ImageFolder):
+    """ImageFolder lấy lớp và danh sách file từ manifest (không quét thư mục); lớp theo split train"""
+
+    def __init__(self, manifest: DatasetManifest, split: str, transform=None):
+        self.manifest = manifest
+        self.split = split
+        super().__init__(str(manifest.root / split), transform=transform)
+
+    def find_classes(self, directory: str) -> Tuple[List[str], Dict[str, int]]:
+        classes = self.manifest.classes()
+        return classes, {c: i for i, c in enumerate(classes)}
+
+    def make_dataset(self, directory, class_to_idx, *args, **kwargs) -> List[Tuple[str, int]]:
+        return self.manifest.samples(self.split, class_to_idx)
+
+
+def load_manifest(dataset_dir: str | Path, refresh: bool = True, workers: Optional[int] = None) -> DatasetManifest:
+    manifest = DatasetManifest(dataset_dir)
+    if refresh:
+        checked = manifest.refresh(workers)
+        if checked:
+            print(f"[MANIFEST] Đã kiểm tra {checked} file mới/thay đổi trong {dataset_dir}")
+    return manifest
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Cập nhật manifest dataset (train/val)")
+    parser.add_argument("dataset_dir")
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    manifest = load_manifest(args.dataset_dir, workers=args.workers)
+    invalid = sum(1 for e in manifest.entries.values() if not e["valid"])
+    for split in SPLITS:
+        counts = manifest.class_counts(split)
+        print(f"{split}: {sum(counts.values())} ảnh, {len(counts)} lớp")
+    print(f"Ảnh lỗi: {invalid}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""
+Cache ảnh huấn luyện đã giải mã dạng shard uint8 (memory-mapped .npy).
+
+Mỗi ảnh JPEG/PNG chỉ được giải mã và resize về (DEFAULT_IMAGE_SIZE, DEFAULT_IMAGE_SIZE) một lần;
+các epoch sau đọc thẳng tensor uint8 (3, H, W) từ memmap:
+- val: ảnh trong cache chính là kết quả Resize của val transform, chỉ còn chuẩn hoá (phép tính rẻ)
+- train: CachedImageDataset áp các augmentation ngẫu nhiên (crop, lật, xoay, màu) trên ảnh 256x256 đã giải mã
+  thay vì ảnh gốc kích thước đầy đủ
+
+Mỗi split có index.json chứa fingerprint (đường dẫn, kích thước, mtime của từng file, nhãn, kích thước ảnh);
+fingerprint khác với thư mục nguồn thì cache được dựng lại.
+
+Dựng trước (không bắt buộc, train_model tự dựng khi cần):
+    python -m app.training.shard_cache datasets
+"""
+
+from __future__ import annotations
+
+import argparse
+import bisect
+import hashlib
+import json
+import os
+import shutil
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Callable, List, Optional, Sequence, Tuple
+
+import numpy as np
+import torch
+from PIL import Image
+from torch.utils.data import Dataset
+from torchvision import datasets, transforms
+
+from ..config import DEFAULT_IMAGE_SIZE, TRAIN_CACHE_DIR, TRAIN_CACHE_SHARD_IMAGES
+from .manifest import DatasetManifest
+
+FORMAT_VERSION = 1
+IMAGENET_MEAN = [0.485, 0.456, 0.406]
+IMAGENET_STD = [0.229, 0.224, 0.225]
+
+_MEAN = torch.tensor(IMAGENET_MEAN).view(3, 1, 1)
+_STD = torch.tensor(IMAGENET_STD).view(3, 1, 1)
+
+
+def normalize_uint8(images: torch.Tensor) -> torch.Tensor:
+    """uint8 (…, 3, H, W) -> float chuẩn hoá ImageNet, giống ToTensor + Normalize"""
+    return (images.float() / 255 - _MEAN) / _STD
+
+
+def train_augmentation(image_size: int = DEFAULT_IMAGE_SIZE) -> transforms.Compose:
+    """Augmentation ngẫu nhiên trên ảnh PIL đã giải mã (tương ứng train transform gốc, bỏ ToTensor)"""
+    return transforms.Compose([
+        transforms.RandomResizedCrop(image_size, scale=(0.7, 1.0)),
+        transforms.RandomHorizontalFlip(),
+        transforms.RandomRotation(10),
+        transforms.ColorJitter(0.2, 0.2, 0.2, 0.05),
+    ])
+
+
+def source_fingerprint(root: Path, samples: Sequence[Tuple[str, int]], image_size: int) -> str:
+    h = hashlib.sha1(f"{FORMAT_VERSION}|{image_size}".encode())
+    for path, label in samples:
+        st = os.stat(path)
+        h.update(f"|{os.path.relpath(path, root)}|{st.st_size}|{st.st_mtime_ns}|{label}".encode())
+    return h.hexdigest()
+
+
+def decode_image(path: str, image_size: int) -> np.ndarray:
+    """Ảnh -> uint8 (3, H, W), cùng phép resize BILINEAR với transforms.Resize"""
+    with Image.open(path) as img:
+        img = img.convert("RGB").resize((image_size, image_size), Image.BILINEAR)
+        return np.asarray(img, dtype=np.uint8).transpose(2, 0, 1)
+
+
+def _read_index(cache_dir: Path) -> Optional[dict]:
+    try:
+        with open(cache_dir / "index.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def build_split_cache(
+    split_dir: str | Path,
+    cache_dir: str | Path,
+    image_size: int = DEFAULT_IMAGE_SIZE,
+    shard_images: int = TRAIN_CACHE_SHARD_IMAGES,
+    workers: Optional[int] = None,
+    folder: Optional[datasets.ImageFolder] = None,
+) -> dict:
+    """
+    Dựng cache cho một split (thư mục dạng ImageFolder) nếu chưa có hoặc đã cũ; trả về index.
+    folder: danh sách lớp/file đã có sẵn (vd. từ manifest), mặc định quét split_dir
+    """
+    split_dir = Path(split_dir)
+    cache_dir = Path(cache_dir)
+    folder = folder if folder is not None else datasets.ImageFolder(str(split_dir))
+    fingerprint = source_fingerprint(split_dir, folder.samples, image_size)
+
+    index = _read_index(cache_dir)
+    if index is not None and index.get("fingerprint") == fingerprint and all(
+        (cache_dir / s["file"]).exists() for s in index["shards"]
+    ):
+        return index
+
+    print(f"[SHARD_CACHE] Giải mã {len(folder.samples)} ảnh từ {split_dir} -> {cache_dir}")
+    tmp_dir = cache_dir.with_name(f"{cache_dir.name}.tmp{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+
+    def load(sample: Tuple[str, int]) -> Optional[np.ndarray]:
+        try:
+            return decode_image(sample[0], image_size)
+        except Exception as e:
+            print(f"[SHARD_CACHE] Bỏ qua ảnh lỗi {sample[0]}: {e}")
+            return None
+
+    shards: List[dict] = []
+    labels: List[int] = []
+    failed: List[str] = []
+    with ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1)) as pool:
+        for start in range(0, len(folder.samples), shard_images):
+            chunk = folder.samples[start:start + shard_images]
+            decoded = list(pool.map(load, chunk))
+            ok = [(img, sample) for img, sample in zip(decoded, chunk) if img is not None]
+            failed.extend(sample[0] for img, sample in zip(decoded, chunk) if img is None)
+            if not ok:
+                continue
+            name = f"shard_{len(shards):05d}.npy"
+            array = np.lib.format.open_memmap(
+                tmp_dir / name, mode="w+", dtype=np.uint8, shape=(len(ok), 3, image_size, image_size)
+            )
+            for i, (img, _) in enumerate(ok):
+                array[i] = img
+            array.flush()
+            del array
+            shards.append({"file": name, "count": len(ok)})
+            labels.extend(sample[1] for _, sample in ok)
+
+    np.save(tmp_dir / "labels.npy", np.asarray(labels, dtype=np.int64))
+    index = {
+        "format_version": FORMAT_VERSION,
+        "fingerprint": fingerprint,
+        "source": str(split_dir.resolve()),
+        "image_size": image_size,
+        "classes": folder.classes,
+        "count": len(labels),
+        "shards": shards,
+        "failed": failed,
+    }
+    with open(tmp_dir / "index.json", "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False, indent=2)
+
+    # Thay cache cũ bằng bản mới dựng xong
+    shutil.rmtree(cache_dir, ignore_errors=True)
+    os.replace(tmp_dir, cache_dir)
+    return index
+
+
+class CachedImageDataset(Dataset):
+    """Dataset đọc ảnh uint8 từ shard memmap; transform (nếu có) nhận và trả về ảnh PIL"""
+
+    def __init__(self, cache_dir: str | Path, transform: Optional[Callable[[Image.Image], Image.Image]] = None):
+        self.cache_dir = Path(cache_dir)
+        index = _read_index(self.cache_dir)
+        if index is None:
+            raise FileNotFoundError(f"Chưa có cache tại {self.cache_dir}")
+        self.classes: List[str] = index["classes"]
+        self.class_to_idx = {c: i for i, c in enumerate(self.classes)}
+        self.image_size: int = index["image_size"]
+        self.transform = transform
+        self._files = [s["file"] for s in index["shards"]]
+        self._offsets = np.cumsum([0] + [s["count"] for s in index["shards"]]).tolist()
+        self.targets: List[int] = np.load(self.cache_dir / "labels.npy").tolist()
+        self._arrays: Optional[List[np.ndarray]] = None
+
+    def __getstate__(self):
+        # Mỗi worker của DataLoader tự mở memmap của mình
+        state = self.__dict__.copy()
+        state["_arrays"] = None
+        return state
+
+    def _shards(self) -> List[np.ndarray]:
+        if self._arrays is None:
+            self._arrays = [np.load(self.cache_dir / f, mmap_mode="r") for f in self._files]
+        return self._arrays
+
+    def __len__(self) -> int:
+        return len(self.targets)
+
+    def get_uint8(self, idx: int) -> torch.Tensor:
+        shard = bisect.bisect_right(self._offsets, idx) - 1
+        return torch.from_numpy(np.array(self._shards()[shard][idx - self._offsets[shard]]))
+
+    def __getitem__(self, idx: int) -> Tuple[torch.Tensor, int]:
+        image = self.get_uint8(idx)
+        if self.transform is not None:
+            # Augmentation PIL nhanh hơn bản tensor trên CPU (xoay, chỉnh màu)
+            augmented = self.transform(Image.fromarray(image.permute(1, 2, 0).numpy()))
+            image = torch.from_numpy(np.asarray(augmented, dtype=np.uint8).transpose(2, 0, 1).copy())
+        return normalize_uint8(image), self.targets[idx]
+
+
+def cache_dir_for(dataset_dir: str | Path) -> Path:
+    """Thư mục cache riêng cho mỗi dataset (theo đường dẫn tuyệt đối)"""
+    resolved = str(Path(dataset_dir).resolve())
+    return TRAIN_CACHE_DIR / f"{Path(resolved).name}-{hashlib.sha1(resolved.encode()).hexdigest()[:10]}"
+
+
+def cached_datasets(
+    dataset_dir: str | Path, image_size: int = DEFAULT_IMAGE_SIZE, manifest: Optional[DatasetManifest] = None
+) -> Tuple[CachedImageDataset, CachedImageDataset]:
+    """(train, val) đọc từ cache, dựng lại cache nếu thư mục nguồn đã thay đổi"""
+    dataset_dir = Path(dataset_dir)
+    root = cache_dir_for(dataset_dir)
+    for split in ("train", "val"):
+        folder = manifest.image_folder(split) if manifest is not None else None
+        build_split_cache(dataset_dir / split, root / split, image_size, folder=folder)
+    train_ds = CachedImageDataset(root / "train", transform=train_augmentation(image_size))
+    val_ds = CachedImageDataset(root / "val")
+    return train_ds, val_ds
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Dựng cache ảnh đã giải mã cho dataset train/val")
+    parser.add_argument("dataset_dir", help="Thư mục chứa train/ và val/")
+    parser.add_argument("--image-size", type=int, default=DEFAULT_IMAGE_SIZE)
+    args = parser.parse_args()
+    root = cache_dir_for(args.dataset_dir)
+    for split in ("train", "val"):
+        index = build_split_cache(Path(args.dataset_dir) / split, root / split, args.image_size)
+        print(f"{split}: {index['count']} ảnh, {len(index['shards'])} shard, {len(index['failed'])} lỗi -> {root / split}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,275 @@
+"""
+Dò siêu tham số (num_epochs, batch_size, learning_rate, unfrozen_blocks) bằng successive halving.
+
+- Không gian tìm kiếm: mỗi tham số là danh sách giá trị, hoặc {"low", "high", "log"} để lấy ngẫu nhiên;
+  lưới đủ nhỏ thì chạy hết, lớn hơn thì lấy ngẫu nhiên n_trials cấu hình
+- Các trial chạy song song trong tiến trình riêng, mỗi tiến trình ghim vào một phần CPU của ngân sách
+  (CPU được cấp chia cho TRAIN_SWEEP_CPUS_PER_TRIAL CPU mỗi trial)
+- Manifest và cache ảnh đã giải mã được dựng một lần trước khi chạy, mọi trial đọc chung memmap
+- Successive halving: mọi trial chạy tới mốc min_epochs, chỉ 1/eta trial có best_acc cao nhất chạy tiếp
+  tới mốc min_epochs*eta... (trial dừng ở mốc nhờ checkpoint, chạy tiếp bằng resume), còn lại bị loại
+- Kết quả: bảng xếp hạng MODEL_DIR/sweep_leaderboard.json, mô hình của trial tốt nhất ghi vào
+  MODEL_PATH/LABELS_PATH như /train
+
+    python -m app.training.sweep datasets --space space.json --trials 9
+    space.json: {"learning_rate": {"low": 1e-4, "high": 3e-3, "log": true}, "batch_size": [16, 32],
+                 "unfrozen_blocks": [2, 4, 6], "num_epochs": [6, 9]}
+"""
+
+from __future__ import annotations
+
+import argparse
+import itertools
+import json
+import math
+import os
+import random
+import shutil
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+from typing import Callable, Dict, List, Optional, Sequence
+
+import torch
+import torch.multiprocessing as mp
+
+from ..config import (
+    DEFAULT_IMAGE_SIZE, LABELS_PATH, MODEL_DIR, MODEL_PATH, TRAIN_SWEEP_CPUS_PER_TRIAL, TRAIN_SWEEP_ETA,
+    TRAIN_SWEEP_MIN_EPOCHS,
+)
+from .checkpoint import model_arch, run_dir_for, save_model_arch
+from .manifest import load_manifest
+from .perf import available_cpus
+from .shard_cache import cached_datasets
+
+LEADERBOARD_NAME = "sweep_leaderboard.json"
+
+DEFAULT_SPACE: Dict[str, object] = {
+    "num_epochs": [5, 10],
+    "batch_size": [16, 32],
+    "learning_rate": {"low": 1e-4, "high": 3e-3, "log": True},
+    "unfrozen_blocks": [2, 4, 6],
+}
+PARAMS = ("num_epochs", "batch_size", "learning_rate", "unfrozen_blocks")
+
+
+class _RungReached(Exception):
+    """Trial đã tới mốc của vòng hiện tại (checkpoint đã được ghi)"""
+
+
+def sample_configs(space: Dict[str, object], n_trials: int, seed: int = 0) -> List[dict]:
+    """Cấu hình các trial: cả lưới nếu lưới có tối đa n_trials điểm, ngược lại lấy ngẫu nhiên không lặp"""
+    unknown = set(space) - set(PARAMS)
+    if unknown:
+        raise ValueError(f"Tham số không hỗ trợ: {sorted(unknown)}")
+    rng = random.Random(seed)
+    if all(isinstance(v, list) for v in space.values()):
+        grid = [dict(zip(space, values)) for values in itertools.product(*space.values())]
+        if len(grid) <= n_trials:
+            return grid
+        return rng.sample(grid, n_trials)
+
+    def draw(spec):
+        if isinstance(spec, list):
+            return rng.choice(spec)
+        low, high = float(spec["low"]), float(spec["high"])
+        if spec.get("log"):
+            return float(math.exp(rng.uniform(math.log(low), math.log(high))))
+        return rng.uniform(low, high)
+
+    configs = [{name: draw(spec) for name, spec in space.items()} for _ in range(n_trials)]
+    # Khoảng {"low", "high"} của tham số nguyên (epoch, batch, số block) làm tròn
+    return [{k: v if k == "learning_rate" else int(round(v)) for k, v in c.items()} for c in configs]
+
+
+def _init_worker(slots) -> None:
+    # Mỗi tiến trình của pool nhận một phần CPU riêng
+    cpus = slots.get()
+    if hasattr(os, "sched_setaffinity"):
+        os.sched_setaffinity(0, cpus)
+    torch.set_num_threads(len(cpus))
+
+
+def _run_trial(dataset_dir: str, trial: dict, stop_at: int) -> dict:
+    """Train trial tới epoch stop_at (chạy tiếp từ checkpoint nếu đã train một phần)"""
+    from .train import train_model
+
+    progress: List[dict] = []
+
+    def on_epoch(metrics: dict) -> None:
+        progress.append(metrics)
+        if metrics["epoch"] >= stop_at and metrics["epoch"] < metrics["num_epochs"]:
+            raise _RungReached()
+
+    trial_dir = Path(trial["dir"])
+    started = time.perf_counter()
+    try:
+        train_model(
+            dataset_dir, **trial["params"], use_cache=True, cache_features=False, streaming=False,
+            on_epoch=on_epoch, resume=trial["epochs_done"] > 0, run_dir=str(trial_dir),
+            # Dừng ở mốc bất kỳ -> cần checkpoint mỗi epoch để vòng sau chạy tiếp (không theo TRAIN_CHECKPOINT_EVERY)
+            checkpoint_every=1,
+            model_path=str(trial_dir / "best.pt"), labels_path=str(trial_dir / "labels.txt"),
+        )
+    except _RungReached:
+        pass
+    except Exception as e:
+        traceback.print_exc()
+        return {"progress": progress, "error": f"{type(e).__name__}: {e}", "seconds": time.perf_counter() - started}
+    return {"progress": progress, "seconds": time.perf_counter() - started}
+
+
+def _cpu_slots(cpus: Sequence[int], cpus_per_trial: int) -> List[List[int]]:
+    cpus = list(cpus)
+    count = max(1, len(cpus) // max(1, cpus_per_trial))
+    per_slot = max(1, len(cpus) // count)
+    return [cpus[i * per_slot:(i + 1) * per_slot] for i in range(count)]
+
+
+def _install(trial: dict, model_path: Path, labels_path: Path) -> None:
+    """Chép mô hình của trial thắng vào thư mục models (file tạm rồi thay thế)"""
+    trial_dir = Path(trial["dir"])
+    for src, dst in ((trial_dir / "best.pt", model_path), (trial_dir / "labels.txt", labels_path)):
+        dst.parent.mkdir(parents=True, exist_ok=True)
+        tmp = dst.with_name(f".{dst.name}.tmp{os.getpid()}")
+        shutil.copyfile(src, tmp)
+        os.replace(tmp, dst)
+    save_model_arch(model_path, model_arch(trial_dir / "best.pt"))
+
+
+def _leaderboard(trials: List[dict]) -> List[dict]:
+    rows = sorted(trials, key=lambda t: (-t["best_acc"], t["id"]))
+    return [{k: v for k, v in t.items() if k != "dir"} for t in rows]
+
+
+def run_sweep(
+    dataset_dir: str,
+    space: Optional[Dict[str, object]] = None,
+    n_trials: int = 8,
+    min_epochs: int = TRAIN_SWEEP_MIN_EPOCHS,
+    eta: int = TRAIN_SWEEP_ETA,
+    cpus: Optional[Sequence[int]] = None,
+    cpus_per_trial: int = TRAIN_SWEEP_CPUS_PER_TRIAL,
+    sweep_dir: Optional[str] = None,
+    install: bool = True,
+    seed: int = 0,
+    on_epoch: Optional[Callable[[dict], None]] = None,
+    on_stage: Optional[Callable[[dict], None]] = None,
+) -> dict:
+    """
+    space: không gian tìm kiếm (mặc định DEFAULT_SPACE); cpus: CPU dành cho sweep (mặc định CPU được cấp);
+    sweep_dir: thư mục checkpoint các trial; install: ghi mô hình thắng vào MODEL_PATH/LABELS_PATH.
+    on_epoch nhận số liệu từng epoch của mọi trial (kèm "trial"), on_stage nhận trạng thái các vòng.
+    """
+    configs = sample_configs(space or DEFAULT_SPACE, n_trials, seed)
+    eta = max(2, eta)
+    if sweep_dir is None:
+        run_dir = run_dir_for(dataset_dir)
+        sweep_dir = run_dir.with_name(f"{run_dir.name}-sweep")
+    sweep_dir = Path(sweep_dir)
+    # Checkpoint/mô hình của lần sweep trước không được lẫn vào lần này
+    shutil.rmtree(sweep_dir, ignore_errors=True)
+    trials = [{
+        "id": i, "params": params, "status": "running", "epochs_done": 0, "best_acc": 0.0, "val_acc": [],
+        "seconds": 0.0, "dir": str(sweep_dir / f"trial-{i:03d}"),
+    } for i, params in enumerate(configs)]
+
+    # Dựng manifest + cache ảnh đã giải mã một lần, các trial chỉ đọc
+    manifest = load_manifest(dataset_dir)
+    cached_datasets(dataset_dir, DEFAULT_IMAGE_SIZE, manifest)
+
+    cpus = list(cpus) if cpus else (sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity")
+                                    else list(range(available_cpus())))
+    slots = _cpu_slots(cpus, cpus_per_trial)
+    print(f"[SWEEP] {len(trials)} trial, {len(slots)} trial song song x {len(slots[0])} CPU -> {sweep_dir}")
+    pool = None
+    if len(slots) > 1:
+        ctx = mp.get_context("spawn")
+        queue = ctx.Queue()
+        for slot in slots:
+            queue.put(slot)
+        pool = ProcessPoolExecutor(len(slots), mp_context=ctx, initializer=_init_worker, initargs=(queue,))
+
+    rung, milestone = 0, max(1, min_epochs)
+    try:
+        active = list(trials)
+        while active:
+            jobs = [(t, min(milestone, t["params"]["num_epochs"])) for t in active]
+            if pool is not None:
+                futures = [pool.submit(_run_trial, dataset_dir, t, stop_at) for t, stop_at in jobs]
+                outcomes = [f.result() for f in futures]
+            else:
+                outcomes = [_run_trial(dataset_dir, t, stop_at) for t, stop_at in jobs]
+
+            for (trial, _), outcome in zip(jobs, outcomes):
+                trial["seconds"] += outcome["seconds"]
+                for metrics in outcome["progress"]:
+                    trial["epochs_done"] = metrics["epoch"]
+                    trial["best_acc"] = metrics["best_acc"]
+                    trial["val_acc"].append(metrics["val_acc"])
+                    if on_epoch is not None:
+                        on_epoch({**metrics, "trial": trial["id"], "rung": rung})
+                if "error" in outcome:
+                    trial.update(status="failed", error=outcome["error"])
+                elif trial["epochs_done"] >= trial["params"]["num_epochs"]:
+                    trial["status"] = "completed"
+
+            # Chỉ 1/eta trial tốt nhất còn đang chạy được đi tiếp, còn lại bị loại ở mốc này
+            running = sorted((t for t in trials if t["status"] == "running"), key=lambda t: (-t["best_acc"], t["id"]))
+            keep = math.ceil(len(running) / eta)
+            for trial in running[keep:]:
+                trial.update(status="pruned", pruned_at=trial["epochs_done"])
+            active = running[:keep]
+            print(f"[SWEEP] Vòng {rung} (mốc {milestone} epoch): {len(active)} trial chạy tiếp, "
+                  f"loại {len(running) - keep}")
+            if on_stage is not None:
+                on_stage({f"rung_{rung}": {"milestone": milestone, "kept": [t["id"] for t in active],
+                                           "pruned": [t["id"] for t in running[keep:]]}})
+            rung, milestone = rung + 1, milestone * eta
+    finally:
+        if pool is not None:
+            pool.shutdown(cancel_futures=True)
+
+    leaderboard = _leaderboard(trials)
+    best = next((t for t in leaderboard if t["status"] != "failed" and t["epochs_done"] > 0), None)
+    if best is None:
+        raise RuntimeError("Không trial nào train thành công")
+    winner = trials[best["id"]]
+    if install:
+        _install(winner, MODEL_PATH, LABELS_PATH)
+    MODEL_DIR.mkdir(parents=True, exist_ok=True)
+    report = {
+        "dataset_dir": str(dataset_dir), "min_epochs": min_epochs, "eta": eta, "cpus": cpus,
+        "best": best, "installed": str(MODEL_PATH) if install else None, "trials": leaderboard,
+    }
+    leaderboard_path = MODEL_DIR / LEADERBOARD_NAME
+    tmp = leaderboard_path.with_name(f".{leaderboard_path.name}.tmp{os.getpid()}")
+    tmp.write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    os.replace(tmp, leaderboard_path)
+    print(f"[SWEEP] Tốt nhất: trial {best['id']} best_acc={best['best_acc']:.4f} {best['params']}")
+    return {"best_acc": best["best_acc"], "best_params": best["params"], "leaderboard": str(leaderboard_path),
+            "classes": Path(winner["dir"], "labels.txt").read_text(encoding="utf-8").splitlines()}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Dò siêu tham số bằng successive halving")
+    parser.add_argument("dataset_dir")
+    parser.add_argument("--space", help="File JSON không gian tìm kiếm (mặc định DEFAULT_SPACE)")
+    parser.add_argument("--trials", type=int, default=8)
+    parser.add_argument("--min-epochs", type=int, default=TRAIN_SWEEP_MIN_EPOCHS)
+    parser.add_argument("--eta", type=int, default=TRAIN_SWEEP_ETA)
+    parser.add_argument("--cpus-per-trial", type=int, default=TRAIN_SWEEP_CPUS_PER_TRIAL)
+    parser.add_argument("--no-install", action="store_true", help="Không ghi đè mô hình đang phục vụ")
+    args = parser.parse_args()
+    space = None
+    if args.space:
+        with open(args.space, "r", encoding="utf-8") as f:
+            space = json.load(f)
+    result = run_sweep(args.dataset_dir, space, args.trials, args.min_epochs, args.eta,
+                       cpus_per_trial=args.cpus_per_trial, install=not args.no_install)
+    print(json.dumps({k: v for k, v in result.items() if k != "classes"}, ensure_ascii=False, indent=2))
+
+
+if __name__ == "__main__":
+    main()
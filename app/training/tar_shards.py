@@ -0,0 +1,213 @@
+"""
+Dataset đóng gói thành vài shard tar lớn để đọc tuần tự khi huấn luyện (thay vì mở từng file nhỏ).
+
+- pack_shards: ảnh train/val (danh sách lấy từ manifest) được xáo trộn một lần rồi ghi nguyên bytes vào
+  <split>-00000.tar, <split>-00001.tar...; index.json chứa lớp, số ảnh và nhãn từng ảnh của mỗi shard
+  cùng fingerprint manifest (dataset thay đổi thì đóng gói lại)
+- TarShardDataset (IterableDataset): mỗi epoch xáo thứ tự shard, chia shard cho các worker của DataLoader
+  (và các rank khi huấn luyện data-parallel),
+  đọc tuần tự từng tar (streaming) và trộn thêm bằng shuffle buffer
+
+Đóng gói trước (không bắt buộc, train_model(streaming=True) tự đóng gói khi cần):
+    python -m app.training.tar_shards datasets
+"""
+
+from __future__ import annotations
+
+import argparse
+import hashlib
+import io
+import json
+import os
+import random
+import shutil
+import tarfile
+from pathlib import Path
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import torch
+from PIL import Image
+from torch.utils.data import IterableDataset, get_worker_info
+
+from ..config import TRAIN_TAR_SHARD_IMAGES, TRAIN_SHUFFLE_BUFFER
+from .distributed import get_rank, get_world_size
+from .manifest import DatasetManifest, load_manifest
+from .shard_cache import cache_dir_for
+
+FORMAT_VERSION = 1
+SPLITS = ("train", "val")
+
+
+def manifest_fingerprint(manifest: DatasetManifest) -> str:
+    h = hashlib.sha1(str(FORMAT_VERSION).encode())
+    for rel in sorted(manifest.entries):
+        e = manifest.entries[rel]
+        h.update(f"|{rel}|{e['size']}|{e['mtime_ns']}|{e['valid']}".encode())
+    return h.hexdigest()
+
+
+def _read_index(shard_dir: Path) -> Optional[dict]:
+    try:
+        with open(shard_dir / "index.json", "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def pack_shards(
+    dataset_dir: str | Path,
+    shard_dir: Optional[str | Path] = None,
+    shard_images: int = TRAIN_TAR_SHARD_IMAGES,
+    manifest: Optional[DatasetManifest] = None,
+    seed: int = 0,
+) -> dict:
+    """Đóng gói train/val thành shard tar nếu chưa có hoặc đã cũ; trả về index"""
+    manifest = manifest or load_manifest(dataset_dir)
+    shard_dir = Path(shard_dir) if shard_dir is not None else cache_dir_for(dataset_dir) / "tar"
+    fingerprint = manifest_fingerprint(manifest)
+    index = _read_index(shard_dir)
+    if index is not None and index.get("fingerprint") == fingerprint and all(
+        (shard_dir / s["file"]).exists() for split in SPLITS for s in index["splits"][split]
+    ):
+        return index
+
+    classes = manifest.classes()
+    tmp_dir = shard_dir.with_name(f"{shard_dir.name}.tmp{os.getpid()}")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    tmp_dir.mkdir(parents=True)
+    index = {"format_version": FORMAT_VERSION, "fingerprint": fingerprint, "classes": classes, "splits": {}}
+    for split in SPLITS:
+        samples = manifest.samples(split)
+        # Xáo trước khi ghi để mỗi shard trộn đủ lớp (đọc tuần tự vẫn ra batch đa dạng)
+        random.Random(seed).shuffle(samples)
+        print(f"[TAR_SHARDS] Đóng gói {len(samples)} ảnh {split} -> {shard_dir}")
+        shards = []
+        for start in range(0, len(samples), shard_images):
+            chunk = samples[start:start + shard_images]
+            name = f"{split}-{len(shards):05d}.tar"
+            with tarfile.open(tmp_dir / name, "w") as tar:
+                for i, (path, _) in enumerate(chunk):
+                    tar.add(path, arcname=f"{start + i:08d}{Path(path).suffix.lower()}")
+            shards.append({"file": name, "count": len(chunk), "labels": [label for _, label in chunk]})
+        index["splits"][split] = shards
+    with open(tmp_dir / "index.json", "w", encoding="utf-8") as f:
+        json.dump(index, f, ensure_ascii=False)
+
+    shutil.rmtree(shard_dir, ignore_errors=True)
+    os.replace(tmp_dir, shard_dir)
+    return index
+
+
+class TarShardDataset(IterableDataset):
+    """Đọc tuần tự các shard tar của một split; transform nhận ảnh PIL"""
+
+    def __init__(
+        self,
+        shard_dir: str | Path,
+        split: str,
+        transform: Optional[Callable[[Image.Image], torch.Tensor]] = None,
+        shuffle: bool = True,
+        shuffle_buffer: int = TRAIN_SHUFFLE_BUFFER,
+    ):
+        self.shard_dir = Path(shard_dir)
+        index = _read_index(self.shard_dir)
+        if index is None:
+            raise FileNotFoundError(f"Chưa có shard tại {self.shard_dir}")
+        self.classes: List[str] = index["classes"]
+        self.class_to_idx = {c: i for i, c in enumerate(self.classes)}
+        self.shards: List[dict] = index["splits"][split]
+        self.targets: List[int] = [label for s in self.shards for label in s["labels"]]
+        self.transform = transform
+        self.shuffle = shuffle
+        self.shuffle_buffer = shuffle_buffer
+        # Huấn luyện data-parallel: split train chia shard theo rank (val chỉ chạy ở rank 0, đọc đủ)
+        self.rank, self.world_size = (get_rank(), get_world_size()) if shuffle else (0, 1)
+        self._epoch = 0
+
+    def __len__(self) -> int:
+        return len(self.targets)
+
+    def set_epoch(self, epoch: int) -> None:
+        """Đặt số epoch cho lần lặp kế tiếp (train_model gọi trước mỗi epoch, kể cả khi resume)"""
+        self._epoch = epoch
+
+    def _read_shard(self, shard: dict) -> Iterator[Tuple[Image.Image, int]]:
+        # "r|": đọc tar như stream, không seek
+        with tarfile.open(self.shard_dir / shard["file"], "r|") as tar:
+            for member, label in zip(tar, shard["labels"]):
+                data = tar.extractfile(member).read()
+                with Image.open(io.BytesIO(data)) as img:
+                    yield img.convert("RGB"), label
+
+    def __iter__(self) -> Iterator[Tuple[torch.Tensor, int]]:
+        info = get_worker_info()
+        # Mọi worker dùng chung seed gốc của epoch -> cùng thứ tự shard, mỗi worker lấy phần của mình
+        if info is not None:
+            base_seed, worker_id, num_workers = info.seed - info.id, info.id, info.num_workers
+        else:
+            base_seed, worker_id, num_workers = torch.initial_seed(), 0, 1
+        # Data-parallel: shard chia cho (rank, worker); seed DataLoader khác nhau giữa các rank nên chỉ dùng số epoch
+        rank, world_size = self.rank, self.world_size
+        if world_size > 1:
+            base_seed = 0
+        # Trộn số epoch vào seed: persistent worker giữ nguyên info.seed qua các epoch, bản dataset trong
+        # worker tự tăng _epoch mỗi lần lặp nên thứ tự vẫn đổi theo epoch
+        base_seed += self._epoch
+        self._epoch += 1
+        rng = random.Random(base_seed * 1000003 + rank * num_workers + worker_id)
+        order = list(range(len(self.shards)))
+        if self.shuffle:
+            random.Random(base_seed).shuffle(order)
+        mine = order[rank * num_workers + worker_id::world_size * num_workers]
+
+        buffer: List[Tuple[Image.Image, int]] = []
+        for shard_idx in mine:
+            for sample in self._read_shard(self.shards[shard_idx]):
+                if not self.shuffle or self.shuffle_buffer <= 1:
+                    yield self._apply(sample)
+                    continue
+                if len(buffer) < self.shuffle_buffer:
+                    buffer.append(sample)
+                    continue
+                # Buffer đầy: trả một phần tử ngẫu nhiên, chỗ trống nhận ảnh mới
+                pos = rng.randrange(len(buffer))
+                buffer[pos], sample = sample, buffer[pos]
+                yield self._apply(sample)
+        rng.shuffle(buffer)
+        for sample in buffer:
+            yield self._apply(sample)
+
+    def _apply(self, sample: Tuple[Image.Image, int]):
+        image, label = sample
+        return (self.transform(image) if self.transform is not None else image), label
+
+
+def streaming_datasets(
+    dataset_dir: str | Path,
+    train_transform: Callable,
+    val_transform: Callable,
+    manifest: Optional[DatasetManifest] = None,
+) -> Tuple[TarShardDataset, TarShardDataset]:
+    """(train, val) đọc từ shard tar, đóng gói lại nếu dataset đã thay đổi"""
+    shard_dir = cache_dir_for(dataset_dir) / "tar"
+    pack_shards(dataset_dir, shard_dir, manifest=manifest)
+    return (
+        TarShardDataset(shard_dir, "train", transform=train_transform),
+        TarShardDataset(shard_dir, "val", transform=val_transform, shuffle=False),
+    )
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Đóng gói train/val thành shard tar để đọc tuần tự")
+    parser.add_argument("dataset_dir", help="Thư mục chứa train/ và val/")
+    parser.add_argument("--shard-images", type=int, default=TRAIN_TAR_SHARD_IMAGES)
+    args = parser.parse_args()
+    shard_dir = cache_dir_for(args.dataset_dir) / "tar"
+    index = pack_shards(args.dataset_dir, shard_dir, args.shard_images)
+    for split in SPLITS:
+        shards = index["splits"][split]
+        print(f"{split}: {sum(s['count'] for s in shards)} ảnh, {len(shards)} shard -> {shard_dir}")
+
+
+if __name__ == "__main__":
+    main()
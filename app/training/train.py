@@ -1,19 +1,39 @@
 from __future__ import annotations
+import contextlib
 from pathlib import Path
-from typing import Tuple
+import time
+from typing import Callable, Optional, Tuple
 import torch
+import torch.distributed as dist
+from torch.nn.parallel import DistributedDataParallel
 from torch.utils.data import DataLoader
-from torchvision import datasets, transforms
+from torchvision import transforms
 from torchvision.models import mobilenet_v3_large, MobileNet_V3_Large_Weights
 
-from ..config import MODEL_DIR, MODEL_PATH, LABELS_PATH, DEFAULT_IMAGE_SIZE
+from ..config import (
+    MODEL_DIR, MODEL_PATH, LABELS_PATH, DEFAULT_IMAGE_SIZE, TRAIN_CACHE_ENABLED,
+    TRAIN_FEATURE_CACHE, TRAIN_FEATURE_VARIANTS, TRAIN_STREAMING, TRAIN_CHECKPOINT_EVERY,
+)
+from .checkpoint import (
+    atomic_save, clear_checkpoint, load_checkpoint, restore_rng_state, rng_state, run_dir_for, save_checkpoint,
+    save_model_arch,
+)
+from .distributed import (
+    DistributedWeightedSampler, all_reduce_sum, get_rank, get_world_size, is_distributed, shared_seed,
+)
+from .feature_cache import TailModel, cached_features, frozen_prefix
+from .manifest import DatasetManifest, load_manifest
+from .perf import (
+    PerfSettings, apply_threads, autocast, describe, loader_kwargs, prepare_inputs, prepare_model, resolve_settings,
+)
+from .shard_cache import cached_datasets
+from .tar_shards import streaming_datasets
 
+# Số block cuối của backbone được fine-tune cùng classifier
+UNFROZEN_BLOCKS = 4
 
-def _build_dataloaders(dataset_dir: str, batch_size: int) -> Tuple[DataLoader, DataLoader, int, list[str]]:
-    dataset_dir = Path(dataset_dir)
-    train_dir = dataset_dir / "train"
-    val_dir = dataset_dir / "val"
 
+def _transforms():
     train_tf = transforms.Compose([
         transforms.RandomResizedCrop(DEFAULT_IMAGE_SIZE, scale=(0.7, 1.0)),
         transforms.RandomHorizontalFlip(),
@@ -27,42 +47,152 @@ def _build_dataloaders(dataset_dir: str, batch_size: int) -> Tuple[DataLoader, D
         transforms.ToTensor(),
         transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
     ])
+    return train_tf, val_tf
+
+
+def _build_datasets(dataset_dir: Path, use_cache: bool, manifest: Optional[DatasetManifest] = None):
+    # Danh sách lớp/file lấy từ manifest (chỉ ảnh hợp lệ), không quét lại thư mục
+    manifest = manifest or load_manifest(dataset_dir)
+    if use_cache:
+        # Ảnh đã giải mã sẵn trong shard memmap, chỉ còn augmentation trên tensor
+        return cached_datasets(dataset_dir, DEFAULT_IMAGE_SIZE, manifest)
+
+    train_tf, val_tf = _transforms()
+    train_ds = manifest.image_folder("train", transform=train_tf)
+    val_ds = manifest.image_folder("val", transform=val_tf)
+    return train_ds, val_ds
+
+
+def _build_dataloaders(
+    dataset_dir: str,
+    batch_size: int,
+    use_cache: Optional[bool] = None,
+    manifest: Optional[DatasetManifest] = None,
+    streaming: Optional[bool] = None,
+    loader_options: Optional[dict] = None,
+    sampler_seed: Optional[int] = None,
+) -> Tuple[DataLoader, DataLoader, int, list[str]]:
+    dataset_dir = Path(dataset_dir)
+    # Số worker, persistent workers, prefetch, pin_memory (xem perf.loader_kwargs)
+    loader_options = loader_options or loader_kwargs(
+        PerfSettings(), torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    )
+    if TRAIN_STREAMING if streaming is None else streaming:
+        # Đọc tuần tự từ shard tar; IterableDataset không dùng sampler (cân bằng lớp nhờ class weight của loss)
+        train_ds, val_ds = streaming_datasets(dataset_dir, *_transforms(), manifest=manifest)
+        train_loader = DataLoader(train_ds, batch_size=batch_size, **loader_options)
+        val_loader = DataLoader(val_ds, batch_size=batch_size, **loader_options)
+        return train_loader, val_loader, len(train_ds.classes), train_ds.classes
 
-    train_ds = datasets.ImageFolder(str(train_dir), transform=train_tf)
-    val_ds = datasets.ImageFolder(str(val_dir), transform=val_tf)
+    train_ds, val_ds = _build_datasets(dataset_dir, TRAIN_CACHE_ENABLED if use_cache is None else use_cache, manifest)
 
     class_names = train_ds.classes
     num_classes = len(class_names)
 
+    train_loader = DataLoader(
+        train_ds,
+        batch_size=batch_size,
+        sampler=_weighted_sampler(train_ds.targets, num_classes, seed=sampler_seed),
+        shuffle=False,
+        **loader_options,
+    )
+    val_loader = DataLoader(val_ds, batch_size=batch_size, shuffle=False, **loader_options)
+
+    return train_loader, val_loader, num_classes, class_names
+
+
+def _weighted_sampler(
+    targets, num_classes: int, generator: Optional[torch.Generator] = None, seed: Optional[int] = None,
+):
     # Weighted sampling để cân bằng batch theo tần suất lớp
+    # seed: seed chung của các rank khi chạy data-parallel (distributed.shared_seed, lấy trong train_model)
     from torch.utils.data import WeightedRandomSampler
     import numpy as np
 
-    targets = [train_ds.samples[i][1] for i in range(len(train_ds))]
+    targets = list(targets)
     class_counts = np.bincount(targets, minlength=num_classes)
     class_counts[class_counts == 0] = 1
     weights_per_class = 1.0 / class_counts
     sample_weights = [weights_per_class[t] for t in targets]
-    sampler = WeightedRandomSampler(sample_weights, num_samples=len(sample_weights), replacement=True)
+    if is_distributed():
+        # Mỗi rank lấy một phần của cùng một dãy lấy mẫu
+        if seed is None:
+            raise ValueError("Huấn luyện data-parallel cần seed chung cho sampler")
+        return DistributedWeightedSampler(sample_weights, get_rank(), get_world_size(), seed)
+    if generator is None:
+        # Generator riêng để checkpoint lưu/khôi phục được thứ tự lấy mẫu
+        generator = torch.Generator()
+        generator.manual_seed(int(torch.randint(2 ** 62, ()).item()))
+    return WeightedRandomSampler(
+        sample_weights, num_samples=len(sample_weights), replacement=True, generator=generator
+    )
 
+
+def _build_feature_dataloaders(
+    dataset_dir: str, batch_size: int, prefix: torch.nn.Module, variants: int, device: torch.device,
+    manifest: Optional[DatasetManifest] = None, sampler_seed: Optional[int] = None,
+) -> Tuple[DataLoader, DataLoader, int, list[str]]:
+    # Activation đọc từ memmap, không cần worker riêng
+    train_ds, val_ds = cached_features(dataset_dir, prefix, variants, DEFAULT_IMAGE_SIZE, device, manifest)
+    class_names = train_ds.classes
+    num_classes = len(class_names)
     train_loader = DataLoader(
-        train_ds,
-        batch_size=batch_size,
-        sampler=sampler,
+        train_ds, batch_size=batch_size, sampler=_weighted_sampler(train_ds.targets, num_classes, seed=sampler_seed),
         shuffle=False,
-        num_workers=2,
-        pin_memory=True,
     )
-    val_loader = DataLoader(val_ds, batch_size=batch_size, shuffle=False, num_workers=2, pin_memory=True)
-
+    val_loader = DataLoader(val_ds, batch_size=batch_size, shuffle=False)
     return train_loader, val_loader, num_classes, class_names
 
 
-def train_model(dataset_dir: str, num_epochs: int = 5, batch_size: int = 32, learning_rate: float = 5e-4) -> None:
+def train_model(
+    dataset_dir: str,
+    num_epochs: int = 5,
+    batch_size: int = 32,
+    learning_rate: float = 5e-4,
+    use_cache: Optional[bool] = None,
+    cache_features: Optional[bool] = None,
+    feature_variants: Optional[int] = None,
+    on_epoch: Optional[Callable[[dict], None]] = None,
+    streaming: Optional[bool] = None,
+    perf: Optional[bool] = None,
+    compile_model: Optional[bool] = None,
+    resume: bool = False,
+    run_dir: Optional[str] = None,
+    checkpoint_every: Optional[int] = None,
+    unfrozen_blocks: int = UNFROZEN_BLOCKS,
+    model_path: Optional[str] = None,
+    labels_path: Optional[str] = None,
+) -> dict:
+    """
+    use_cache: đọc ảnh từ cache đã giải mã (mặc định theo TRAIN_CACHE_ENABLED)
+    streaming: đọc tuần tự từ shard tar thay cho ảnh rời (mặc định theo TRAIN_STREAMING)
+    perf: chế độ tối ưu CPU — bf16 autocast, channels_last, số luồng theo worker (mặc định theo TRAIN_PERF_MODE);
+        compile_model: torch.compile (mặc định theo TRAIN_COMPILE)
+    cache_features: tính activation phần backbone đóng băng một lần rồi chỉ huấn luyện phần đuôi
+        (mặc định theo TRAIN_FEATURE_CACHE); feature_variants: số biến thể augment mỗi ảnh train
+    on_epoch: nhận số liệu sau mỗi epoch (loss, accuracy, ảnh/giây), dùng để báo tiến độ job
+    resume: chạy tiếp từ checkpoint trong run_dir (mặc định checkpoint.run_dir_for(dataset_dir));
+        checkpoint_every: số epoch giữa hai lần ghi checkpoint (mặc định TRAIN_CHECKPOINT_EVERY)
+    unfrozen_blocks: số block cuối của backbone được fine-tune cùng classifier
+    model_path, labels_path: nơi ghi mô hình tốt nhất (mặc định MODEL_PATH, LABELS_PATH)
+    """
     device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+    model_path = Path(model_path) if model_path else MODEL_PATH
+    labels_path = Path(labels_path) if labels_path else LABELS_PATH
     MODEL_DIR.mkdir(parents=True, exist_ok=True)
-
-    train_loader, val_loader, num_classes, class_names = _build_dataloaders(dataset_dir, batch_size)
+    cache_features = TRAIN_FEATURE_CACHE if cache_features is None else cache_features
+    # Chạy data-parallel (distributed.train_distributed): rank 0 dựng cache trước, validation và ghi file
+    distributed = is_distributed()
+    is_main = get_rank() == 0
+    # Collective đầu tiên, mọi rank gọi cùng thứ tự (trước barrier chờ rank 0 dựng cache)
+    sampler_seed = shared_seed() if distributed else None
+    if distributed and not is_main:
+        dist.barrier()
+    # Kiểm tra lại ảnh mới/đã sửa một lần; lớp, số ảnh và danh sách file đều đọc từ manifest
+    manifest = load_manifest(dataset_dir)
+    settings = resolve_settings(perf, compile_model)
+    apply_threads(settings)
+    print(f"[TRAIN] {describe(settings)} threads_in_use={torch.get_num_threads()}")
 
     model = mobilenet_v3_large(weights=MobileNet_V3_Large_Weights.DEFAULT)
     # Fine-tune sâu hơn: mở một số block cuối
@@ -72,77 +202,139 @@ def train_model(dataset_dir: str, num_epochs: int = 5, batch_size: int = 32, lea
     for param in model.classifier.parameters():
         param.requires_grad = True
     # optional: bật grad cho phần cuối của features (last 2 inverted residual blocks)
-    for layer in list(model.features.children())[-4:]:
+    for layer in list(model.features.children())[-unfrozen_blocks:]:
         for p in layer.parameters():
             p.requires_grad = True
 
+    if cache_features:
+        train_loader, val_loader, num_classes, class_names = _build_feature_dataloaders(
+            dataset_dir, batch_size, frozen_prefix(model, unfrozen_blocks),
+            feature_variants or TRAIN_FEATURE_VARIANTS, device, manifest, sampler_seed,
+        )
+    else:
+        train_loader, val_loader, num_classes, class_names = _build_dataloaders(
+            dataset_dir, batch_size, use_cache, manifest, streaming, loader_kwargs(settings, device), sampler_seed,
+        )
+    if distributed and is_main:
+        dist.barrier()
+
     num_features = model.classifier[3].in_features
     model.classifier[3] = torch.nn.Linear(num_features, num_classes)
     model = model.to(device)
+    # Ở chế độ cache activation, vòng lặp chỉ chạy phần đuôi (dùng chung trọng số với model)
+    net = TailModel(model, unfrozen_blocks) if cache_features else model
+    net = prepare_model(net, settings)
+    if distributed:
+        # Đồng bộ gradient giữa các rank (trọng số ban đầu lấy theo rank 0)
+        net = DistributedDataParallel(net)
 
     # Class weighting để giúp các lớp khó
-    # Đếm số ảnh mỗi lớp (hỗ trợ .jpg/.jpeg/.png)
-    class_counts = []
-    for c in class_names:
-        cls_dir = Path(dataset_dir) / 'train' / c
-        num_jpg = sum(1 for _ in cls_dir.glob('*.jpg'))
-        num_jpeg = sum(1 for _ in cls_dir.glob('*.jpeg'))
-        num_png = sum(1 for _ in cls_dir.glob('*.png'))
-        class_counts.append(num_jpg + num_jpeg + num_png)
+    # Số ảnh train hợp lệ mỗi lớp (theo manifest)
+    counts = manifest.class_counts("train")
+    class_counts = [counts.get(c, 0) for c in class_names]
     total = sum(class_counts)
     weights = [total / max(1, c) for c in class_counts]
     norm = sum(weights)
     weights = [w / norm for w in weights]
     criterion = torch.nn.CrossEntropyLoss(weight=torch.tensor(weights, dtype=torch.float32).to(device))
-    optimizer = torch.optim.AdamW(filter(lambda p: p.requires_grad, model.parameters()), lr=learning_rate)
+    optimizer = torch.optim.AdamW(filter(lambda p: p.requires_grad, net.parameters()), lr=learning_rate)
     scheduler = torch.optim.lr_scheduler.CosineAnnealingLR(optimizer, T_max=max(1, num_epochs))
 
+    run_dir = Path(run_dir) if run_dir else run_dir_for(dataset_dir)
+    checkpoint_every = max(1, checkpoint_every or TRAIN_CHECKPOINT_EVERY)
+    sampler_generator = getattr(train_loader.sampler, "generator", None)
     best_acc = 0.0
-    for epoch in range(num_epochs):
-        model.train()
+    start_epoch = 0
+    history: list[dict] = []
+    state = load_checkpoint(run_dir, map_location=device) if resume else None
+    if state is not None:
+        if state["classes"] != class_names:
+            raise ValueError(f"Checkpoint trong {run_dir} có lớp khác dataset hiện tại, không thể chạy tiếp")
+        model.load_state_dict(state["model"])
+        optimizer.load_state_dict(state["optimizer"])
+        scheduler.load_state_dict(state["scheduler"])
+        restore_rng_state(state["rng"], sampler_generator)
+        start_epoch, best_acc, history = state["epoch"], state["best_acc"], state["history"]
+        print(f"[TRAIN] Chạy tiếp từ epoch {start_epoch}/{num_epochs} (best_acc={best_acc:.4f}) - {run_dir}")
+    elif not resume and is_main:
+        # Lần chạy mới: bỏ checkpoint cũ để resume sau này không lấy nhầm
+        clear_checkpoint(run_dir)
+
+    # Validation chạy trên module gốc (không qua DDP, chỉ rank 0)
+    eval_net = net.module if distributed else net
+    for epoch in range(start_epoch, num_epochs):
+        if hasattr(train_loader.dataset, "set_epoch"):
+            # Streaming: thứ tự shard theo epoch (persistent worker nhận epoch bắt đầu rồi tự tăng)
+            train_loader.dataset.set_epoch(epoch)
+        net.train()
         running_loss = 0.0
         running_corrects = 0
         total = 0
-        for images, labels in train_loader:
-            images = images.to(device)
-            labels = labels.to(device)
+        started = time.perf_counter()
+        # join: các rank có số batch lệch nhau vẫn không bị treo ở all-reduce
+        with net.join() if distributed else contextlib.nullcontext():
+            for images, labels in train_loader:
+                images = prepare_inputs(images, device, settings)
+                labels = labels.to(device)
 
-            optimizer.zero_grad(set_to_none=True)
-            outputs = model(images)
-            loss = criterion(outputs, labels)
-            loss.backward()
-            optimizer.step()
+                optimizer.zero_grad(set_to_none=True)
+                with autocast(settings, device):
+                    outputs = net(images)
+                    loss = criterion(outputs, labels)
+                loss.backward()
+                optimizer.step()
 
-            running_loss += loss.item() * images.size(0)
-            preds = outputs.argmax(dim=1)
-            running_corrects += (preds == labels).sum().item()
-            total += images.size(0)
+                running_loss += loss.item() * images.size(0)
+                preds = outputs.argmax(dim=1)
+                running_corrects += (preds == labels).sum().item()
+                total += images.size(0)
 
+        running_loss, running_corrects, total = all_reduce_sum([running_loss, running_corrects, total])
         train_loss = running_loss / total if total > 0 else 0.0
         train_acc = running_corrects / total if total > 0 else 0.0
+        images_per_sec = total / max(time.perf_counter() - started, 1e-9)
+        scheduler.step()
+        if not is_main:
+            continue
 
         # validate
-        model.eval()
+        eval_net.eval()
         val_corrects = 0
         val_total = 0
         with torch.inference_mode():
             for images, labels in val_loader:
-                images = images.to(device)
+                images = prepare_inputs(images, device, settings)
                 labels = labels.to(device)
-                outputs = model(images)
+                with autocast(settings, device):
+                    outputs = eval_net(images)
                 preds = outputs.argmax(dim=1)
                 val_corrects += (preds == labels).sum().item()
                 val_total += images.size(0)
         val_acc = val_corrects / val_total if val_total > 0 else 0.0
 
-        print(f"Epoch {epoch+1}/{num_epochs} - train_loss={train_loss:.4f} train_acc={train_acc:.4f} val_acc={val_acc:.4f}")
+        print(f"Epoch {epoch+1}/{num_epochs} - train_loss={train_loss:.4f} train_acc={train_acc:.4f} "
+              f"val_acc={val_acc:.4f} ({images_per_sec:.1f} img/s)")
 
         if val_acc > best_acc:
             best_acc = val_acc
-            torch.save(model.state_dict(), MODEL_PATH)
-            Path(LABELS_PATH).write_text("\n".join(class_names), encoding="utf-8")
-            print(f"Saved best model to {MODEL_PATH} with val_acc={best_acc:.4f}")
+            atomic_save(model.state_dict(), model_path)
+            save_model_arch(model_path, "large")
+            labels_path.write_text("\n".join(class_names), encoding="utf-8")
+            print(f"Saved best model to {model_path} with val_acc={best_acc:.4f}")
 
-        scheduler.step()
+        metrics = {"epoch": epoch + 1, "num_epochs": num_epochs, "train_loss": train_loss, "train_acc": train_acc,
+                   "val_acc": val_acc, "best_acc": best_acc, "images_per_sec": images_per_sec}
+        if distributed:
+            metrics["world_size"] = get_world_size()
+        history.append(metrics)
+        if (epoch + 1) % checkpoint_every == 0 or epoch + 1 == num_epochs:
+            save_checkpoint(run_dir, {
+                "epoch": epoch + 1, "num_epochs": num_epochs, "best_acc": best_acc, "classes": class_names,
+                "model": model.state_dict(), "optimizer": optimizer.state_dict(),
+                "scheduler": scheduler.state_dict(), "rng": rng_state(sampler_generator), "history": history,
+            })
+        if on_epoch is not None:
+            on_epoch(metrics)
 
     print("Training finished. Best val_acc=", best_acc)
+    return {"best_acc": best_acc, "classes": class_names}
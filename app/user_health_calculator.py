@@ -1,8 +1,55 @@
-from typing import Dict, List
+from functools import lru_cache
+from typing import Dict, List, Tuple
+from app.config import USER_METRICS_CACHE_SIZE
 from app.schemas import UserProfile, UserMetrics
 
+# (height, weight, age, gender, activity_level, goal)
+ProfileKey = Tuple[float, float, int, str, str, str]
+
+
+def _enum_value(value) -> str:
+    return str(getattr(value, "value", value))
+
+
 class UserHealthCalculator:
     """Tính toán các chỉ số sức khỏe của người dùng"""
+
+    # Ngưỡng BMI (cận trên, không bao gồm) và phân loại tương ứng
+    BMI_CATEGORIES = [
+        (18.5, "Thiếu cân"),
+        (25, "Bình thường"),
+        (30, "Thừa cân"),
+        (float("inf"), "Béo phì"),
+    ]
+
+    # Hệ số Harris-Benedict: (hằng số, hệ số cân nặng, hệ số chiều cao, hệ số tuổi)
+    BMR_COEFFICIENTS = {
+        "male": (88.362, 13.397, 4.799, 5.677),
+        "female": (447.593, 9.247, 3.098, 4.330),
+    }
+
+    ACTIVITY_MULTIPLIERS = {
+        "sedentary": 1.2,      # Ít vận động
+        "light": 1.375,        # Vận động nhẹ
+        "moderate": 1.55,      # Vận động vừa phải
+        "active": 1.725,       # Vận động nhiều
+        "very_active": 1.9     # Vận động rất nhiều
+    }
+    DEFAULT_ACTIVITY_MULTIPLIER = 1.2
+
+    # Điều chỉnh calo theo mục tiêu (cal/ngày)
+    GOAL_CALORIE_ADJUSTMENTS = {
+        "lose_weight": -500,   # Giảm 500 cal/ngày để giảm 0.5kg/tuần
+        "maintain": 0,         # Duy trì cân nặng
+        "gain_weight": 300,    # Tăng 300 cal/ngày để tăng cân
+    }
+
+    # Phân bổ macronutrients: (tỷ lệ calo, calo mỗi gram)
+    MACRO_SPLIT = {
+        "protein": (0.25, 4),  # 25% protein, 1g = 4 cal
+        "fat": (0.25, 9),      # 25% fat, 1g = 9 cal
+        "carbs": (0.5, 4),     # 50% carbs, 1g = 4 cal
+    }
     
     @staticmethod
     def calculate_bmi(height_cm: float, weight_kg: float) -> tuple[float, str]:
@@ -10,85 +57,81 @@ class UserHealthCalculator:
         height_m = height_cm / 100
         bmi = weight_kg / (height_m * height_m)
         
-        if bmi < 18.5:
-            category = "Thiếu cân"
-        elif bmi < 25:
-            category = "Bình thường"
-        elif bmi < 30:
-            category = "Thừa cân"
-        else:
-            category = "Béo phì"
+        category = UserHealthCalculator.BMI_CATEGORIES[-1][1]
+        for upper, label in UserHealthCalculator.BMI_CATEGORIES:
+            if bmi < upper:
+                category = label
+                break
             
         return round(bmi, 1), category
     
     @staticmethod
     def calculate_bmr(weight_kg: float, height_cm: float, age: int, gender: str) -> float:
         """Tính BMR (Basal Metabolic Rate)"""
-        if gender.lower() == "male":
-            bmr = 88.362 + (13.397 * weight_kg) + (4.799 * height_cm) - (5.677 * age)
-        else:
-            bmr = 447.593 + (9.247 * weight_kg) + (3.098 * height_cm) - (4.330 * age)
+        key = "male" if gender.lower() == "male" else "female"
+        base, w, h, a = UserHealthCalculator.BMR_COEFFICIENTS[key]
+        bmr = base + (w * weight_kg) + (h * height_cm) - (a * age)
         
         return round(bmr, 0)
     
     @staticmethod
     def calculate_tdee(bmr: float, activity_level: str) -> float:
         """Tính TDEE (Total Daily Energy Expenditure)"""
-        activity_multipliers = {
-            "sedentary": 1.2,      # Ít vận động
-            "light": 1.375,        # Vận động nhẹ
-            "moderate": 1.55,      # Vận động vừa phải
-            "active": 1.725,       # Vận động nhiều
-            "very_active": 1.9     # Vận động rất nhiều
-        }
-        
-        multiplier = activity_multipliers.get(activity_level.lower(), 1.2)
+        multiplier = UserHealthCalculator.ACTIVITY_MULTIPLIERS.get(
+            activity_level.lower(), UserHealthCalculator.DEFAULT_ACTIVITY_MULTIPLIER
+        )
         return round(bmr * multiplier, 0)
     
     @staticmethod
     def calculate_daily_targets(tdee: float, goal: str) -> Dict[str, float]:
         """Tính toán mục tiêu dinh dưỡng hàng ngày"""
-        if goal == "lose_weight":
-            target_calories = tdee - 500  # Giảm 500 cal/ngày để giảm 0.5kg/tuần
-        elif goal == "gain_weight":
-            target_calories = tdee + 300  # Tăng 300 cal/ngày để tăng cân
-        else:
-            target_calories = tdee  # Duy trì cân nặng
+        target_calories = tdee + UserHealthCalculator.GOAL_CALORIE_ADJUSTMENTS.get(goal, 0)
         
-        # Phân bổ macronutrients
-        protein_calories = target_calories * 0.25  # 25% protein
-        fat_calories = target_calories * 0.25      # 25% fat
-        carbs_calories = target_calories * 0.5     # 50% carbs
-        
-        return {
-            "calories": round(target_calories, 0),
-            "protein": round(protein_calories / 4, 1),    # 1g protein = 4 cal
-            "fat": round(fat_calories / 9, 1),            # 1g fat = 9 cal
-            "carbs": round(carbs_calories / 4, 1)         # 1g carbs = 4 cal
-        }
+        targets = {"calories": round(target_calories, 0)}
+        for macro, (ratio, cal_per_gram) in UserHealthCalculator.MACRO_SPLIT.items():
+            targets[macro] = round(target_calories * ratio / cal_per_gram, 1)
+        return targets
     
     @staticmethod
-    def calculate_user_metrics(user_profile: UserProfile) -> UserMetrics:
-        """Tính toán tất cả các chỉ số sức khỏe của người dùng"""
-        bmi, bmi_category = UserHealthCalculator.calculate_bmi(
-            user_profile.height, user_profile.weight
-        )
-        
-        bmr = UserHealthCalculator.calculate_bmr(
-            user_profile.weight, user_profile.height, user_profile.age, user_profile.gender
-        )
-        
-        tdee = UserHealthCalculator.calculate_tdee(bmr, user_profile.activity_level)
-        
-        daily_targets = UserHealthCalculator.calculate_daily_targets(tdee, user_profile.goal)
-        
-        return UserMetrics(
-            bmi=bmi,
-            bmi_category=bmi_category,
-            bmr=bmr,
-            tdee=tdee,
-            daily_calories_target=daily_targets["calories"],
-            daily_protein_target=daily_targets["protein"],
-            daily_carbs_target=daily_targets["carbs"],
-            daily_fat_target=daily_targets["fat"]
+    def profile_key(user_profile: UserProfile) -> ProfileKey:
+        """Khóa bất biến của hồ sơ, dùng cho cache"""
+        return (
+            float(user_profile.height),
+            float(user_profile.weight),
+            int(user_profile.age),
+            _enum_value(user_profile.gender),
+            _enum_value(user_profile.activity_level),
+            _enum_value(user_profile.goal),
         )
+
+    @staticmethod
+    def calculate_user_metrics(user_profile: UserProfile) -> UserMetrics:
+        """Tính toán tất cả các chỉ số sức khỏe của người dùng.
+        Kết quả được nhớ theo hồ sơ; UserMetrics bất biến nên có thể dùng chung giữa các request.
+        """
+        return _cached_user_metrics(UserHealthCalculator.profile_key(user_profile))
+
+    @staticmethod
+    def cache_info():
+        """Thống kê cache chỉ số người dùng (hits, misses, maxsize, currsize)"""
+        return _cached_user_metrics.cache_info()
+
+
+@lru_cache(maxsize=USER_METRICS_CACHE_SIZE)
+def _cached_user_metrics(key: ProfileKey) -> UserMetrics:
+    height, weight, age, gender, activity_level, goal = key
+    bmi, bmi_category = UserHealthCalculator.calculate_bmi(height, weight)
+    bmr = UserHealthCalculator.calculate_bmr(weight, height, age, gender)
+    tdee = UserHealthCalculator.calculate_tdee(bmr, activity_level)
+    daily_targets = UserHealthCalculator.calculate_daily_targets(tdee, goal)
+
+    return UserMetrics(
+        bmi=bmi,
+        bmi_category=bmi_category,
+        bmr=bmr,
+        tdee=tdee,
+        daily_calories_target=daily_targets["calories"],
+        daily_protein_target=daily_targets["protein"],
+        daily_carbs_target=daily_targets["carbs"],
+        daily_fat_target=daily_targets["fat"]
+    )
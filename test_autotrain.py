@@ -0,0 +1,87 @@
+"""
+Test autotrain nền: lớp đủ ảnh được train tăng dần ngay, không chờ lớp tải chậm
+"""
+
+import os
+import sys
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from PIL import Image
+
+from app.training import autotrain
+from app.training.crawler import ImageCrawler, SearchCache, make_session
+
+
+class _Handler(BaseHTTPRequestHandler):
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        kind, name = self.path.strip("/").split("/")
+        n = int(name.split(".")[0])
+        if kind == "slow":
+            time.sleep(0.5)
+        out = BytesIO()
+        Image.new("RGB", (64, 64), (n * 37 % 256, n * 91 % 256, n * 53 % 256)).save(out, format="JPEG")
+        body = out.getvalue()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield f"http://127.0.0.1:{httpd.server_address[1]}"
+    httpd.shutdown()
+
+
+def test_incremental_autotrain_trains_ready_classes_first(tmp_path, server, monkeypatch):
+    model_path, labels_path = tmp_path / "best.pt", tmp_path / "labels.txt"
+    model_path.write_bytes(b"model")
+    labels_path.write_text("pho_bo\n", encoding="utf-8")
+    monkeypatch.setattr(autotrain, "MODEL_PATH", model_path)
+    monkeypatch.setattr(autotrain, "LABELS_PATH", labels_path)
+    ds = tmp_path / "ds"
+    calls = []
+    labels = ["pho_bo"]
+
+    def fake_incremental(dataset_dir, classes, on_epoch, **kwargs):
+        on_epoch({"epoch": 1})
+        calls.append((list(classes), (ds / "train" / "slow_dish").exists()
+                      and len(list((ds / "train" / "slow_dish").iterdir()))))
+        # Như train_incremental: "classes" là toàn bộ nhãn sau khi thêm lớp mới
+        labels.extend(classes)
+        return {"status": "updated", "best": object(), "classes": list(labels)}
+
+    monkeypatch.setattr(autotrain, "train_incremental", fake_incremental)
+    results = {
+        "fast_dish": [f"{server}/fast/{i}.jpg" for i in range(12)],
+        "slow_dish": [f"{server}/slow/{i}.jpg" for i in range(20, 32)],
+        "rare_dish": [f"{server}/fast/{i}.jpg" for i in range(40, 42)],
+    }
+    crawler = ImageCrawler(search=lambda q, n: results.get(q, [])[:n], session=make_session(retries=0),
+                           max_workers=4, per_host=4, host_rate=0, search_cache=SearchCache(tmp_path / "cache"))
+    epochs, stages = [], {}
+
+    report = autotrain.run_autotrain(
+        ["fast_dish", "slow_dish", "rare_dish"], str(ds), images_per_class=6, incremental=True,
+        min_class_images=5, crawler=crawler, on_epoch=epochs.append, on_stage=stages.update,
+    )
+
+    # Lớp nhanh được train khi lớp chậm còn chưa tải xong
+    assert calls[0][0] == ["fast_dish"] and calls[0][1] < 5
+    assert [c[0] for c in calls] == [["fast_dish"], ["slow_dish"]]
+    assert [s["class"] for s in report["skipped"]] == ["rare_dish"]
+    assert [t["classes"] for t in report["trained"]] == [["fast_dish"], ["slow_dish"]]
+    assert epochs[0]["classes"] == ["fast_dish"]
+    assert stages["crawl"] == "done" and stages["skipped"] == ["rare_dish"]
+    assert stages["ready"] == ["fast_dish", "slow_dish"]
+    assert report["crawl"]["slow_dish"]["saved"] == 6
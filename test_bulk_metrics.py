@@ -0,0 +1,79 @@
+"""
+Test tính chỉ số sức khỏe hàng loạt: kết quả phải khớp với UserHealthCalculator từng người
+"""
+
+import json
+import os
+import random
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.bulk_metrics import BulkProfiles, compute_bulk_metrics, parse_profiles, stream_bulk_metrics
+from app.schemas import UserProfile
+from app.user_health_calculator import UserHealthCalculator
+
+
+def _random_profiles(n, seed=0):
+    rng = random.Random(seed)
+    return [
+        {
+            "height": round(rng.uniform(100, 220), 1),
+            "weight": round(rng.uniform(30, 200), 1),
+            "age": rng.randint(1, 120),
+            "gender": rng.choice(["male", "female"]),
+            "activity_level": rng.choice(["sedentary", "light", "moderate", "active", "very_active"]),
+            "goal": rng.choice(["lose_weight", "maintain", "gain_weight"]),
+        }
+        for _ in range(n)
+    ]
+
+
+def test_bulk_matches_scalar():
+    rows = _random_profiles(5000)
+    metrics = compute_bulk_metrics(BulkProfiles(rows))
+    for i, row in enumerate(rows):
+        expected = UserHealthCalculator.calculate_user_metrics(UserProfile(**row)).model_dump()
+        for field, value in expected.items():
+            assert metrics[field][i] == value, (field, row)
+
+
+def test_invalid_rows_are_reported_per_row():
+    rows = parse_profiles(
+        "id,height,weight,age,gender,activity_level,goal\n"
+        "u1,170,65,25,male,moderate,lose_weight\n"
+        "u2,abc,65,25,male,moderate,lose_weight\n"
+        "u3,170,65,25,other,moderate,lose_weight\n"
+        "u4,170,600,25,female,light,maintain\n"
+    )
+    out = [json.loads(line) for line in "".join(stream_bulk_metrics(rows, "ndjson")).splitlines()]
+    assert [r["id"] for r in out] == ["u1", "u2", "u3", "u4"]
+    assert out[0]["error"] is None and out[0]["bmi"] == 22.5
+    assert all(r["error"] for r in out[1:])
+
+
+def test_csv_output_has_header_and_all_rows():
+    rows = _random_profiles(2500, seed=1)
+    text = "".join(stream_bulk_metrics(parse_profiles(json.dumps(rows)), "csv"))
+    lines = text.strip().splitlines()
+    assert lines[0].startswith("id,bmi,bmi_category")
+    assert len(lines) == 2501
+
+
+def test_missing_or_null_numeric_fields_are_row_errors():
+    # Thiếu cột / null / dòng CSV thiếu ô không được thành NaN -> 0 -> BMI vô cực
+    base = {"height": 170, "weight": 65, "age": 25, "gender": "male", "activity_level": "moderate",
+            "goal": "maintain"}
+    missing = {k: v for k, v in base.items() if k != "height"}
+    rows = [{"id": "ok", **base}, {"id": "missing", **missing}, {"id": "null", **base, "weight": None}]
+    text = "".join(stream_bulk_metrics(parse_profiles(json.dumps(rows)), "ndjson"))
+    assert "Infinity" not in text and "NaN" not in text
+    out = {r["id"]: r for r in map(json.loads, text.splitlines())}
+    assert out["ok"]["error"] is None
+    assert out["missing"] == {"id": "missing", "error": "height không hợp lệ"}
+    assert out["null"] == {"id": "null", "error": "weight không hợp lệ"}
+
+    short = parse_profiles("id,height,weight,age,gender,activity_level,goal\n"
+                           "u1,170,65,25,male,moderate,maintain\n"
+                           "u2,170\n")
+    csv_text = "".join(stream_bulk_metrics(short, "csv"))
+    assert "inf" not in csv_text and csv_text.splitlines()[2] == "u2,,,,,,,,,weight không hợp lệ"
@@ -0,0 +1,83 @@
+"""
+Test nén mô hình: cắt kênh có cấu trúc, QAT int8 và báo cáo Pareto
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import torch
+from PIL import Image
+from torchvision.models import mobilenet_v3_large
+
+from app.training import compress, shard_cache
+from app.training.compress import build_model, large_config, pareto_front, prune_state_dict
+
+
+def _large(num_classes=2):
+    model = mobilenet_v3_large(weights=None)
+    model.classifier[3] = torch.nn.Linear(model.classifier[3].in_features, num_classes)
+    return model.eval()
+
+
+def test_pruning_keeps_block_interfaces():
+    model = _large()
+    settings, last_channel = large_config()
+    x = torch.randn(2, 3, 96, 96)
+
+    state, same = prune_state_dict(model.state_dict(), settings, 0.0)
+    unpruned = build_model(same, last_channel, 2).eval()
+    unpruned.load_state_dict(state)
+    with torch.inference_mode():
+        assert torch.allclose(unpruned(x), model(x), atol=1e-5)
+
+    state, pruned_settings = prune_state_dict(model.state_dict(), settings, 0.5)
+    pruned = build_model(pruned_settings, last_channel, 2).eval()
+    pruned.load_state_dict(state)
+    assert [c.out_channels for c in pruned_settings] == [c.out_channels for c in settings]
+    assert sum(c.expanded_channels for c in pruned_settings) < 0.6 * sum(c.expanded_channels for c in settings)
+    assert sum(p.numel() for p in pruned.parameters()) < sum(p.numel() for p in model.parameters())
+    with torch.inference_mode():
+        assert pruned(x).shape == (2, 2)
+
+
+def test_pareto_front():
+    points = pareto_front([
+        {"val_acc": 0.9, "latency_ms": 30, "size_mb": 16},
+        {"val_acc": 0.85, "latency_ms": 10, "size_mb": 3},
+        {"val_acc": 0.8, "latency_ms": 12, "size_mb": 4},
+    ])
+    assert [p["pareto"] for p in points] == [True, True, False]
+
+
+def test_compress_sweep_writes_int8_models_and_report(tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    for split, n in (("train", 4), ("val", 2)):
+        for cls in ("a", "b"):
+            (tmp_path / "ds" / split / cls).mkdir(parents=True)
+            for i in range(n):
+                Image.fromarray(rng.integers(0, 255, (40, 48, 3), dtype=np.uint8)).save(
+                    tmp_path / "ds" / split / cls / f"{i}.jpg")
+    models = tmp_path / "models"
+    models.mkdir()
+    torch.save(_large().state_dict(), models / "best.pt")
+    (models / "labels.txt").write_text("a\nb", encoding="utf-8")
+    monkeypatch.setattr(shard_cache, "TRAIN_CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(compress, "MODEL_DIR", models)
+    monkeypatch.setattr(compress, "MODEL_PATH", models / "best.pt")
+    monkeypatch.setattr(compress, "LABELS_PATH", models / "labels.txt")
+
+    torch.manual_seed(0)
+    report = compress.compress_model(str(tmp_path / "ds"), sparsities=[0.5], finetune_epochs=1, qat_epochs=2,
+                                     batch_size=4, latency_runs=2)
+    names = [p["name"] for p in report["points"]]
+    assert names == ["baseline", "sparsity_50_fp32", "sparsity_50_int8"]
+    by_name = {p["name"]: p for p in report["points"]}
+    assert by_name["sparsity_50_int8"]["size_mb"] < by_name["sparsity_50_fp32"]["size_mb"] / 2
+    assert any(p["pareto"] for p in report["points"])
+    assert (models / "compress_report.json").exists()
+
+    kiosk = torch.jit.load(by_name["sparsity_50_int8"]["path"])
+    with torch.inference_mode():
+        assert kiosk(torch.randn(1, 3, 256, 256)).shape == (1, 2)
@@ -0,0 +1,151 @@
+"""
+Test crawler ảnh song song với server HTTP cục bộ thay cho internet
+"""
+
+import hashlib
+import os
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from io import BytesIO
+from urllib.parse import urlsplit
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from PIL import Image
+
+from app.training.auto_dataset import build_dataset
+from app.training.clean_dataset import clean_dataset
+from app.training.crawler import ImageCrawler, SearchCache, TokenBucket, make_session
+
+
+def _image(seed, size=80, fmt="JPEG"):
+    out = BytesIO()
+    Image.new("RGB", (size, size), (seed * 37 % 256, seed * 91 % 256, seed * 53 % 256)).save(out, format=fmt)
+    return out.getvalue()
+
+
+class _Handler(BaseHTTPRequestHandler):
+    lock = threading.Lock()
+    hits = Counter()
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        with self.lock:
+            self.hits[self.path] += 1
+            hits = self.hits[self.path]
+        time.sleep(0.03)
+        kind, name = self.path.strip("/").split("/")
+        n = int(name.split(".")[0])
+        if kind == "flaky" and hits == 1:
+            self.send_response(503)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = {
+            "img": lambda: _image(n),
+            "flaky": lambda: _image(100 + n),
+            "dup": lambda: _image(0),
+            "webp": lambda: _image(200 + n, fmt="WEBP"),
+            "small": lambda: _image(300 + n, size=10),
+            "broken": lambda: b"not an image",
+        }[kind]()
+        self.send_response(200)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class _CountingSession:
+    """Bọc session để đo số request đồng thời mỗi host phía client"""
+
+    def __init__(self, session):
+        self.session = session
+        self.lock = threading.Lock()
+        self.in_flight = Counter()
+        self.max_in_flight = Counter()
+
+    @contextmanager
+    def get(self, url, **kwargs):
+        host = urlsplit(url).hostname
+        with self.lock:
+            self.in_flight[host] += 1
+            self.max_in_flight[host] = max(self.max_in_flight[host], self.in_flight[host])
+        try:
+            with self.session.get(url, **kwargs) as r:
+                yield r
+        finally:
+            with self.lock:
+                self.in_flight[host] -= 1
+
+
+@pytest.fixture
+def server():
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), _Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    _Handler.hits.clear()
+    yield httpd.server_address[1]
+    httpd.shutdown()
+
+
+def test_crawl_dedupes_validates_and_limits_hosts(tmp_path, server):
+    a = f"http://127.0.0.1:{server}"
+    b = f"http://localhost:{server}"
+    results = {
+        "pho bo": [f"{a}/img/0.jpg", f"{a}/dup/1.jpg", f"{a}/broken/2.jpg", f"{b}/img/3.jpg", f"{a}/img/0.jpg",
+                   f"{b}/flaky/4.jpg", f"{a}/small/5.png", f"{b}/webp/6.webp"],
+        "phở bò": [f"{a}/img/7.jpg", f"{b}/img/8.jpg", f"{a}/img/9.jpg", f"{b}/img/10.jpg"],
+        "banh_xeo": [f"{a}/img/{i}.jpg" for i in range(20, 26)] + [f"{b}/img/{i}.jpg" for i in range(26, 32)],
+    }
+    calls = Counter()
+
+    def search(query, max_results):
+        calls[query] += 1
+        return results.get(query, [])[:max_results]
+
+    session = _CountingSession(make_session(retries=2, backoff=0))
+    crawler = ImageCrawler(search=search, session=session, max_workers=8,
+                           per_host=2, host_rate=0, search_cache=SearchCache(tmp_path / "cache"))
+    ds = tmp_path / "ds"
+    stats = crawler.crawl(ds, {"pho_bo": ["pho bo", "phở bò"], "banh_xeo": None}, num_images=5)
+
+    for cls in ("pho_bo", "banh_xeo"):
+        assert stats[cls]["saved"] == 5 and stats[cls]["train"] == 4 and stats[cls]["val"] == 1
+        files = list((ds / "train" / cls).iterdir()) + list((ds / "val" / cls).iterdir())
+        assert len(files) == 5
+        assert len({hashlib.sha1(f.read_bytes()).hexdigest() for f in files}) == 5
+        for f in files:
+            with Image.open(f) as img:
+                assert img.format in ("JPEG", "PNG") and f.suffix in (".jpg", ".png")
+    assert _Handler.hits[f"/img/0.jpg"] == 1
+    assert session.max_in_flight == {"127.0.0.1": 2, "localhost": 2}
+    assert (ds / "crawl_index.json").exists()
+
+    # Lần crawl sau không tải lại URL đã xử lý, không ghi đè ảnh cũ
+    build_dataset(ds, ["banh_xeo"], images_per_class=3, crawler=crawler)
+    files = list((ds / "train" / "banh_xeo").iterdir()) + list((ds / "val" / "banh_xeo").iterdir())
+    assert len({hashlib.sha1(f.read_bytes()).hexdigest() for f in files}) == len(files) == 8
+
+    # Kết quả tìm kiếm được cache ra đĩa
+    assert calls["banh_xeo"] == 2
+    again = ImageCrawler(search=search, search_cache=SearchCache(tmp_path / "cache"))
+    assert again.search(["banh_xeo"], 16) == results["banh_xeo"]
+    assert calls["banh_xeo"] == 2
+
+    # clean_dataset bỏ qua ảnh đã kiểm tra lúc tải, chỉ kiểm tra file lạ
+    (ds / "train" / "pho_bo" / "manual.jpg").write_bytes(b"broken")
+    assert clean_dataset(ds) == (1, 1)
+
+
+def test_token_bucket_paces_requests():
+    bucket = TokenBucket(rate=20, burst=1)
+    started = time.perf_counter()
+    for _ in range(11):
+        bucket.acquire()
+    assert time.perf_counter() - started >= 0.45
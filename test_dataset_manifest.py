@@ -0,0 +1,53 @@
+"""
+Test manifest dataset: chỉ kiểm tra lại file mới/đã đổi, train đọc danh sách file từ manifest
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from PIL import Image
+from torchvision import datasets
+
+from app.training.clean_dataset import clean_dataset
+from app.training.manifest import load_manifest
+
+
+def _make_dataset(root, per_class=20):
+    for split, n in (("train", per_class), ("val", 2)):
+        for c, cls in enumerate(("bun_cha", "pho_bo")):
+            d = root / split / cls
+            d.mkdir(parents=True)
+            for i in range(n):
+                Image.new("RGB", (40 + i, 30), (c * 120, i * 10, 50)).save(d / f"{cls}_{i}.jpg")
+    (root / "train" / "pho_bo" / "broken.png").write_bytes(b"not an image")
+    (root / "train" / "pho_bo" / "notes.txt").write_text("bỏ qua")
+
+
+def test_manifest_revalidates_only_changed_files(tmp_path):
+    ds = tmp_path / "ds"
+    _make_dataset(ds)
+
+    # Lần đầu: 44 ảnh + 1 file lỗi được kiểm tra song song, file lỗi bị xoá
+    assert clean_dataset(ds, workers=2) == (1, 45)
+    assert not (ds / "train" / "pho_bo" / "broken.png").exists()
+    assert clean_dataset(ds, workers=2) == (0, 0)
+
+    # Sửa một ảnh, thêm một ảnh, xoá một ảnh: chỉ 2 file được kiểm tra lại
+    Image.new("RGB", (64, 48)).save(ds / "train" / "bun_cha" / "bun_cha_0.jpg")
+    Image.new("RGB", (32, 32)).save(ds / "val" / "pho_bo" / "new.png")
+    (ds / "train" / "pho_bo" / "pho_bo_3.jpg").unlink()
+    manifest = load_manifest(ds, refresh=False)
+    assert manifest.refresh() == 2
+    entry = manifest.entries["train/bun_cha/bun_cha_0.jpg"]
+    assert (entry["width"], entry["height"], entry["valid"]) == (64, 48, True)
+    assert len(entry["sha1"]) == 40 and entry["class"] == "bun_cha" and entry["split"] == "train"
+
+    assert manifest.classes() == ["bun_cha", "pho_bo"]
+    assert manifest.class_counts("train") == {"bun_cha": 20, "pho_bo": 19}
+    assert manifest.class_counts("val") == {"bun_cha": 2, "pho_bo": 3}
+    # Cùng lớp, nhãn và thứ tự file với ImageFolder
+    for split in ("train", "val"):
+        folder = manifest.image_folder(split)
+        expected = datasets.ImageFolder(str(ds / split))
+        assert folder.classes == expected.classes and folder.samples == expected.samples
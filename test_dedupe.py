@@ -0,0 +1,79 @@
+"""
+Test tìm ảnh gần trùng (dHash + multi-index) trong và giữa train/val
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pytest
+from PIL import Image
+
+from app.training.dedupe import dhash, find_duplicates, near_duplicate_pairs
+
+
+def _photo(seed, size):
+    # Ảnh có cấu trúc thô (như ảnh thật) để dHash ổn định khi đổi kích thước
+    rng = np.random.default_rng(seed)
+    coarse = Image.fromarray(rng.integers(0, 256, (6, 6, 3), dtype=np.uint8)).resize((256, 256), Image.BICUBIC)
+    return coarse.resize(size, Image.BILINEAR)
+
+
+def _dataset(root):
+    layout = {
+        "train/pho_bo/a.jpg": (1, (256, 256)),
+        "train/pho_bo/a_small.jpg": (1, (120, 120)),  # trùng trong train
+        "val/pho_bo/a_val.jpg": (1, (200, 200)),      # rò rỉ sang val
+        "train/pho_bo/b.jpg": (2, (256, 256)),
+        "val/pho_bo/b_val.png": (2, (300, 300)),      # rò rỉ, bản val lớn hơn
+        "train/bun_cha/c.jpg": (3, (256, 256)),
+        "val/bun_cha/d.jpg": (4, (256, 256)),
+        "val/pho_bo/c_other.jpg": (3, (180, 180)),    # cùng ảnh nhưng khác nhãn
+    }
+    for rel, (seed, size) in layout.items():
+        (root / rel).parent.mkdir(parents=True, exist_ok=True)
+        _photo(seed, size).save(root / rel)
+
+
+def test_near_duplicate_pairs_matches_bruteforce():
+    rng = np.random.default_rng(0)
+    base = rng.integers(0, 2 ** 63, size=300, dtype=np.int64).astype(np.uint64)
+    flips = np.uint64(1) << rng.integers(0, 64, size=(300, 3)).astype(np.uint64)
+    hashes = np.concatenate([base, base ^ flips[:, 0] ^ flips[:, 1] ^ flips[:, 2]])
+    expected = {(i, j) for i in range(len(hashes)) for j in range(i + 1, len(hashes))
+                if bin(int(hashes[i]) ^ int(hashes[j])).count("1") <= 4}
+    assert set(map(tuple, near_duplicate_pairs(hashes, 4).tolist())) == expected
+
+
+def test_resized_copies_share_hash(tmp_path):
+    _photo(7, (256, 256)).save(tmp_path / "a.jpg")
+    _photo(7, (90, 90)).save(tmp_path / "b.png")
+    _photo(8, (256, 256)).save(tmp_path / "c.jpg")
+    a, b, c = (dhash(str(tmp_path / n)) for n in ("a.jpg", "b.png", "c.jpg"))
+    assert bin(a ^ b).count("1") <= 4 < bin(a ^ c).count("1")
+    assert dhash(str(tmp_path / "missing.jpg")) is None
+
+
+@pytest.mark.parametrize("action", ["report", "drop", "resplit"])
+def test_find_duplicates_actions(tmp_path, action):
+    ds = tmp_path / "ds"
+    _dataset(ds)
+    report = find_duplicates(ds, threshold=4, action=action, val_ratio=0.5)
+    assert report["images"] == 8
+    assert (report["within_split"], report["cross_split"], report["conflicts"]) == (0, 3, 1)
+    files = {p.relative_to(ds).as_posix() for p in ds.rglob("*.*") if p.parent.parent.parent == ds}
+
+    if action == "report":
+        assert not report["dropped"] and not report["moved"] and len(files) == 8
+        return
+    # Cụm xung đột nhãn không bị động tới
+    assert {"train/bun_cha/c.jpg", "val/pho_bo/c_other.jpg"} <= files
+    assert len(report["dropped"]) == 3 and all(d["to"].startswith("duplicates/") for d in report["dropped"])
+    # Không còn cụm nào lọt cả train và val
+    assert find_duplicates(ds, threshold=4)["cross_split"] == 1
+    if action == "drop":
+        assert {"train/pho_bo/a.jpg", "train/pho_bo/b.jpg"} <= files and not report["moved"]
+    else:
+        kept = {os.path.basename(f) for f in files if "/pho_bo/" in f}
+        assert {"a.jpg", "b_val.png", "c_other.jpg"} == kept
@@ -0,0 +1,98 @@
+"""
+Test chưng cất MobileNetV3 Large -> Small: logits teacher được cache, student phục vụ được bằng inference
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pytest
+import torch
+import torchvision.models
+from PIL import Image
+from torchvision.models import mobilenet_v3_large, mobilenet_v3_small
+
+from app import inference
+from app.training import compress, distill, shard_cache
+from app.training.checkpoint import model_arch
+from app.training.distill import VariantImageDataset, distillation_loss
+
+
+@pytest.fixture
+def setup(tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    for split, n in (("train", 4), ("val", 2)):
+        for cls in ("a", "b"):
+            (tmp_path / "ds" / split / cls).mkdir(parents=True)
+            for i in range(n):
+                Image.fromarray(rng.integers(0, 255, (40, 48, 3), dtype=np.uint8)).save(
+                    tmp_path / "ds" / split / cls / f"{i}.jpg")
+    models = tmp_path / "models"
+    models.mkdir()
+    teacher = mobilenet_v3_large(weights=None)
+    teacher.classifier[3] = torch.nn.Linear(teacher.classifier[3].in_features, 2)
+    torch.save(teacher.state_dict(), models / "best.pt")
+    (models / "labels.txt").write_text("a\nb", encoding="utf-8")
+
+    monkeypatch.setattr(shard_cache, "TRAIN_CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(distill, "mobilenet_v3_small", lambda weights=None: mobilenet_v3_small(weights=None))
+    for module in (distill, inference):
+        monkeypatch.setattr(module, "MODEL_PATH", models / "best.pt")
+        monkeypatch.setattr(module, "LABELS_PATH", models / "labels.txt")
+    monkeypatch.setattr(distill, "MODEL_DIR", models)
+    monkeypatch.setattr(inference, "_model", None)
+    monkeypatch.setattr(inference, "_labels", [])
+    monkeypatch.setattr(torchvision.models, "mobilenet_v3_large", lambda weights=None: mobilenet_v3_large(weights=None))
+    monkeypatch.setattr(torchvision.models, "mobilenet_v3_small", lambda weights=None: mobilenet_v3_small(weights=None))
+    return tmp_path
+
+
+def test_variants_are_fixed_views():
+    class Images:
+        image_size = 32
+        classes = ["a"]
+        targets = [0, 0]
+
+        def __len__(self):
+            return 2
+
+        def get_uint8(self, idx):
+            return torch.full((3, 32, 32), 40 * idx, dtype=torch.uint8) + torch.arange(32, dtype=torch.uint8)
+
+    ds = VariantImageDataset(Images(), variants=3)
+    assert torch.equal(ds.view(1, 2), ds.view(1, 2))
+    assert not torch.equal(ds.view(1, 1), ds.view(1, 2))
+
+
+def test_loss_matches_teacher_when_student_agrees():
+    teacher = torch.tensor([[2.0, -1.0], [0.5, 1.5]])
+    labels = torch.tensor([0, 1])
+    assert distillation_loss(teacher, teacher, labels, alpha=1.0).item() == pytest.approx(0.0, abs=1e-6)
+    assert distillation_loss(-teacher, teacher, labels, alpha=1.0).item() > 0.1
+
+
+def test_distilled_student_is_served_by_inference(setup):
+    torch.manual_seed(0)
+    report = distill.distill_model(str(setup / "ds"), num_epochs=2, batch_size=4, variants=2, latency_runs=3,
+                                   install=True)
+    cache = setup / "cache"
+    assert len(list(cache.glob("*/teacher/logits_v*.npy"))) == 2
+    assert report["student"]["params"] < report["teacher"]["params"]
+    assert (setup / "models" / "distill_report.json").exists()
+    assert (setup / "models" / "teacher.pt").exists()
+
+    # MODEL_PATH giờ là Small: bước chỉ nạp Large báo lỗi rõ ràng, teacher mặc định chuyển sang teacher.pt
+    models = setup / "models"
+    assert model_arch(models / "best.pt") == "small" and model_arch(models / "teacher.pt") == "large"
+    assert distill.default_teacher_path() == models / "teacher.pt"
+    distill.load_teacher(models / "teacher.pt", 2)
+    with pytest.raises(ValueError):
+        distill.load_teacher(models / "best.pt", 2)
+    with pytest.raises(ValueError):
+        compress.compress_model(str(setup / "ds"), model_path=str(models / "best.pt"))
+
+    inference.load_model()
+    assert sum(p.numel() for p in inference._model.parameters()) == report["student"]["params"]
+    dish, score = inference.predict(Image.new("RGB", (50, 50)))
+    assert dish in ("a", "b") and 0 <= score <= 1
@@ -0,0 +1,111 @@
+"""
+Test huấn luyện data-parallel: chia mẫu giữa các rank và đồng bộ số liệu qua gloo
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from PIL import Image
+from torchvision.models import mobilenet_v3_large
+
+from app.training.distributed import (
+    DistributedWeightedSampler, _cpu_slices, _free_port, _init, all_reduce_sum, get_rank, get_world_size,
+)
+
+
+def test_sampler_ranks_split_one_shared_sequence():
+    weights = [1.0, 5.0, 1.0, 3.0, 1.0, 2.0, 1.0]
+    samplers = [DistributedWeightedSampler(weights, rank, 2, seed=7) for rank in range(2)]
+    single = DistributedWeightedSampler(weights, 0, 1, seed=7)
+    for _ in range(2):
+        parts = [list(s) for s in samplers]
+        assert [len(p) for p in parts] == [len(s) for s in samplers] == [4, 4]
+        # Ghép xen kẽ lại đúng dãy của một generator cùng seed (các epoch sau cũng vậy)
+        expected = list(torch.multinomial(torch.as_tensor(weights, dtype=torch.double), 8, True,
+                                          generator=single.generator))
+        assert [i for pair in zip(*parts) for i in pair] == [int(i) for i in expected]
+
+
+def _rank_main(rank, world_size, port, results):
+    _init(rank, world_size, port, _cpu_slices(world_size)[rank])
+    try:
+        results[rank] = (get_rank(), get_world_size(), all_reduce_sum([float(rank + 1), 10.0]))
+    finally:
+        dist.destroy_process_group()
+
+
+def test_ranks_all_reduce_over_gloo():
+    world_size = 2
+    port = _free_port()
+    with mp.get_context("spawn").Manager() as manager:
+        results = manager.dict()
+        mp.start_processes(_rank_main, args=(world_size, port, results), nprocs=world_size,
+                           start_method="spawn")
+        results = dict(results)
+    assert results == {0: (0, 2, [3.0, 20.0]), 1: (1, 2, [3.0, 20.0])}
+
+
+def _train_rank(rank, world_size, port, tmp_path, results):
+    # Tiến trình spawn không thấy monkeypatch của pytest: tự trỏ cache/model vào tmp_path
+    from app.training import shard_cache, train
+
+    shard_cache.TRAIN_CACHE_DIR = tmp_path / "cache"
+    train.mobilenet_v3_large = lambda weights=None: mobilenet_v3_large(weights=None)
+    train.MODEL_DIR = tmp_path / "models"
+    train.MODEL_PATH = tmp_path / "models" / "model.pt"
+    train.LABELS_PATH = tmp_path / "models" / "labels.txt"
+    _init(rank, world_size, port, _cpu_slices(world_size)[rank])
+    try:
+        torch.manual_seed(rank)
+        epochs = []
+        result = train.train_model(str(tmp_path / "ds"), num_epochs=2, batch_size=2, cache_features=True,
+                                   feature_variants=2, run_dir=str(tmp_path / "run"), on_epoch=epochs.append)
+        results[rank] = {"result": result, "epochs": epochs}
+    finally:
+        dist.destroy_process_group()
+
+
+def test_two_rank_train_model_end_to_end(tmp_path):
+    rng = np.random.default_rng(0)
+    for split, n in (("train", 5), ("val", 2)):
+        for cls in ("a", "b"):
+            (tmp_path / "ds" / split / cls).mkdir(parents=True)
+            for i in range(n):
+                Image.fromarray(rng.integers(0, 255, (40, 48, 3), dtype=np.uint8)).save(
+                    tmp_path / "ds" / split / cls / f"{i}.jpg")
+    with mp.get_context("spawn").Manager() as manager:
+        results = manager.dict()
+        mp.start_processes(_train_rank, args=(2, _free_port(), tmp_path, results), nprocs=2, start_method="spawn")
+        results = dict(results)
+
+    assert set(results) == {0, 1}
+    assert results[0]["result"]["classes"] == results[1]["result"]["classes"] == ["a", "b"]
+    # Chỉ rank 0 validate, báo tiến độ và ghi checkpoint/model
+    assert [m["epoch"] for m in results[0]["epochs"]] == [1, 2]
+    assert all(m["world_size"] == 2 for m in results[0]["epochs"])
+    assert results[1]["epochs"] == []
+    assert (tmp_path / "models" / "model.pt").exists()
+
+
+def test_compare_cli_uses_temporary_run_dir(monkeypatch):
+    from app.training import distributed, train
+
+    calls = []
+
+    def fake_train_distributed(dataset_dir, world_size, on_epoch=None, **kwargs):
+        calls.append((world_size, kwargs["run_dir"]))
+        on_epoch({"images_per_sec": float(world_size)})
+        return {}
+
+    monkeypatch.setattr(distributed, "train_distributed", fake_train_distributed)
+    monkeypatch.setattr(train, "MODEL_PATH", train.MODEL_PATH)
+    monkeypatch.setattr(train, "LABELS_PATH", train.LABELS_PATH)
+    monkeypatch.setattr(sys, "argv", ["distributed", "datasets", "--world-size", "2", "--compare"])
+    distributed.main()
+    assert [w for w, _ in calls] == [1, 2]
+    assert all(run_dir is not None for _, run_dir in calls) and calls[0][1] != calls[1][1]
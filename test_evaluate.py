@@ -0,0 +1,61 @@
+"""
+Test đánh giá offline: chỉ số phân loại, ECE, nạp state_dict / TorchScript và báo cáo JSON
+"""
+
+import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+from torchvision.models import mobilenet_v3_small
+
+from app.training.evaluate import classification_metrics, evaluate_model, expected_calibration_error
+
+
+def test_metrics_top_k_confusion_and_calibration():
+    logits = torch.tensor([[3.0, 1.0, 0.0], [0.0, 2.0, 1.0], [1.0, 0.0, 2.0], [2.0, 0.0, 1.0]])
+    targets = torch.tensor([0, 1, 1, 2])
+    metrics = classification_metrics(logits, targets, ["a", "b", "c"])
+    assert metrics["top1"] == pytest.approx(0.5)
+    assert metrics["top5"] == pytest.approx(1.0)
+    assert metrics["confusion"] == [[1, 0, 0], [0, 1, 1], [1, 0, 0]]
+    assert metrics["per_class"]["b"] == {"support": 2, "recall": 0.5, "precision": 1.0}
+    assert metrics["per_class"]["c"]["precision"] == 0.0
+
+    # Độ tin cậy đúng bằng accuracy -> ECE 0; luôn tin 100% mà sai một nửa -> ECE 0.5
+    assert expected_calibration_error(torch.tensor([0.75] * 4), torch.tensor([1, 1, 1, 0])) == pytest.approx(0)
+    assert expected_calibration_error(torch.tensor([1.0] * 4), torch.tensor([1, 0, 1, 0])) == pytest.approx(0.5)
+
+
+def test_evaluates_state_dict_and_torchscript(tmp_path):
+    rng = np.random.default_rng(0)
+    for split, n in (("train", 2), ("val", 3)):
+        for cls in ("a", "b"):
+            (tmp_path / "ds" / split / cls).mkdir(parents=True)
+            for i in range(n):
+                Image.fromarray(rng.integers(0, 255, (40, 48, 3), dtype=np.uint8)).save(
+                    tmp_path / "ds" / split / cls / f"{i}.jpg")
+    model = mobilenet_v3_small(weights=None)
+    model.classifier[3] = torch.nn.Linear(model.classifier[3].in_features, 3)
+    model.eval()
+    torch.save(model.state_dict(), tmp_path / "small.pt")
+    torch.jit.trace(model, torch.randn(1, 3, 64, 64)).save(str(tmp_path / "small_ts.pt"))
+    # Thứ tự nhãn của mô hình khác thứ tự lớp của dataset, có thêm lớp không có trong val
+    (tmp_path / "labels.txt").write_text("b\nx\na", encoding="utf-8")
+
+    reports = []
+    for name in ("small.pt", "small_ts.pt"):
+        reports.append(evaluate_model(str(tmp_path / name), str(tmp_path / "labels.txt"), str(tmp_path / "ds"),
+                                      batch_sizes=[1, 4], latency_runs=2, output=str(tmp_path / f"{name}.json")))
+    eager, scripted = reports
+    assert eager["backend"] == "eager-small" and scripted["backend"] == "torchscript"
+    assert eager["images"] == 6 and eager["classes"] == ["b", "x", "a"]
+    assert eager["top1"] == pytest.approx(scripted["top1"]) and eager["ece"] == pytest.approx(scripted["ece"], abs=1e-5)
+    assert [row["batch_size"] for row in eager["latency"]] == [1, 4]
+    assert all(row["images_per_sec"] > 0 for row in eager["latency"])
+    saved = json.loads((tmp_path / "small.pt.json").read_text(encoding="utf-8"))
+    assert saved["confusion"] == eager["confusion"] and sum(map(sum, saved["confusion"])) == 6
@@ -0,0 +1,75 @@
+"""
+Test cache activation backbone đóng băng và huấn luyện phần đuôi
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import torch
+from PIL import Image
+from torchvision.models import mobilenet_v3_large
+
+from app.training import shard_cache, train
+from app.training.feature_cache import FeatureDataset, TailModel, build_feature_cache, frozen_prefix
+from app.training.shard_cache import CachedImageDataset, build_split_cache
+
+SIZE = 64
+
+
+def _make_split(root, counts, seed=0):
+    rng = np.random.default_rng(seed)
+    for cls, n in counts.items():
+        (root / cls).mkdir(parents=True, exist_ok=True)
+        for i in range(n):
+            pixels = rng.integers(0, 255, size=(48 + i, 60, 3), dtype=np.uint8)
+            Image.fromarray(pixels).save(root / cls / f"{cls}_{i}.jpg")
+
+
+def test_tail_on_cached_features_matches_full_model(tmp_path):
+    torch.manual_seed(0)
+    _make_split(tmp_path / "val", {"a": 3, "b": 2})
+    build_split_cache(tmp_path / "val", tmp_path / "images", image_size=SIZE)
+    images = CachedImageDataset(tmp_path / "images")
+    model = mobilenet_v3_large(weights=None, num_classes=2).eval()
+
+    index = build_feature_cache(images, frozen_prefix(model, 4), tmp_path / "features", variants=2)
+    assert index["count"] == 5 and len(index["files"]) == 2
+    stamp = (tmp_path / "features" / "index.json").stat().st_mtime_ns
+    build_feature_cache(images, frozen_prefix(model, 4), tmp_path / "features", variants=2)
+    assert (tmp_path / "features" / "index.json").stat().st_mtime_ns == stamp
+
+    features = FeatureDataset(tmp_path / "features")
+    tail = TailModel(model, 4).eval()
+    with torch.inference_mode():
+        for i in range(len(images)):
+            expected = model(images[i][0].unsqueeze(0))
+            actual = tail(features[i][0].unsqueeze(0))
+            assert features[i][1] == images.targets[i]
+            assert torch.allclose(actual, expected, atol=1e-2)
+
+    # Trọng số phần đầu đổi thì cache được dựng lại
+    with torch.no_grad():
+        model.features[0][0].weight.mul_(2)
+    build_feature_cache(images, frozen_prefix(model, 4), tmp_path / "features", variants=2)
+    assert (tmp_path / "features" / "index.json").stat().st_mtime_ns != stamp
+
+
+def test_train_model_with_cached_features(tmp_path, monkeypatch):
+    _make_split(tmp_path / "ds" / "train", {"a": 4, "b": 2})
+    _make_split(tmp_path / "ds" / "val", {"a": 1, "b": 1}, seed=1)
+    monkeypatch.setattr(shard_cache, "TRAIN_CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(train, "mobilenet_v3_large", lambda weights=None: mobilenet_v3_large(weights=None))
+    monkeypatch.setattr(train, "MODEL_DIR", tmp_path / "models")
+    monkeypatch.setattr(train, "MODEL_PATH", tmp_path / "models" / "model.pt")
+    monkeypatch.setattr(train, "LABELS_PATH", tmp_path / "models" / "labels.txt")
+
+    train.train_model(str(tmp_path / "ds"), num_epochs=2, batch_size=4, cache_features=True, feature_variants=2)
+
+    assert (tmp_path / "models" / "labels.txt").read_text(encoding="utf-8").splitlines() == ["a", "b"]
+    model = mobilenet_v3_large(weights=None)
+    model.classifier[3] = torch.nn.Linear(model.classifier[3].in_features, 2)
+    model.load_state_dict(torch.load(tmp_path / "models" / "model.pt"))
+    features = FeatureDataset(shard_cache.cache_dir_for(tmp_path / "ds") / "features" / "train")
+    assert len(features) == 6 and len(features._variants()) == 2
@@ -0,0 +1,108 @@
+"""
+Test huấn luyện tăng dần khi thêm lớp mới
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import torch
+from PIL import Image
+from torchvision.models import mobilenet_v3_large, mobilenet_v3_small
+
+from app.training import incremental
+from app.training.checkpoint import model_arch, save_model_arch
+from app.training.incremental import expand_classifier, train_incremental
+
+COLORS = {"b": (30, 200, 30), "c": (30, 30, 200), "d": (200, 200, 30)}
+
+
+def _make_split(root, classes, n, seed=0):
+    rng = np.random.default_rng(seed)
+    for cls in classes:
+        (root / cls).mkdir(parents=True, exist_ok=True)
+        for i in range(n):
+            noise = rng.integers(-20, 20, size=(40, 40, 3))
+            pixels = np.clip(np.array(COLORS[cls]) + noise, 0, 255).astype(np.uint8)
+            Image.fromarray(pixels).save(root / cls / f"{cls}_{i}.jpg")
+
+
+def _checkpoint(tmp_path, monkeypatch, classes, factory=mobilenet_v3_large):
+    torch.manual_seed(0)
+    model = factory(weights=None)
+    model.classifier[3] = torch.nn.Linear(model.classifier[3].in_features, len(classes))
+    (tmp_path / "models").mkdir()
+    torch.save(model.state_dict(), tmp_path / "models" / "model.pt")
+    (tmp_path / "models" / "labels.txt").write_text("\n".join(classes), encoding="utf-8")
+    monkeypatch.setattr(incremental, "MODEL_DIR", tmp_path / "models")
+    monkeypatch.setattr(incremental, "MODEL_PATH", tmp_path / "models" / "model.pt")
+    monkeypatch.setattr(incremental, "LABELS_PATH", tmp_path / "models" / "labels.txt")
+    return model
+
+
+def test_expand_classifier_keeps_old_outputs():
+    model = mobilenet_v3_large(weights=None, num_classes=3).eval()
+    x = torch.randn(2, 3, 64, 64)
+    with torch.inference_mode():
+        before = model(x)
+    expand_classifier(model, 5)
+    with torch.inference_mode():
+        after = model(x)
+    assert after.shape == (2, 5)
+    assert torch.allclose(after[:, :3], before)
+
+
+def test_adds_new_class_and_guards_old_accuracy(tmp_path, monkeypatch):
+    # Lớp "c" nằm giữa theo thứ tự chữ cái ("b" < "c" < "d") nhưng phải được nối vào cuối
+    _make_split(tmp_path / "ds" / "train", ["b", "c", "d"], 6)
+    _make_split(tmp_path / "ds" / "val", ["b", "c", "d"], 2, seed=1)
+    _checkpoint(tmp_path, monkeypatch, ["b", "d"])
+    original = (tmp_path / "models" / "model.pt").read_bytes()
+
+    # Không epoch nào đạt ngưỡng -> giữ nguyên mô hình cũ
+    report = train_incremental(str(tmp_path / "ds"), num_epochs=1, batch_size=4, replay_per_class=2,
+                               max_old_acc_drop=-1.0, use_cache=False)
+    assert report["status"] == "rejected" and report["replay_images"] == 4
+    assert (tmp_path / "models" / "model.pt").read_bytes() == original
+
+    report = train_incremental(str(tmp_path / "ds"), num_epochs=1, batch_size=4, replay_per_class=2,
+                               max_old_acc_drop=1.0, use_cache=False)
+    assert report["status"] == "updated" and report["new_classes"] == ["c"]
+    assert (tmp_path / "models" / "labels.txt").read_text(encoding="utf-8").splitlines() == ["b", "d", "c"]
+    model = mobilenet_v3_large(weights=None, num_classes=3)
+    model.load_state_dict(torch.load(tmp_path / "models" / "model.pt"))
+
+    report = train_incremental(str(tmp_path / "ds"), num_epochs=1, use_cache=False)
+    assert report["status"] == "no_new_classes"
+
+
+def test_extends_installed_small_student(tmp_path, monkeypatch):
+    # Sau distill --install, MODEL_PATH là MobileNetV3 Small (file .arch ghi "small")
+    _make_split(tmp_path / "ds" / "train", ["b", "c"], 4)
+    _make_split(tmp_path / "ds" / "val", ["b", "c"], 2, seed=1)
+    _checkpoint(tmp_path, monkeypatch, ["b"], factory=mobilenet_v3_small)
+    save_model_arch(tmp_path / "models" / "model.pt", "small")
+
+    report = train_incremental(str(tmp_path / "ds"), num_epochs=1, batch_size=4, max_old_acc_drop=1.0,
+                               use_cache=False)
+    assert report["status"] == "updated"
+    assert model_arch(tmp_path / "models" / "model.pt") == "small"
+    model = mobilenet_v3_small(weights=None, num_classes=2)
+    model.load_state_dict(torch.load(tmp_path / "models" / "model.pt"))
+
+
+def test_rejects_without_old_class_val(tmp_path, monkeypatch):
+    # Val chỉ có lớp mới -> baseline lớp cũ bằng 0, chốt chặn không đo được nên phải từ chối
+    _make_split(tmp_path / "ds" / "train", ["b", "c"], 4)
+    _make_split(tmp_path / "ds" / "val", ["c"], 2, seed=1)
+    _checkpoint(tmp_path, monkeypatch, ["b", "d"])
+    original = (tmp_path / "models" / "model.pt").read_bytes()
+
+    report = train_incremental(str(tmp_path / "ds"), num_epochs=1, batch_size=4, max_old_acc_drop=1.0,
+                               use_cache=False)
+    assert report["status"] == "rejected" and report["guard"] == "skipped"
+    # Lớp cũ "d" không còn ảnh train nên không có ảnh replay
+    assert report["no_replay_classes"] == ["d"]
+    assert (tmp_path / "models" / "model.pt").read_bytes() == original
+    assert (tmp_path / "models" / "labels.txt").read_text(encoding="utf-8").splitlines() == ["b", "d"]
@@ -0,0 +1,49 @@
+"""
+Test ánh xạ nhãn mô hình -> món trong catalog dinh dưỡng
+"""
+
+import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.label_catalog import LabelCatalog, fold_name
+from app.nutrition_store import JsonNutritionStore
+
+FOODS = {
+    "pho_bo": {"name": "Phở bò", "calories": 350},
+    "bun_cha_ha_noi": {"name": "Bún chả Hà Nội", "calories": 450},
+    "f17": {"name": "Gỏi Cuốn", "calories": 150},
+    "f18": {"name": "Đậu hũ chiên", "calories": 200},
+}
+
+
+def test_fold_name():
+    assert fold_name("Phở bò") == "pho_bo"
+    assert fold_name("  Đậu hũ  chiên ") == "dau_hu_chien"
+    assert fold_name("Bia Sài Gòn 333") == "bia_sai_gon_333"
+
+
+def test_mapping_and_reload(tmp_path):
+    path = tmp_path / "foods.json"
+    path.write_text(json.dumps(FOODS, ensure_ascii=False), encoding="utf-8")
+    store = JsonNutritionStore(path)
+    catalog = LabelCatalog(store, aliases={"bun_cha": ["Bún chả", "Bún chả Hà Nội"]})
+    labels = ["pho_bo", "bun_cha", "goi_cuon", "dau_hu_chien", "bia_tiger"]
+    catalog.build(labels)
+
+    assert catalog.mapping == {
+        "pho_bo": "pho_bo",             # trùng key
+        "bun_cha": "bun_cha_ha_noi",    # qua alias
+        "goi_cuon": "f17",              # tên món bỏ dấu
+        "dau_hu_chien": "f18",
+    }
+    assert catalog.unmapped == ["bia_tiger"]
+    assert catalog.lookup("goi_cuon")["calories"] == 150
+    assert catalog.lookup("bia_tiger") is None
+
+    # Catalog reload thì bảng được dựng lại ở lần refresh kế tiếp
+    path.write_text(json.dumps({**FOODS, "bia": {"name": "Bia Tiger", "calories": 150}}, ensure_ascii=False), encoding="utf-8")
+    store.reload()
+    catalog.refresh(labels)
+    assert catalog.unmapped == [] and catalog.lookup("bia_tiger")["name"] == "Bia Tiger"
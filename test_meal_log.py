@@ -0,0 +1,121 @@
+"""
+Test nhật ký ăn uống: tổng cộng dồn theo ngày/tuần và nén dữ liệu cũ
+"""
+
+import json
+import os
+import random
+import sys
+from datetime import date, datetime, timedelta
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from fastapi.testclient import TestClient
+
+import app.main as main
+from app import meal_log
+from app.meal_log import MACROS, MealLog, iso_week
+from app.nutrition_store import JsonNutritionStore
+from app.schemas import UserProfile
+from app.user_health_calculator import UserHealthCalculator
+
+FOODS = {
+    "pho_bo": {"name": "Phở bò", "calories": 350, "protein": 25, "carbs": 45, "fat": 8},
+    "goi_cuon": {"name": "Gỏi cuốn", "calories": 150, "protein": 10, "carbs": 20, "fat": 3},
+}
+PROFILE = {"height": 170, "weight": 65, "age": 30, "gender": "male",
+           "activity_level": "moderate", "goal": "maintain"}
+
+
+def _naive_totals(records, user, match):
+    sums = {m: 0.0 for m in MACROS}
+    count = 0
+    for user_id, eaten_at, key, _, servings, _, nutrition in records:
+        if user_id == user and match(eaten_at.date()):
+            count += 1
+            for m in MACROS:
+                sums[m] += nutrition[m] * servings
+    return count, sums
+
+
+def test_incremental_totals_match_history(tmp_path):
+    rng = random.Random(1)
+    log = MealLog(tmp_path / "log.sqlite3")
+    start = datetime(2026, 3, 1)
+    records = []
+    for _ in range(3000):
+        key = rng.choice(list(FOODS))
+        records.append((f"u{rng.randrange(5)}", start + timedelta(minutes=rng.randrange(40 * 1440)),
+                        key, FOODS[key]["name"], rng.choice([0.5, 1, 2]), "manual", FOODS[key]))
+    log.append_many(records[:2000])
+    for r in records[2000:]:
+        log.append(r[0], r[3], r[6], servings=r[4], food_key=r[2], eaten_at=r[1])
+
+    for day in (date(2026, 3, 1), date(2026, 3, 15), date(2026, 4, 9)):
+        for user in ("u0", "u3"):
+            count, sums = log.daily_totals(user, day)
+            expected = _naive_totals(records, user, lambda d: d == day)
+            assert count == expected[0]
+            assert all(abs(sums[m] - expected[1][m]) < 1e-6 for m in MACROS)
+            count, sums = log.weekly_totals(user, day)
+            expected = _naive_totals(records, user, lambda d: iso_week(d) == iso_week(day))
+            assert count == expected[0]
+            assert all(abs(sums[m] - expected[1][m]) < 1e-6 for m in MACROS)
+
+    # Nén không làm thay đổi tổng, chỉ xoá bản chi tiết cũ
+    before = log.daily_totals("u1", date(2026, 3, 2))
+    deleted = log.compact(keep_days=10, today=date(2026, 4, 10))
+    assert deleted > 0
+    assert log.entries("u1", date(2026, 3, 2)) == []
+    assert log.daily_totals("u1", date(2026, 3, 2)) == before
+    history = log._conn.execute(
+        "SELECT SUM(entries), SUM(calories) FROM meal_history WHERE user_id = 'u1' AND day = '2026-03-02'"
+    ).fetchone()
+    assert history[0] == before[0] and abs(history[1] - before[1]["calories"]) < 1e-6
+    assert log.entries("u1", date(2026, 4, 9))
+
+
+def test_diary_endpoints(tmp_path, monkeypatch):
+    path = tmp_path / "foods.json"
+    path.write_text(json.dumps(FOODS, ensure_ascii=False), encoding="utf-8")
+    monkeypatch.setattr(main, "nutrition_store", JsonNutritionStore(path))
+    monkeypatch.setattr(main, "_meal_log", MealLog(tmp_path / "log.sqlite3"))
+    client = TestClient(main.app)
+
+    today = datetime.combine(date.today(), datetime.min.time()) + timedelta(hours=12)
+    r = client.post("/diary/entries", json={"user_id": "an", "food_name": "phở bò", "servings": 2,
+                                            "eaten_at": today.isoformat()})
+    assert r.status_code == 200, r.text
+    assert r.json()["calories"] == 700 and r.json()["food_key"] == "pho_bo"
+    assert client.post("/diary/entries", json={"user_id": "an", "food_name": "không có"}).status_code == 404
+
+    r = client.post("/diary/an/progress", json=PROFILE)
+    assert r.status_code == 200, r.text
+    progress = r.json()
+    metrics = UserHealthCalculator.calculate_user_metrics(UserProfile(**PROFILE))
+    assert progress["today"]["consumed"]["calories"] == 700
+    assert progress["today"]["target"]["calories"] == metrics.daily_calories_target
+    assert progress["today"]["remaining"]["calories"] == round(metrics.daily_calories_target - 700, 1)
+    assert progress["week"]["target"]["calories"] == metrics.daily_calories_target * 7
+    assert [e["food_name"] for e in client.get("/diary/an/entries").json()] == ["Phở bò"]
+
+
+def test_bench_cleans_up_only_its_own_files(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    small = ["--entries", "200", "--users", "5", "--days", "10", "--batch", "50"]
+    monkeypatch.setattr(sys, "argv", ["meal_log", "bench", *small])
+    meal_log.main()
+    # Mặc định chạy trong thư mục tạm, không để lại file ở thư mục hiện tại
+    assert list(tmp_path.iterdir()) == []
+
+    monkeypatch.setattr(sys, "argv", ["meal_log", "bench", "--db", str(tmp_path / "bench.sqlite3"), *small])
+    meal_log.main()
+    assert list(tmp_path.iterdir()) == []
+
+    # File có sẵn không bị bench xoá
+    user_db = tmp_path / "mine.sqlite3"
+    user_db.write_bytes(b"du lieu")
+    monkeypatch.setattr(sys, "argv", ["meal_log", "bench", "--db", str(user_db), *small])
+    with pytest.raises(SystemExit):
+        meal_log.main()
+    assert user_db.read_bytes() == b"du lieu"
@@ -0,0 +1,139 @@
+"""
+Test cho kho dữ liệu dinh dưỡng (JSON và SQLite)
+"""
+
+import json
+import os
+import sqlite3
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+from app.nutrition_analyzer import NutritionAnalyzer
+from app.nutrition_binary import BinaryNutritionStore, build_binary_catalog
+from app.nutrition_store import JsonNutritionStore, NutritionStore, SqliteNutritionStore, import_json_to_sqlite
+
+SAMPLE_FOODS = {
+    "pho_bo": {
+        "name": "Phở bò", "calories": 350, "protein": 25, "carbs": 45, "fat": 8,
+        "fiber": 3, "sodium": 800, "serving_size": "1 tô",
+        "ingredients": ["bánh phở", "thịt bò"], "vitamins": {"B12": 2.5},
+        "minerals": {"iron": 3.2}, "description": "Món nước truyền thống với nước dùng xương bò",
+    },
+    "goi_cuon": {
+        "name": "Gỏi cuốn", "calories": 150, "protein": 10, "carbs": 20, "fat": 3,
+        "fiber": 2, "sodium": 300, "serving_size": "2 cuốn",
+        "ingredients": ["bánh tráng", "tôm"], "vitamins": {"C": 5.0},
+        "minerals": {"calcium": 40}, "description": "Cuốn tôm thịt với rau sống",
+    },
+    "banh_my": {
+        "name": "Bánh mì", "calories": 420, "protein": 15, "carbs": 55, "fat": 16,
+        "fiber": 2, "sodium": 900, "serving_size": "1 ổ",
+        "ingredients": ["bánh mì", "pate"], "vitamins": {},
+        "minerals": {}, "description": "Bánh mì kẹp thịt và pate",
+    },
+}
+
+
+def _make_stores(tmp_path):
+    json_path = tmp_path / "foods.json"
+    json_path.write_text(json.dumps(SAMPLE_FOODS, ensure_ascii=False), encoding="utf-8")
+    db_path = tmp_path / "foods.sqlite3"
+    assert import_json_to_sqlite(json_path, db_path) == len(SAMPLE_FOODS)
+    bin_path = tmp_path / "foods.bin"
+    assert build_binary_catalog(json_path, bin_path) == len(SAMPLE_FOODS)
+    return JsonNutritionStore(json_path), SqliteNutritionStore(db_path, pool_size=2), BinaryNutritionStore(bin_path)
+
+
+def test_lookup_matches_between_backends(tmp_path):
+    for store in _make_stores(tmp_path):
+        assert len(store) == 3
+        assert set(store) == set(SAMPLE_FOODS)
+        assert "pho_bo" in store and "bun_bo" not in store
+        assert dict(store["goi_cuon"]) == SAMPLE_FOODS["goi_cuon"]
+        assert store.find("PHỞ BÒ")[0] == "pho_bo"
+        assert dict(store.find("PHỞ BÒ")[1]) == SAMPLE_FOODS["pho_bo"]
+        assert store.find("Banh_My")[0] == "banh_my"
+        assert store.find("không có") is None
+
+
+def test_search_and_ranges(tmp_path):
+    json_store, sqlite_store, binary_store = _make_stores(tmp_path)
+    assert sqlite_store.search("tôm") == ["goi_cuon"]
+    # FTS5 bỏ dấu nên tìm được cả khi gõ không dấu
+    assert sqlite_store.search("nuoc dung") == ["pho_bo"]
+    assert json_store.search("pate") == ["banh_my"]
+    assert binary_store.search("pate") == ["banh_my"]
+    for store in (json_store, sqlite_store, binary_store):
+        assert sorted(store.filter_ranges(calories=(None, 360))) == ["goi_cuon", "pho_bo"]
+        assert store.filter_ranges(calories=(200, None), fat=(None, 10)) == ["pho_bo"]
+        # Mặc định không giới hạn số kết quả (như /nutrition/search trước đây), limit chỉ khi được truyền
+        assert len(store.search("thịt")) >= 2
+        assert len(store.search("thịt", limit=1)) == 1
+
+
+def test_search_semantics_match_between_backends(tmp_path):
+    stores = _make_stores(tmp_path)
+    queries = ["tôm", "TÔM", "nuoc dung", "pate", "thịt", "bo", "thit bo", "ban", "banh-mi", "xương bò",
+               "ung", "dùng bò", "", "--", "mì kẹp", "kẹp mì"]
+    for query in queries:
+        # Cùng tập kết quả; chỉ thứ tự có thể khác (SQLite xếp theo rank)
+        results = [sorted(store.search(query)) for store in stores]
+        assert results[0] == results[1] == results[2], query
+    for store in stores:
+        assert sorted(store.search("thit")) == ["banh_my", "goi_cuon"]
+        # Mọi từ đều phải khớp (AND), có thể ở tên hoặc mô tả
+        assert store.search("thit bo") == [] and store.search("tom rau") == ["goi_cuon"]
+        assert store.search("ban") == ["banh_my"]
+        # Khớp theo tiền tố từ, không theo chuỗi con ("ung" nằm giữa "dung")
+        assert store.search("ung") == []
+        # Cụm nối bằng dấu gạch phải liên tiếp trong cùng một trường
+        assert store.search("banh-mi") == ["banh_my"]
+        assert store.search("pho-bo") == ["pho_bo"]
+        assert store.search("bo-pho") == []
+
+
+def test_reload_closes_checked_out_connections(tmp_path):
+    _, store, _ = _make_stores(tmp_path)
+    pool = store._pool
+    with pool.connection() as busy:
+        store.reload()
+        # Kết nối đang dùng vẫn truy vấn được cho tới khi trả về
+        assert busy.execute("SELECT COUNT(*) FROM foods").fetchone()[0] == 3
+    with pytest.raises(sqlite3.ProgrammingError):
+        busy.execute("SELECT 1")
+    assert pool._idle.empty() and pool._created == 0
+    assert len(store) == 3
+
+
+def test_store_interface_is_abstract():
+    with pytest.raises(TypeError):
+        NutritionStore()
+
+
+def test_analyzer_uses_store(tmp_path):
+    results = []
+    for store in _make_stores(tmp_path):
+        analyzer = NutritionAnalyzer(store=store)
+        results.append(sorted((s["food_key"], s["health_score"]) for s in analyzer.get_all_foods_summary()))
+    assert results[0] == results[1] == results[2]
+
+
+def test_binary_keeps_extra_fields_and_reloads(tmp_path):
+    json_path = tmp_path / "foods.json"
+    foods = {"che": {"name": "Chè", "calories": 250, "sugar": 30}}
+    json_path.write_text(json.dumps(foods, ensure_ascii=False), encoding="utf-8")
+    bin_path = tmp_path / "foods.bin"
+    build_binary_catalog(json_path, bin_path)
+    store = BinaryNutritionStore(bin_path)
+    view = store["che"]
+    assert view["sugar"] == 30 and "protein" not in view
+    assert view.to_dict() == {**foods["che"], "ingredients": [], "vitamins": {}, "minerals": {}}
+
+    foods["che"]["calories"] = 300
+    json_path.write_text(json.dumps(foods, ensure_ascii=False), encoding="utf-8")
+    build_binary_catalog(json_path, bin_path)
+    store.reload()
+    # View cũ vẫn đọc bản đã map trước đó, view mới đọc dữ liệu mới
+    assert view["calories"] == 250 and store["che"]["calories"] == 300
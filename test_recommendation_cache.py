@@ -0,0 +1,76 @@
+"""
+Test cache khuyến nghị theo hồ sơ đã lượng tử hoá và món ăn
+"""
+
+import json
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from app.food_recommendation_service import FoodRecommendationService
+from app.nutrition_store import JsonNutritionStore
+from app.recommendation_cache import RecommendationCache
+from app.schemas import UserProfile
+
+FOODS = {
+    "pho_bo": {"name": "Phở bò", "calories": 350, "protein": 25, "carbs": 45, "fat": 8},
+    "banh_my": {"name": "Bánh mì", "calories": 420, "protein": 15, "carbs": 55, "fat": 16},
+}
+
+
+def _profile(height=170.2, weight=65.1, goal="lose_weight"):
+    return UserProfile(height=height, weight=weight, age=30, gender="female",
+                       activity_level="light", goal=goal)
+
+
+def _store(tmp_path):
+    path = tmp_path / "foods.json"
+    path.write_text(json.dumps(FOODS, ensure_ascii=False), encoding="utf-8")
+    return JsonNutritionStore(path)
+
+
+def test_near_identical_profiles_share_entry(tmp_path):
+    cache = RecommendationCache(_store(tmp_path), height_step=1, weight_step=0.5)
+    first = cache.get_recommendation(_profile(), "pho_bo", "pho bo", FOODS["pho_bo"])
+    second = cache.get_recommendation(_profile(170.4, 64.9), "pho_bo", "Phở bò", FOODS["pho_bo"])
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+    assert second.food_name == "Phở bò" and first.food_name == "pho bo"
+    assert second.health_score == first.health_score
+    # Kết quả là khuyến nghị của hồ sơ đại diện cho nhóm
+    expected = FoodRecommendationService.get_food_recommendation(_profile(170, 65), "pho bo", FOODS["pho_bo"])
+    assert first == expected
+
+    cache.get_recommendation(_profile(goal="maintain"), "pho_bo", "pho bo", FOODS["pho_bo"])
+    assert cache.stats()["misses"] == 2
+
+
+def test_invalidated_on_catalog_reload(tmp_path):
+    store = _store(tmp_path)
+    cache = RecommendationCache(store)
+    cache.get_recommendation(_profile(), "pho_bo", "pho bo", FOODS["pho_bo"])
+    store.reload()
+    cache.get_recommendation(_profile(), "pho_bo", "pho bo", FOODS["pho_bo"])
+    stats = cache.stats()
+    assert stats["hits"] == 0 and stats["misses"] == 2 and stats["invalidations"] == 1
+
+
+def test_bounded_by_entries_bytes_and_ttl(tmp_path):
+    store = _store(tmp_path)
+    cache = RecommendationCache(store, max_entries=3, height_step=0)
+    for i in range(5):
+        cache.get_recommendation(_profile(height=160 + i), "pho_bo", "pho bo", FOODS["pho_bo"])
+    stats = cache.stats()
+    assert stats["entries"] == 3 and stats["evictions"] == 2
+
+    one_size = stats["bytes"] // 3
+    cache = RecommendationCache(store, max_bytes=int(one_size * 2.5), height_step=0)
+    for i in range(5):
+        cache.get_recommendation(_profile(height=160 + i), "banh_my", "banh mi", FOODS["banh_my"])
+    assert cache.stats()["entries"] == 2 and cache.stats()["bytes"] <= cache.max_bytes
+
+    cache = RecommendationCache(store, ttl=0.05)
+    cache.get_recommendation(_profile(), "pho_bo", "pho bo", FOODS["pho_bo"])
+    time.sleep(0.1)
+    cache.get_recommendation(_profile(), "pho_bo", "pho bo", FOODS["pho_bo"])
+    assert cache.stats()["expirations"] == 1 and cache.stats()["hits"] == 0
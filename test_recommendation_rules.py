@@ -0,0 +1,254 @@
+"""
+Test cho bảng luật khuyến nghị
+"""
+
+import json
+import os
+import random
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+
+from app.food_recommendation_service import FoodRecommendationService
+from app.recommendation_rules import RuleBook, RuleSet
+from app.schemas import UserProfile
+from app.user_health_calculator import UserHealthCalculator
+
+
+def test_batch_matches_scalar():
+    rng = random.Random(3)
+    for goal in ("lose_weight", "maintain", "gain_weight"):
+        profile = UserProfile(height=165, weight=80, age=35, gender="female",
+                              activity_level="light", goal=goal)
+        metrics = UserHealthCalculator.calculate_user_metrics(profile)
+        foods = {
+            "calories": np.array([rng.choice([150, 400, 520]) + rng.uniform(-80, 80) for _ in range(500)]),
+            "protein": np.array([rng.uniform(0, 60) for _ in range(500)]),
+            "carbs": np.array([rng.uniform(0, 150) for _ in range(500)]),
+            "fat": np.array([rng.uniform(0, 50) for _ in range(500)]),
+        }
+        batch = FoodRecommendationService.score_foods(profile, foods, metrics)
+        for i in range(500):
+            food = {k: float(v[i]) for k, v in foods.items()}
+            rec = FoodRecommendationService.get_food_recommendation(profile, "món", food, metrics)
+            assert batch["health_score"][i] == rec.health_score
+            assert batch["recommendation"][i] == rec.recommendation
+
+
+def test_tiers_and_fallback():
+    rules = RuleSet("demo", {
+        "base": 10, "min": 0, "max": 20, "default_label": "OK",
+        "fallback_advice": ["ổn"],
+        "rules": [
+            {"metric": "sodium", "tiers": [
+                {"gt": 1000, "delta": -15, "label": "CAO", "advice": "natri {value:.0f}mg"},
+                {"gt": 600, "delta": -5},
+            ]},
+            {"when": {"goal": ["lose_weight"]}, "tiers": [{"delta": 3, "channel": "goal", "advice": "giảm cân"}]},
+        ],
+    })
+    high = rules.evaluate({"sodium": 1200, "goal": "lose_weight"})
+    assert high.score == 0 and high.label == "CAO"
+    assert high.messages() == ["natri 1200mg"] and high.messages("goal") == ["giảm cân"]
+    mid = rules.evaluate({"sodium": 700, "goal": "maintain"})
+    assert mid.score == 5 and mid.label == "OK" and mid.messages() == ["ổn"]
+    # Thiếu chỉ số thì bỏ qua luật
+    assert rules.evaluate({}).score == 10
+
+    batch = rules.evaluate_batch({"sodium": np.array([1200, 700, np.nan]), "goal": "lose_weight"})
+    assert batch.scores.tolist() == [0, 8, 13]
+    assert batch.labels.tolist() == ["CAO", "OK", "OK"]
+    assert batch.row(1).messages() == [] and batch.row(1).messages("goal") == ["giảm cân"]
+
+
+def test_rule_book_reloads_on_change(tmp_path):
+    path = tmp_path / "rules.json"
+    spec = {"score": {"base": 0, "rules": [{"metric": "calories", "tiers": [{"gt": 400, "delta": -1}]}]}}
+    path.write_text(json.dumps(spec), encoding="utf-8")
+    book = RuleBook(path)
+    assert book.get("score").evaluate({"calories": 350}).score == 0
+
+    # Chỉnh ngưỡng trong file, không cần sửa code
+    spec["score"]["rules"][0]["tiers"][0]["gt"] = 300
+    path.write_text(json.dumps(spec), encoding="utf-8")
+    os.utime(path, (0, 12345))
+    book._checked_at -= RuleBook.CHECK_INTERVAL
+    assert book.get("score").evaluate({"calories": 350}).score == -1
+
+    # File lỗi không làm mất bộ luật đang dùng
+    path.write_text(json.dumps({"score": {"rules": [{"tiers": [{"gtt": 1}]}]}}), encoding="utf-8")
+    os.utime(path, (0, 23456))
+    book._checked_at -= RuleBook.CHECK_INTERVAL
+    assert book.get("score").evaluate({"calories": 350}).score == -1
+
+
+# ===== Đối chiếu bảng luật với code rẽ nhánh trước khi chuyển sang recommendation_rules.json =====
+
+def _baseline_label(goal, cal):
+    if goal == "lose_weight":
+        return "HẠN CHẾ ĂN" if cal > 30 else "ĂN VỪA PHẢI" if cal > 20 else "NÊN ĂN"
+    if goal == "gain_weight":
+        return "NÊN ĂN THÊM" if cal < 15 else "NÊN ĂN" if cal < 25 else "ĂN VỪA PHẢI"
+    return "ĂN VỪA PHẢI" if cal > 25 else "NÊN ĂN"
+
+
+def _baseline_advice(goal, bmi_category, cal, protein, carbs, fat):
+    advice = []
+    if cal > 30:
+        advice.append("⚠️ Món ăn này có lượng calo cao, chiếm {:.1f}% nhu cầu hàng ngày".format(cal))
+    elif cal < 10:
+        advice.append("✅ Món ăn này ít calo, chỉ chiếm {:.1f}% nhu cầu hàng ngày".format(cal))
+    if protein > 40:
+        advice.append("💪 Protein cao, tốt cho cơ bắp và no lâu")
+    elif protein < 15:
+        advice.append("🥩 Có thể bổ sung thêm protein từ thịt, cá, trứng")
+    if carbs > 40:
+        advice.append("🍞 Carbs cao, nên ăn vào buổi sáng hoặc trước khi tập")
+    elif carbs < 20:
+        advice.append("🌾 Carbs thấp, phù hợp với chế độ low-carb")
+    if fat > 40:
+        advice.append("🥑 Chất béo cao, nên ăn vừa phải")
+    elif fat < 15:
+        advice.append("🥜 Chất béo thấp, có thể bổ sung từ các loại hạt")
+    if goal == "lose_weight":
+        if cal > 25:
+            advice.append("🎯 Để giảm cân, nên ăn món này vào bữa chính và giảm bữa phụ")
+    elif goal == "gain_weight":
+        if cal < 20:
+            advice.append("🎯 Để tăng cân, có thể ăn thêm món này hoặc bổ sung thêm calo")
+    if bmi_category in ("Thừa cân", "Béo phì"):
+        advice.append("📊 Với BMI hiện tại, nên ưu tiên món ăn ít calo, nhiều protein")
+    elif bmi_category == "Thiếu cân":
+        advice.append("📊 Với BMI hiện tại, nên ưu tiên món ăn giàu calo và dinh dưỡng")
+    return advice
+
+
+def _baseline_score(goal, cal, protein, carbs, fat):
+    score = 100
+    if cal > 40:
+        score -= 20
+    elif cal > 30:
+        score -= 10
+    elif cal > 25:
+        score -= 5
+    if 20 <= protein <= 40:
+        score += 10
+    elif protein < 15:
+        score -= 5
+    if 30 <= carbs <= 50:
+        score += 10
+    elif carbs > 60:
+        score -= 5
+    if 20 <= fat <= 35:
+        score += 10
+    elif fat > 40:
+        score -= 5
+    if goal == "lose_weight" and cal <= 25:
+        score += 15
+    elif goal == "gain_weight" and cal >= 20:
+        score += 15
+    elif goal == "maintain" and 20 <= cal <= 30:
+        score += 15
+    return max(0, min(100, round(score, 1)))
+
+
+def _baseline_food_health(food):
+    score, tips = 100.0, []
+    for metric, high, low, high_delta, low_delta in (
+        ("calories", 400, 300, -20, -10),
+        ("sodium", 1000, 600, -15, -8),
+        ("fat", 20, 15, -15, -8),
+        ("protein", 20, 15, 10, 5),
+        ("fiber", 3, 1, 10, 5),
+    ):
+        if food[metric] > high:
+            score += high_delta
+        elif food[metric] > low:
+            score += low_delta
+    # Thứ tự lời khuyên như code cũ: calo, natri, protein, chất xơ, chất béo
+    if food["calories"] > 400:
+        tips.append("Món ăn này có lượng calo cao, nên ăn vừa phải")
+    if food["sodium"] > 1000:
+        tips.append("Hàm lượng natri cao, người bị huyết áp nên hạn chế")
+    if food["protein"] > 20:
+        tips.append("Giàu protein, tốt cho việc xây dựng cơ bắp")
+    if food["fiber"] > 3:
+        tips.append("Chứa nhiều chất xơ, tốt cho hệ tiêu hóa")
+    if food["fat"] > 20:
+        tips.append("Hàm lượng chất béo cao, nên ăn điều độ")
+    if not tips:
+        tips.append("Món ăn cân bằng dinh dưỡng, phù hợp cho bữa ăn hàng ngày")
+    return max(0, min(100, score)), tips
+
+
+# Giá trị % quanh mọi ngưỡng của code cũ (10/15/20/25/30/35/40/50/60)
+PERCENT_BOUNDARIES = [0, 5, 9.9, 10, 10.1, 14.9, 15, 15.1, 19.9, 20, 20.1, 24.9, 25, 25.1, 29.9, 30, 30.1,
+                      34.9, 35, 35.1, 39.9, 40, 40.1, 49.9, 50, 50.1, 59.9, 60, 60.1, 85]
+BMI_CATEGORIES = ["Thiếu cân", "Bình thường", "Thừa cân", "Béo phì"]
+
+
+def _recommendation_cases():
+    """Mỗi chỉ số lần lượt chạy qua các ngưỡng, các chỉ số còn lại cố định ở vài mức nền"""
+    for goal in ("lose_weight", "maintain", "gain_weight"):
+        for bmi_category in BMI_CATEGORIES:
+            for base in (0, 22, 45, 70):
+                for metric in range(4):
+                    for value in PERCENT_BOUNDARIES:
+                        percents = [base] * 4
+                        percents[metric] = value
+                        yield goal, bmi_category, percents
+    rng = random.Random(7)
+    for _ in range(3000):
+        yield (rng.choice(["lose_weight", "maintain", "gain_weight"]), rng.choice(BMI_CATEGORIES),
+               [rng.choice(PERCENT_BOUNDARIES) for _ in range(4)])
+
+
+def test_recommendation_rules_match_baseline_branches():
+    from types import SimpleNamespace
+
+    profiles = {goal: UserProfile(height=170, weight=65, age=30, gender="male", activity_level="moderate",
+                                  goal=goal) for goal in ("lose_weight", "maintain", "gain_weight")}
+    for goal, bmi_category, (cal, protein, carbs, fat) in _recommendation_cases():
+        analysis = {n: {"percent": v} for n, v in zip(("calories", "protein", "carbs", "fat"),
+                                                      (cal, protein, carbs, fat))}
+        profile = profiles[goal]
+        case = (goal, bmi_category, cal, protein, carbs, fat)
+        assert FoodRecommendationService.generate_recommendation(profile, analysis) == _baseline_label(goal, cal), case
+        assert FoodRecommendationService.calculate_health_score(profile, analysis) == \
+            _baseline_score(goal, cal, protein, carbs, fat), case
+        advice = FoodRecommendationService.generate_detailed_advice(
+            profile, analysis, SimpleNamespace(bmi_category=bmi_category))
+        assert advice == _baseline_advice(goal, bmi_category, cal, protein, carbs, fat), case
+
+
+def test_food_health_rules_match_baseline_branches(tmp_path):
+    from app.nutrition_analyzer import NutritionAnalyzer
+    from app.nutrition_store import JsonNutritionStore
+
+    # Ngưỡng của food_health: calo 300/400, natri 600/1000, chất béo 15/20, protein 15/20, chất xơ 1/3
+    around = {"calories": [0, 299, 300, 301, 399, 400, 401, 650], "sodium": [0, 599, 600, 601, 999, 1000, 1001],
+              "fat": [0, 14.9, 15, 15.1, 19.9, 20, 20.1], "protein": [0, 14.9, 15, 15.1, 19.9, 20, 20.1, 40],
+              "fiber": [0, 0.9, 1, 1.1, 2.9, 3, 3.1]}
+    rng = random.Random(11)
+    foods = {}
+    for metric, values in around.items():
+        for value in values:
+            food = {m: rng.choice(v) for m, v in around.items()}
+            food[metric] = value
+            foods[f"{metric}_{value}"] = food
+    for i in range(1500):
+        foods[f"random_{i}"] = {m: rng.choice(v) for m, v in around.items()}
+    for key, food in foods.items():
+        food.update(name=key, carbs=30, serving_size="1 phần")
+    path = tmp_path / "foods.json"
+    path.write_text(json.dumps(foods, ensure_ascii=False), encoding="utf-8")
+    analyzer = NutritionAnalyzer(store=JsonNutritionStore(path))
+
+    # Từng món (evaluate) và cả catalog một lượt (evaluate_batch) đều khớp code cũ
+    for summary in analyzer.get_all_foods_summary():
+        food = foods[summary["food_key"]]
+        score, tips = _baseline_food_health(food)
+        single = analyzer.analyze_nutrition(summary["food_key"])
+        assert single.health_score == summary["health_score"] == score, food
+        assert single.health_tips == tips and summary["health_tips"] == tips[:2], food
@@ -0,0 +1,86 @@
+"""
+Test pipeline /nutrition/scan-and-recommend: các giai đoạn chạy song song và header Server-Timing
+"""
+
+import io
+import json
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+from fastapi.testclient import TestClient
+from PIL import Image
+
+import app.main as main
+from app import inference
+from app.label_catalog import LabelCatalog
+from app.nutrition_store import JsonNutritionStore
+from app.user_health_calculator import UserHealthCalculator
+
+PROFILE = {"height": 170, "weight": 65, "age": 30, "gender": "male",
+           "activity_level": "moderate", "goal": "maintain"}
+
+
+def _image_bytes():
+    buf = io.BytesIO()
+    Image.new("RGB", (64, 64), "orange").save(buf, "JPEG")
+    return buf.getvalue()
+
+
+def _post(client, profile=PROFILE):
+    return client.post(
+        "/nutrition/scan-and-recommend",
+        files={"file": ("pho.jpg", _image_bytes(), "image/jpeg")},
+        data={"user_profile": json.dumps(profile)},
+    )
+
+
+def test_stages_overlap_and_report_timings(tmp_path, monkeypatch):
+    # Key khác nhãn: món được tìm qua tên đã bỏ dấu
+    foods = {"pho": {"name": "Phở bò", "calories": 350, "protein": 25, "carbs": 45, "fat": 8,
+                     "fiber": 3, "sodium": 800, "serving_size": "1 tô"}}
+    path = tmp_path / "foods.json"
+    path.write_text(json.dumps(foods, ensure_ascii=False), encoding="utf-8")
+    store = JsonNutritionStore(path)
+    monkeypatch.setattr(main, "nutrition_store", store)
+    monkeypatch.setattr(main, "label_catalog", LabelCatalog(store, aliases={}))
+    labels = ["pho_bo"]
+    monkeypatch.setattr(inference, "labels", lambda: labels)
+
+    calculate = UserHealthCalculator.calculate_user_metrics
+
+    def slow_metrics(profile):
+        time.sleep(0.3)
+        return calculate(profile)
+
+    def slow_predict(tensor):
+        assert tuple(tensor.shape[:2]) == (1, 3)
+        time.sleep(0.3)
+        return "pho_bo", 0.9
+
+    monkeypatch.setattr(UserHealthCalculator, "calculate_user_metrics", staticmethod(slow_metrics))
+    monkeypatch.setattr(inference, "predict_tensor", slow_predict)
+
+    start = time.perf_counter()
+    r = _post(TestClient(main.app))
+    elapsed = time.perf_counter() - start
+
+    assert r.status_code == 200, r.text
+    body = r.json()
+    assert body["food_name"] == "pho_bo" and body["food_nutrition"]["calories"] == 350
+    # Chỉ số người dùng được tính trong lúc suy luận nên không cộng dồn thời gian
+    assert elapsed < 0.55
+    stages = [part.split(";")[0] for part in r.headers["server-timing"].split(", ")]
+    assert {"read", "decode", "infer", "metrics", "catalog", "lookup", "recommend"} <= set(stages)
+    assert stages[-1] == "total"
+
+
+def test_low_confidence_keeps_status_and_timings(monkeypatch):
+    monkeypatch.setattr(inference, "predict_tensor", lambda tensor: ("pho_bo", 0.2))
+    r = _post(TestClient(main.app))
+    assert r.status_code == 400
+    assert "infer;dur=" in r.headers["server-timing"]
+
+    r = _post(TestClient(main.app), profile={**PROFILE, "height": -1})
+    assert r.status_code == 422
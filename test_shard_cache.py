@@ -0,0 +1,75 @@
+"""
+Test cache ảnh huấn luyện đã giải mã (shard uint8 memmap)
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import torch
+from PIL import Image
+from torchvision import datasets, transforms
+
+from app.training import shard_cache
+from app.training.shard_cache import CachedImageDataset, build_split_cache, train_augmentation
+from app.training.train import _build_dataloaders
+
+SIZE = 32
+
+
+def _make_split(root, counts, seed=0):
+    rng = np.random.default_rng(seed)
+    for cls, n in counts.items():
+        (root / cls).mkdir(parents=True, exist_ok=True)
+        for i in range(n):
+            pixels = rng.integers(0, 255, size=(40 + i, 50, 3), dtype=np.uint8)
+            Image.fromarray(pixels).save(root / cls / f"{cls}_{i}.jpg")
+
+
+def test_val_matches_original_transform(tmp_path):
+    _make_split(tmp_path / "val", {"pho_bo": 3, "bun_cha": 2})
+    (tmp_path / "val" / "bun_cha" / "broken.jpg").write_bytes(b"not an image")
+    index = build_split_cache(tmp_path / "val", tmp_path / "cache", image_size=SIZE, shard_images=2)
+    assert index["count"] == 5 and len(index["shards"]) == 3 and len(index["failed"]) == 1
+
+    cached = CachedImageDataset(tmp_path / "cache")
+    original = datasets.ImageFolder(str(tmp_path / "val"), transform=transforms.Compose([
+        transforms.Resize((SIZE, SIZE)),
+        transforms.ToTensor(),
+        transforms.Normalize(mean=[0.485, 0.456, 0.406], std=[0.229, 0.224, 0.225]),
+    ]))
+    assert cached.classes == original.classes
+    good = [s for s in original.samples if not s[0].endswith("broken.jpg")]
+    for i, (path, label) in enumerate(good):
+        image, target = cached[i]
+        expected = original[original.samples.index((path, label))][0]
+        assert target == label
+        assert torch.allclose(image, expected, atol=1e-5)
+
+
+def test_rebuilds_only_when_sources_change(tmp_path):
+    _make_split(tmp_path / "train", {"a": 2, "b": 2})
+    build_split_cache(tmp_path / "train", tmp_path / "cache", image_size=SIZE)
+    stamp = (tmp_path / "cache" / "index.json").stat().st_mtime_ns
+    build_split_cache(tmp_path / "train", tmp_path / "cache", image_size=SIZE)
+    assert (tmp_path / "cache" / "index.json").stat().st_mtime_ns == stamp
+
+    _make_split(tmp_path / "train", {"c": 1}, seed=1)
+    index = build_split_cache(tmp_path / "train", tmp_path / "cache", image_size=SIZE)
+    assert index["classes"] == ["a", "b", "c"] and index["count"] == 5
+
+    augmented = CachedImageDataset(tmp_path / "cache", transform=train_augmentation(SIZE))
+    image, _ = augmented[4]
+    assert image.shape == (3, SIZE, SIZE) and image.dtype == torch.float32
+
+
+def test_dataloaders_use_cache(tmp_path, monkeypatch):
+    _make_split(tmp_path / "ds" / "train", {"a": 3, "b": 1})
+    _make_split(tmp_path / "ds" / "val", {"a": 1, "b": 1})
+    monkeypatch.setattr(shard_cache, "TRAIN_CACHE_DIR", tmp_path / "cache")
+    train_loader, val_loader, num_classes, classes = _build_dataloaders(str(tmp_path / "ds"), 2, use_cache=True)
+    assert num_classes == 2 and classes == ["a", "b"]
+    assert isinstance(train_loader.dataset, CachedImageDataset)
+    images, labels = next(iter(val_loader))
+    assert images.shape[1] == 3 and labels.tolist() == [0, 1]
@@ -0,0 +1,68 @@
+"""
+Test dò siêu tham số bằng successive halving
+"""
+
+import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+from torchvision.models import mobilenet_v3_large
+
+from app.training import shard_cache, sweep, train
+from app.training.sweep import sample_configs
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    for split, n in (("train", 4), ("val", 2)):
+        for cls in ("a", "b"):
+            (tmp_path / "ds" / split / cls).mkdir(parents=True)
+            for i in range(n):
+                Image.fromarray(rng.integers(0, 255, (40, 48, 3), dtype=np.uint8)).save(
+                    tmp_path / "ds" / split / cls / f"{i}.jpg")
+    monkeypatch.setattr(shard_cache, "TRAIN_CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(train, "mobilenet_v3_large", lambda weights=None: mobilenet_v3_large(weights=None))
+    monkeypatch.setattr(train, "MODEL_DIR", tmp_path / "models")
+    monkeypatch.setattr(sweep, "MODEL_DIR", tmp_path / "models")
+    monkeypatch.setattr(sweep, "MODEL_PATH", tmp_path / "models" / "best.pt")
+    monkeypatch.setattr(sweep, "LABELS_PATH", tmp_path / "models" / "labels.txt")
+    return tmp_path / "ds"
+
+
+def test_sample_configs_grid_and_random():
+    grid = sample_configs({"batch_size": [8, 16], "unfrozen_blocks": [2, 4]}, n_trials=10)
+    assert len(grid) == 4 and {"batch_size": 16, "unfrozen_blocks": 2} in grid
+    configs = sample_configs({"learning_rate": {"low": 1e-4, "high": 1e-2, "log": True},
+                              "num_epochs": {"low": 2, "high": 6}}, n_trials=5, seed=1)
+    assert len(configs) == 5
+    assert all(1e-4 <= c["learning_rate"] <= 1e-2 and isinstance(c["num_epochs"], int) for c in configs)
+    with pytest.raises(ValueError):
+        sample_configs({"momentum": [0.9]}, n_trials=1)
+
+
+def test_successive_halving_prunes_and_installs_winner(tmp_path, dataset, monkeypatch):
+    # Trial luôn ghi checkpoint mỗi epoch, kể cả khi TRAIN_CHECKPOINT_EVERY lớn hơn mốc
+    monkeypatch.setattr(train, "TRAIN_CHECKPOINT_EVERY", 5)
+    torch.manual_seed(0)
+    epochs = []
+    space = {"num_epochs": [3], "batch_size": [4], "learning_rate": [1e-3, 1e-4], "unfrozen_blocks": [1, 2]}
+    result = sweep.run_sweep(str(dataset), space, n_trials=4, min_epochs=1, eta=2, cpus=[0],
+                             sweep_dir=str(tmp_path / "sweep"), on_epoch=epochs.append)
+
+    report = json.loads((tmp_path / "models" / "sweep_leaderboard.json").read_text(encoding="utf-8"))
+    trials = {t["id"]: t for t in report["trials"]}
+    statuses = sorted(t["status"] for t in trials.values())
+    # 4 trial -> mốc 1 epoch giữ 2 -> mốc 2 epoch giữ 1 -> chạy hết 3 epoch
+    assert statuses == ["completed", "pruned", "pruned", "pruned"]
+    assert sorted(t["epochs_done"] for t in trials.values()) == [1, 1, 2, 3]
+    assert len(epochs) == 4 + 2 + 1
+    assert report["trials"][0]["best_acc"] == result["best_acc"]
+    assert (tmp_path / "models" / "best.pt").read_bytes() == (
+        tmp_path / "sweep" / f"trial-{report['best']['id']:03d}" / "best.pt").read_bytes()
+    assert (tmp_path / "models" / "labels.txt").read_text(encoding="utf-8").splitlines() == ["a", "b"]
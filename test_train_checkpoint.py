@@ -0,0 +1,73 @@
+"""
+Test checkpoint đầy đủ và chạy tiếp (resume) lần huấn luyện bị ngắt
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import pytest
+import torch
+from PIL import Image
+from torchvision.models import mobilenet_v3_large
+
+from app.training import shard_cache, train
+from app.training.checkpoint import load_checkpoint
+
+
+class _Preempted(Exception):
+    pass
+
+
+@pytest.fixture
+def dataset(tmp_path, monkeypatch):
+    rng = np.random.default_rng(0)
+    for split, n in (("train", 5), ("val", 2)):
+        for cls in ("a", "b"):
+            (tmp_path / "ds" / split / cls).mkdir(parents=True)
+            for i in range(n):
+                Image.fromarray(rng.integers(0, 255, (40, 48, 3), dtype=np.uint8)).save(
+                    tmp_path / "ds" / split / cls / f"{i}.jpg")
+    monkeypatch.setattr(shard_cache, "TRAIN_CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(train, "mobilenet_v3_large", lambda weights=None: mobilenet_v3_large(weights=None))
+    monkeypatch.setattr(train, "MODEL_DIR", tmp_path / "models")
+    monkeypatch.setattr(train, "MODEL_PATH", tmp_path / "models" / "model.pt")
+    monkeypatch.setattr(train, "LABELS_PATH", tmp_path / "models" / "labels.txt")
+    return tmp_path / "ds"
+
+
+def _train(dataset, run_dir, **kwargs):
+    torch.manual_seed(0)
+    return train.train_model(str(dataset), num_epochs=4, batch_size=4, cache_features=True, feature_variants=2,
+                             run_dir=str(run_dir), **kwargs)
+
+
+def test_resume_continues_from_last_full_epoch(tmp_path, dataset):
+    _train(dataset, tmp_path / "full")
+    full = load_checkpoint(tmp_path / "full")
+
+    def preempt_after_two(metrics):
+        if metrics["epoch"] == 2:
+            raise _Preempted()
+
+    with pytest.raises(_Preempted):
+        _train(dataset, tmp_path / "run", on_epoch=preempt_after_two)
+    assert load_checkpoint(tmp_path / "run")["epoch"] == 2
+    assert not list((tmp_path / "run").glob(".*tmp*"))
+
+    epochs = []
+    result = _train(dataset, tmp_path / "run", resume=True, on_epoch=epochs.append)
+    resumed = load_checkpoint(tmp_path / "run")
+    assert [m["epoch"] for m in epochs] == [3, 4]
+    assert [m["epoch"] for m in resumed["history"]] == [1, 2, 3, 4]
+    # Cùng kết quả như khi không bị ngắt (optimizer, scheduler, thứ tự lấy mẫu đều được khôi phục)
+    assert result["best_acc"] == full["best_acc"]
+    assert resumed["scheduler"]["last_epoch"] == full["scheduler"]["last_epoch"] == 4
+    for key, value in full["model"].items():
+        assert torch.allclose(resumed["model"][key].float(), value.float(), atol=1e-5), key
+
+    # Chạy mới (không resume) xoá checkpoint cũ trước khi bắt đầu
+    with pytest.raises(_Preempted):
+        _train(dataset, tmp_path / "run", on_epoch=lambda m: (_ for _ in ()).throw(_Preempted()))
+    assert load_checkpoint(tmp_path / "run")["epoch"] == 1
@@ -0,0 +1,83 @@
+"""
+Test chế độ huấn luyện tối ưu CPU (bf16 autocast, channels_last)
+"""
+
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import numpy as np
+import torch
+from PIL import Image
+from torchvision.models import mobilenet_v3_large
+
+from app.training import perf, shard_cache, train
+from app.training.perf import PerfSettings, autocast, loader_kwargs, prepare_inputs, prepare_model
+
+
+def test_bf16_channels_last_matches_fp32():
+    torch.manual_seed(0)
+    model = mobilenet_v3_large(weights=None, num_classes=5).eval()
+    images = torch.randn(16, 3, 128, 128)
+    with torch.inference_mode():
+        expected = model(images)
+    settings = PerfSettings(bf16=True, channels_last=True)
+    net = prepare_model(model, settings)
+    cpu = torch.device("cpu")
+    with torch.inference_mode(), autocast(settings, cpu):
+        actual = net(prepare_inputs(images, cpu, settings))
+    assert actual.dtype == torch.bfloat16
+    assert (actual.float().argmax(1) == expected.argmax(1)).float().mean() >= 0.9
+    assert torch.allclose(actual.float().softmax(1), expected.softmax(1), atol=0.05)
+
+
+def test_loader_kwargs():
+    assert loader_kwargs(PerfSettings(num_workers=0), torch.device("cpu")) == {"num_workers": 0, "pin_memory": False}
+    kwargs = loader_kwargs(PerfSettings(num_workers=3, prefetch_factor=2), torch.device("cpu"))
+    assert kwargs["persistent_workers"] and kwargs["prefetch_factor"] == 2
+    assert perf.resolve_settings(perf=False) == PerfSettings()
+
+
+def test_train_model_perf_mode(tmp_path, monkeypatch):
+    torch.manual_seed(0)
+    rng = np.random.default_rng(0)
+    for split, n in (("train", 4), ("val", 2)):
+        for cls in ("a", "b"):
+            (tmp_path / "ds" / split / cls).mkdir(parents=True)
+            for i in range(n):
+                Image.fromarray(rng.integers(0, 255, (40, 40, 3), dtype=np.uint8)).save(
+                    tmp_path / "ds" / split / cls / f"{i}.jpg")
+    monkeypatch.setattr(shard_cache, "TRAIN_CACHE_DIR", tmp_path / "cache")
+    monkeypatch.setattr(train, "mobilenet_v3_large", lambda weights=None: mobilenet_v3_large(weights=None))
+    monkeypatch.setattr(train, "MODEL_DIR", tmp_path / "models")
+    monkeypatch.setattr(train, "MODEL_PATH", tmp_path / "models" / "model.pt")
+    monkeypatch.setattr(train, "LABELS_PATH", tmp_path / "models" / "labels.txt")
+    monkeypatch.setattr(perf, "TRAIN_BF16", "1")
+    threads = torch.get_num_threads()
+    epochs = []
+    try:
+        train.train_model(str(tmp_path / "ds"), num_epochs=2, batch_size=4, perf=True, on_epoch=epochs.append)
+    finally:
+        torch.set_num_threads(threads)
+    assert len(epochs) == 2 and all(e["images_per_sec"] > 0 for e in epochs)
+    model = mobilenet_v3_large(weights=None)
+    model.classifier[3] = torch.nn.Linear(model.classifier[3].in_features, 2)
+    model.load_state_dict(torch.load(tmp_path / "models" / "model.pt"))
+
+
+def test_benchmark_cli_keeps_real_checkpoint(monkeypatch):
+    # So sánh fp32/perf không được đụng tới MODEL_PATH và checkpoint resume mặc định
+    calls = []
+
+    def fake_train_model(dataset_dir, on_epoch=None, **kwargs):
+        calls.append(kwargs)
+        on_epoch({"images_per_sec": 1.0})
+        return {"best_acc": 0.5}
+
+    monkeypatch.setattr(train, "train_model", fake_train_model)
+    monkeypatch.setattr(train, "MODEL_PATH", train.MODEL_PATH)
+    monkeypatch.setattr(train, "LABELS_PATH", train.LABELS_PATH)
+    monkeypatch.setattr(sys, "argv", ["perf", "datasets", "--epochs", "1"])
+    perf.main()
+    assert len(calls) == 2 and all(c["run_dir"] is not None for c in calls)
+    assert calls[0]["run_dir"] != calls[1]["run_dir"]
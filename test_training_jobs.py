@@ -0,0 +1,131 @@
+"""
+Test quản lý job huấn luyện chạy ở tiến trình riêng
+"""
+
+import json
+import os
+import sys
+import time
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+
+from app.training import jobs
+from app.training.jobs import JobBusyError, JobManager, parse_budgets
+
+
+def fake_train(num_epochs, delay=0.0, on_epoch=None):
+    """Hàm huấn luyện giả, chạy trong tiến trình con"""
+    for epoch in range(num_epochs):
+        time.sleep(delay)
+        on_epoch({"epoch": epoch + 1, "num_epochs": num_epochs, "train_loss": 1.0 / (epoch + 1),
+                  "val_acc": epoch / num_epochs, "images_per_sec": 100.0})
+    cpus = sorted(os.sched_getaffinity(0)) if hasattr(os, "sched_getaffinity") else None
+    return {"nice": os.nice(0), "cpus": cpus}
+
+
+def fake_preemptible(resume=False, on_epoch=None):
+    """Lần đầu "bị ngắt"; chạy lại qua JobManager.resume phải nhận resume=True"""
+    if not resume:
+        raise RuntimeError("preempted")
+    return {"resume": resume}
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.setitem(jobs.TARGETS, "fake", "test_training_jobs:fake_train")
+    monkeypatch.setitem(jobs.TARGETS, "preemptible", "test_training_jobs:fake_preemptible")
+    cpu = sorted(os.sched_getaffinity(0))[:1]
+    return JobManager(tmp_path / "jobs", budgets={"default": cpu, "other": cpu}, nice=5)
+
+
+def _wait_status(manager, job_id, status, timeout=30):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = manager.get(job_id)
+        if job["status"] == status:
+            return job
+        time.sleep(0.05)
+    raise AssertionError(f"job {job_id} không đạt trạng thái {status}: {manager.get(job_id)}")
+
+
+def test_job_runs_out_of_process_with_progress(manager):
+    job = manager.submit("fake", {"num_epochs": 3})
+    job = manager.wait(job["id"], timeout=60)
+    assert job["status"] == "completed", job
+    assert [p["epoch"] for p in job["progress"]] == [1, 2, 3]
+    assert job["pid"] != os.getpid()
+    assert job["result"]["nice"] >= os.nice(0) + 5
+    assert job["result"]["cpus"] == job["cpus"]
+    with pytest.raises(ValueError):
+        manager.submit("unknown", {})
+
+
+def test_budget_cancel_and_resume(manager):
+    job = manager.submit("fake", {"num_epochs": 200, "delay": 0.05})
+    _wait_status(manager, job["id"], "running")
+    with pytest.raises(JobBusyError):
+        manager.submit("fake", {"num_epochs": 1})
+    # Ngân sách khác vẫn nhận job
+    other = manager.submit("fake", {"num_epochs": 1}, budget="other")
+
+    cancelled = manager.cancel(job["id"])
+    assert manager.wait(job["id"], timeout=30)["status"] == "cancelled"
+    assert cancelled["id"] == job["id"]
+    assert manager.wait(other["id"], timeout=60)["status"] == "completed"
+
+    resumed = manager.resume(job["id"])
+    assert resumed["attempt"] == 2 and resumed["history"][0]["status"] == "cancelled"
+    manager.cancel(job["id"])
+    manager.wait(job["id"], timeout=30)
+
+
+def test_lost_process_marked_interrupted(tmp_path, manager):
+    state = {"id": "lost", "kind": "fake", "target": "test_training_jobs:fake_train", "params": {"num_epochs": 1},
+             "budget": "default", "cpus": [], "nice": 0, "status": "running", "attempt": 1,
+             "created_at": "2026-01-01T00:00:00", "started_at": None, "finished_at": None,
+             "pid": 2 ** 22 + 12345, "progress": [], "result": None, "error": None}
+    (tmp_path / "jobs" / "lost.json").write_text(json.dumps(state), encoding="utf-8")
+    restarted = JobManager(tmp_path / "jobs", budgets=manager.budgets)
+    assert restarted.get("lost")["status"] == "interrupted"
+    restarted.resume("lost")
+    assert restarted.wait("lost", timeout=60)["status"] == "completed"
+    with pytest.raises(KeyError):
+        restarted.get("missing")
+
+
+def test_resumed_job_continues_from_checkpoint(manager):
+    job = manager.submit("preemptible", {"resume": False})
+    assert manager.wait(job["id"], timeout=60)["status"] == "failed"
+    manager.resume(job["id"])
+    job = manager.wait(job["id"], timeout=60)
+    assert job["status"] == "completed" and job["result"] == {"resume": True}
+
+
+def test_parse_budgets():
+    assert parse_budgets("default=1-3;nightly=4,6") == {"default": [1, 2, 3], "nightly": [4, 6]}
+    assert parse_budgets("")["default"]
+
+
+def _queued_state(job_id, launcher):
+    return {"id": job_id, "kind": "fake", "target": "test_training_jobs:fake_train", "params": {"num_epochs": 1},
+            "budget": "default", "cpus": [], "nice": 0, "status": "queued", "attempt": 1,
+            "created_at": "2026-01-01T00:00:00", "started_at": None, "finished_at": None,
+            "pid": None, "launcher": launcher, "progress": [], "result": None, "error": None}
+
+
+def test_other_worker_keeps_job_queued_before_pid(tmp_path, manager):
+    # Worker khác (tiến trình này) vừa xếp hàng job, tiến trình con chưa ghi pid
+    (tmp_path / "jobs" / "fresh.json").write_text(json.dumps(_queued_state("fresh", os.getpid())),
+                                                   encoding="utf-8")
+    other = JobManager(tmp_path / "jobs", budgets=manager.budgets)
+    assert other.get("fresh")["status"] == "queued"
+    # Job vẫn chiếm ngân sách trong mắt worker khác
+    with pytest.raises(JobBusyError):
+        other.submit("fake", {"num_epochs": 1})
+
+    # Worker tạo job đã chết trước khi kịp chạy tiến trình con -> interrupted
+    (tmp_path / "jobs" / "orphan.json").write_text(json.dumps(_queued_state("orphan", 2 ** 22 + 12345)),
+                                                    encoding="utf-8")
+    assert other.get("orphan")["status"] == "interrupted"
+    assert (tmp_path / "jobs" / ".lock").exists()
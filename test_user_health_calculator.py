@@ -0,0 +1,71 @@
+"""
+Test cache chỉ số người dùng (BMI, BMR, TDEE) của UserHealthCalculator
+"""
+
+import json
+import os
+import sys
+sys.path.append(os.path.dirname(os.path.abspath(__file__)))
+
+import pytest
+from fastapi.testclient import TestClient
+from pydantic import ValidationError
+
+import app.main as main
+from app.nutrition_store import JsonNutritionStore
+from app.recommendation_cache import RecommendationCache
+from app.schemas import UserProfile
+from app.user_health_calculator import UserHealthCalculator, _cached_user_metrics
+
+PROFILE = {"height": 170, "weight": 65, "age": 30, "gender": "male",
+           "activity_level": "moderate", "goal": "maintain"}
+
+
+def test_equal_profiles_share_cached_metrics():
+    _cached_user_metrics.cache_clear()
+    first = UserHealthCalculator.calculate_user_metrics(UserProfile(**PROFILE))
+    second = UserHealthCalculator.calculate_user_metrics(UserProfile(**PROFILE))
+    # Hồ sơ bằng nhau (khác instance) dùng chung một UserMetrics trong cache
+    assert second is first
+    info = UserHealthCalculator.cache_info()
+    assert (info.hits, info.misses, info.currsize) == (1, 1, 1)
+
+    other = UserHealthCalculator.calculate_user_metrics(UserProfile(**{**PROFILE, "weight": 80}))
+    assert other is not first and other.bmi > first.bmi
+    assert UserHealthCalculator.cache_info().misses == 2
+    # Bất biến: request sau không sửa được đối tượng dùng chung
+    with pytest.raises(ValidationError):
+        first.bmi = 0
+
+
+def test_compare_foods_computes_metrics_once(tmp_path, monkeypatch):
+    foods = {
+        key: {"name": name, "calories": calories, "protein": 20, "carbs": 40, "fat": 10,
+              "fiber": 3, "sodium": 600, "serving_size": "1 phần"}
+        for key, name, calories in (("pho_bo", "Phở bò", 350), ("goi_cuon", "Gỏi cuốn", 150),
+                                    ("banh_my", "Bánh mì", 420))
+    }
+    path = tmp_path / "foods.json"
+    path.write_text(json.dumps(foods, ensure_ascii=False), encoding="utf-8")
+    store = JsonNutritionStore(path)
+    monkeypatch.setattr(main, "nutrition_store", store)
+    monkeypatch.setattr(main, "recommendation_cache", RecommendationCache(store))
+
+    calculate = UserHealthCalculator.calculate_user_metrics
+    calls = []
+
+    def counting_metrics(profile):
+        calls.append(profile)
+        return calculate(profile)
+
+    monkeypatch.setattr(UserHealthCalculator, "calculate_user_metrics", staticmethod(counting_metrics))
+    _cached_user_metrics.cache_clear()
+
+    r = TestClient(main.app).post("/nutrition/compare-foods", json={
+        "user_profile": PROFILE, "food_names": ["pho_bo", "goi_cuon", "banh_my", "bun_rieu"],
+    })
+    assert r.status_code == 200, r.text
+    assert len(r.json()) == 4
+    # Một lần cho cả request (4 món), kể cả món không có trong catalog
+    assert len(calls) == 1
+    assert UserHealthCalculator.cache_info().misses == 1
@@ -3,14 +3,21 @@
 Script training mô hình nhận diện thức ăn Việt Nam
 """
 
+import argparse
 import sys
 import os
 sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
-from app.training.train import train_model
+from app.training.manifest import load_manifest
+from app.training.distributed import train_distributed
 from pathlib import Path
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Training mô hình nhận diện thức ăn Việt Nam")
+    parser.add_argument("--resume", action="store_true", help="Chạy tiếp từ checkpoint của lần train bị ngắt")
+    parser.add_argument("--world-size", type=int, default=None, help="Số tiến trình data-parallel")
+    args = parser.parse_args()
+
     # Đường dẫn tới dataset
     dataset_dir = "datasets"
     
@@ -33,16 +40,19 @@ if __name__ == "__main__":
         print(f"❌ Lỗi: Thư mục validation '{val_dir}' không tồn tại!")
         sys.exit(1)
     
-    # Liệt kê các lớp
-    classes = [d.name for d in train_dir.iterdir() if d.is_dir()]
+    # Cập nhật manifest (chỉ kiểm tra ảnh mới/đã sửa), lớp và số ảnh đọc từ manifest
+    manifest = load_manifest(dataset_dir)
+    train_counts = manifest.class_counts("train")
+    val_counts = manifest.class_counts("val")
+    classes = list(train_counts)
     print(f"📊 Số lớp: {len(classes)}")
     print(f"🏷️  Các lớp: {', '.join(classes)}")
     
     # Đếm số ảnh mỗi lớp
     print("\n📸 Số lượng ảnh mỗi lớp:")
     for cls in classes:
-        train_count = len(list((train_dir / cls).glob("*.jpg")) + list((train_dir / cls).glob("*.jpeg")) + list((train_dir / cls).glob("*.png")))
-        val_count = len(list((val_dir / cls).glob("*.jpg")) + list((val_dir / cls).glob("*.jpeg")) + list((val_dir / cls).glob("*.png")))
+        train_count = train_counts[cls]
+        val_count = val_counts[cls]
         print(f"  {cls}: {train_count} (train) + {val_count} (val) = {train_count + val_count}")
     
     print(f"\n🚀 Bắt đầu training với:")
@@ -53,11 +63,13 @@ if __name__ == "__main__":
     
     try:
         # Bắt đầu training
-        train_model(
+        train_distributed(
             dataset_dir=dataset_dir,
+            world_size=args.world_size,
             num_epochs=10,
             batch_size=16,  # Giảm batch size cho CPU
-            learning_rate=3e-4
+            learning_rate=3e-4,
+            resume=args.resume,
         )
         print("\n✅ Training hoàn thành thành công!")
         